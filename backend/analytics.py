@@ -0,0 +1,175 @@
+"""Sales rollups for the admin dashboard.
+
+An order is folded into two small collections when it turns paid:
+``sales_daily`` (one document per UTC day: orders, revenue, units) and
+``sales_daily_products`` (one per day and product: units, revenue and the
+product's category). Reports only read the rollups, so their cost follows the
+number of days and products in the range rather than the number of orders.
+
+``rebuild_rollups`` recomputes both collections from ``orders`` with
+aggregation pipelines that run inside MongoDB, e.g. to backfill orders paid
+before the rollups existed.
+"""
+import asyncio
+from datetime import date
+from typing import Dict, List
+
+from pymongo import UpdateOne
+
+# Day an order counts for: when it was paid, or when it was placed for orders
+# paid before ``paid_at`` was recorded (both are stored as UTC isoformat)
+PAID_DAY = {"$substrCP": [{"$ifNull": ["$paid_at", "$created_at"]}, 0, 10]}
+
+NAME_FIELDS = {"_id": 0, "id": 1, "name_fr": 1, "name_tr": 1, "name_en": 1}
+
+
+def product_increments(items: List[Dict]) -> Dict[str, Dict]:
+    """Units and revenue per product for the items of one order."""
+    rows: Dict[str, Dict] = {}
+    for item in items:
+        row = rows.setdefault(item["product_id"], {"units": 0, "revenue": 0.0, "category_id": None})
+        row["units"] += item.get("quantity", 0)
+        # Net of promotions; shipping is charged on the order, not on a product,
+        # so the products add up to the orders' totals less their shipping
+        row["revenue"] += item.get("subtotal", 0.0) - item.get("discount", 0.0)
+        row["category_id"] = row["category_id"] or item.get("category_id")
+    return rows
+
+
+async def record_paid_order(database, order: Dict, paid_at: str, session=None):
+    """Adds one newly paid order to the rollups of the day ``paid_at`` falls on.
+
+    The caller must make sure this runs once per order (see
+    ``OrderRepository.mark_paid``, which records it in the transaction that
+    flips the status).
+    """
+    day = paid_at[:10]
+    rows = product_increments(order.get("items", []))
+    missing = [product_id for product_id, row in rows.items() if row["category_id"] is None]
+    if missing:
+        # Orders placed before items carried their category
+        products = database.products.find({"id": {"$in": missing}}, {"_id": 0, "id": 1, "category_id": 1}, session=session)
+        async for product in products:
+            rows[product["id"]]["category_id"] = product.get("category_id")
+
+    writes = [
+        database.sales_daily.update_one(
+            {"_id": day},
+            {"$inc": {
+                "orders": 1,
+                "revenue": float(order.get("total", 0.0)),
+                "units": sum(row["units"] for row in rows.values()),
+            }},
+            upsert=True,
+            session=session,
+        )
+    ]
+    if rows:
+        writes.append(database.sales_daily_products.bulk_write([
+            UpdateOne(
+                {"_id": f"{day}:{product_id}"},
+                {
+                    "$inc": {"units": row["units"], "revenue": row["revenue"]},
+                    "$set": {"day": day, "product_id": product_id, "category_id": row["category_id"]},
+                },
+                upsert=True,
+            )
+            for product_id, row in rows.items()
+        ], ordered=False, session=session))
+    if session is None:
+        await asyncio.gather(*writes)
+    else:
+        # Operations of one transaction cannot run concurrently
+        for write in writes:
+            await write
+
+
+async def rebuild_rollups(database):
+    """Recomputes both rollup collections from every paid order."""
+    await asyncio.gather(database.sales_daily.delete_many({}), database.sales_daily_products.delete_many({}))
+    paid = {"$match": {"status": "paid"}}
+    await database.orders.aggregate([
+        paid,
+        {"$group": {
+            "_id": PAID_DAY,
+            "orders": {"$sum": 1},
+            "revenue": {"$sum": "$total"},
+            "units": {"$sum": {"$sum": "$items.quantity"}},
+        }},
+        {"$merge": {"into": "sales_daily", "whenMatched": "replace"}},
+    ]).to_list(None)
+    await database.orders.aggregate([
+        paid,
+        {"$unwind": "$items"},
+        {"$group": {
+            "_id": {"day": PAID_DAY, "product_id": "$items.product_id"},
+            "category_id": {"$max": "$items.category_id"},
+            "units": {"$sum": "$items.quantity"},
+            "revenue": {"$sum": {"$subtract": ["$items.subtotal", {"$ifNull": ["$items.discount", 0]}]}},
+        }},
+        # Grouped rows are few (days x products), so the lookup is cheap here
+        {"$lookup": {"from": "products", "localField": "_id.product_id", "foreignField": "id", "as": "product"}},
+        {"$project": {
+            "_id": {"$concat": ["$_id.day", ":", "$_id.product_id"]},
+            "day": "$_id.day",
+            "product_id": "$_id.product_id",
+            "category_id": {"$ifNull": ["$category_id", {"$arrayElemAt": ["$product.category_id", 0]}]},
+            "units": 1,
+            "revenue": 1,
+        }},
+        {"$merge": {"into": "sales_daily_products", "whenMatched": "replace"}},
+    ]).to_list(None)
+
+
+def _top(database, days: Dict, field: str, limit: int):
+    return database.sales_daily_products.aggregate([
+        {"$match": {"day": days}},
+        {"$group": {"_id": f"${field}", "units": {"$sum": "$units"}, "revenue": {"$sum": "$revenue"}}},
+        {"$sort": {"revenue": -1, "_id": 1}},
+        {"$limit": limit},
+    ]).to_list(None)
+
+
+def _ranked(rows: List[Dict], names: Dict[str, Dict], key: str) -> List[Dict]:
+    ranked = []
+    for row in rows:
+        named = names.get(row["_id"], {})
+        ranked.append({
+            key: row["_id"],
+            **{field: named.get(field) for field in ("name_fr", "name_tr", "name_en")},
+            "units": row["units"],
+            "revenue": round(row["revenue"], 2),
+        })
+    return ranked
+
+
+async def sales_report(database, start: date, end: date, top: int = 10) -> Dict:
+    days = {"$gte": start.isoformat(), "$lte": end.isoformat()}
+    daily, products, categories = await asyncio.gather(
+        database.sales_daily.find({"_id": days}).sort("_id", 1).to_list(None),
+        _top(database, days, "product_id", top),
+        _top(database, days, "category_id", top),
+    )
+    product_names, category_names = await asyncio.gather(
+        database.products.find({"id": {"$in": [r["_id"] for r in products]}}, NAME_FIELDS).to_list(None),
+        database.categories.find({"id": {"$in": [r["_id"] for r in categories]}}, NAME_FIELDS).to_list(None),
+    )
+
+    orders = sum(d["orders"] for d in daily)
+    revenue = sum(d["revenue"] for d in daily)
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "totals": {
+            "orders": orders,
+            "revenue": round(revenue, 2),
+            "units": sum(d["units"] for d in daily),
+            "average_order_value": round(revenue / orders, 2) if orders else 0.0,
+        },
+        "daily": [
+            {"day": d["_id"], "orders": d["orders"], "revenue": round(d["revenue"], 2), "units": d["units"]}
+            for d in daily
+        ],
+        "top_products": _ranked(products, {p["id"]: p for p in product_names}, "product_id"),
+        "top_categories": _ranked(categories, {c["id"]: c for c in category_names}, "category_id"),
+    }
@@ -0,0 +1,251 @@
+"""Archival of old orders into Parquet files on local disk.
+
+``orders`` and ``payment_transactions`` only grow. ``archive_orders`` moves
+orders created more than a given age ago, with their payment transactions,
+into files partitioned by the month the order was placed:
+
+    <directory>/orders/month=2024-03/part-<uuid>.parquet
+    <directory>/payment_transactions/month=2024-03/part-<uuid>.parquet
+
+A slim stub per order (id, user, status, total, dates) goes into
+``archived_orders``, so the hot collections and their indexes only hold
+recent orders. Account and admin listings still find archived orders through
+the stubs, and ``load_orders`` reads the full documents back from the month's
+files. Rows are sorted by id and written in small row groups, so a lookup by
+id only decompresses the row groups whose id range can contain it.
+
+Each batch writes its files before it inserts stubs and deletes the
+originals. A crash in between archives the same orders again on the next run,
+so a file can repeat an order; readers keep one row per id.
+
+    python archive.py                       # orders older than ORDER_ARCHIVE_DAYS
+    python archive.py --older-than-days 90
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List, Sequence
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 50000
+ROW_GROUP_SIZE = 5000
+COMPRESSION = "zstd"
+
+# Fields not listed here are kept as JSON in the ``extra`` column
+ORDER_SCHEMA = pa.schema([
+    ("id", pa.string()),
+    ("user_id", pa.string()),
+    ("customer_name", pa.string()),
+    ("customer_email", pa.string()),
+    ("customer_phone", pa.string()),
+    ("customer_address", pa.string()),
+    ("items", pa.string()),
+    ("total", pa.float64()),
+    ("status", pa.string()),
+    ("payment_session_id", pa.string()),
+    ("paid_at", pa.string()),
+    ("cart_session_id", pa.string()),
+    ("cart_version", pa.int64()),
+    ("language", pa.string()),
+    ("created_at", pa.string()),
+    ("extra", pa.string()),
+])
+PAYMENT_SCHEMA = pa.schema([
+    ("id", pa.string()),
+    ("session_id", pa.string()),
+    ("order_id", pa.string()),
+    ("amount", pa.float64()),
+    ("currency", pa.string()),
+    ("status", pa.string()),
+    ("payment_status", pa.string()),
+    ("metadata", pa.string()),
+    ("created_at", pa.string()),
+    ("updated_at", pa.string()),
+    ("extra", pa.string()),
+])
+JSON_COLUMNS = {"items", "metadata"}
+STUB_FIELDS = ("id", "user_id", "status", "total", "created_at", "paid_at")
+
+
+def month_of(order: Dict) -> str:
+    return str(order["created_at"])[:7]
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def _text(value):
+    return value.isoformat() if isinstance(value, datetime) else str(value)
+
+
+def _encoded(value):
+    return json.dumps(value, default=_json_default, ensure_ascii=False)
+
+
+def _converter(name: str, kind: pa.DataType):
+    if name in JSON_COLUMNS:
+        return _encoded
+    if pa.types.is_floating(kind):
+        return float
+    if pa.types.is_integer(kind):
+        return int
+    return _text
+
+
+def to_table(docs: Sequence[Dict], schema: pa.Schema) -> pa.Table:
+    fields = [(name, _converter(name, schema.field(name).type)) for name in schema.names if name != "extra"]
+    known = set(schema.names) | {"_id"}
+    columns = {name: [] for name in schema.names}
+    for doc in sorted(docs, key=lambda d: d.get("id") or ""):
+        for name, convert in fields:
+            value = doc.get(name)
+            columns[name].append(None if value is None else convert(value))
+        extra = {k: v for k, v in doc.items() if k not in known}
+        columns["extra"].append(_encoded(extra) if extra else None)
+    return pa.table(columns, schema=schema)
+
+
+def from_row(row: Dict) -> Dict:
+    doc = {}
+    for name, value in row.items():
+        # Null columns are fields the order did not have, e.g. before they existed
+        if name == "extra" or value is None:
+            continue
+        doc[name] = json.loads(value) if name in JSON_COLUMNS else value
+    if row.get("extra"):
+        doc.update(json.loads(row["extra"]))
+    return doc
+
+
+def write_partition(directory: Path, collection: str, month: str, table: pa.Table) -> Path:
+    partition = directory / collection / f"month={month}"
+    partition.mkdir(parents=True, exist_ok=True)
+    path = partition / f"part-{uuid.uuid4().hex}.parquet"
+    tmp = path.with_suffix(".tmp")
+    pq.write_table(table, tmp, compression=COMPRESSION, row_group_size=ROW_GROUP_SIZE)
+    os.replace(tmp, path)
+    return path
+
+
+def read_partition(directory: Path, collection: str, month: str, ids: Sequence[str]) -> Dict[str, Dict]:
+    found = {}
+    partition = directory / collection / f"month={month}"
+    for path in sorted(partition.glob("*.parquet")):
+        table = pq.read_table(path, filters=[("id", "in", list(ids))])
+        for row in table.to_pylist():
+            found[row["id"]] = from_row(row)
+    return found
+
+
+def stub(order: Dict, month: str, archived_at: str) -> Dict:
+    return {**{field: order.get(field) for field in STUB_FIELDS}, "month": month, "archived_at": archived_at}
+
+
+async def _insert_stubs(collection, stubs: List[Dict]):
+    try:
+        await collection.insert_many(stubs, ordered=False)
+    except BulkWriteError as e:
+        # Stubs left by an interrupted run
+        if any(error["code"] != 11000 for error in e.details.get("writeErrors", [])):
+            raise
+
+
+async def archive_orders(database, directory: Path, older_than: timedelta, batch_size: int = BATCH_SIZE) -> Dict:
+    started = time.perf_counter()
+    cutoff = (datetime.now(timezone.utc) - older_than).isoformat()
+    archived = payments = 0
+    files = 0
+    while True:
+        orders = await database.orders.find({"created_at": {"$lt": cutoff}}).sort("created_at", 1).to_list(batch_size)
+        if not orders:
+            break
+        ids = [order["id"] for order in orders]
+        by_month = defaultdict(list)
+        for order in orders:
+            by_month[month_of(order)].append(order)
+        month_by_order = {order["id"]: month_of(order) for order in orders}
+        transactions = defaultdict(list)
+        async for payment in database.payment_transactions.find({"order_id": {"$in": ids}}):
+            transactions[month_by_order[payment["order_id"]]].append(payment)
+
+        for month, docs in by_month.items():
+            await asyncio.to_thread(write_partition, directory, "orders", month, to_table(docs, ORDER_SCHEMA))
+            files += 1
+        for month, docs in transactions.items():
+            await asyncio.to_thread(write_partition, directory, "payment_transactions", month, to_table(docs, PAYMENT_SCHEMA))
+            files += 1
+
+        archived_at = datetime.now(timezone.utc).isoformat()
+        await _insert_stubs(database.archived_orders, [stub(order, month_of(order), archived_at) for order in orders])
+        await database.payment_transactions.delete_many({"order_id": {"$in": ids}})
+        await database.orders.delete_many({"_id": {"$in": [order["_id"] for order in orders]}})
+        archived += len(orders)
+        payments += sum(len(docs) for docs in transactions.values())
+        logger.info("Archived %d orders up to %s", archived, orders[-1]["created_at"])
+    return {
+        "orders": archived,
+        "payment_transactions": payments,
+        "files": files,
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+
+
+async def load_orders(directory: Path, stubs: Sequence[Dict]) -> List[Dict]:
+    """Full archived orders for ``stubs``, in the same order.
+
+    Orders whose file has gone missing are left out and logged: a stub lacks
+    the customer and items an order needs.
+    """
+    by_month = defaultdict(list)
+    for entry in stubs:
+        by_month[entry["month"]].append(entry["id"])
+    found = {}
+    for month, ids in by_month.items():
+        found.update(await asyncio.to_thread(read_partition, directory, "orders", month, ids))
+    missing = [entry for entry in stubs if entry["id"] not in found]
+    for entry in missing:
+        logger.error("Archived order %s is missing from the %s files", entry["id"], entry["month"])
+    return [found[entry["id"]] for entry in stubs if entry["id"] in found]
+
+
+def main():
+    import argparse
+
+    from config import get_settings
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    settings = get_settings().validate()
+    parser = argparse.ArgumentParser(description="Move old orders into Parquet files")
+    parser.add_argument("--older-than-days", type=int, default=settings.order_archive_days)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    async def run():
+        client = AsyncIOMotorClient(settings.mongo_url)
+        try:
+            result = await archive_orders(
+                client[settings.db_name], Path(settings.archive_dir), timedelta(days=args.older_than_days)
+            )
+        finally:
+            client.close()
+        print(result)
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
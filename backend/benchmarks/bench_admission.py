@@ -0,0 +1,184 @@
+"""Checkout latency while browse traffic overloads the server.
+
+Starts uvicorn with a stand-in app behind ``AdmissionMiddleware`` and the
+default rules from middleware.py, once with admission control and once
+without. The stand-in app needs no database. ``GET /api/products`` burns
+``--browse-cpu-ms`` of CPU on the event loop, like serializing a big catalog
+page. ``POST /api/checkout/session`` awaits ``--checkout-io-ms``, like Stripe
+and MongoDB calls, and does a little CPU work.
+
+The load is open-loop: browse requests arrive at ``--browse-rps``, above what
+one worker can serve, and checkouts at ``--checkout-rps``. Each request goes
+out on schedule over a new connection, whether or not earlier ones have
+finished. Without admission control, checkouts queue behind the browse
+backlog and their latency grows for the whole run. With it, browse requests
+are shed with 503 once loop lag passes the threshold, and checkout p99 stays
+below a second instead of growing with the backlog.
+
+    python benchmarks/bench_admission.py --browse-rps 150 --checkout-rps 20 --duration 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+BACKEND_DIR = BENCH_DIR.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from middleware import AdmissionMiddleware, LoadMonitor, default_admission_rules  # noqa: E402
+
+
+def burn(milliseconds: float):
+    deadline = time.perf_counter() + milliseconds / 1000
+    while time.perf_counter() < deadline:
+        pass
+
+
+def make_app():
+    """uvicorn factory; configured through BENCH_* environment variables."""
+    browse_cpu_ms = float(os.environ.get("BENCH_BROWSE_CPU_MS", "10"))
+    checkout_io_ms = float(os.environ.get("BENCH_CHECKOUT_IO_MS", "20"))
+    monitor = LoadMonitor()
+
+    async def app(scope, receive, send):
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    monitor.start()
+                    await send({"type": "lifespan.startup.complete"})
+                elif message["type"] == "lifespan.shutdown":
+                    await monitor.close()
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+        path = scope["path"]
+        if path.startswith("/api/products"):
+            burn(browse_cpu_ms)
+        elif path.startswith("/api/checkout"):
+            await asyncio.sleep(checkout_io_ms / 1000)
+            burn(0.5)
+        body = json.dumps({"ok": True, "lag_ms": monitor.loop_lag_ms}).encode()
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": body})
+
+    if os.environ.get("BENCH_ADMISSION", "on") == "off":
+        return app
+
+    return AdmissionMiddleware(
+        app,
+        default_admission_rules(),
+        monitor,
+        loop_lag_ms=float(os.environ.get("BENCH_SHED_LOOP_LAG_MS", "200")),
+    )
+
+
+async def request(port: int, method: str, path: str, timeout: float):
+    # A bare HTTP/1.1 exchange: a full client library would use more CPU than
+    # the server under test on a small machine
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        writer.write(f"{method} {path} HTTP/1.1\r\nHost: bench\r\nContent-Length: 0\r\nConnection: close\r\n\r\n".encode())
+        status_line = await asyncio.wait_for(reader.readline(), timeout)
+        await asyncio.wait_for(reader.read(), timeout)
+        return int(status_line.split()[1])
+    finally:
+        writer.close()
+
+
+async def wait_until_up(port: int, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if await request(port, "GET", "/api/health/ready", 1.0) == 200:
+                return
+        except (OSError, ValueError, IndexError, asyncio.TimeoutError):
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("Server did not start")
+
+
+async def open_loop(port: int, method: str, path: str, rate: float, args, results: list):
+    async def one():
+        started = time.perf_counter()
+        try:
+            status = await request(port, method, path, args.timeout)
+        except (OSError, ValueError, IndexError, asyncio.TimeoutError):
+            status = "error"
+        results.append((status, (time.perf_counter() - started) * 1000))
+
+    tasks = []
+    begin = time.perf_counter()
+    sent = 0
+    while time.perf_counter() - begin < args.duration:
+        due = int((time.perf_counter() - begin) * rate) + 1
+        for _ in range(due - sent):
+            tasks.append(asyncio.create_task(one()))
+        sent = due
+        await asyncio.sleep(0.005)
+    await asyncio.gather(*tasks)
+
+
+def summarize(label: str, results: list, duration: float):
+    statuses = Counter(status for status, _ in results)
+    served = sorted(ms for status, ms in results if status == 200)
+    if served:
+        p50, p99 = statistics.median(served), served[max(0, int(len(served) * 0.99) - 1)]
+    else:
+        p50 = p99 = float("nan")
+    print(f"  {label:<9} sent {len(results):>6}   ok/s {len(served) / duration:7.1f}   "
+          f"503 {statuses.get(503, 0):>6}   errors {statuses.get('error', 0):>5}   "
+          f"p50 {p50:8.1f} ms   p99 {p99:8.1f} ms")
+
+
+async def run(args, admission: str):
+    env = {
+        **os.environ,
+        "PYTHONPATH": os.pathsep.join([str(BACKEND_DIR), str(BENCH_DIR)]),
+        "BENCH_ADMISSION": admission,
+        "BENCH_BROWSE_CPU_MS": str(args.browse_cpu_ms),
+        "BENCH_CHECKOUT_IO_MS": str(args.checkout_io_ms),
+    }
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "--factory", "bench_admission:make_app",
+         "--host", "127.0.0.1", "--port", str(args.port), "--log-level", "warning", "--no-access-log"],
+        cwd=BENCH_DIR,
+        env=env,
+    )
+    try:
+        await wait_until_up(args.port)
+        browse, checkout = [], []
+        await asyncio.gather(
+            open_loop(args.port, "GET", "/api/products", args.browse_rps, args, browse),
+            open_loop(args.port, "POST", "/api/checkout/session", args.checkout_rps, args, checkout),
+        )
+        print(f"\nadmission control {admission}")
+        summarize("checkout", checkout, args.duration)
+        summarize("browse", browse, args.duration)
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--browse-rps", type=float, default=150)
+    parser.add_argument("--checkout-rps", type=float, default=20)
+    parser.add_argument("--browse-cpu-ms", type=float, default=10)
+    parser.add_argument("--checkout-io-ms", type=float, default=20)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+    for admission in ("off", "on"):
+        asyncio.run(run(args, admission))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Sales report cost: daily rollups vs. aggregating the orders themselves.
+
+Fills a scratch database with N synthetic paid orders spread over a year,
+rebuilds the rollups (what migration 4 does on an existing shop), then times
+a 30-day and a 365-day report read from the rollups against the same figures
+computed straight from ``orders``. The database is dropped afterwards.
+
+    python benchmarks/bench_analytics.py --orders 1000000 --mongo-url mongodb://localhost:27017
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import analytics  # noqa: E402
+
+PRODUCTS = 200
+CATEGORIES = 12
+
+
+def synthetic_orders(count: int, first_day: date, days: int, seed: int):
+    rng = random.Random(seed)
+    for n in range(count):
+        created = datetime.combine(first_day, datetime.min.time(), timezone.utc) + timedelta(seconds=rng.randrange(days * 86400))
+        items = []
+        for _ in range(rng.randint(1, 4)):
+            product = rng.randrange(PRODUCTS)
+            quantity = rng.randint(1, 3)
+            price = 50.0 + product * 7
+            items.append({
+                "product_id": f"p{product}",
+                "category_id": f"c{product % CATEGORIES}",
+                "price": price,
+                "quantity": quantity,
+                "subtotal": price * quantity,
+            })
+        yield {
+            "id": f"o{n}",
+            "status": "paid",
+            "items": items,
+            "total": sum(i["subtotal"] for i in items),
+            "created_at": created.isoformat(),
+        }
+
+
+async def report_from_orders(database, start: date, end: date, top: int = 10):
+    days = {"$gte": start.isoformat(), "$lte": (end + timedelta(days=1)).isoformat()}
+    match = {"$match": {"status": "paid", "created_at": days}}
+    daily, products = await asyncio.gather(
+        database.orders.aggregate([
+            match,
+            {"$group": {"_id": {"$substrCP": ["$created_at", 0, 10]}, "orders": {"$sum": 1}, "revenue": {"$sum": "$total"}}},
+        ]).to_list(None),
+        database.orders.aggregate([
+            match,
+            {"$unwind": "$items"},
+            {"$group": {"_id": "$items.product_id", "revenue": {"$sum": "$items.subtotal"}}},
+            {"$sort": {"revenue": -1}},
+            {"$limit": top},
+        ]).to_list(None),
+    )
+    return daily, products
+
+
+async def timed(label: str, coro):
+    started = time.perf_counter()
+    result = await coro
+    print(f"{label:<34} {(time.perf_counter() - started) * 1000:10.1f} ms")
+    return result
+
+
+async def run(args):
+    client = AsyncIOMotorClient(args.mongo_url)
+    database = client[args.db_name]
+    try:
+        await database.products.insert_many([
+            {"id": f"p{i}", "category_id": f"c{i % CATEGORIES}", "name_fr": f"Produit {i}"} for i in range(PRODUCTS)
+        ])
+        await database.orders.create_index("created_at")
+        first_day = date.today() - timedelta(days=args.days - 1)
+        started = time.perf_counter()
+        batch = []
+        for order in synthetic_orders(args.orders, first_day, args.days, args.seed):
+            batch.append(order)
+            if len(batch) == args.batch:
+                await database.orders.insert_many(batch, ordered=False)
+                batch = []
+        if batch:
+            await database.orders.insert_many(batch, ordered=False)
+        print(f"{'insert ' + str(args.orders) + ' orders':<34} {(time.perf_counter() - started) * 1000:10.1f} ms")
+
+        await timed("rebuild rollups", analytics.rebuild_rollups(database))
+        print(f"{'rollup documents':<34} {await database.sales_daily_products.count_documents({}):10d}")
+        end = date.today()
+        for days in (30, args.days):
+            start = end - timedelta(days=days - 1)
+            await timed(f"{days}-day report (rollups)", analytics.sales_report(database, start, end))
+            await timed(f"{days}-day report (orders)", report_from_orders(database, start, end))
+    finally:
+        await client.drop_database(args.db_name)
+        client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-url", default="mongodb://localhost:27017")
+    parser.add_argument("--db-name", default="gulum_bench_analytics")
+    parser.add_argument("--orders", type=int, default=100000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--batch", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=1)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""Hot-set query latency before and after archiving old orders.
+
+Fills a scratch database with N synthetic orders spread over
+``--years`` years, each with a payment transaction, then measures the
+queries the order endpoints run:
+
+* ``get_my_orders``: one user's latest 100 orders;
+* ``get_order``: a recent order by id;
+* ``get_order`` for an archived order, which reads its Parquet file.
+
+It runs them, archives everything older than ``--keep-days`` with
+archive.py, and runs them again. Collection and index sizes come from
+``collStats``, and the size of the Parquet files is printed alongside. The
+database and the files are removed afterwards.
+
+    python benchmarks/bench_archive.py --orders 5000000 --mongo-url mongodb://localhost:27017
+"""
+import argparse
+import asyncio
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import archive  # noqa: E402
+
+USERS = 50000
+NOW = datetime.now(timezone.utc)
+
+
+def synthetic_orders(count: int, years: int, seed: int):
+    rng = random.Random(seed)
+    span = years * 365 * 24 * 3600
+    for n in range(count):
+        created = NOW - timedelta(seconds=span * (count - n) / count)
+        order_id = f"order-{n:08d}"
+        items = [
+            {"product_id": f"prod-{rng.randint(0, 500)}", "quantity": rng.randint(1, 3), "price": round(rng.uniform(20, 2000), 2)}
+            for _ in range(rng.randint(1, 4))
+        ]
+        yield {
+            "id": order_id,
+            "user_id": f"user-{rng.randrange(USERS)}",
+            "customer_name": "Client Test",
+            "customer_email": "client@example.com",
+            "customer_phone": "0600000000",
+            "customer_address": f"{n} rue de la Paix, Paris",
+            "items": items,
+            "total": round(sum(i["price"] * i["quantity"] for i in items), 2),
+            "status": "paid",
+            "payment_session_id": f"cs_{n}",
+            "paid_at": created.isoformat(),
+            "cart_session_id": f"cart-{n}",
+            "cart_version": 1,
+            "language": "fr",
+            "created_at": created.isoformat(),
+        }, {
+            "id": f"pay-{n:08d}",
+            "session_id": f"cs_{n}",
+            "order_id": order_id,
+            "amount": 0.0,
+            "currency": "eur",
+            "status": "complete",
+            "payment_status": "paid",
+            "metadata": {"order_id": order_id},
+            "created_at": created.isoformat(),
+            "updated_at": created.isoformat(),
+        }
+
+
+async def fill(database, count: int, years: int, seed: int):
+    orders, payments = [], []
+    for order, payment in synthetic_orders(count, years, seed):
+        orders.append(order)
+        payments.append(payment)
+        if len(orders) == 10000:
+            await asyncio.gather(database.orders.insert_many(orders), database.payment_transactions.insert_many(payments))
+            orders, payments = [], []
+    if orders:
+        await asyncio.gather(database.orders.insert_many(orders), database.payment_transactions.insert_many(payments))
+    # Indexes of migrations 2 and 9
+    await database.orders.create_index("id")
+    await database.orders.create_index([("user_id", 1), ("created_at", -1)])
+    await database.orders.create_index("created_at")
+    await database.payment_transactions.create_index("session_id")
+    await database.payment_transactions.create_index("order_id")
+    await database.archived_orders.create_index("id", unique=True)
+    await database.archived_orders.create_index([("user_id", 1), ("created_at", -1)])
+
+
+async def latency(operation, runs: int):
+    times = []
+    for n in range(runs):
+        started = time.perf_counter()
+        await operation(n)
+        times.append((time.perf_counter() - started) * 1000)
+    times.sort()
+    return statistics.median(times), times[int(len(times) * 0.99) - 1]
+
+
+async def measure(database, directory: Path, args, label: str):
+    recent = [f"order-{n:08d}" for n in range(args.orders - 1000, args.orders)]
+
+    async def my_orders(n):
+        await database.orders.find({"user_id": f"user-{n % USERS}"}, {"_id": 0}).sort("created_at", -1).to_list(100)
+
+    async def one_order(n):
+        await database.orders.find_one({"id": recent[n % len(recent)]}, {"_id": 0})
+
+    async def archived_order(n):
+        stub = await database.archived_orders.find_one({"id": f"order-{n * 997 % (args.orders // 2):08d}"}, {"_id": 0})
+        if stub is not None:
+            await archive.load_orders(directory, [stub])
+
+    print(f"\n{label}")
+    for stats_of in ("orders", "payment_transactions", "archived_orders"):
+        stats = await database.command("collStats", stats_of)
+        print(f"  {stats_of:<22} {stats.get('count', 0):>10} docs   data {stats.get('size', 0) / 1e6:9.1f} MB"
+              f"   indexes {stats.get('totalIndexSize', 0) / 1e6:8.1f} MB")
+    rows = [("get_my_orders", my_orders), ("get_order (hot)", one_order)]
+    if label.startswith("after"):
+        rows.append(("get_order (archived)", archived_order))
+    for name, operation in rows:
+        p50, p99 = await latency(operation, args.runs)
+        print(f"  {name:<22} p50 {p50:7.2f} ms   p99 {p99:7.2f} ms")
+
+
+async def bench(args):
+    client = AsyncIOMotorClient(args.mongo_url)
+    database = client[args.db_name]
+    directory = Path(tempfile.mkdtemp(prefix="gulum-archive-"))
+    try:
+        started = time.perf_counter()
+        await fill(database, args.orders, args.years, args.seed)
+        print(f"inserted {args.orders} orders in {time.perf_counter() - started:.1f} s")
+
+        await measure(database, directory, args, "before archiving")
+        result = await archive.archive_orders(database, directory, timedelta(days=args.keep_days))
+        on_disk = sum(f.stat().st_size for f in directory.rglob("*.parquet"))
+        print(f"\narchived {result}, {on_disk / 1e6:.1f} MB of Parquet")
+        await measure(database, directory, args, f"after archiving (kept {args.keep_days} days)")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+        await client.drop_database(args.db_name)
+        client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=5000000)
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--keep-days", type=int, default=365)
+    parser.add_argument("--runs", type=int, default=2000)
+    parser.add_argument("--mongo-url", default="mongodb://localhost:27017")
+    parser.add_argument("--db-name", default=f"gulum_bench_{uuid.uuid4().hex[:8]}")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    asyncio.run(bench(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Cart edit latency with write-through vs. the write-behind cart store.
+
+Runs the read-modify-write of ``add_to_cart`` through ``CartStore`` for
+``--carts`` sessions, ``--edits`` times each. It runs once with a flush
+interval of 0 (every edit goes to MongoDB, as before the hot tier) and once
+with write-behind and the memory tier. Prints per-edit latency, then how
+long the final flush of the dirty carts takes, in batched ``bulk_write``
+calls. The scratch database is dropped afterwards.
+
+    python benchmarks/bench_carts.py --carts 2000 --edits 10 --mongo-url mongodb://localhost:27017
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from carts import CartStore  # noqa: E402
+
+
+async def add_item(store: CartStore, session_id: str, product_id: str):
+    now = datetime.now(timezone.utc).isoformat()
+    cart = await store.get(session_id) or {
+        "id": str(uuid.uuid4()), "session_id": session_id, "items": [], "version": -1,
+        "order_id": None, "created_at": now,
+    }
+    cart["items"].append({"product_id": product_id, "quantity": 1})
+    await store.save({**cart, "version": cart["version"] + 1, "updated_at": now})
+
+
+async def run(database, args, flush_interval: float, label: str):
+    await database.carts.drop()
+    await database.carts.create_index("session_id")
+    store = CartStore()
+    store.configure(database, "memory://", flush_interval)
+    times = []
+    for edit in range(args.edits):
+        for n in range(args.carts):
+            started = time.perf_counter()
+            await add_item(store, f"bench-{n}", f"prod-{edit}")
+            times.append((time.perf_counter() - started) * 1e6)
+    times.sort()
+    started = time.perf_counter()
+    flushed = await store.flush()
+    flush_ms = (time.perf_counter() - started) * 1000
+    await store.close()
+    print(f"{label:<14} edit p50 {statistics.median(times):9.1f} us   p99 {times[int(len(times) * 0.99) - 1]:9.1f} us"
+          f"   final flush {flushed:>6} carts in {flush_ms:7.1f} ms")
+
+
+async def bench(args):
+    client = AsyncIOMotorClient(args.mongo_url)
+    database = client[args.db_name]
+    try:
+        await run(database, args, 0, "write-through")
+        await run(database, args, 60, "write-behind")
+    finally:
+        await client.drop_database(args.db_name)
+        client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--carts", type=int, default=2000)
+    parser.add_argument("--edits", type=int, default=10)
+    parser.add_argument("--mongo-url", default="mongodb://localhost:27017")
+    parser.add_argument("--db-name", default=f"gulum_bench_{uuid.uuid4().hex[:8]}")
+    args = parser.parse_args()
+    asyncio.run(bench(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Bytes on the wire and CPU cost of response compression per route.
+
+By default the payloads are synthetic catalog responses shaped like the
+seeded products (three-language names and descriptions). ``--base-url``
+fetches the real, uncompressed bodies from a running API instead.
+
+    python benchmarks/bench_compression.py --products 500
+    python benchmarks/bench_compression.py --base-url http://localhost:8001
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from middleware import CompressionMiddleware, brotli  # noqa: E402
+
+DESCRIPTION = {
+    "fr": "Canapé élégant et confortable en tissu gris de haute qualité. Parfait pour votre salon moderne.",
+    "tr": "Yüksek kaliteli gri kumaştan yapılmış zarif ve konforlu koltuk. Modern oturma odanız için mükemmel.",
+    "en": "Elegant and comfortable sofa in high-quality grey fabric. Perfect for your modern living room.",
+}
+
+
+def synthetic_product(i: int) -> dict:
+    return {
+        "id": f"prod-{i:06d}",
+        "name_fr": f"Canapé Moderne {i}",
+        "name_tr": f"Modern Koltuk {i}",
+        "name_en": f"Modern Sofa {i}",
+        "description_fr": DESCRIPTION["fr"],
+        "description_tr": DESCRIPTION["tr"],
+        "description_en": DESCRIPTION["en"],
+        "price": 199.0 + i % 1300,
+        "category_id": ["cat-furniture", "cat-bedroom", "cat-appliances"][i % 3],
+        "images": [f"https://images.unsplash.com/photo-{1555041469 + i}?w=800"],
+        "stock": i % 25,
+        "featured": i % 4 == 0,
+        "created_at": "2026-01-15T10:00:00+00:00",
+    }
+
+
+def synthetic_payloads(count: int) -> dict:
+    products = [synthetic_product(i) for i in range(count)]
+    categories = [
+        {"id": "cat-furniture", "name_fr": "Mobilier", "name_tr": "Mobilya", "name_en": "Furniture",
+         "slug": "furniture", "image_url": "https://images.unsplash.com/photo-1555041469-a586c61ea9bc?w=800",
+         "created_at": "2026-01-15T10:00:00+00:00"},
+    ] * 3
+    cart_items = [{"product_id": p["id"], "quantity": 1} for p in products[:4]]
+    return {
+        "/api/products": products,
+        "/api/products?featured=true": [p for p in products if p["featured"]],
+        "/api/products/{id}": products[0],
+        "/api/categories": categories,
+        "/api/cart/{session_id}": {"session_id": "s", "items": cart_items,
+                                   "products": [{**p, "quantity": 1} for p in products[:4]]},
+    }
+
+
+def fetch_payloads(base_url: str) -> dict:
+    import requests
+
+    products = requests.get(f"{base_url}/api/products", headers={"Accept-Encoding": "identity"}).json()
+    paths = {
+        "/api/products": "/api/products",
+        "/api/products?featured=true": "/api/products?featured=true",
+        "/api/categories": "/api/categories",
+    }
+    if products:
+        paths["/api/products/{id}"] = f"/api/products/{products[0]['id']}"
+    return {
+        name: requests.get(base_url + path, headers={"Accept-Encoding": "identity"}).json()
+        for name, path in paths.items()
+    }
+
+
+def measure(compressor: CompressionMiddleware, body: bytes, encoding: str, repeat: int):
+    started = time.process_time()
+    for _ in range(repeat):
+        compressed = compressor.compress(body, encoding)
+    cpu_ms = (time.process_time() - started) * 1000 / repeat
+    return len(compressed), cpu_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=200)
+    parser.add_argument("--base-url", default=None)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--gzip-level", type=int, default=6)
+    parser.add_argument("--brotli-quality", type=int, default=4)
+    args = parser.parse_args()
+
+    payloads = fetch_payloads(args.base_url) if args.base_url else synthetic_payloads(args.products)
+    compressor = CompressionMiddleware(None, gzip_level=args.gzip_level, brotli_quality=args.brotli_quality)
+    encodings = ["gzip"] + (["br"] if brotli is not None else [])
+
+    header = f"{'route':<30} {'raw B':>10}"
+    for encoding in encodings:
+        header += f" {encoding + ' B':>10} {'ratio':>6} {encoding + ' ms':>8}"
+    print(header)
+    for route, payload in payloads.items():
+        body = json.dumps(payload, ensure_ascii=False).encode()
+        line = f"{route:<30} {len(body):>10}"
+        for encoding in encodings:
+            size, cpu_ms = measure(compressor, body, encoding, args.repeat)
+            line += f" {size:>10} {len(body) / size:>6.1f} {cpu_ms:>8.3f}"
+        print(line)
+    if brotli is None:
+        print("brotli is not installed; only gzip was measured")
+
+
+if __name__ == "__main__":
+    main()
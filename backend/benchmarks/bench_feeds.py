@@ -0,0 +1,146 @@
+"""Feed and sitemap generation at catalog scale: time and peak memory.
+
+Fills a scratch database with N synthetic products and then runs feeds.py:
+
+* a full run, which writes every shard;
+* a run with nothing changed, which only computes digests;
+* a run after ``--change-fraction`` of the products got a new price, which
+  rewrites the affected shards only;
+* for comparison, the naive approach: load every product into a list and
+  build each language's feed as one string, as a ``get_products``-style
+  handler would without its 1000-item cap.
+
+Peak memory is the process high-water mark (VmHWM), reset before each phase
+through ``/proc/self/clear_refs``, so this needs Linux. The database is
+dropped afterwards.
+
+    python benchmarks/bench_feeds.py --products 200000 --mongo-url mongodb://localhost:27017
+"""
+import argparse
+import asyncio
+import random
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import feeds  # noqa: E402
+from storefront import LANGUAGES  # noqa: E402
+
+SITE = "https://gulmobilya.fr"
+CATEGORIES = 12
+WORDS = "chêne noyer velours lin gris bleu moderne classique scandinave angle pliant extensible".split()
+
+
+def reset_peak():
+    with open("/proc/self/clear_refs", "w") as f:
+        f.write("5")
+
+
+def peak_mb() -> float:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def synthetic_products(count: int, seed: int):
+    rng = random.Random(seed)
+    for n in range(count):
+        name = " ".join(rng.choice(WORDS) for _ in range(4))
+        yield {
+            "id": f"prod-{n:07d}",
+            **{f"name_{lang}": f"{name} {lang} {n}" for lang in LANGUAGES},
+            **{f"description_{lang}": " ".join(rng.choice(WORDS) for _ in range(30)) for lang in LANGUAGES},
+            "price": round(rng.uniform(20, 3000), 2),
+            "stock": rng.randint(0, 20),
+            "images": [f"https://images.example.com/{n}/{i}.jpg" for i in range(rng.randint(1, 4))],
+            "category_id": f"cat-{n % CATEGORIES}",
+            "featured": False,
+        }
+
+
+async def fill(database, count: int, seed: int):
+    await database.categories.insert_many([
+        {"id": f"cat-{c}", **{f"name_{lang}": f"Category {c} {lang}" for lang in LANGUAGES}} for c in range(CATEGORIES)
+    ])
+    batch = []
+    for product in synthetic_products(count, seed):
+        batch.append(product)
+        if len(batch) == 5000:
+            await database.products.insert_many(batch)
+            batch = []
+    if batch:
+        await database.products.insert_many(batch)
+    await database.products.create_index([("feed_shard", 1), ("id", 1)])
+
+
+async def naive(database) -> int:
+    products = await database.products.find({}, {"_id": 0}).to_list(None)
+    categories = {c["id"]: c for c in await database.categories.find({}, {"_id": 0}).to_list(None)}
+    size = 0
+    for lang in LANGUAGES:
+        body = feeds.feed_header(lang, SITE) + "".join(
+            feeds.feed_item(p, lang, SITE, categories) for p in products
+        ) + feeds.FEED_FOOTER
+        size += len(body)
+    return size
+
+
+async def phase(label: str, run):
+    reset_peak()
+    started = time.perf_counter()
+    result = await run()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<28} {elapsed:8.2f} s   peak RSS {peak_mb():8.1f} MB   {result}")
+
+
+async def bench(args):
+    client = AsyncIOMotorClient(args.mongo_url)
+    database = client[args.db_name]
+    directory = Path(tempfile.mkdtemp(prefix="gulum-feeds-"))
+    try:
+        started = time.perf_counter()
+        await fill(database, args.products, args.seed)
+        print(f"inserted {args.products} products in {time.perf_counter() - started:.1f} s")
+
+        await phase("full generation", lambda: feeds.generate(database, directory, SITE, force=True))
+        await phase("nothing changed", lambda: feeds.generate(database, directory, SITE))
+
+        rng = random.Random(args.seed + 1)
+        changed = rng.sample(range(args.products), max(1, int(args.products * args.change_fraction)))
+        await database.products.bulk_write([
+            UpdateOne({"id": f"prod-{n:07d}"}, {"$set": {"price": round(rng.uniform(20, 3000), 2)}}) for n in changed
+        ])
+        await phase(f"{len(changed)} products changed", lambda: feeds.generate(database, directory, SITE))
+
+        await phase("naive, all in memory", lambda: naive(database))
+        on_disk = sum(f.stat().st_size for f in directory.iterdir())
+        print(f"files on disk: {len(list(directory.iterdir()))}, {on_disk / 1e6:.1f} MB compressed")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+        await client.drop_database(args.db_name)
+        client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=200000)
+    parser.add_argument("--change-fraction", type=float, default=0.001)
+    parser.add_argument("--mongo-url", default="mongodb://localhost:27017")
+    parser.add_argument("--db-name", default=f"gulum_bench_{uuid.uuid4().hex[:8]}")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    asyncio.run(bench(args))
+
+
+if __name__ == "__main__":
+    main()
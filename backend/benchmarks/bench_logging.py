@@ -0,0 +1,107 @@
+"""Event-loop lag while logging at high volume: synchronous vs. queue handler.
+
+Several coroutines log JSON records as fast as they can while a probe task
+sleeps in short intervals and records how late it wakes up. The sink can be
+slowed down (``--sink-delay-ms`` per write) to stand in for a busy terminal,
+a full pipe or a slow disk. In ``sync`` mode the write happens on the event
+loop; in ``queue`` mode (what the app uses, see logs.py) it happens on the
+listener thread and the loop only enqueues.
+
+    python benchmarks/bench_logging.py --records 20000 --sink-delay-ms 0.2
+"""
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import logs  # noqa: E402
+
+
+class SlowSink:
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.sink = open(os.devnull, "w")
+
+    def write(self, text: str):
+        if self.delay:
+            time.sleep(self.delay)
+        return self.sink.write(text)
+
+    def flush(self):
+        self.sink.flush()
+
+
+async def probe(lags, interval: float, stop: asyncio.Event):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        started = loop.time()
+        await asyncio.sleep(interval)
+        lags.append((loop.time() - started - interval) * 1000)
+
+
+async def producer(logger, count: int):
+    for n in range(count):
+        logger.info("order %s priced", n, extra={"order_id": f"o{n}", "total": 129.9})
+        await asyncio.sleep(0)
+
+
+async def workload(records: int, tasks: int, interval: float):
+    logger = logging.getLogger("bench")
+    lags = []
+    stop = asyncio.Event()
+    probe_task = asyncio.create_task(probe(lags, interval, stop))
+    started = time.perf_counter()
+    await asyncio.gather(*(producer(logger, records // tasks) for _ in range(tasks)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await probe_task
+    return elapsed, lags
+
+
+def run(mode: str, args) -> None:
+    sink = SlowSink(args.sink_delay_ms / 1000)
+    root = logging.getLogger()
+    previous = root.handlers[:], root.level
+    handler = None
+    if mode == "sync":
+        output = logging.StreamHandler(sink)
+        output.setFormatter(logs.JsonFormatter())
+        root.handlers = [output]
+        root.setLevel(logging.INFO)
+    else:
+        handler = logs.setup("INFO", "json", stream=sink, queue_size=args.queue_size)
+    try:
+        elapsed, lags = asyncio.run(workload(args.records, args.tasks, args.interval_ms / 1000))
+    finally:
+        if mode == "sync":
+            root.handlers, level = previous
+            root.setLevel(level)
+        else:
+            logs.shutdown()
+    lags.sort()
+    p99 = lags[int(len(lags) * 0.99) - 1] if lags else 0.0
+    dropped = f", dropped {handler.dropped}" if handler is not None else ""
+    print(f"{mode:<6} {args.records / elapsed:10.0f} rec/s   lag p50 {statistics.median(lags) if lags else 0:7.2f} ms"
+          f"   p99 {p99:7.2f} ms   max {lags[-1] if lags else 0:7.2f} ms{dropped}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=20000)
+    parser.add_argument("--tasks", type=int, default=50)
+    parser.add_argument("--sink-delay-ms", type=float, default=0.2)
+    parser.add_argument("--interval-ms", type=float, default=5.0)
+    parser.add_argument("--queue-size", type=int, default=logs.QUEUE_SIZE)
+    args = parser.parse_args()
+    for mode in ("sync", "queue"):
+        run(mode, args)
+
+
+if __name__ == "__main__":
+    main()
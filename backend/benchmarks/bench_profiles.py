@@ -0,0 +1,126 @@
+"""Latency per data-access profile against a replica set.
+
+Runs the same concurrent workload through the client defaults and through
+each profile in database.py: cart-style writes (``update_one`` upserts),
+payment-style inserts and catalog-style reads. It prints p50/p99 latency and
+throughput, once per pool size. Writes show what ``w=1`` saves over
+``w: majority``. Reads show how much of the work secondaries take; per-server
+counters come from ``serverStatus`` before and after the run. Use a replica
+set with at least one secondary. A single-node set shows no read offload and
+little difference between write concerns.
+
+    mongod --replSet rs0 --port 27017 --dbpath /tmp/rs0-0 &
+    mongod --replSet rs0 --port 27018 --dbpath /tmp/rs0-1 &
+    mongosh --eval 'rs.initiate({_id: "rs0", members: [{_id: 0, host: "localhost:27017"}, {_id: 1, host: "localhost:27018"}]})'
+    python benchmarks/bench_profiles.py --mongo-url "mongodb://localhost:27017,localhost:27018/?replicaSet=rs0"
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+import uuid
+from pathlib import Path
+
+from pymongo import MongoClient
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from database import Database  # noqa: E402
+
+PRODUCTS = 500
+
+
+async def timed(latencies, operation):
+    started = time.perf_counter()
+    await operation
+    latencies.append((time.perf_counter() - started) * 1000)
+
+
+async def run_workload(handle, kind: str, operations: int, concurrency: int):
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(n: int):
+        async with semaphore:
+            if kind == "cart":
+                operation = handle.carts.update_one(
+                    {"session_id": f"s{n % 1000}"}, {"$set": {"items": [{"product_id": f"p{n % PRODUCTS}"}]},
+                                                     "$inc": {"version": 1}}, upsert=True
+                )
+            elif kind == "payment":
+                operation = handle.payment_transactions.insert_one({"id": uuid.uuid4().hex, "amount": 100.0})
+            else:
+                operation = handle.products.find({"category_id": f"c{n % 10}"}, {"_id": 0}).to_list(50)
+            await timed(latencies, operation)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(n) for n in range(operations)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return statistics.median(latencies), latencies[int(len(latencies) * 0.99) - 1], operations / elapsed
+
+
+def query_counters(mongo_url: str):
+    client = MongoClient(mongo_url, serverSelectionTimeoutMS=5000)
+    try:
+        counters = {}
+        for host, port in client.nodes:
+            member = MongoClient(host, port, directConnection=True)
+            try:
+                counters[f"{host}:{port}"] = member.admin.command("serverStatus")["opcounters"]["query"]
+            finally:
+                member.close()
+        return counters
+    finally:
+        client.close()
+
+
+async def bench(args, pool_size: int):
+    database = Database()
+    database.connect(args.mongo_url, args.db_name, max_pool_size=pool_size, max_connecting=args.max_connecting)
+    try:
+        await database.products.insert_many([
+            {"id": f"p{n}", "category_id": f"c{n % 10}", "price": float(n), "name_fr": f"Produit {n}"}
+            for n in range(PRODUCTS)
+        ])
+        await database.products.create_index("category_id")
+        # Give secondaries a moment to catch up so max staleness does not exclude them
+        await asyncio.sleep(1)
+        rows = [
+            ("cart", "default", database),
+            ("cart", "cart-write", database.profile("cart-write")),
+            ("payment", "default", database),
+            ("payment", "payment-critical", database.profile("payment-critical")),
+            ("catalog", "default", database),
+            ("catalog", "catalog-read", database.profile("catalog-read")),
+        ]
+        print(f"\npool size {pool_size}, concurrency {args.concurrency}")
+        for kind, label, handle in rows:
+            before = query_counters(args.mongo_url) if kind == "catalog" else None
+            p50, p99, rate = await run_workload(handle, kind, args.operations, args.concurrency)
+            served = ""
+            if before is not None:
+                after = query_counters(args.mongo_url)
+                served = "   queries " + ", ".join(f"{node} {after[node] - before.get(node, 0)}" for node in sorted(after))
+            print(f"  {kind:<8} {label:<17} p50 {p50:7.2f} ms   p99 {p99:7.2f} ms   {rate:8.0f} ops/s{served}")
+    finally:
+        await database.client.drop_database(args.db_name)
+        database.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-url", default="mongodb://localhost:27017,localhost:27018/?replicaSet=rs0")
+    parser.add_argument("--db-name", default=f"gulum_bench_{uuid.uuid4().hex[:8]}")
+    parser.add_argument("--operations", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--pool-sizes", default="10,100", help="comma-separated maxPoolSize values")
+    parser.add_argument("--max-connecting", type=int, default=2)
+    args = parser.parse_args()
+    for pool_size in (int(size) for size in args.pool_sizes.split(",")):
+        asyncio.run(bench(args, pool_size))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Cost of pricing a cart with hundreds of active promotions.
+
+Builds a synthetic rule set for each count in ``--rules``. Most rules are
+percentage sales on a category or a handful of products; the rest are
+buy-X-get-Y offers, order-level amounts and codes, some with date windows
+that are closed. It compiles the rules with ``PromotionEngine`` and prices
+``--carts`` random carts of 1 to 10 lines over ``--products`` products, with
+and without a code. Prints compile time and per-cart pricing time.
+No database is needed.
+
+    python benchmarks/bench_promotions.py --rules 10,100,500,1000
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from promotions import InvalidCode, PromotionEngine  # noqa: E402
+
+CATEGORIES = 50
+
+
+def synthetic_rules(count: int, products: int, rng: random.Random):
+    rules = []
+    for n in range(count):
+        roll = rng.random()
+        rule = {"id": f"promo-{n}", "name": f"Promotion {n}", "kind": "percent", "value": rng.choice((5, 10, 15, 20, 30))}
+        if roll < 0.6:
+            if rng.random() < 0.5:
+                rule["category_ids"] = [f"cat-{rng.randrange(CATEGORIES)}"]
+            else:
+                rule["product_ids"] = [f"prod-{rng.randrange(products)}" for _ in range(rng.randint(1, 20))]
+        elif roll < 0.75:
+            rule.update(kind="buy_x_get_y", value=100, buy_quantity=rng.randint(1, 3), get_quantity=1,
+                        product_ids=[f"prod-{rng.randrange(products)}" for _ in range(rng.randint(1, 10))])
+        elif roll < 0.85:
+            rule.update(kind="fixed", value=rng.choice((10, 20, 50)), min_subtotal=rng.choice((100, 300, 1000)))
+        else:
+            rule.update(code=f"CODE{n}")
+            if rng.random() < 0.5:
+                rule["category_ids"] = [f"cat-{rng.randrange(CATEGORIES)}"]
+        if rng.random() < 0.3:
+            # Half of these windows are already closed
+            rule["ends_at"] = rng.choice(("2020-01-01T00:00:00+00:00", "2100-01-01T00:00:00+00:00"))
+        rules.append(rule)
+    return rules
+
+
+def synthetic_carts(count: int, products: int, rng: random.Random):
+    carts = []
+    for _ in range(count):
+        cart = []
+        for _ in range(rng.randint(1, 10)):
+            product = rng.randrange(products)
+            price, quantity = float(rng.randint(20, 2000)), rng.randint(1, 4)
+            cart.append({"product_id": f"prod-{product}", "category_id": f"cat-{product % CATEGORIES}",
+                         "price": price, "quantity": quantity, "subtotal": price * quantity})
+        carts.append(cart)
+    return carts
+
+
+def measure(engine: PromotionEngine, carts, code=None):
+    times = []
+    for cart in carts:
+        started = time.perf_counter()
+        try:
+            engine.apply(cart, code)
+        except InvalidCode:
+            # A code that does not cover the cart still costs a full pricing
+            pass
+        times.append((time.perf_counter() - started) * 1e6)
+    times.sort()
+    return statistics.median(times), times[int(len(times) * 0.99) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rules", default="10,100,500,1000")
+    parser.add_argument("--products", type=int, default=20000)
+    parser.add_argument("--carts", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    carts = synthetic_carts(args.carts, args.products, rng)
+    for count in (int(n) for n in args.rules.split(",")):
+        rules = synthetic_rules(count, args.products, rng)
+        engine = PromotionEngine()
+        started = time.perf_counter()
+        engine.set_rules(rules)
+        compile_ms = (time.perf_counter() - started) * 1000
+        # A code on the whole cart whose window is open
+        code = next((r["code"] for r in rules if r.get("code") and "category_ids" not in r
+                     and not r.get("ends_at", "").startswith("2020")), None)
+        p50, p99 = measure(engine, carts)
+        line = f"{count:>5} rules   compile {compile_ms:7.2f} ms   cart p50 {p50:6.1f} us   p99 {p99:6.1f} us"
+        if code:
+            p50, p99 = measure(engine, carts, code)
+            line += f"   with code p50 {p50:6.1f} us   p99 {p99:6.1f} us"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
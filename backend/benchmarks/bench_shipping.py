@@ -0,0 +1,84 @@
+"""Cost of quoting delivery for large carts.
+
+Compiles ``--zones`` zones over the two-digit postcode prefixes, plus
+``--overrides`` five-digit postcodes with their own rates, each with
+``--bands`` weight bands up to two tonnes. It then quotes carts of each
+size in ``--lines`` to random postcodes, with products drawn from a
+catalog where a third of the products have no dimensions. Prints compile
+time and per-quote time. No database is needed.
+
+    python benchmarks/bench_shipping.py --lines 10,100,1000,10000
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from shipping import ShippingRates  # noqa: E402
+
+
+def synthetic_zones(count: int, overrides: int, bands: int, rng: random.Random):
+    def rates():
+        step = 2000 / bands
+        return [{"max_kg": round(step * (n + 1)), "price": round(15 + n * rng.uniform(8, 20), 2)} for n in range(bands)]
+
+    zones = [{"id": f"zone-{n}", "name": f"Zone {n}", "postcodes": [], "bands": rates(), "per_kg_over": 0.2,
+              "bulky_fee": 25} for n in range(count)]
+    for department in range(1, 96):
+        zones[department % count]["postcodes"].append(f"{department:02d}")
+    for n, postcode in enumerate(rng.sample(range(1000, 96000), overrides)):
+        zones.append({"id": f"override-{n}", "name": f"Override {n}", "postcodes": [f"{postcode:05d}"], "bands": rates()})
+    return zones
+
+
+def synthetic_products(count: int, rng: random.Random):
+    products = []
+    for _ in range(count):
+        product = {"weight_kg": round(rng.uniform(1, 90), 1)}
+        if rng.random() < 2 / 3:
+            product.update(length_cm=rng.randint(20, 230), width_cm=rng.randint(20, 100), height_cm=rng.randint(10, 100))
+        products.append(product)
+    return products
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", default="10,100,1000,10000")
+    parser.add_argument("--zones", type=int, default=20)
+    parser.add_argument("--overrides", type=int, default=500)
+    parser.add_argument("--bands", type=int, default=10)
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--quotes", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    zones = synthetic_zones(args.zones, args.overrides, args.bands, rng)
+    rates = ShippingRates()
+    started = time.perf_counter()
+    rates.set_zones(zones)
+    print(f"compiled {len(zones)} zones in {(time.perf_counter() - started) * 1000:.2f} ms")
+
+    products = synthetic_products(args.products, rng)
+    postcodes = [f"{rng.randrange(1000, 96000):05d}" for _ in range(1000)]
+    for size in (int(n) for n in args.lines.split(",")):
+        # Fewer quotes for the largest carts, so each size takes about as long
+        count = max(20, args.quotes * 10 // size)
+        carts = [[(rng.choice(products), rng.randint(1, 4)) for _ in range(size)] for _ in range(min(count, 50))]
+        times = []
+        for n in range(count):
+            cart, postcode = carts[n % len(carts)], postcodes[n % len(postcodes)]
+            started = time.perf_counter()
+            rates.quote(postcode, cart)
+            times.append((time.perf_counter() - started) * 1e6)
+        times.sort()
+        print(f"{size:>6} lines   quote p50 {statistics.median(times):9.1f} us   p99 {times[int(len(times) * 0.99) - 1]:9.1f} us"
+              f"   {statistics.median(times) * 1000 / size:6.0f} ns/line")
+
+
+if __name__ == "__main__":
+    main()
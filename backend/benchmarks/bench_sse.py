@@ -0,0 +1,115 @@
+"""Cost of idle payment-status waiters.
+
+``--mode hub`` (default) runs in-process: it parks N waiters shaped like the
+``/checkout/status/{id}/stream`` generator (future + heartbeat loop) on the
+event hub, reports allocated bytes per waiter with tracemalloc and the time
+to wake all of them.
+
+``--mode http`` opens N real SSE connections against a running server and
+reports the server's RSS growth per open stream (Linux, ``--pid`` of the
+uvicorn worker). The session id should belong to an unpaid checkout.
+
+    python benchmarks/bench_sse.py --waiters 10000
+    python benchmarks/bench_sse.py --mode http --base-url http://127.0.0.1:8001 \\
+        --session-id cs_test_... --pid 12345 --waiters 10000
+"""
+import argparse
+import asyncio
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from urllib.parse import urlparse
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from events import EventHub  # noqa: E402
+
+
+async def idle_stream(hub: EventHub, topic: str, heartbeat: float):
+    waiter = hub.subscribe(topic)
+    try:
+        while True:
+            try:
+                return await asyncio.wait_for(asyncio.shield(waiter), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                continue
+    finally:
+        hub.unsubscribe(topic, waiter)
+
+
+async def run_hub(waiters: int, heartbeat: float):
+    hub = EventHub()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    tasks = [asyncio.create_task(idle_stream(hub, f"payment:cs_{i}", heartbeat)) for i in range(waiters)]
+    await asyncio.sleep(0.5)
+    after, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"waiters:            {hub.waiting}")
+    print(f"memory per waiter:  {(after - before) / waiters:.0f} B (peak total {peak / 1e6:.1f} MB)")
+
+    started = time.perf_counter()
+    for i in range(waiters):
+        await hub.publish(f"payment:cs_{i}", {"payment_status": "paid"})
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+    print(f"wake all:           {elapsed * 1000:.1f} ms ({elapsed / waiters * 1e6:.1f} us per waiter)")
+    print(f"left registered:    {hub.waiting}")
+
+
+def rss_kb(pid: int) -> int:
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    raise RuntimeError("VmRSS not found")
+
+
+async def open_stream(host: str, port: int, path: str):
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\nAccept: text/event-stream\r\n\r\n".encode())
+    await writer.drain()
+    await reader.readuntil(b"\r\n\r\n")
+    return reader, writer
+
+
+async def run_http(base_url: str, session_id: str, pid: int, waiters: int, batch: int):
+    url = urlparse(base_url)
+    path = f"/api/checkout/status/{session_id}/stream"
+    baseline = rss_kb(pid)
+    connections = []
+    started = time.perf_counter()
+    for offset in range(0, waiters, batch):
+        size = min(batch, waiters - offset)
+        connections += await asyncio.gather(*(open_stream(url.hostname, url.port or 80, path) for _ in range(size)))
+    opened = time.perf_counter() - started
+    await asyncio.sleep(2)
+    grown = rss_kb(pid) - baseline
+    print(f"open streams:       {len(connections)} in {opened:.1f} s")
+    print(f"server RSS growth:  {grown / 1024:.1f} MB ({grown * 1024 / len(connections):.0f} B per stream)")
+    for _, writer in connections:
+        writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=["hub", "http"], default="hub")
+    parser.add_argument("--waiters", type=int, default=10000)
+    parser.add_argument("--heartbeat", type=float, default=15.0)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8001")
+    parser.add_argument("--session-id")
+    parser.add_argument("--pid", type=int)
+    parser.add_argument("--batch", type=int, default=500)
+    args = parser.parse_args()
+
+    if args.mode == "hub":
+        asyncio.run(run_hub(args.waiters, args.heartbeat))
+    else:
+        if not args.session_id or not args.pid:
+            parser.error("--mode http needs --session-id and --pid")
+        asyncio.run(run_http(args.base_url, args.session_id, args.pid, args.waiters, args.batch))
+
+
+if __name__ == "__main__":
+    main()
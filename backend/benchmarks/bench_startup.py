@@ -0,0 +1,88 @@
+"""Cold-start cost of the API.
+
+Measures, in fresh interpreters:
+
+* ``import``: ``import server`` (module import plus ``create_app()``)
+* ``ready``: launching uvicorn until ``/api/health/ready`` answers 200
+  (needs MONGO_URL/DB_NAME, skipped with ``--import-only``)
+
+``--budget-ms`` makes the script exit non-zero when the median import time
+exceeds the budget, so it can guard against cold-start regressions in CI.
+
+    python benchmarks/bench_startup.py --runs 10 --budget-ms 1500
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import requests
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+IMPORT_SNIPPET = (
+    "import time; t = time.perf_counter(); import server; "
+    "print((time.perf_counter() - t) * 1000)"
+)
+
+
+def measure_import() -> float:
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_SNIPPET],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def measure_ready(port: int, timeout: float = 30.0) -> float:
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--host", "127.0.0.1",
+         "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+    )
+    try:
+        url = f"http://127.0.0.1:{port}/api/health/ready"
+        while time.perf_counter() - started < timeout:
+            try:
+                if requests.get(url, timeout=1).status_code == 200:
+                    return (time.perf_counter() - started) * 1000
+            except requests.RequestException:
+                pass
+            time.sleep(0.01)
+        raise RuntimeError("Server did not become ready")
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+
+def summarize(name: str, samples):
+    print(f"{name:>8}: median {statistics.median(samples):8.1f} ms   "
+          f"min {min(samples):8.1f} ms   max {max(samples):8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--import-only", action="store_true")
+    parser.add_argument("--budget-ms", type=float, default=None)
+    args = parser.parse_args()
+
+    import_samples = [measure_import() for _ in range(args.runs)]
+    summarize("import", import_samples)
+    if not args.import_only:
+        summarize("ready", [measure_ready(args.port) for _ in range(args.runs)])
+
+    if args.budget_ms is not None and statistics.median(import_samples) > args.budget_ms:
+        print(f"import time exceeds budget of {args.budget_ms} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
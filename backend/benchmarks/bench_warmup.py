@@ -0,0 +1,89 @@
+"""First-request latency of a fresh worker, with and without warm-up.
+
+Starts uvicorn with ``WARMUP=false`` and then ``WARMUP=true`` (``--runs``
+times each), waits for ``/api/health/ready`` and times the first request to
+each catalog route, then the median of ``--requests`` more. The cache is the
+worker's own memory, so every run starts cold. Needs MONGO_URL/DB_NAME and a
+seeded database.
+
+    python benchmarks/bench_warmup.py --runs 5
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import requests
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+PATHS = [
+    "/api/storefront/home?lang=fr",
+    "/api/categories",
+    "/api/products",
+    "/api/products?featured=true",
+    "/api/currencies",
+]
+
+
+def timed_get(session: requests.Session, url: str) -> float:
+    started = time.perf_counter()
+    session.get(url, timeout=30).raise_for_status()
+    return (time.perf_counter() - started) * 1000
+
+
+def measure(port: int, warmup: bool, repeats: int, timeout: float = 60.0):
+    env = {**os.environ, "WARMUP": "true" if warmup else "false", "CACHE_URL": "memory://", "LOG_LEVEL": "WARNING"}
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--host", "127.0.0.1",
+         "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+        env=env,
+    )
+    base = f"http://127.0.0.1:{port}"
+    try:
+        while True:
+            if time.perf_counter() - started > timeout:
+                raise RuntimeError("Server did not become ready")
+            try:
+                if requests.get(f"{base}/api/health/ready", timeout=1).status_code == 200:
+                    break
+            except requests.RequestException:
+                pass
+            time.sleep(0.01)
+        ready_ms = (time.perf_counter() - started) * 1000
+        # A new connection per route, as a browser opening the site would have
+        first = {path: timed_get(requests.Session(), base + path) for path in PATHS}
+        session = requests.Session()
+        product_id = session.get(f"{base}/api/products", timeout=30).json()[0]["id"]
+        first[f"/api/products/{product_id}"] = timed_get(requests.Session(), f"{base}/api/products/{product_id}")
+        warm = {path: statistics.median(timed_get(session, base + path) for _ in range(repeats)) for path in first}
+        return ready_ms, first, warm
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--port", type=int, default=8767)
+    args = parser.parse_args()
+
+    for warmup in (False, True):
+        runs = [measure(args.port, warmup, args.requests) for _ in range(args.runs)]
+        print(f"WARMUP={str(warmup).lower()}: ready after {statistics.median(r[0] for r in runs):.0f} ms (median)")
+        for path in runs[0][1]:
+            first = statistics.median(r[1][path] for r in runs)
+            warm = statistics.median(r[2][path] for r in runs)
+            # Product ids are the same in every run of a seeded database
+            print(f"  {path:<40} first {first:8.1f} ms   warm {warm:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
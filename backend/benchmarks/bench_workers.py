@@ -0,0 +1,95 @@
+"""Requests/sec of the API as the number of uvicorn workers grows.
+
+Starts ``uvicorn --factory server:create_app`` with ``WEB_CONCURRENCY=N`` for
+N = 1..max and hammers one route with a pool of keep-alive HTTP clients. MONGO_URL/DB_NAME
+(and CACHE_URL=redis://... to share caches between workers) are read from
+the environment or backend/.env like the server itself.
+
+    python benchmarks/bench_workers.py --max-workers 4 --path /api/products
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import requests
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def wait_until_up(base_url: str, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(f"{base_url}/api/health/ready", timeout=1).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Server at {base_url} did not start")
+
+
+def client_loop(url: str, stop_at: float):
+    session = requests.Session()
+    latencies = []
+    errors = 0
+    while time.monotonic() < stop_at:
+        started = time.perf_counter()
+        try:
+            ok = session.get(url, timeout=10).status_code == 200
+        except requests.RequestException:
+            ok = False
+        latencies.append(time.perf_counter() - started)
+        errors += not ok
+    return latencies, errors
+
+
+def run_load(url: str, concurrency: int, duration: float):
+    stop_at = time.monotonic() + duration
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda _: client_loop(url, stop_at), range(concurrency)))
+    latencies = sorted(l for lat, _ in results for l in lat)
+    errors = sum(e for _, e in results)
+    return latencies, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 4)
+    parser.add_argument("--path", default="/api/products")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=15.0)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    print(f"{'workers':>7} {'req/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for workers in range(1, args.max_workers + 1):
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "--factory", "server:create_app",
+             "--host", "127.0.0.1", "--port", str(args.port),
+             "--log-level", "warning"],
+            cwd=BACKEND_DIR,
+            # Rather than --workers, so the workers know how many they are
+            env={**os.environ, "WEB_CONCURRENCY": str(workers)},
+        )
+        try:
+            wait_until_up(base_url)
+            run_load(base_url + args.path, args.concurrency, 2.0)  # warm caches and pools
+            latencies, errors = run_load(base_url + args.path, args.concurrency, args.duration)
+        finally:
+            proc.terminate()
+            proc.wait(timeout=30)
+
+        rps = len(latencies) / args.duration
+        p50 = statistics.median(latencies) * 1000
+        p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+        print(f"{workers:>7} {rps:>10.1f} {p50:>8.2f} {p99:>8.2f} {errors:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+"""Shared cache and invalidation bus.
+
+Two backends are available:
+
+* ``memory://`` keeps everything inside the worker process. It is the default
+  and is only consistent when the API runs as a single worker.
+* ``redis://host:port/db`` stores cache entries and rate-limit counters in
+  Redis (or any server speaking the Redis protocol) and broadcasts
+  invalidations over pub/sub, so every worker drops its derived state.
+
+Values are stored as JSON, so only plain API payloads should be cached.
+"""
+import asyncio
+import json
+import logging
+import time
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+InvalidationHandler = Callable[[str], Awaitable[None]]
+
+INVALIDATION_CHANNEL = "gulum:invalidate"
+
+
+class MemoryBackend:
+    def __init__(self):
+        self._data: Dict[str, Tuple[Optional[float], str]] = {}
+
+    async def get(self, key: str) -> Optional[str]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            self._data.pop(key, None)
+            return None
+        return value
+
+    async def set(self, key: str, value: str, ttl: Optional[int] = None):
+        expires_at = time.monotonic() + ttl if ttl else None
+        self._data[key] = (expires_at, value)
+
+    async def delete(self, *keys: str):
+        for key in keys:
+            self._data.pop(key, None)
+
+    async def delete_prefix(self, prefix: str):
+        for key in [k for k in self._data if k.startswith(prefix)]:
+            self._data.pop(key, None)
+
+    async def incr(self, key: str, ttl: int) -> int:
+        current = await self.get(key)
+        if current is None:
+            await self.set(key, "1", ttl)
+            return 1
+        expires_at, _ = self._data[key]
+        value = int(current) + 1
+        self._data[key] = (expires_at, str(value))
+        return value
+
+    async def close(self):
+        self._data.clear()
+
+
+class RedisBackend:
+    def __init__(self, client):
+        self.client = client
+
+    @classmethod
+    def from_url(cls, url: str) -> "RedisBackend":
+        import redis.asyncio as redis
+
+        return cls(redis.from_url(url, decode_responses=True))
+
+    async def get(self, key: str) -> Optional[str]:
+        return await self.client.get(key)
+
+    async def set(self, key: str, value: str, ttl: Optional[int] = None):
+        await self.client.set(key, value, ex=ttl)
+
+    async def delete(self, *keys: str):
+        if keys:
+            await self.client.delete(*keys)
+
+    async def delete_prefix(self, prefix: str):
+        batch = []
+        async for key in self.client.scan_iter(match=f"{prefix}*", count=500):
+            batch.append(key)
+            if len(batch) >= 500:
+                await self.client.delete(*batch)
+                batch = []
+        if batch:
+            await self.client.delete(*batch)
+
+    async def incr(self, key: str, ttl: int) -> int:
+        # One transaction, so a counter is never left without its expiry
+        pipe = self.client.pipeline(transaction=True)
+        pipe.set(key, 0, ex=ttl, nx=True)
+        pipe.incr(key)
+        _, value = await pipe.execute()
+        return int(value)
+
+    async def close(self):
+        await self.client.aclose()
+
+
+class MemoryBus:
+    """Delivers invalidations to handlers registered in this process only."""
+
+    def __init__(self):
+        self._dispatch: Optional[InvalidationHandler] = None
+
+    async def start(self, dispatch: InvalidationHandler):
+        self._dispatch = dispatch
+
+    async def publish(self, namespace: str):
+        if self._dispatch is not None:
+            await self._dispatch(namespace)
+
+    async def close(self):
+        self._dispatch = None
+
+
+class RedisBus:
+    """Broadcasts invalidations to every worker through Redis pub/sub."""
+
+    def __init__(self, client, channel: str = INVALIDATION_CHANNEL):
+        self.client = client
+        self.channel = channel
+        self._pubsub = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self, dispatch: InvalidationHandler):
+        self._pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        await self._pubsub.subscribe(self.channel)
+        self._task = asyncio.create_task(self._listen(dispatch))
+
+    async def _listen(self, dispatch: InvalidationHandler):
+        while True:
+            try:
+                message = await self._pubsub.get_message(timeout=1.0)
+                if message and message.get("type") == "message":
+                    await dispatch(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Invalidation bus error: {e}")
+                await asyncio.sleep(1.0)
+
+    async def publish(self, namespace: str):
+        await self.client.publish(self.channel, namespace)
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+            self._pubsub = None
+
+
+class Cache:
+    """Cache facade used by the route handlers.
+
+    Keys are grouped in namespaces (``catalog:products:...``). ``invalidate``
+    drops a whole namespace and notifies every worker, so in-process state
+    derived from the same data can be rebuilt through ``on_invalidate``.
+    """
+
+    def __init__(self):
+        self.backend = MemoryBackend()
+        self.bus = MemoryBus()
+        self._handlers: Dict[str, List[InvalidationHandler]] = defaultdict(list)
+
+    def configure(self, url: str = "memory://"):
+        if url.startswith("memory://"):
+            self.backend = MemoryBackend()
+            self.bus = MemoryBus()
+        elif url.startswith(("redis://", "rediss://", "unix://")):
+            backend = RedisBackend.from_url(url)
+            self.backend = backend
+            self.bus = RedisBus(backend.client)
+        else:
+            raise ValueError(f"Unsupported cache URL: {url}")
+
+    async def start(self):
+        await self.bus.start(self._dispatch)
+
+    async def close(self):
+        await self.bus.close()
+        await self.backend.close()
+
+    def on_invalidate(self, namespace: str, handler: InvalidationHandler):
+        self._handlers[namespace].append(handler)
+
+    async def _dispatch(self, namespace: str):
+        if isinstance(self.backend, MemoryBackend):
+            await self.backend.delete_prefix(f"{namespace}:")
+        for handler in self._handlers.get(namespace, []):
+            try:
+                await handler(namespace)
+            except Exception as e:
+                logger.error(f"Invalidation handler for {namespace} failed: {e}")
+
+    async def get(self, key: str) -> Optional[Any]:
+        value = await self.backend.get(key)
+        return json.loads(value) if value is not None else None
+
+    async def set(self, key: str, value: Any, ttl: Optional[int] = None):
+        await self.backend.set(key, json.dumps(value, default=str), ttl)
+
+    async def delete(self, *keys: str):
+        await self.backend.delete(*keys)
+
+    async def incr(self, key: str, ttl: int) -> int:
+        return await self.backend.incr(key, ttl)
+
+    async def invalidate(self, namespace: str):
+        await self.backend.delete_prefix(f"{namespace}:")
+        await self.bus.publish(namespace)
+
+
+cache = Cache()
@@ -0,0 +1,287 @@
+"""Write-behind cart store.
+
+Every click in the cart used to cost a MongoDB read and a write. ``CartStore``
+serves cart reads and edits from a hot tier instead. The tier lives in Redis
+with a ``redis://`` URL, so that every worker sees the same carts, or in the
+worker's memory when there is a single worker. Carts held by several workers'
+memory would drift apart, and each worker would flush its own copy over the
+others', so ``memory://`` with more than one worker writes through instead.
+An edited cart is marked dirty in the hot tier. Dirty carts are written to
+``carts`` in batched ``bulk_write`` calls every flush interval and when the
+store closes. A cart that is not in the hot tier is read from MongoDB once.
+
+The flush interval is the durability knob. A worker that dies loses at most
+the cart edits of the last interval; with the Redis tier the dirty set
+outlives the worker and another worker flushes it. An interval of 0 turns the
+hot tier off and writes every edit through to MongoDB. Checkout flushes its
+cart first, so orders are always priced and claimed against MongoDB.
+
+A flush only replaces a stored cart with a newer version of it, so a slow
+flush never puts an older cart back over one written since.
+"""
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Sequence, Set
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+FLUSH_BATCH = 500
+MAX_MEMORY_CARTS = 100000
+REDIS_CART_TTL = 7 * 24 * 3600
+REDIS_KEY_PREFIX = "gulum:cart:"
+REDIS_DIRTY_KEY = "gulum:carts:dirty"
+
+
+def _copy(cart: Dict) -> Dict:
+    # Handlers edit the carts they get; the tier keeps its own copy
+    return {**cart, "items": [dict(item) for item in cart.get("items", [])]}
+
+
+def upsert(cart: Dict) -> UpdateOne:
+    """Writes ``cart`` unless the stored cart already has its version or a later one."""
+    stored_version = {"$ifNull": ["$version", -1]}
+    newer = {"$lt": [stored_version, cart.get("version", 0)]}
+
+    def pick(field: str) -> Dict:
+        return {"$cond": [newer, {"$literal": cart.get(field)}, f"${field}"]}
+
+    return UpdateOne(
+        {"session_id": cart["session_id"]},
+        [{"$set": {
+            "id": {"$ifNull": ["$id", {"$literal": cart.get("id")}]},
+            "created_at": {"$ifNull": ["$created_at", {"$literal": cart.get("created_at")}]},
+            "items": pick("items"),
+            "order_id": pick("order_id"),
+            "updated_at": pick("updated_at"),
+            "version": {"$max": [stored_version, cart.get("version", 0)]},
+        }}],
+        upsert=True,
+    )
+
+
+class MemoryTier:
+    """Carts of this worker, least recently used first."""
+
+    name = "memory"
+
+    def __init__(self, max_carts: int = MAX_MEMORY_CARTS):
+        self.max_carts = max_carts
+        self._carts: "OrderedDict[str, Dict]" = OrderedDict()
+        self._dirty: Set[str] = set()
+
+    async def get(self, session_id: str) -> Optional[Dict]:
+        cart = self._carts.get(session_id)
+        if cart is None:
+            return None
+        self._carts.move_to_end(session_id)
+        return _copy(cart)
+
+    async def put(self, cart: Dict, dirty: bool):
+        session_id = cart["session_id"]
+        self._carts[session_id] = _copy(cart)
+        self._carts.move_to_end(session_id)
+        if dirty:
+            self._dirty.add(session_id)
+        self._evict()
+
+    def _evict(self):
+        # Dirty carts stay until they have been flushed
+        while len(self._carts) > self.max_carts:
+            oldest_clean = next((s for s in self._carts if s not in self._dirty), None)
+            if oldest_clean is None:
+                return
+            del self._carts[oldest_clean]
+
+    async def delete(self, session_id: str):
+        self._carts.pop(session_id, None)
+        self._dirty.discard(session_id)
+
+    async def take_dirty(self, session_ids: Optional[Sequence[str]], limit: int) -> List[Dict]:
+        candidates = self._dirty if session_ids is None else [s for s in session_ids if s in self._dirty]
+        taken = list(candidates)[:limit]
+        self._dirty.difference_update(taken)
+        return [_copy(self._carts[s]) for s in taken]
+
+    async def mark_dirty(self, session_ids: Iterable[str]):
+        self._dirty.update(s for s in session_ids if s in self._carts)
+
+    async def dirty_count(self) -> int:
+        return len(self._dirty)
+
+    async def close(self):
+        self._carts.clear()
+        self._dirty.clear()
+
+
+class RedisTier:
+    """Carts shared by every worker, with the set of dirty carts kept in Redis."""
+
+    name = "redis"
+
+    def __init__(self, client, ttl: int = REDIS_CART_TTL):
+        self.client = client
+        self.ttl = ttl
+
+    @classmethod
+    def from_url(cls, url: str) -> "RedisTier":
+        import redis.asyncio as redis
+
+        return cls(redis.from_url(url, decode_responses=True))
+
+    async def get(self, session_id: str) -> Optional[Dict]:
+        raw = await self.client.get(REDIS_KEY_PREFIX + session_id)
+        return json.loads(raw) if raw is not None else None
+
+    async def put(self, cart: Dict, dirty: bool):
+        pipe = self.client.pipeline(transaction=True)
+        pipe.set(REDIS_KEY_PREFIX + cart["session_id"], json.dumps(cart, default=str), ex=self.ttl)
+        if dirty:
+            pipe.sadd(REDIS_DIRTY_KEY, cart["session_id"])
+        await pipe.execute()
+
+    async def delete(self, session_id: str):
+        pipe = self.client.pipeline(transaction=True)
+        pipe.delete(REDIS_KEY_PREFIX + session_id)
+        pipe.srem(REDIS_DIRTY_KEY, session_id)
+        await pipe.execute()
+
+    async def take_dirty(self, session_ids: Optional[Sequence[str]], limit: int) -> List[Dict]:
+        if session_ids is None:
+            taken = await self.client.spop(REDIS_DIRTY_KEY, limit) or []
+        else:
+            pipe = self.client.pipeline(transaction=False)
+            for session_id in session_ids:
+                pipe.srem(REDIS_DIRTY_KEY, session_id)
+            removed = await pipe.execute()
+            # Another worker may be flushing the rest already
+            taken = [s for s, was_dirty in zip(session_ids, removed) if was_dirty]
+        if not taken:
+            return []
+        values = await self.client.mget([REDIS_KEY_PREFIX + s for s in taken])
+        return [json.loads(value) for value in values if value is not None]
+
+    async def mark_dirty(self, session_ids: Iterable[str]):
+        session_ids = list(session_ids)
+        if session_ids:
+            await self.client.sadd(REDIS_DIRTY_KEY, *session_ids)
+
+    async def dirty_count(self) -> int:
+        return int(await self.client.scard(REDIS_DIRTY_KEY))
+
+    async def close(self):
+        await self.client.aclose()
+
+
+class CartStore:
+    def __init__(self):
+        self.database = None
+        self.tier = None
+        self.flush_interval = 0.0
+        self.flushed = 0
+        self.last_flush_ms = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def configure(self, database, url: str = "memory://", flush_interval: float = 1.0, workers: int = 1):
+        self.database = database
+        self.flush_interval = flush_interval
+        if flush_interval <= 0:
+            self.tier = None
+        elif url.startswith(("redis://", "rediss://", "unix://")):
+            self.tier = RedisTier.from_url(url)
+        elif workers > 1:
+            logger.warning(f"Carts are written through: a memory:// tier is not shared by {workers} workers")
+            self.tier = None
+        else:
+            self.tier = MemoryTier()
+
+    async def start(self):
+        if self.tier is not None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Cart flush failed: {e}")
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.tier is not None:
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Final cart flush failed: {e}")
+            await self.tier.close()
+            self.tier = None
+
+    async def get(self, session_id: str) -> Optional[Dict]:
+        if self.tier is None:
+            return await self.database.carts.find_one({"session_id": session_id}, {"_id": 0})
+        cart = await self.tier.get(session_id)
+        if cart is None:
+            cart = await self.database.carts.find_one({"session_id": session_id}, {"_id": 0})
+            if cart is not None:
+                await self.tier.put(cart, dirty=False)
+        return cart
+
+    async def save(self, cart: Dict):
+        """Stores an edited cart, whose version the caller has already bumped."""
+        if self.tier is None:
+            await self._write([cart])
+        else:
+            await self.tier.put(cart, dirty=True)
+
+    async def delete(self, session_id: str):
+        if self.tier is not None:
+            await self.tier.delete(session_id)
+        await self.database.carts.delete_one({"session_id": session_id})
+
+    async def flush(self, session_ids: Optional[Sequence[str]] = None) -> int:
+        """Writes dirty carts (all, or only ``session_ids``) to MongoDB; returns how many."""
+        if self.tier is None:
+            return 0
+        started = time.perf_counter()
+        written = 0
+        while True:
+            carts = await self.tier.take_dirty(session_ids, FLUSH_BATCH)
+            if not carts:
+                break
+            try:
+                await self._write(carts)
+            except Exception:
+                await self.tier.mark_dirty(cart["session_id"] for cart in carts)
+                raise
+            written += len(carts)
+        if written:
+            self.flushed += written
+            self.last_flush_ms = round((time.perf_counter() - started) * 1000, 2)
+        return written
+
+    async def _write(self, carts: List[Dict]):
+        await self.database.carts.bulk_write([upsert(cart) for cart in carts], ordered=False)
+
+    async def stats(self) -> Dict:
+        return {
+            "tier": self.tier.name if self.tier is not None else "none",
+            "dirty": await self.tier.dirty_count() if self.tier is not None else 0,
+            "flushed": self.flushed,
+            "last_flush_ms": self.last_flush_ms,
+        }
+
+
+cart_store = CartStore()
@@ -0,0 +1,155 @@
+"""Versioned change log of the catalog, for delta sync.
+
+Every product or category write is recorded in ``catalog_changes`` under a
+version taken from one counter, so versions are unique and increase across
+the whole catalog. There is one entry per entity (``"product:<id>"``): a new
+write moves the entry to a fresh version instead of adding another one, which
+keeps the log as large as the catalog plus recent deletions rather than its
+whole history.
+
+Entries store no document. ``changes_since`` reads the current documents for
+the entries it returns, and an entity that no longer exists becomes a
+tombstone. A client that syncs again from the version it got last therefore
+ends up with the catalog as it is now, whatever happened in between.
+
+Deletion entries are compacted after ``TOMBSTONE_RETENTION``. The counter
+document keeps the highest version removed that way as ``floor``: a client
+whose version is older than it would miss deletions and has to start over
+from version 0, which lists the whole catalog.
+
+Versions are reserved before the entry is written, so for a moment a higher
+version can be visible while a lower one is still being written. Reads stop
+before entries younger than ``SETTLE`` so that a client never moves past a
+version that has not been written yet.
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional
+
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
+
+PRODUCT = "product"
+CATEGORY = "category"
+
+COLLECTIONS = {PRODUCT: "products", CATEGORY: "categories"}
+# Internal fields that are not part of the public documents
+PROJECTIONS = {PRODUCT: {"_id": 0, "feed_shard": 0}, CATEGORY: {"_id": 0}}
+
+COUNTER_ID = "catalog_changes"
+SETTLE = timedelta(seconds=2)
+TOMBSTONE_RETENTION = timedelta(days=30)
+MAX_PAGE = 1000
+
+
+class ResyncRequired(Exception):
+    """The requested version predates the oldest deletion still in the log."""
+
+    def __init__(self, floor: int):
+        super().__init__(f"Changes before version {floor} have been compacted")
+        self.floor = floor
+
+
+async def _reserve(database, count: int) -> int:
+    counter = await database.counters.find_one_and_update(
+        {"_id": COUNTER_ID},
+        {"$inc": {"value": count}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return counter["value"] - count + 1
+
+
+async def record(database, kind: str, ids: Iterable[str], deleted: bool = False) -> None:
+    """Moves the entries of ``ids`` to new versions; call after the write succeeded."""
+    ids = list(dict.fromkeys(ids))
+    if not ids:
+        return
+    first = await _reserve(database, len(ids))
+    now = datetime.now(timezone.utc)
+    writes = []
+    for offset, entity_id in enumerate(ids):
+        version = first + offset
+        writes.append(UpdateOne(
+            # A concurrent write that already moved the entry further wins
+            {"_id": f"{kind}:{entity_id}", "version": {"$lt": version}},
+            {"$set": {"kind": kind, "id": entity_id, "version": version, "deleted": deleted, "at": now}},
+            upsert=True,
+        ))
+    try:
+        await database.catalog_changes.bulk_write(writes, ordered=False)
+    except BulkWriteError as e:
+        if any(error["code"] != 11000 for error in e.details.get("writeErrors", [])):
+            raise
+    if deleted:
+        await compact(database)
+
+
+async def backfill(database) -> int:
+    """Records every existing product and category, e.g. when the log is introduced."""
+    count = 0
+    for kind, collection in COLLECTIONS.items():
+        ids = [doc["id"] async for doc in database[collection].find({}, {"_id": 0, "id": 1})]
+        await record(database, kind, ids)
+        count += len(ids)
+    return count
+
+
+async def compact(database, retention: timedelta = TOMBSTONE_RETENTION) -> int:
+    cutoff = datetime.now(timezone.utc) - retention
+    newest = await database.catalog_changes.find_one(
+        {"deleted": True, "at": {"$lt": cutoff}}, {"_id": 0, "version": 1}, sort=[("version", -1)]
+    )
+    if newest is None:
+        return 0
+    # The floor moves first, so no reader sees the gap without being told
+    await database.counters.update_one({"_id": COUNTER_ID}, {"$max": {"floor": newest["version"]}}, upsert=True)
+    result = await database.catalog_changes.delete_many({"deleted": True, "version": {"$lte": newest["version"]}})
+    return result.deleted_count
+
+
+async def _current_documents(database, entries: List[Dict]) -> Dict[tuple, Dict]:
+    documents = {}
+    for kind, collection in COLLECTIONS.items():
+        ids = [entry["id"] for entry in entries if entry["kind"] == kind]
+        if ids:
+            async for doc in database[collection].find({"id": {"$in": ids}}, PROJECTIONS[kind]):
+                documents[(kind, doc["id"])] = doc
+    return documents
+
+
+async def changes_since(database, since: int, limit: int = MAX_PAGE, now: Optional[datetime] = None) -> Dict:
+    counter = await database.counters.find_one({"_id": COUNTER_ID}) or {}
+    floor = counter.get("floor", 0)
+    if 0 < since < floor:
+        raise ResyncRequired(floor)
+
+    entries = await database.catalog_changes.find(
+        {"version": {"$gt": since}}, {"_id": 0}
+    ).sort("version", 1).limit(limit + 1).to_list(None)
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+    settled = (now or datetime.now(timezone.utc)) - SETTLE
+    for position, entry in enumerate(entries):
+        if entry["at"].replace(tzinfo=timezone.utc) > settled:
+            # The rest is picked up by the next poll
+            entries = entries[:position]
+            has_more = False
+            break
+
+    documents = await _current_documents(database, entries)
+    changes = []
+    for entry in entries:
+        change = {"type": entry["kind"], "id": entry["id"], "version": entry["version"]}
+        doc = documents.get((entry["kind"], entry["id"]))
+        if doc is None:
+            change["op"] = "delete"
+        else:
+            change["op"] = "upsert"
+            change["data"] = doc
+        changes.append(change)
+    return {
+        "since": since,
+        "version": entries[-1]["version"] if entries else since,
+        "has_more": has_more,
+        "changes": changes,
+    }
@@ -0,0 +1,193 @@
+"""Application settings read from the environment and ``backend/.env``.
+
+Nothing here runs at import time: ``get_settings()`` loads and caches the
+settings on first use and ``Settings.validate()`` reports every problem at
+once instead of failing on the first missing key.
+"""
+import os
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Mapping, Optional, Tuple
+
+from dotenv import load_dotenv
+
+ROOT_DIR = Path(__file__).parent
+
+CACHE_URL_SCHEMES = ("memory://", "redis://", "rediss://", "unix://")
+LOG_LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL")
+LOG_FORMATS = ("json", "text")
+SMTP_URL_SCHEMES = ("smtp://", "smtps://")
+EXCHANGE_RATES_URL_SCHEMES = ("ecb://", "file://", "fixed://")
+# Catalog reads and probes are most of the traffic; keep a sample of their request logs
+DEFAULT_LOG_SAMPLE_RATES = "/api/products=0.1,/api/categories=0.1,/api/storefront=0.1,/api/health=0.01"
+
+
+class ConfigError(RuntimeError):
+    pass
+
+
+@dataclass(frozen=True)
+class Settings:
+    mongo_url: str
+    db_name: str
+    cors_origins: List[str]
+    stripe_api_key: Optional[str]
+    jwt_secret: str
+    admin_emails: Tuple[str, ...] = ()
+    mongo_max_pool_size: int = 100
+    mongo_min_pool_size: int = 0
+    mongo_max_connecting: int = 2
+    mongo_wait_queue_timeout_ms: int = 0
+    cache_url: str = "memory://"
+    web_concurrency: int = 1
+    catalog_cache_ttl: int = 300
+    login_rate_limit: int = 20
+    catalog_max_age: int = 300
+    compression_min_size: int = 1024
+    run_migrations: bool = True
+    log_level: str = "INFO"
+    log_format: str = "json"
+    log_sample_rates: Tuple[Tuple[str, float], ...] = ()
+    log_slow_request_ms: int = 1000
+    smtp_url: Optional[str] = None
+    mail_from: str = "Gül Mobilya <noreply@gulmobilya.fr>"
+    shop_email: Optional[str] = None
+    outbox_workers: int = 1
+    site_url: str = "http://localhost:3000"
+    feeds_dir: str = str(ROOT_DIR / "generated" / "feeds")
+    archive_dir: str = str(ROOT_DIR / "generated" / "archive")
+    order_archive_days: int = 365
+    shed_loop_lag_ms: int = 200
+    shed_pool_wait_ms: int = 100
+    cart_flush_interval_ms: int = 1000
+    currencies: Tuple[str, ...] = ("eur", "try", "usd", "gbp")
+    exchange_rates_url: Optional[str] = None
+    exchange_rates_refresh_s: int = 3600
+    warmup: bool = True
+    warmup_connections: int = 4
+    warmup_timeout_s: int = 30
+    errors: Tuple[str, ...] = field(default=(), repr=False)
+
+    @classmethod
+    def from_env(cls, environ: Mapping[str, str] = os.environ) -> "Settings":
+        errors = []
+
+        def required(name: str) -> str:
+            value = environ.get(name, "").strip()
+            if not value:
+                errors.append(f"{name} is not set")
+            return value
+
+        def integer(name: str, default: int, minimum: int = 0) -> int:
+            raw = environ.get(name)
+            if raw is None or raw.strip() == "":
+                return default
+            try:
+                value = int(raw)
+            except ValueError:
+                errors.append(f"{name} must be an integer, got {raw!r}")
+                return default
+            if value < minimum:
+                errors.append(f"{name} must be >= {minimum}, got {value}")
+            return value
+
+        def boolean(name: str, default: bool) -> bool:
+            raw = environ.get(name)
+            if raw is None or raw.strip() == "":
+                return default
+            if raw.strip().lower() in ("1", "true", "yes", "on"):
+                return True
+            if raw.strip().lower() in ("0", "false", "no", "off"):
+                return False
+            errors.append(f"{name} must be true or false, got {raw!r}")
+            return default
+
+        def sample_rates(name: str, default: str) -> Tuple[Tuple[str, float], ...]:
+            rates = []
+            for part in filter(None, (p.strip() for p in environ.get(name, default).split(","))):
+                prefix, _, raw_rate = part.partition("=")
+                try:
+                    rate = float(raw_rate)
+                except ValueError:
+                    rate = -1.0
+                if not prefix.startswith("/") or not 0.0 <= rate <= 1.0:
+                    errors.append(f"{name} entries must look like /api/path=0.1, got {part!r}")
+                    continue
+                rates.append((prefix, rate))
+            return tuple(rates)
+
+        settings = dict(
+            mongo_url=required("MONGO_URL"),
+            db_name=required("DB_NAME"),
+            cors_origins=environ.get("CORS_ORIGINS", "*").split(","),
+            stripe_api_key=environ.get("STRIPE_API_KEY") or None,
+            jwt_secret=environ.get("JWT_SECRET", "gulum-mobilya-secret-key-2024"),
+            admin_emails=tuple(
+                email.strip().lower() for email in environ.get("ADMIN_EMAILS", "").split(",") if email.strip()
+            ),
+            mongo_max_pool_size=integer("MONGO_MAX_POOL_SIZE", 100, minimum=1),
+            mongo_min_pool_size=integer("MONGO_MIN_POOL_SIZE", 0),
+            mongo_max_connecting=integer("MONGO_MAX_CONNECTING", 2, minimum=1),
+            mongo_wait_queue_timeout_ms=integer("MONGO_WAIT_QUEUE_TIMEOUT_MS", 0),
+            cache_url=environ.get("CACHE_URL", "memory://"),
+            web_concurrency=integer("WEB_CONCURRENCY", 1, minimum=1),
+            catalog_cache_ttl=integer("CATALOG_CACHE_TTL", 300),
+            login_rate_limit=integer("LOGIN_RATE_LIMIT", 20, minimum=1),
+            catalog_max_age=integer("CATALOG_MAX_AGE", 300),
+            compression_min_size=integer("COMPRESSION_MIN_SIZE", 1024),
+            run_migrations=boolean("RUN_MIGRATIONS", True),
+            log_level=environ.get("LOG_LEVEL", "INFO").strip().upper(),
+            log_format=environ.get("LOG_FORMAT", "json").strip().lower(),
+            log_sample_rates=sample_rates("LOG_SAMPLE_RATES", DEFAULT_LOG_SAMPLE_RATES),
+            log_slow_request_ms=integer("LOG_SLOW_REQUEST_MS", 1000),
+            smtp_url=environ.get("SMTP_URL") or None,
+            mail_from=environ.get("MAIL_FROM") or "Gül Mobilya <noreply@gulmobilya.fr>",
+            shop_email=environ.get("SHOP_EMAIL") or None,
+            outbox_workers=integer("OUTBOX_WORKERS", 1),
+            site_url=environ.get("SITE_URL", "http://localhost:3000").strip().rstrip("/"),
+            feeds_dir=environ.get("FEEDS_DIR") or str(ROOT_DIR / "generated" / "feeds"),
+            archive_dir=environ.get("ARCHIVE_DIR") or str(ROOT_DIR / "generated" / "archive"),
+            order_archive_days=integer("ORDER_ARCHIVE_DAYS", 365, minimum=1),
+            shed_loop_lag_ms=integer("SHED_LOOP_LAG_MS", 200),
+            shed_pool_wait_ms=integer("SHED_POOL_WAIT_MS", 100),
+            cart_flush_interval_ms=integer("CART_FLUSH_INTERVAL_MS", 1000),
+            currencies=tuple(
+                code.strip().lower() for code in environ.get("CURRENCIES", "eur,try,usd,gbp").split(",") if code.strip()
+            ),
+            exchange_rates_url=environ.get("EXCHANGE_RATES_URL") or None,
+            exchange_rates_refresh_s=integer("EXCHANGE_RATES_REFRESH_S", 3600, minimum=60),
+            warmup=boolean("WARMUP", True),
+            warmup_connections=integer("WARMUP_CONNECTIONS", 4, minimum=1),
+            warmup_timeout_s=integer("WARMUP_TIMEOUT_S", 30, minimum=1),
+        )
+        if settings["mongo_min_pool_size"] > settings["mongo_max_pool_size"]:
+            errors.append("MONGO_MIN_POOL_SIZE cannot exceed MONGO_MAX_POOL_SIZE")
+        if settings["warmup"] and settings["warmup_connections"] > settings["mongo_max_pool_size"]:
+            errors.append("WARMUP_CONNECTIONS cannot exceed MONGO_MAX_POOL_SIZE")
+        if not settings["cache_url"].startswith(CACHE_URL_SCHEMES):
+            errors.append(f"CACHE_URL must start with one of {', '.join(CACHE_URL_SCHEMES)}")
+        if settings["log_level"] not in LOG_LEVELS:
+            errors.append(f"LOG_LEVEL must be one of {', '.join(LOG_LEVELS)}")
+        if settings["log_format"] not in LOG_FORMATS:
+            errors.append(f"LOG_FORMAT must be one of {', '.join(LOG_FORMATS)}")
+        if settings["smtp_url"] and not settings["smtp_url"].startswith(SMTP_URL_SCHEMES):
+            errors.append(f"SMTP_URL must start with one of {', '.join(SMTP_URL_SCHEMES)}")
+        if settings["exchange_rates_url"] and not settings["exchange_rates_url"].startswith(EXCHANGE_RATES_URL_SCHEMES):
+            errors.append(f"EXCHANGE_RATES_URL must start with one of {', '.join(EXCHANGE_RATES_URL_SCHEMES)}")
+        if not all(len(code) == 3 and code.isalpha() for code in settings["currencies"]):
+            errors.append("CURRENCIES must be three-letter currency codes, e.g. eur,try")
+        if not settings["site_url"].startswith(("http://", "https://")):
+            errors.append("SITE_URL must be an http:// or https:// URL")
+        return cls(**settings, errors=tuple(errors))
+
+    def validate(self) -> "Settings":
+        if self.errors:
+            raise ConfigError("Invalid configuration: " + "; ".join(self.errors))
+        return self
+
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    load_dotenv(ROOT_DIR / '.env')
+    return Settings.from_env()
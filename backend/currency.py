@@ -0,0 +1,210 @@
+"""Exchange rates and prices in the shop's other currencies.
+
+Prices are stored and orders are totalled in euros. ``ExchangeRates`` keeps
+a table of rates from the euro in memory, loaded from the provider named by
+``EXCHANGE_RATES_URL``:
+
+* ``ecb://``: the European Central Bank's daily reference rates;
+* ``file:///path/rates.json``: ``{"rates": {"TRY": 35.2, "USD": 1.08}}``;
+* ``fixed://TRY=35.2,USD=1.08``: fixed rates, for tests and development.
+
+Without a provider only euros are offered. Each worker refreshes its table
+every ``EXCHANGE_RATES_REFRESH_S`` in the background; a failed refresh keeps
+the table it has. When the table changes, ``on_change`` runs (the API shares
+the table with the other workers and invalidates the catalog cache namespace
+once, so the cached catalog responses are rebuilt with the new prices).
+
+``prices(amount)`` returns the amount in every currency of the table,
+rounded to the currency's minor unit: the cent, or a whole yen or won for the
+currencies Stripe charges without decimals. The result is memoized per amount until the table
+changes; a catalog has few distinct prices, so serving prices costs a
+dictionary lookup and never a database or network call.
+"""
+import asyncio
+import json
+import logging
+import urllib.request
+import xml.etree.ElementTree as ET
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+BASE = "eur"
+ECB_URL = "https://www.ecb.europa.eu/stats/eurofxref/eurofxref-daily.xml"
+ECB_NAMESPACE = "{http://www.ecb.int/vocabulary/2002-08-01/eurofxref}"
+FETCH_TIMEOUT = 10.0
+# How long startup waits for the first table before serving euros only
+FIRST_LOAD_TIMEOUT = 2.0
+MEMO_SIZE = 100000
+# Currencies Stripe takes in whole units
+ZERO_DECIMAL_CURRENCIES = frozenset({
+    "bif", "clp", "djf", "gnf", "jpy", "kmf", "krw", "mga",
+    "pyg", "rwf", "ugx", "vnd", "vuv", "xaf", "xof", "xpf",
+})
+
+
+class UnsupportedCurrency(Exception):
+    """The currency is not in the current rate table."""
+
+
+def decimals(currency: str) -> int:
+    return 0 if currency.lower() in ZERO_DECIMAL_CURRENCIES else 2
+
+
+def _normalized(rates: Dict[str, float]) -> Dict[str, float]:
+    return {code.strip().lower(): float(rate) for code, rate in rates.items() if float(rate) > 0}
+
+
+class FixedRates:
+    def __init__(self, rates: Dict[str, float]):
+        self.rates = _normalized(rates)
+
+    @classmethod
+    def from_url(cls, url: str) -> "FixedRates":
+        pairs = (part.partition("=") for part in url[len("fixed://"):].split(",") if part.strip())
+        return cls({code: float(rate) for code, _, rate in pairs})
+
+    async def fetch(self) -> Dict[str, float]:
+        return dict(self.rates)
+
+
+class FileRates:
+    def __init__(self, path: str):
+        self.path = Path(path)
+
+    async def fetch(self) -> Dict[str, float]:
+        text = await asyncio.to_thread(self.path.read_text)
+        return _normalized(json.loads(text)["rates"])
+
+
+class EcbRates:
+    def __init__(self, url: str = ECB_URL):
+        self.url = url
+
+    def _download(self) -> bytes:
+        with urllib.request.urlopen(self.url, timeout=FETCH_TIMEOUT) as response:
+            return response.read()
+
+    async def fetch(self) -> Dict[str, float]:
+        root = ET.fromstring(await asyncio.to_thread(self._download))
+        return _normalized({
+            cube.attrib["currency"]: float(cube.attrib["rate"])
+            for cube in root.iter(f"{ECB_NAMESPACE}Cube")
+            if "currency" in cube.attrib
+        })
+
+
+def provider_from_url(url: Optional[str]):
+    if not url:
+        return None
+    if url.startswith("fixed://"):
+        return FixedRates.from_url(url)
+    if url.startswith("file://"):
+        return FileRates(url[len("file://"):])
+    if url.startswith("ecb://"):
+        return EcbRates()
+    raise ValueError(f"Unsupported exchange rates URL: {url}")
+
+
+class ExchangeRates:
+    def __init__(self):
+        self.provider = None
+        self.currencies: Sequence[str] = (BASE,)
+        self.refresh_interval = 3600.0
+        self.on_change: Optional[Callable[[], Awaitable[None]]] = None
+        self.rates: Dict[str, float] = {BASE: 1.0}
+        self.updated_at: Optional[datetime] = None
+        self._memo: Dict[float, Dict[str, float]] = {}
+        self._loaded: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def configure(self, provider, currencies: Sequence[str], refresh_interval: float,
+                  on_change: Optional[Callable[[], Awaitable[None]]] = None):
+        self.provider = provider
+        self.currencies = tuple(dict.fromkeys([BASE, *(code.strip().lower() for code in currencies)]))
+        self.refresh_interval = refresh_interval
+        self.on_change = on_change
+
+    def set_rates(self, rates: Dict[str, float], updated_at: Optional[datetime] = None) -> bool:
+        """Swaps in a new table; returns whether it changed."""
+        table = {BASE: 1.0, **{code: rates[code] for code in self.currencies if code in rates and code != BASE}}
+        missing = [code for code in self.currencies if code not in table]
+        if missing:
+            logger.warning("No exchange rate for %s", ", ".join(missing))
+        if table == self.rates:
+            return False
+        # Swapped together so a request never prices with half of a table
+        self.rates, self._memo = table, {}
+        self.updated_at = updated_at or datetime.now(timezone.utc)
+        return True
+
+    async def refresh(self) -> bool:
+        if self.provider is None:
+            return False
+        try:
+            rates = await self.provider.fetch()
+        except Exception as e:
+            logger.warning("Could not refresh exchange rates: %s", e)
+            return False
+        changed = self.set_rates(rates)
+        if changed:
+            logger.info("Exchange rates updated: %s", self.rates)
+            if self.on_change is not None:
+                try:
+                    await self.on_change()
+                except Exception:
+                    logger.exception("Exchange rate change handler failed")
+        return changed
+
+    async def _run(self):
+        while True:
+            await self.refresh()
+            self._loaded.set()
+            await asyncio.sleep(self.refresh_interval)
+
+    async def start(self):
+        if self.provider is None or self._task is not None:
+            return
+        self._loaded = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        try:
+            await asyncio.wait_for(self._loaded.wait(), FIRST_LOAD_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning("Exchange rates not loaded yet; prices are in euros only until they are")
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def prices(self, amount: float) -> Dict[str, float]:
+        """``amount`` euros in every currency of the table; do not modify the result."""
+        cached = self._memo.get(amount)
+        if cached is None:
+            cached = {code: round(amount * rate, decimals(code)) for code, rate in self.rates.items()}
+            if len(self._memo) >= MEMO_SIZE:
+                self._memo = {}
+            self._memo[amount] = cached
+        return cached
+
+    def convert(self, amount: float, currency: str) -> float:
+        rate = self.rates.get(currency.lower())
+        if rate is None:
+            raise UnsupportedCurrency(f"Currency {currency!r} is not available")
+        return round(amount * rate, decimals(currency))
+
+    def describe(self) -> Dict:
+        return {
+            "base": BASE,
+            "rates": self.rates,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+        }
+
+
+exchange_rates = ExchangeRates()
@@ -0,0 +1,185 @@
+"""MongoDB connection lifecycle and data-access profiles.
+
+The Motor client is created by the application lifespan instead of at import
+time, so every uvicorn/gunicorn worker opens its own pool after forking.
+
+Not every operation needs the same guarantees. A profile (see ``PROFILES``)
+names a read preference, read/write concern and server-side time limit, and
+``db.profile(name)`` returns a view of the database whose collections use
+them: catalog and report reads may be served by secondaries and are cut off
+early, cart edits are acknowledged by the primary alone, and order and
+payment writes wait for a majority. Code that does not ask for a profile
+keeps the client defaults.
+"""
+from dataclasses import dataclass
+from typing import Dict, Optional, Sequence
+
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorCollection, AsyncIOMotorDatabase
+from pymongo.read_concern import ReadConcern
+from pymongo.read_preferences import Primary, SecondaryPreferred, _ServerMode
+from pymongo.write_concern import WriteConcern
+
+
+@dataclass(frozen=True)
+class Profile:
+    read_preference: Optional[_ServerMode] = None
+    write_concern: Optional[WriteConcern] = None
+    read_concern: Optional[ReadConcern] = None
+    # Applied to reads and find-and-modify commands; writes are bounded by wtimeout
+    max_time_ms: Optional[int] = None
+
+
+PROFILES: Dict[str, Profile] = {
+    # Cached catalog data: a secondary at most 90 s behind is fine
+    "catalog-read": Profile(
+        read_preference=SecondaryPreferred(max_staleness=90),
+        max_time_ms=2000,
+    ),
+    # The same reads right after a catalog change, which a lagging secondary
+    # would answer with the old catalog
+    "catalog-fresh": Profile(
+        read_preference=Primary(),
+        max_time_ms=2000,
+    ),
+    "analytics-read": Profile(
+        read_preference=SecondaryPreferred(max_staleness=90),
+        max_time_ms=30000,
+    ),
+    # Carts and contact messages: losing a write on failover costs a retry
+    "cart-write": Profile(
+        write_concern=WriteConcern(w=1),
+        max_time_ms=2000,
+    ),
+    # Orders, payments and checkout idempotency keys must survive a failover
+    "payment-critical": Profile(
+        write_concern=WriteConcern(w="majority", wtimeout=5000),
+        read_concern=ReadConcern("majority"),
+        max_time_ms=5000,
+    ),
+}
+
+# Keyword each Motor collection method takes its server-side time limit as
+_TIME_LIMIT_ARGUMENTS = {
+    "find": "max_time_ms",
+    "find_one": "max_time_ms",
+    "aggregate": "maxTimeMS",
+    "count_documents": "maxTimeMS",
+    "distinct": "maxTimeMS",
+    "find_one_and_update": "maxTimeMS",
+    "find_one_and_replace": "maxTimeMS",
+    "find_one_and_delete": "maxTimeMS",
+}
+
+
+class ProfiledCollection:
+    """A Motor collection whose reads carry the profile's ``maxTimeMS``."""
+
+    def __init__(self, collection: AsyncIOMotorCollection, max_time_ms: Optional[int]):
+        self._collection = collection
+        self._max_time_ms = max_time_ms
+
+    def __getattr__(self, name):
+        attribute = getattr(self._collection, name)
+        argument = _TIME_LIMIT_ARGUMENTS.get(name)
+        if argument is None or self._max_time_ms is None:
+            return attribute
+
+        def with_time_limit(*args, **kwargs):
+            kwargs.setdefault(argument, self._max_time_ms)
+            return attribute(*args, **kwargs)
+
+        return with_time_limit
+
+
+class ProfileView:
+    """The database as seen through one profile.
+
+    Collections come back as ``ProfiledCollection``; anything else (``client``,
+    ``command``, ...) is the underlying database's. Resolved on every access,
+    so views can be created at import time, before the lifespan connects.
+    """
+
+    def __init__(self, owner: "Database", name: str):
+        self._owner = owner
+        self._name = name
+
+    def __getattr__(self, name):
+        database = self._owner._database_for(self._name)
+        attribute = getattr(database, name)
+        if isinstance(attribute, AsyncIOMotorCollection):
+            return ProfiledCollection(attribute, PROFILES[self._name].max_time_ms)
+        return attribute
+
+    def __getitem__(self, name):
+        return self.__getattr__(name)
+
+
+class Database:
+    """Holds the Motor client of the current worker.
+
+    Attribute access is forwarded to the connected database, so route handlers
+    keep using ``db.products``, ``db.orders`` and so on.
+    """
+
+    def __init__(self):
+        self.client: Optional[AsyncIOMotorClient] = None
+        self._database: Optional[AsyncIOMotorDatabase] = None
+        self._profiled: Dict[str, AsyncIOMotorDatabase] = {}
+
+    def connect(self, mongo_url: str, db_name: str, max_pool_size: int = 100, min_pool_size: int = 0,
+                max_connecting: int = 2, wait_queue_timeout_ms: int = 0, event_listeners: Sequence = ()):
+        options = {}
+        if wait_queue_timeout_ms:
+            # Fail fast instead of queueing forever when the pool is exhausted
+            options["waitQueueTimeoutMS"] = wait_queue_timeout_ms
+        self.client = AsyncIOMotorClient(
+            mongo_url,
+            maxPoolSize=max_pool_size,
+            minPoolSize=min_pool_size,
+            maxConnecting=max_connecting,
+            event_listeners=list(event_listeners),
+            **options,
+        )
+        self._database = self.client[db_name]
+        self._profiled = {
+            name: self._database.with_options(
+                read_preference=profile.read_preference,
+                write_concern=profile.write_concern,
+                read_concern=profile.read_concern,
+            )
+            for name, profile in PROFILES.items()
+        }
+
+    def close(self):
+        if self.client is not None:
+            self.client.close()
+        self.client = None
+        self._database = None
+        self._profiled = {}
+
+    @property
+    def connected(self) -> bool:
+        return self._database is not None
+
+    def profile(self, name: str) -> ProfileView:
+        if name not in PROFILES:
+            raise KeyError(f"Unknown data-access profile {name!r}")
+        return ProfileView(self, name)
+
+    def _database_for(self, profile: str) -> AsyncIOMotorDatabase:
+        database = self.__dict__.get("_profiled", {}).get(profile)
+        if database is None:
+            raise RuntimeError("Database is not connected; the application lifespan has not started")
+        return database
+
+    def __getattr__(self, name):
+        database = self.__dict__.get("_database")
+        if database is None:
+            raise RuntimeError("Database is not connected; the application lifespan has not started")
+        return getattr(database, name)
+
+    def __getitem__(self, name):
+        return self.__getattr__(name)
+
+
+db = Database()
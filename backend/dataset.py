@@ -0,0 +1,540 @@
+"""Synthetic, production-sized data for local index and query work.
+
+The seed catalog has 3 categories and 8 products. This fills a database with
+documents shaped like the ``Category``, ``Product``, ``User``, ``Cart``,
+``Order`` and ``PaymentTransaction`` models, at whatever scale is asked for:
+
+* product names and descriptions in French, Turkish and English;
+* product popularity follows a Zipf law, so a few products are in most
+  orders, as in the real sales data;
+* registered customers order again and again while guests order once;
+* most orders are paid, some were left pending at checkout, and every order
+  has its checked-out cart and a payment transaction;
+* abandoned carts that never became orders.
+
+The output depends only on the seed, the sizes and ``--end``. Documents are
+generated in chunks of ``--batch-size``, each from its own seed, so the
+number of worker processes does not change the data. Each worker inserts its
+chunks with ``insert_many``. The app's migrations then build the indexes,
+sales rollups, feed shards and catalog change log, as on a fresh deployment.
+
+Every user's password is ``--password``.
+
+    python dataset.py --db-name gulum_scale --orders 2000000
+    python dataset.py --db-name gulum_scale --orders 2000000 --drop   # start over
+"""
+import asyncio
+import logging
+import os
+import random
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from itertools import accumulate
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 10000
+# Zipf exponent of product popularity; with 20000 products the top 1% are in
+# about two thirds of the order lines
+POPULARITY_SKEW = 1.1
+LANGUAGES = (("fr", 0.7), ("tr", 0.2), ("en", 0.1))
+PAID_SHARE = 0.88
+REGISTERED_SHARE = 0.7
+
+# Product names are built from these words, (fr, tr, en) each
+KINDS = (
+    # (fr, tr, en), base price in euros, category slug
+    (("Canapé", "Kanepe", "Sofa"), 900, "living-room"),
+    (("Fauteuil", "Berjer", "Armchair"), 450, "living-room"),
+    (("Table basse", "Orta sehpa", "Coffee table"), 220, "living-room"),
+    (("Meuble TV", "TV ünitesi", "TV stand"), 260, "living-room"),
+    (("Table à manger", "Yemek masası", "Dining table"), 700, "dining-room"),
+    (("Chaise", "Sandalye", "Chair"), 110, "dining-room"),
+    (("Buffet", "Konsol", "Sideboard"), 550, "dining-room"),
+    (("Lit", "Yatak", "Bed"), 800, "bedroom"),
+    (("Table de chevet", "Komodin", "Nightstand"), 140, "bedroom"),
+    (("Armoire", "Gardırop", "Wardrobe"), 750, "bedroom"),
+    (("Bureau", "Çalışma masası", "Desk"), 320, "office"),
+    (("Bibliothèque", "Kitaplık", "Bookcase"), 280, "office"),
+    (("Lampadaire", "Lambader", "Floor lamp"), 120, "lighting"),
+    (("Suspension", "Sarkıt avize", "Pendant light"), 90, "lighting"),
+    (("Service à thé", "Çay seti", "Tea set"), 60, "kitchen"),
+    (("Machine à café", "Kahve makinesi", "Coffee machine"), 400, "kitchen"),
+)
+# Packed size of each kind: length, width, height in cm, weight in kg
+PARCELS = {
+    "Sofa": (215, 95, 85, 62),
+    "Armchair": (90, 85, 95, 28),
+    "Coffee table": (115, 65, 20, 18),
+    "TV stand": (165, 45, 25, 32),
+    "Dining table": (185, 95, 20, 45),
+    "Chair": (60, 50, 55, 7),
+    "Sideboard": (175, 50, 85, 55),
+    "Bed": (210, 165, 40, 70),
+    "Nightstand": (52, 42, 58, 14),
+    "Wardrobe": (205, 65, 30, 95),
+    "Desk": (135, 70, 15, 26),
+    "Bookcase": (190, 40, 20, 38),
+    "Floor lamp": (165, 30, 30, 8),
+    "Pendant light": (45, 45, 40, 3),
+    "Tea set": (42, 32, 36, 4.5),
+    "Coffee machine": (48, 34, 42, 10),
+}
+CATEGORIES = {
+    "living-room": ("Salon", "Oturma Odası", "Living Room"),
+    "dining-room": ("Salle à manger", "Yemek Odası", "Dining Room"),
+    "bedroom": ("Chambre à coucher", "Yatak Odası", "Bedroom"),
+    "office": ("Bureau", "Çalışma Odası", "Home Office"),
+    "lighting": ("Luminaires", "Aydınlatma", "Lighting"),
+    "kitchen": ("Cuisine", "Mutfak", "Kitchen"),
+}
+STYLES = (
+    ("scandinave", "İskandinav", "Scandinavian"),
+    ("moderne", "modern", "modern"),
+    ("classique", "klasik", "classic"),
+    ("industriel", "endüstriyel", "industrial"),
+    ("bohème", "bohem", "bohemian"),
+    ("ottoman", "Osmanlı", "Ottoman"),
+)
+MATERIALS = (
+    # fr, tr, en, price factor
+    ("en chêne", "meşe", "oak", 1.2),
+    ("en noyer", "ceviz", "walnut", 1.4),
+    ("en velours", "kadife", "velvet", 1.1),
+    ("en lin", "keten", "linen", 1.0),
+    ("en cuir", "deri", "leather", 1.6),
+    ("en métal", "metal", "metal", 0.8),
+    ("en rotin", "hasır", "rattan", 0.9),
+)
+COLORS = (
+    ("gris", "gri", "grey"),
+    ("bleu nuit", "lacivert", "navy"),
+    ("beige", "bej", "beige"),
+    ("vert sauge", "adaçayı yeşili", "sage green"),
+    ("terracotta", "kiremit", "terracotta"),
+    ("blanc", "beyaz", "white"),
+    ("noir", "siyah", "black"),
+)
+SENTENCES = (
+    ("Fabriqué à la main par nos artisans.", "Ustalarımız tarafından el yapımıdır.", "Handmade by our craftspeople."),
+    ("Livraison et montage inclus.", "Teslimat ve kurulum dahildir.", "Delivery and assembly included."),
+    ("Finition résistante aux taches.", "Lekeye dayanıklı yüzey.", "Stain-resistant finish."),
+    ("Parfait pour les petits espaces.", "Küçük alanlar için mükemmel.", "Perfect for small spaces."),
+    ("Garantie de cinq ans.", "Beş yıl garantili.", "Five-year warranty."),
+    ("Bois issu de forêts gérées durablement.", "Sürdürülebilir ormanlardan ahşap.", "Wood from sustainably managed forests."),
+    ("Un classique de notre collection.", "Koleksiyonumuzun klasiği.", "A classic of our collection."),
+    ("Se marie avec tous les intérieurs.", "Her iç mekâna uyum sağlar.", "Goes with any interior."),
+)
+FIRST_NAMES = (
+    "Camille", "Louis", "Emma", "Hugo", "Léa", "Jules", "Chloé", "Lucas", "Manon", "Arthur",
+    "Ayşe", "Mehmet", "Zeynep", "Emre", "Elif", "Can", "Selin", "Burak", "Deniz", "Özge",
+    "Olivia", "James", "Sophie", "Daniel",
+)
+LAST_NAMES = (
+    "Martin", "Bernard", "Dubois", "Thomas", "Moreau", "Laurent", "Lefebvre", "Girard", "Roux", "Fontaine",
+    "Yılmaz", "Kaya", "Demir", "Şahin", "Çelik", "Öztürk", "Aydın", "Arslan", "Doğan", "Koç",
+    "Smith", "Brown",
+)
+CITIES = (
+    ("75011", "Paris"), ("69003", "Lyon"), ("13006", "Marseille"), ("67000", "Strasbourg"),
+    ("59000", "Lille"), ("33000", "Bordeaux"), ("31000", "Toulouse"), ("44000", "Nantes"),
+    ("06000", "Nice"), ("34000", "Montpellier"),
+)
+STREETS = ("rue de la République", "avenue Jean Jaurès", "rue Victor Hugo", "boulevard Voltaire", "rue des Lilas", "place de la Mairie")
+IMAGES = (
+    "https://images.unsplash.com/photo-1555041469-a586c61ea9bc?w=800",
+    "https://images.pexels.com/photos/2995012/pexels-photo-2995012.jpeg?w=800",
+    "https://images.pexels.com/photos/1350789/pexels-photo-1350789.jpeg?w=800",
+    "https://images.pexels.com/photos/6903157/pexels-photo-6903157.jpeg?w=800",
+    "https://images.pexels.com/photos/1866149/pexels-photo-1866149.jpeg?w=800",
+)
+
+
+@dataclass(frozen=True)
+class Plan:
+    seed: int
+    products: int
+    users: int
+    orders: int
+    abandoned_carts: int
+    days: int
+    end: datetime
+    password_hash: str
+    batch_size: int = BATCH_SIZE
+
+    @property
+    def start(self) -> datetime:
+        return self.end - timedelta(days=self.days)
+
+    def chunks(self, count: int) -> int:
+        return -(-count // self.batch_size)
+
+    def rng(self, kind: str, chunk: int = 0) -> random.Random:
+        # String seeds are hashed with SHA-512, so this is stable across runs
+        return random.Random(f"{self.seed}:{kind}:{chunk}")
+
+
+@dataclass(frozen=True)
+class Catalog:
+    categories: List[Dict]
+    products: List[Dict]
+    # Cumulative popularity weights, aligned with ``products``
+    popularity: List[float]
+
+    def pick(self, rng: random.Random, k: int) -> List[Dict]:
+        return rng.choices(self.products, cum_weights=self.popularity, k=k)
+
+
+def _uuid(rng: random.Random) -> str:
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def _iso(moment: datetime) -> str:
+    return moment.isoformat()
+
+
+def build_catalog(plan: Plan) -> Catalog:
+    rng = plan.rng("catalog")
+    created = _iso(plan.start - timedelta(days=30))
+    categories = [
+        {
+            "id": f"cat-{slug}",
+            "name_fr": fr,
+            "name_tr": tr,
+            "name_en": en,
+            "slug": slug,
+            "image_url": IMAGES[n % len(IMAGES)],
+            "created_at": created,
+        }
+        for n, (slug, (fr, tr, en)) in enumerate(CATEGORIES.items())
+    ]
+    products = []
+    for n in range(plan.products):
+        (kind_fr, kind_tr, kind_en), base_price, slug = rng.choice(KINDS)
+        style, color = rng.choice(STYLES), rng.choice(COLORS)
+        material_fr, material_tr, material_en, factor = rng.choice(MATERIALS)
+        sentences = rng.sample(SENTENCES, 3)
+        price = base_price * factor * rng.lognormvariate(0, 0.3)
+        length, width, height, weight = PARCELS[kind_en]
+        products.append({
+            "id": f"prod-{n:07d}",
+            "name_fr": f"{kind_fr} {style[0]} {material_fr} {color[0]}",
+            "name_tr": f"{style[1].capitalize()} {color[1]} {material_tr} {kind_tr.lower()}",
+            "name_en": f"{style[2].capitalize()} {color[2]} {material_en} {kind_en.lower()}",
+            "description_fr": " ".join(s[0] for s in sentences),
+            "description_tr": " ".join(s[1] for s in sentences),
+            "description_en": " ".join(s[2] for s in sentences),
+            "price": max(9.0, round(price / 10) * 10 - 1.0),
+            "category_id": f"cat-{slug}",
+            "images": rng.sample(IMAGES, rng.randint(1, 3)),
+            "stock": rng.choice((0, rng.randint(1, 50), rng.randint(1, 500))),
+            "featured": rng.random() < 0.02,
+            "weight_kg": weight,
+            "length_cm": length,
+            "width_cm": width,
+            "height_cm": height,
+            "version": 0,
+            "created_at": _iso(plan.start - timedelta(days=rng.uniform(0, 365))),
+        })
+    # Popularity rank is independent of the product id
+    ranks = list(range(plan.products))
+    rng.shuffle(ranks)
+    popularity = list(accumulate(1 / (rank + 1) ** POPULARITY_SKEW for rank in ranks))
+    return Catalog(categories, products, popularity)
+
+
+def user_id(plan: Plan, n: int) -> str:
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"gulum-dataset:{plan.seed}:user:{n}"))
+
+
+def _name(n: int) -> str:
+    return f"{FIRST_NAMES[n % len(FIRST_NAMES)]} {LAST_NAMES[(n // len(FIRST_NAMES)) % len(LAST_NAMES)]}"
+
+
+def _phone(n: int) -> str:
+    return f"0{6 + n % 2}{n % 100000000:08d}"
+
+
+def _address(n: int) -> str:
+    postcode, city = CITIES[n % len(CITIES)]
+    return f"{n % 180 + 1} {STREETS[n % len(STREETS)]}, {postcode} {city}"
+
+
+def _customer(plan: Plan, n: int) -> Dict:
+    """Profile of user ``n``; orders repeat it without reading the user back."""
+    return {
+        "user_id": user_id(plan, n),
+        "customer_name": _name(n),
+        "customer_email": f"user{n}@example.com",
+        "customer_phone": _phone(n),
+        "customer_address": _address(n),
+    }
+
+
+def generate_users(plan: Plan, chunk: int) -> Dict[str, List[Dict]]:
+    rng = plan.rng("users", chunk)
+    users = []
+    for n in range(chunk * plan.batch_size, min((chunk + 1) * plan.batch_size, plan.users)):
+        customer = _customer(plan, n)
+        users.append({
+            "id": customer["user_id"],
+            "email": customer["customer_email"],
+            "password": plan.password_hash,
+            "name": customer["customer_name"],
+            "phone": customer["customer_phone"] if rng.random() < 0.8 else None,
+            "address": customer["customer_address"] if rng.random() < 0.6 else None,
+            "created_at": _iso(plan.start - timedelta(days=rng.uniform(0, 365))),
+        })
+    return {"users": users}
+
+
+def _order_time(plan: Plan, rng: random.Random) -> datetime:
+    # Order volume grows linearly over the window, so recent months are busier
+    return plan.start + timedelta(days=plan.days * rng.random() ** 0.5)
+
+
+def _cart_items(catalog: Catalog, rng: random.Random, lines: int) -> List[Tuple[Dict, int]]:
+    chosen = {}
+    for product in catalog.pick(rng, lines):
+        chosen[product["id"]] = (product, rng.choices((1, 2, 3, 4), (70, 20, 7, 3))[0])
+    return list(chosen.values())
+
+
+def generate_orders(plan: Plan, catalog: Catalog, chunk: int) -> Dict[str, List[Dict]]:
+    """Orders with their checked-out carts and payment transactions."""
+    rng = plan.rng("orders", chunk)
+    languages, language_weights = zip(*LANGUAGES)
+    orders, carts, payments = [], [], []
+    for _ in range(chunk * plan.batch_size, min((chunk + 1) * plan.batch_size, plan.orders)):
+        created = _order_time(plan, rng)
+        if plan.users and rng.random() < REGISTERED_SHARE:
+            # Low user numbers are the regular customers
+            customer = _customer(plan, int(plan.users * rng.random() ** 3))
+        else:
+            guest = rng.randrange(10 ** 9)
+            customer = {**_customer(plan, guest), "user_id": None, "customer_email": f"guest{guest}@example.com"}
+        lines = _cart_items(catalog, rng, rng.choices((1, 2, 3, 4, 5), (50, 25, 13, 8, 4))[0])
+        items = [
+            {
+                "product_id": product["id"],
+                "name_fr": product["name_fr"],
+                "name_tr": product["name_tr"],
+                "name_en": product["name_en"],
+                "category_id": product["category_id"],
+                "price": product["price"],
+                "quantity": quantity,
+                "subtotal": round(product["price"] * quantity, 2),
+            }
+            for product, quantity in lines
+        ]
+        order_id, cart_session_id, payment_session_id = _uuid(rng), _uuid(rng), f"cs_{rng.getrandbits(96):024x}"
+        paid = rng.random() < PAID_SHARE
+        paid_at = _iso(created + timedelta(seconds=rng.uniform(30, 1800))) if paid else None
+        cart_version = len(items) + rng.randint(0, 4)
+        total = round(sum(item["subtotal"] for item in items), 2)
+        orders.append({
+            "id": order_id,
+            **customer,
+            "items": items,
+            "total": total,
+            "status": "paid" if paid else "pending",
+            "payment_session_id": payment_session_id,
+            "paid_at": paid_at,
+            "cart_session_id": cart_session_id,
+            "cart_version": cart_version,
+            "language": rng.choices(languages, language_weights)[0],
+            "created_at": _iso(created),
+        })
+        carts.append({
+            "id": _uuid(rng),
+            "session_id": cart_session_id,
+            "items": [{"product_id": item["product_id"], "quantity": item["quantity"]} for item in items],
+            "version": cart_version,
+            "order_id": order_id,
+            "checked_out_at": _iso(created),
+            "created_at": _iso(created - timedelta(minutes=rng.uniform(2, 3 * 24 * 60))),
+            "updated_at": _iso(created),
+        })
+        payments.append({
+            "id": _uuid(rng),
+            "session_id": payment_session_id,
+            "order_id": order_id,
+            "amount": total,
+            "currency": "eur",
+            "status": "complete" if paid else "pending",
+            "payment_status": "paid" if paid else "pending",
+            "metadata": {"order_id": order_id},
+            "created_at": _iso(created),
+            "updated_at": paid_at or _iso(created),
+        })
+    return {"orders": orders, "carts": carts, "payment_transactions": payments}
+
+
+def generate_abandoned_carts(plan: Plan, catalog: Catalog, chunk: int) -> Dict[str, List[Dict]]:
+    rng = plan.rng("carts", chunk)
+    carts = []
+    for _ in range(chunk * plan.batch_size, min((chunk + 1) * plan.batch_size, plan.abandoned_carts)):
+        updated = _order_time(plan, rng)
+        lines = _cart_items(catalog, rng, rng.choices((1, 2, 3), (65, 25, 10))[0])
+        carts.append({
+            "id": _uuid(rng),
+            "session_id": _uuid(rng),
+            "items": [{"product_id": product["id"], "quantity": quantity} for product, quantity in lines],
+            "version": len(lines) + rng.randint(0, 3),
+            "order_id": None,
+            "created_at": _iso(updated - timedelta(minutes=rng.uniform(0, 2 * 24 * 60))),
+            "updated_at": _iso(updated),
+        })
+    return {"carts": carts}
+
+
+# ============== WRITING ==============
+
+_worker: Optional[Tuple[Plan, Catalog, object]] = None
+
+
+def _start_worker(plan: Plan, mongo_url: str, db_name: str):
+    global _worker
+    from pymongo import MongoClient
+
+    # Each worker rebuilds the catalog from the seed rather than receiving it
+    _worker = (plan, build_catalog(plan), MongoClient(mongo_url)[db_name])
+
+
+def _write_chunk(phase: str, chunk: int) -> Dict[str, int]:
+    plan, catalog, database = _worker
+    if phase == "users":
+        batches = generate_users(plan, chunk)
+    elif phase == "orders":
+        batches = generate_orders(plan, catalog, chunk)
+    else:
+        batches = generate_abandoned_carts(plan, catalog, chunk)
+    for collection, docs in batches.items():
+        if docs:
+            database[collection].insert_many(docs, ordered=False)
+    return {collection: len(docs) for collection, docs in batches.items()}
+
+
+def _report(phase: str, counts: Dict[str, int], seconds: float):
+    total = sum(counts.values())
+    detail = ", ".join(f"{count} {collection}" for collection, count in counts.items())
+    print(f"{phase:<16} {total:>10} docs in {seconds:7.1f} s  {total / max(seconds, 1e-9):>9.0f} docs/s  ({detail})")
+
+
+def load(plan: Plan, mongo_url: str, db_name: str, workers: int) -> Dict[str, int]:
+    """Insert the dataset with ``workers`` processes; returns documents per collection."""
+    from pymongo import MongoClient
+
+    totals: Dict[str, int] = {}
+    started = time.perf_counter()
+    catalog = build_catalog(plan)
+    client = MongoClient(mongo_url)
+    try:
+        client[db_name].categories.insert_many(catalog.categories)
+        for offset in range(0, len(catalog.products), plan.batch_size):
+            client[db_name].products.insert_many(catalog.products[offset:offset + plan.batch_size], ordered=False)
+    finally:
+        client.close()
+    counts = {"categories": len(catalog.categories), "products": len(catalog.products)}
+    _report("catalog", counts, time.perf_counter() - started)
+    totals.update(counts)
+
+    phases = (
+        ("users", plan.chunks(plan.users)),
+        ("orders", plan.chunks(plan.orders)),
+        ("abandoned carts", plan.chunks(plan.abandoned_carts)),
+    )
+    with ProcessPoolExecutor(workers, initializer=_start_worker, initargs=(plan, mongo_url, db_name)) as pool:
+        for phase, chunks in phases:
+            started = time.perf_counter()
+            counts = {}
+            for done, written in enumerate(pool.map(_write_chunk, [phase] * chunks, range(chunks)), 1):
+                for collection, count in written.items():
+                    counts[collection] = counts.get(collection, 0) + count
+                if done % 20 == 0:
+                    logger.info("%s: %d/%d chunks", phase, done, chunks)
+            _report(phase, counts, time.perf_counter() - started)
+            for collection, count in counts.items():
+                totals[collection] = totals.get(collection, 0) + count
+    return totals
+
+
+def main():
+    import argparse
+
+    import bcrypt
+    from pymongo import MongoClient
+
+    from config import get_settings
+
+    settings = get_settings().validate()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db-name", default=settings.db_name)
+    parser.add_argument("--orders", type=int, default=1000000)
+    parser.add_argument("--products", type=int, default=20000)
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--abandoned-carts", type=int, help="default: as many as orders")
+    parser.add_argument("--days", type=int, default=730, help="orders are spread over this many days before --end")
+    parser.add_argument("--end", type=datetime.fromisoformat, help="ISO date of the last order; default: now")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--password", default="password")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--drop", action="store_true", help="drop the database first")
+    parser.add_argument("--skip-migrations", action="store_true")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    end = args.end or datetime.now(timezone.utc)
+    plan = Plan(
+        seed=args.seed,
+        products=args.products,
+        users=args.users,
+        orders=args.orders,
+        abandoned_carts=args.orders if args.abandoned_carts is None else args.abandoned_carts,
+        days=args.days,
+        end=end if end.tzinfo else end.replace(tzinfo=timezone.utc),
+        # One hash for everybody: bcrypt per user would take longer than the inserts
+        password_hash=bcrypt.hashpw(args.password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8"),
+        batch_size=args.batch_size,
+    )
+
+    client = MongoClient(settings.mongo_url)
+    try:
+        if args.drop:
+            client.drop_database(args.db_name)
+        elif client[args.db_name].list_collection_names():
+            parser.error(f"database {args.db_name!r} is not empty; pass --drop to replace it")
+    finally:
+        client.close()
+
+    started = time.perf_counter()
+    totals = load(plan, settings.mongo_url, args.db_name, args.workers)
+    loaded = time.perf_counter() - started
+    _report("total", totals, loaded)
+
+    if not args.skip_migrations:
+        # Indexes, rollups, feed shards and the change log, built once the
+        # data is in, as the app would on a fresh deployment
+        import server  # noqa: F401
+        import migrations
+        from motor.motor_asyncio import AsyncIOMotorClient
+
+        async def migrate():
+            motor = AsyncIOMotorClient(settings.mongo_url)
+            try:
+                return await migrations.run_migrations(motor[args.db_name])
+            finally:
+                motor.close()
+
+        started = time.perf_counter()
+        applied = asyncio.run(migrate())
+        print(f"migrations {applied} in {time.perf_counter() - started:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""In-process pub/sub for one-shot notifications such as payment status.
+
+Waiters register a future per topic, so an idle waiter costs one future and
+one set entry. ``publish`` resolves every waiter of a topic in this process;
+with a ``redis://`` URL the event is broadcast over Redis pub/sub first, so a
+webhook handled by one worker wakes the streams held open by the others.
+
+Handlers registered with ``on`` are kept across events and run in every
+worker for each event of their topic, e.g. to update in-process indexes.
+"""
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+EVENTS_CHANNEL_PREFIX = "gulum:events:"
+
+EventHandler = Callable[[Any], None]
+
+
+class EventHub:
+    def __init__(self):
+        self._waiters: Dict[str, Set[asyncio.Future]] = defaultdict(set)
+        self._handlers: Dict[str, List[EventHandler]] = defaultdict(list)
+        self._client = None
+        self._pubsub = None
+        self._task: Optional[asyncio.Task] = None
+
+    def configure(self, url: str = "memory://"):
+        if url.startswith(("redis://", "rediss://", "unix://")):
+            import redis.asyncio as redis
+
+            self._client = redis.from_url(url, decode_responses=True)
+        else:
+            self._client = None
+
+    async def start(self):
+        if self._client is None:
+            return
+        self._pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+        await self._pubsub.psubscribe(f"{EVENTS_CHANNEL_PREFIX}*")
+        self._task = asyncio.create_task(self._listen())
+
+    async def _listen(self):
+        while True:
+            try:
+                message = await self._pubsub.get_message(timeout=1.0)
+                if message and message.get("type") == "pmessage":
+                    topic = message["channel"][len(EVENTS_CHANNEL_PREFIX):]
+                    self._deliver(topic, json.loads(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Event bus error: {e}")
+                await asyncio.sleep(1.0)
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+            self._pubsub = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    @property
+    def waiting(self) -> int:
+        return sum(len(w) for w in self._waiters.values())
+
+    def subscribe(self, topic: str) -> asyncio.Future:
+        """Register interest before checking current state, so no event is missed."""
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[topic].add(future)
+        return future
+
+    def unsubscribe(self, topic: str, future: asyncio.Future):
+        waiters = self._waiters.get(topic)
+        if waiters is not None:
+            waiters.discard(future)
+            if not waiters:
+                del self._waiters[topic]
+        if not future.done():
+            future.cancel()
+
+    def on(self, topic: str, handler: EventHandler):
+        self._handlers[topic].append(handler)
+
+    def _deliver(self, topic: str, payload: Any):
+        for future in self._waiters.pop(topic, set()):
+            if not future.done():
+                future.set_result(payload)
+        for handler in self._handlers.get(topic, []):
+            try:
+                handler(payload)
+            except Exception as e:
+                logger.error(f"Event handler for {topic} failed: {e}")
+
+    async def publish(self, topic: str, payload: Any):
+        if self._client is not None:
+            await self._client.publish(EVENTS_CHANNEL_PREFIX + topic, json.dumps(payload, default=str))
+        else:
+            self._deliver(topic, payload)
+
+
+events = EventHub()
@@ -0,0 +1,332 @@
+"""Product feeds (Google Shopping / Meta catalog RSS) and sitemaps on disk.
+
+Every product belongs to one of ``SHARD_COUNT`` shards, derived from a hash of
+its id and stored on the product as ``feed_shard``. For each shard and
+language the generator writes a gzip-compressed feed and sitemap, streaming
+the shard's products from a cursor so memory use does not grow with the
+catalog. A run first computes a digest of each shard's raw product documents
+(cheap: no decoding, no XML) and only rewrites shards whose digest differs
+from ``manifest.json``. A category rename or a new site URL rewrites all of
+them.
+
+Files are written to a temporary name and renamed into place; gzip headers
+carry no timestamp, so the same products always produce the same bytes. The
+manifest records a content hash per file, used as its ETag by the
+``/api/feeds`` route.
+
+    python feeds.py              # regenerate what changed, e.g. from cron
+    python feeds.py --force      # rewrite every shard
+"""
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+import zlib
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from xml.sax.saxutils import escape
+
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
+from pymongo import UpdateOne
+
+from storefront import DEFAULT_LANGUAGE, LANGUAGES
+
+logger = logging.getLogger(__name__)
+
+# 50,000 URLs per sitemap file is the protocol limit; 64 shards keep each
+# file far below it up to a few million products
+SHARD_COUNT = 64
+# Bumped when the XML layout changes, so existing files are rewritten
+FORMAT_VERSION = 1
+WRITE_BUFFER = 256 * 1024
+COMPRESS_LEVEL = 6
+MANIFEST = "manifest.json"
+FILE_NAME_PATTERN = re.compile(r"(feed|sitemap)-(fr|tr|en)(-\d{2})?\.xml(\.gz)?")
+
+FEED_FIELDS = {
+    "_id": 0, "id": 1, "price": 1, "stock": 1, "images": 1, "category_id": 1,
+    **{f"name_{code}": 1 for code in LANGUAGES},
+    **{f"description_{code}": 1 for code in LANGUAGES},
+}
+
+
+def shard_of(product_id: str) -> int:
+    return zlib.crc32(product_id.encode()) % SHARD_COUNT
+
+
+def feed_name(lang: str, shard: int) -> str:
+    return f"feed-{lang}-{shard:02d}.xml.gz"
+
+
+def sitemap_name(lang: str, shard: int) -> str:
+    return f"sitemap-{lang}-{shard:02d}.xml.gz"
+
+
+def product_url(site_url: str, product_id: str, lang: str) -> str:
+    return f"{site_url}/products/{product_id}?lang={lang}"
+
+
+def _text(doc: Dict, field: str, lang: str) -> str:
+    return doc.get(f"{field}_{lang}") or doc.get(f"{field}_{DEFAULT_LANGUAGE}") or ""
+
+
+def feed_item(product: Dict, lang: str, site_url: str, categories: Dict[str, Dict]) -> str:
+    images = product.get("images") or []
+    category = categories.get(product.get("category_id"))
+    parts = [
+        "<item>",
+        f"<g:id>{escape(product['id'])}</g:id>",
+        f"<g:title>{escape(_text(product, 'name', lang))}</g:title>",
+        f"<g:description>{escape(_text(product, 'description', lang))}</g:description>",
+        f"<g:link>{escape(product_url(site_url, product['id'], lang))}</g:link>",
+    ]
+    if images:
+        parts.append(f"<g:image_link>{escape(images[0])}</g:image_link>")
+        parts.extend(f"<g:additional_image_link>{escape(image)}</g:additional_image_link>" for image in images[1:10])
+    parts.append(f"<g:availability>{'in_stock' if product.get('stock', 0) > 0 else 'out_of_stock'}</g:availability>")
+    parts.append(f"<g:price>{product['price']:.2f} EUR</g:price>")
+    parts.append("<g:condition>new</g:condition>")
+    if category is not None:
+        parts.append(f"<g:product_type>{escape(_text(category, 'name', lang))}</g:product_type>")
+    parts.append("</item>\n")
+    return "".join(parts)
+
+
+def sitemap_entries(product: Dict, site_url: str) -> Dict[str, str]:
+    """One ``<url>`` per language; they share the hreflang alternates, built once."""
+    urls = {code: escape(product_url(site_url, product["id"], code)) for code in LANGUAGES}
+    alternates = "".join(f'<xhtml:link rel="alternate" hreflang="{code}" href="{url}"/>' for code, url in urls.items())
+    return {code: f"<url><loc>{url}</loc>{alternates}</url>\n" for code, url in urls.items()}
+
+
+def feed_header(lang: str, site_url: str) -> str:
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<rss version="2.0" xmlns:g="http://base.google.com/ns/1.0"><channel>'
+        f"<title>Gül Mobilya</title><link>{escape(site_url)}/?lang={lang}</link>"
+        f"<description>Gül Mobilya ({lang})</description>\n"
+    )
+
+
+FEED_FOOTER = "</channel></rss>\n"
+SITEMAP_HEADER = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9" xmlns:xhtml="http://www.w3.org/1999/xhtml">\n'
+)
+SITEMAP_FOOTER = "</urlset>\n"
+
+
+class _XmlFile:
+    """Streams text into ``<name>.tmp`` (gzip unless the name says otherwise) and renames it on ``commit``."""
+
+    def __init__(self, directory: Path, name: str):
+        self.path = directory / name
+        self.tmp = directory / f"{name}.tmp"
+        self.raw = open(self.tmp, "wb")
+        self.out = gzip.GzipFile(filename="", mode="wb", fileobj=self.raw, compresslevel=COMPRESS_LEVEL, mtime=0) if name.endswith(".gz") else self.raw
+        self.digest = hashlib.sha256()
+        self.chunks: List[str] = []
+        self.buffered = 0
+
+    def write(self, text: str):
+        self.chunks.append(text)
+        self.buffered += len(text)
+        if self.buffered >= WRITE_BUFFER:
+            self.flush()
+
+    def flush(self):
+        data = "".join(self.chunks).encode()
+        self.digest.update(data)
+        self.out.write(data)
+        self.chunks, self.buffered = [], 0
+
+    def commit(self) -> str:
+        self.flush()
+        if self.out is not self.raw:
+            self.out.close()
+        self.raw.close()
+        os.replace(self.tmp, self.path)
+        return f'"{self.digest.hexdigest()[:32]}"'
+
+    def discard(self):
+        if self.out is not self.raw:
+            self.out.close()
+        self.raw.close()
+        self.tmp.unlink(missing_ok=True)
+
+
+def read_manifest(directory: Path) -> Dict:
+    try:
+        return json.loads((directory / MANIFEST).read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def write_manifest(directory: Path, manifest: Dict):
+    tmp = directory / f"{MANIFEST}.tmp"
+    tmp.write_text(json.dumps(manifest, indent=1, sort_keys=True))
+    os.replace(tmp, directory / MANIFEST)
+
+
+async def assign_shards(products, batch_size: int = 1000) -> int:
+    """Stores ``feed_shard`` on products that do not have one yet (new or imported)."""
+    assigned = 0
+    writes = []
+    async for doc in products.find({"feed_shard": {"$exists": False}}, {"_id": 1, "id": 1}):
+        writes.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"feed_shard": shard_of(doc["id"])}}))
+        if len(writes) >= batch_size:
+            await products.bulk_write(writes, ordered=False)
+            assigned += len(writes)
+            writes = []
+    if writes:
+        await products.bulk_write(writes, ordered=False)
+        assigned += len(writes)
+    return assigned
+
+
+async def shard_digest(products, shard: int) -> Tuple[str, int]:
+    raw = products.with_options(codec_options=CodecOptions(document_class=RawBSONDocument))
+    digest = hashlib.sha256()
+    count = 0
+    async for doc in raw.find({"feed_shard": shard}, FEED_FIELDS).sort("id", 1):
+        digest.update(doc.raw)
+        count += 1
+    return digest.hexdigest(), count
+
+
+async def write_shard(products, directory: Path, shard: int, site_url: str, categories: Dict[str, Dict]) -> Dict[str, str]:
+    files = {}
+    for lang in LANGUAGES:
+        files[feed_name(lang, shard)] = _XmlFile(directory, feed_name(lang, shard))
+        files[sitemap_name(lang, shard)] = _XmlFile(directory, sitemap_name(lang, shard))
+    try:
+        for lang in LANGUAGES:
+            files[feed_name(lang, shard)].write(feed_header(lang, site_url))
+            files[sitemap_name(lang, shard)].write(SITEMAP_HEADER)
+        async for product in products.find({"feed_shard": shard}, FEED_FIELDS).sort("id", 1):
+            entries = sitemap_entries(product, site_url)
+            for lang in LANGUAGES:
+                files[feed_name(lang, shard)].write(feed_item(product, lang, site_url, categories))
+                files[sitemap_name(lang, shard)].write(entries[lang])
+        for lang in LANGUAGES:
+            files[feed_name(lang, shard)].write(FEED_FOOTER)
+            files[sitemap_name(lang, shard)].write(SITEMAP_FOOTER)
+    except BaseException:
+        for file in files.values():
+            file.discard()
+        raise
+    return {name: file.commit() for name, file in files.items()}
+
+
+def write_index(directory: Path, lang: str, site_url: str, shards: Dict[str, Dict]) -> str:
+    index = _XmlFile(directory, f"sitemap-{lang}.xml")
+    index.write('<?xml version="1.0" encoding="UTF-8"?>\n<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n')
+    for shard in range(SHARD_COUNT):
+        entry = shards[str(shard)]
+        index.write(f"<sitemap><loc>{escape(site_url)}/api/feeds/{sitemap_name(lang, shard)}</loc>"
+                    f"<lastmod>{entry['generated_at']}</lastmod></sitemap>\n")
+    index.write("</sitemapindex>\n")
+    return index.commit()
+
+
+async def generate(database, directory: Path, site_url: str, force: bool = False) -> Dict:
+    """Brings the files in ``directory`` up to date; returns what was done."""
+    started = time.perf_counter()
+    directory.mkdir(parents=True, exist_ok=True)
+    site_url = site_url.rstrip("/")
+    assigned = await assign_shards(database.products)
+    categories = {c["id"]: c for c in await database.categories.find({}, {"_id": 0}).to_list(None)}
+    settings_key = hashlib.sha256(json.dumps(
+        [FORMAT_VERSION, SHARD_COUNT, site_url, sorted(categories.items())], sort_keys=True, default=str
+    ).encode()).hexdigest()
+
+    previous = read_manifest(directory)
+    if previous.get("settings") != settings_key:
+        force = True
+    shards = {} if force else dict(previous.get("shards", {}))
+    files = {} if force else dict(previous.get("files", {}))
+    rewritten = []
+    products = 0
+    for shard in range(SHARD_COUNT):
+        digest, count = await shard_digest(database.products, shard)
+        products += count
+        known = shards.get(str(shard))
+        if known is not None and known["digest"] == digest and all(
+            (directory / name).exists() for name in known["files"]
+        ):
+            continue
+        etags = await write_shard(database.products, directory, shard, site_url, categories)
+        files.update(etags)
+        shards[str(shard)] = {
+            "digest": digest,
+            "count": count,
+            "files": sorted(etags),
+            "generated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        }
+        rewritten.append(shard)
+
+    if rewritten or any(f"sitemap-{lang}.xml" not in files for lang in LANGUAGES):
+        for lang in LANGUAGES:
+            files[f"sitemap-{lang}.xml"] = write_index(directory, lang, site_url, shards)
+    write_manifest(directory, {"settings": settings_key, "shards": shards, "files": files})
+    result = {
+        "products": products,
+        "assigned": assigned,
+        "rewritten_shards": len(rewritten),
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+    logger.info(f"Feeds: {result}")
+    return result
+
+
+_published: Dict = {"mtime": None, "files": {}}
+
+
+def published_file(directory: Path, name: str) -> Optional[Tuple[Path, str]]:
+    """Path and ETag of a generated file, or None; the manifest is re-read when it changes."""
+    if not FILE_NAME_PATTERN.fullmatch(name):
+        return None
+    try:
+        mtime = (directory / MANIFEST).stat().st_mtime_ns
+    except OSError:
+        return None
+    if mtime != _published["mtime"]:
+        _published["files"] = read_manifest(directory).get("files", {})
+        _published["mtime"] = mtime
+    etag = _published["files"].get(name)
+    if etag is None:
+        return None
+    return directory / name, etag
+
+
+def main():
+    import argparse
+
+    from config import get_settings
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    parser = argparse.ArgumentParser(description="Regenerate product feeds and sitemaps")
+    parser.add_argument("--force", action="store_true", help="rewrite every shard")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    settings = get_settings().validate()
+
+    async def run():
+        client = AsyncIOMotorClient(settings.mongo_url)
+        try:
+            result = await generate(client[settings.db_name], Path(settings.feeds_dir), settings.site_url, args.force)
+        finally:
+            client.close()
+        print(result)
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
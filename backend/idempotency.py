@@ -0,0 +1,74 @@
+"""Idempotency keys for non-repeatable POSTs.
+
+The first request with a key claims it by inserting a document in
+``idempotency_keys``; retries with the same key get the stored response once
+the first request completes, or ``IdempotencyInProgress`` while it is still
+running. A claim left behind by a crashed request can be taken over once its
+lease expires. Keys are removed by a TTL index (see migrations in server.py).
+"""
+import hashlib
+import json
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+
+from pymongo.errors import DuplicateKeyError
+
+LEASE = timedelta(seconds=60)
+
+
+class IdempotencyInProgress(Exception):
+    pass
+
+
+class IdempotencyMismatch(Exception):
+    pass
+
+
+def fingerprint(payload: Dict) -> str:
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+async def claim(database, scope: str, key: str, request_fingerprint: str) -> Optional[Dict]:
+    """Claim ``key``; returns the stored response if it was already completed."""
+    key_id = f"{scope}:{key}"
+    now = datetime.now(timezone.utc)
+    try:
+        await database.idempotency_keys.insert_one({
+            "_id": key_id,
+            "fingerprint": request_fingerprint,
+            "status": "processing",
+            "locked_until": now + LEASE,
+            "created_at": now,
+        })
+        return None
+    except DuplicateKeyError:
+        pass
+
+    existing = await database.idempotency_keys.find_one({"_id": key_id})
+    if existing is None:
+        # Expired between the insert and the read
+        return await claim(database, scope, key, request_fingerprint)
+    if existing["fingerprint"] != request_fingerprint:
+        raise IdempotencyMismatch()
+    if existing["status"] == "completed":
+        return existing["response"]
+
+    taken = await database.idempotency_keys.find_one_and_update(
+        {"_id": key_id, "status": "processing", "locked_until": {"$lt": now}},
+        {"$set": {"locked_until": now + LEASE}},
+    )
+    if taken is None:
+        raise IdempotencyInProgress()
+    return None
+
+
+async def complete(database, scope: str, key: str, response: Dict):
+    await database.idempotency_keys.update_one(
+        {"_id": f"{scope}:{key}"},
+        {"$set": {"status": "completed", "response": response}},
+    )
+
+
+async def release(database, scope: str, key: str):
+    # Lets the client retry with the same key after a failure
+    await database.idempotency_keys.delete_one({"_id": f"{scope}:{key}", "status": "processing"})
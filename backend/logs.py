@@ -0,0 +1,138 @@
+"""Logging that never blocks the event loop.
+
+``setup`` routes every record through a ``QueueHandler``: code on the request
+path only stamps the record with the current correlation id and puts it on a
+bounded in-memory queue. A ``QueueListener`` thread formats it (JSON lines by
+default) and does the actual write, so a slow stdout, pipe or disk only delays
+the listener. When the queue is full records are dropped and counted rather
+than waiting for room; ``stats()`` reports the count (``/api/admin/load``
+shows it per worker).
+
+The correlation id is set per request by ``RequestLogMiddleware`` (see
+middleware.py) and is available here as the ``correlation_id`` context var.
+"""
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Dict, Optional, TextIO
+
+QUEUE_SIZE = 10000
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - [%(correlation_id)s] %(message)s"
+UVICORN_LOGGERS = ("uvicorn", "uvicorn.error", "uvicorn.access")
+
+correlation_id: ContextVar[str] = ContextVar("correlation_id", default="-")
+
+# Attributes every LogRecord has; anything else was passed through ``extra``
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "correlation_id"}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "correlation_id": getattr(record, "correlation_id", "-"),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class ContextQueueHandler(logging.handlers.QueueHandler):
+    """Stamps the correlation id and freezes the message before queueing."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.correlation_id = correlation_id.get()
+        # Arguments may change after the call returns; the traceback is
+        # rendered here so frames are not kept alive on the queue
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        if not hasattr(record, "correlation_id"):
+            record.correlation_id = "-"
+        return super().format(record)
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_previous = None
+_handler: Optional[ContextQueueHandler] = None
+
+
+def setup(level: str = "INFO", fmt: str = "json", stream: Optional[TextIO] = None,
+          queue_size: int = QUEUE_SIZE) -> ContextQueueHandler:
+    """Installs the queue handler on the root logger and starts the writer thread.
+
+    Called from the app lifespan, i.e. once per worker after it has been forked.
+    """
+    global _listener, _previous, _handler
+    shutdown()
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(JsonFormatter() if fmt == "json" else _TextFormatter(TEXT_FORMAT))
+    handler = ContextQueueHandler(queue.Queue(queue_size))
+
+    root = logging.getLogger()
+    _previous = (root.handlers[:], root.level)
+    root.handlers = [handler]
+    root.setLevel(level)
+    # Uvicorn's own handlers write synchronously; send its records through the
+    # queue too. Per-request lines come from RequestLogMiddleware instead.
+    for name in UVICORN_LOGGERS:
+        logging.getLogger(name).handlers = []
+        logging.getLogger(name).propagate = True
+    logging.getLogger("uvicorn.access").setLevel(logging.WARNING)
+
+    _listener = logging.handlers.QueueListener(handler.queue, output, respect_handler_level=True)
+    _listener.start()
+    _handler = handler
+    return handler
+
+
+def stats() -> Dict:
+    """Records waiting to be written, and records dropped since ``setup``."""
+    if _handler is None:
+        return {"queued": 0, "dropped": 0}
+    return {"queued": _handler.queue.qsize(), "dropped": _handler.dropped}
+
+
+def shutdown():
+    """Flushes queued records and restores the previous root handlers."""
+    global _listener, _previous, _handler
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+    _handler = None
+    if _previous is not None:
+        root = logging.getLogger()
+        root.handlers, level = _previous
+        root.setLevel(level)
+        _previous = None
@@ -0,0 +1,531 @@
+"""HTTP middleware: per-route cache headers, response compression,
+admission control and request logging with correlation ids.
+
+All are plain ASGI middleware. Streaming responses (several body chunks,
+e.g. server-sent events) are passed through untouched; only complete bodies
+are hashed for an ETag or compressed.
+"""
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from pymongo.monitoring import ConnectionPoolListener
+
+from logs import correlation_id
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+COMPRESSIBLE_TYPES = ("application/json", "application/xml", "application/javascript", "text/")
+UNCOMPRESSIBLE_TYPES = ("text/event-stream",)
+
+Headers = List[Tuple[bytes, bytes]]
+
+request_logger = logging.getLogger("gulum.requests")
+
+
+def _header(headers: Headers, name: bytes) -> Optional[bytes]:
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return None
+
+
+def _add_vary(headers: Headers, *names: str):
+    current = _header(headers, b"vary")
+    values = [v.strip() for v in current.decode("latin-1").split(",")] if current else []
+    for name in names:
+        if name not in values:
+            values.append(name)
+    headers[:] = [(k, v) for k, v in headers if k.lower() != b"vary"]
+    headers.append((b"vary", ", ".join(values).encode("latin-1")))
+
+
+def _set_header(headers: Headers, name: bytes, value: bytes):
+    headers[:] = [(k, v) for k, v in headers if k.lower() != name]
+    headers.append((name, value))
+
+
+class _BufferedResponse:
+    """Collects ``http.response.start`` and a single-chunk body.
+
+    ``send`` is called with the start message and the full body once both are
+    known. Multi-chunk responses are forwarded as they arrive.
+    """
+
+    def __init__(self, send, on_complete):
+        self.send = send
+        self.on_complete = on_complete
+        self.start = None
+        self.streaming = False
+
+    async def __call__(self, message):
+        if message["type"] == "http.response.start":
+            self.start = message
+            return
+        if message["type"] != "http.response.body" or self.streaming:
+            await self.send(message)
+            return
+        if message.get("more_body", False):
+            self.streaming = True
+            await self.send(self.start)
+            await self.send(message)
+            return
+        await self.on_complete(self.start, message.get("body", b""))
+
+
+# ============== CACHE HEADERS ==============
+
+@dataclass(frozen=True)
+class CacheRule:
+    prefix: str
+    cache_control: str
+    methods: Tuple[str, ...] = ("GET", "HEAD")
+    etag: bool = False
+    vary: Tuple[str, ...] = ()
+
+
+def default_cache_rules(catalog_max_age: int) -> List[CacheRule]:
+    catalog = f"public, max-age={catalog_max_age}, stale-while-revalidate={catalog_max_age * 10}"
+    private = ("GET", "HEAD", "POST", "PUT", "PATCH", "DELETE")
+    return [
+        CacheRule("/api/products", catalog, etag=True),
+        CacheRule("/api/categories", catalog, etag=True),
+        CacheRule("/api/storefront", catalog, etag=True, vary=("Accept-Language",)),
+        # Revalidated on every poll; unchanged pages come back as 304
+        CacheRule("/api/catalog", "no-cache", etag=True),
+        # Regenerated by feeds.py; the handler sets a content ETag
+        CacheRule("/api/feeds", "public, max-age=3600"),
+        CacheRule("/api/cart", "no-store", methods=private),
+        CacheRule("/api/auth", "no-store", methods=private),
+        CacheRule("/api/checkout", "no-store", methods=private),
+        CacheRule("/api/orders", "no-store", methods=private),
+        CacheRule("/api/webhook", "no-store", methods=private),
+        CacheRule("/api/admin", "no-store", methods=private),
+    ]
+
+
+class CacheControlMiddleware:
+    """Sets ``Cache-Control``/``Vary`` from the first matching rule.
+
+    Rules with ``etag=True`` also get a weak ETag computed from the body and
+    answer ``If-None-Match`` revalidations with 304. A ``Cache-Control``
+    header set by the handler itself always wins.
+    """
+
+    def __init__(self, app, rules: Sequence[CacheRule]):
+        self.app = app
+        self.rules = list(rules)
+
+    def match(self, method: str, path: str) -> Optional[CacheRule]:
+        for rule in self.rules:
+            if method in rule.methods and (path == rule.prefix or path.startswith(rule.prefix + "/")):
+                return rule
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        rule = self.match(scope["method"], scope["path"])
+        if rule is None:
+            await self.app(scope, receive, send)
+            return
+
+        def apply_headers(headers: Headers):
+            if _header(headers, b"cache-control") is None:
+                headers.append((b"cache-control", rule.cache_control.encode("latin-1")))
+            if rule.vary:
+                _add_vary(headers, *rule.vary)
+
+        if not rule.etag:
+            async def send_with_headers(message):
+                if message["type"] == "http.response.start":
+                    headers = list(message.get("headers", []))
+                    apply_headers(headers)
+                    message = {**message, "headers": headers}
+                await send(message)
+
+            await self.app(scope, receive, send_with_headers)
+            return
+
+        if_none_match = _header(scope.get("headers", []), b"if-none-match")
+
+        async def complete(start, body: bytes):
+            headers = list(start.get("headers", []))
+            apply_headers(headers)
+            status = start["status"]
+            if status == 200:
+                etag = b'W/"' + hashlib.blake2b(body, digest_size=12).hexdigest().encode() + b'"'
+                _set_header(headers, b"etag", etag)
+                if if_none_match and etag in [t.strip() for t in if_none_match.split(b",")]:
+                    headers = [(k, v) for k, v in headers if k.lower() != b"content-length"]
+                    await send({"type": "http.response.start", "status": 304, "headers": headers})
+                    await send({"type": "http.response.body", "body": b""})
+                    return
+            await send({**start, "headers": headers})
+            await send({"type": "http.response.body", "body": body})
+
+        buffered = _BufferedResponse(send, complete)
+        await self.app(scope, receive, buffered)
+
+
+# ============== COMPRESSION ==============
+
+def _accepted_encodings(scope) -> List[str]:
+    raw = _header(scope.get("headers", []), b"accept-encoding") or b""
+    accepted = []
+    for part in raw.decode("latin-1").split(","):
+        name, _, params = part.strip().partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0"):
+            continue
+        if name:
+            accepted.append(name.strip().lower())
+    return accepted
+
+
+class CompressionMiddleware:
+    """Brotli (when installed) or gzip for bodies above ``minimum_size``."""
+
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def choose_encoding(self, scope) -> Optional[str]:
+        accepted = _accepted_encodings(scope)
+        if brotli is not None and "br" in accepted:
+            return "br"
+        if "gzip" in accepted:
+            return "gzip"
+        return None
+
+    def compress(self, body: bytes, encoding: str) -> bytes:
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.gzip_level, mtime=0)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = self.choose_encoding(scope)
+
+        async def complete(start, body: bytes):
+            headers = list(start.get("headers", []))
+            content_type = (_header(headers, b"content-type") or b"").decode("latin-1")
+            compressible = (
+                content_type.startswith(COMPRESSIBLE_TYPES)
+                and not content_type.startswith(UNCOMPRESSIBLE_TYPES)
+                and _header(headers, b"content-encoding") is None
+            )
+            if compressible:
+                _add_vary(headers, "Accept-Encoding")
+            if compressible and encoding and len(body) >= self.minimum_size:
+                body = self.compress(body, encoding)
+                _set_header(headers, b"content-encoding", encoding.encode())
+                _set_header(headers, b"content-length", str(len(body)).encode())
+                etag = _header(headers, b"etag")
+                if etag is not None and not etag.startswith(b"W/"):
+                    _set_header(headers, b"etag", b"W/" + etag)
+            await send({**start, "headers": headers})
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, _BufferedResponse(send, complete))
+
+
+# ============== ADMISSION CONTROL ==============
+
+CRITICAL = "critical"
+NORMAL = "normal"
+LOW = "low"
+# Load (as a multiple of the thresholds) at which a class is shed; never for critical
+SHED_AT = {CRITICAL: None, NORMAL: 2.0, LOW: 1.0}
+ALL_METHODS = ("GET", "HEAD", "POST", "PUT", "PATCH", "DELETE")
+
+
+class LoadMonitor(ConnectionPoolListener):
+    """Samples event-loop lag and how long MongoDB connection checkouts wait.
+
+    Loop lag is how late a periodic ``sleep`` wakes up; a spike decays by half
+    per interval rather than vanishing with the next good sample. Pool wait
+    is registered as the client's pool listener: the slowest checkout of the
+    last interval, or the age of the oldest checkout still waiting. Checkouts
+    run in Motor's executor threads, hence the per-thread bookkeeping. Open
+    connections are counted per server, for the warm-up.
+    """
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.loop_lag_ms = 0.0
+        self.pool_wait_ms = 0.0
+        self.outcomes: Counter = Counter()
+        self._waiting: Dict[int, float] = {}
+        self._slowest_checkout = 0.0
+        self._connections: Counter = Counter()
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag_ms = max(0.0, loop.time() - expected) * 1000
+            self.loop_lag_ms = max(lag_ms, self.loop_lag_ms / 2)
+            now = time.monotonic()
+            oldest = min(list(self._waiting.values()), default=now)
+            self.pool_wait_ms = max(self._slowest_checkout, now - oldest) * 1000
+            self._slowest_checkout = 0.0
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict:
+        return {
+            "loop_lag_ms": round(self.loop_lag_ms, 1),
+            "pool_wait_ms": round(self.pool_wait_ms, 1),
+            "requests": dict(self.outcomes),
+            "connections": sum(self._connections.values()),
+        }
+
+    def open_connections(self) -> Dict[Tuple[str, int], int]:
+        """Established connections by server address, for every pool of the client."""
+        return dict(self._connections)
+
+    def connection_check_out_started(self, event):
+        self._waiting[threading.get_ident()] = time.monotonic()
+
+    def _checkout_done(self):
+        started = self._waiting.pop(threading.get_ident(), None)
+        if started is not None:
+            self._slowest_checkout = max(self._slowest_checkout, time.monotonic() - started)
+
+    def connection_checked_out(self, event):
+        self._checkout_done()
+
+    def connection_check_out_failed(self, event):
+        self._checkout_done()
+
+    def pool_created(self, event):
+        self._connections[event.address] += 0
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        self._connections.pop(event.address, None)
+
+    def connection_created(self, event):
+        pass
+
+    def connection_ready(self, event):
+        self._connections[event.address] += 1
+
+    def connection_closed(self, event):
+        if self._connections.get(event.address):
+            self._connections[event.address] -= 1
+
+    def connection_checked_in(self, event):
+        pass
+
+
+@dataclass(frozen=True)
+class AdmissionRule:
+    prefix: str
+    priority: str
+    # Requests handled at once per worker; None means no limit
+    limit: Optional[int] = None
+    # How long a request may wait for a free slot before it gets a 503
+    queue_timeout: float = 1.0
+    methods: Tuple[str, ...] = ALL_METHODS
+
+
+def default_admission_rules() -> List[AdmissionRule]:
+    return [
+        # Long-lived status streams must not hold checkout slots
+        AdmissionRule("/api/checkout/status", CRITICAL),
+        AdmissionRule("/api/webhook", CRITICAL, limit=64, queue_timeout=10.0),
+        AdmissionRule("/api/checkout", CRITICAL, limit=64, queue_timeout=5.0),
+        AdmissionRule("/api/orders", CRITICAL, limit=64, queue_timeout=5.0, methods=("POST",)),
+        AdmissionRule("/api/cart", NORMAL, limit=128, queue_timeout=2.0),
+        # bcrypt makes login and registration CPU-bound
+        AdmissionRule("/api/auth", NORMAL, limit=16, queue_timeout=2.0),
+        AdmissionRule("/api/orders", NORMAL, limit=32, queue_timeout=2.0),
+        AdmissionRule("/api/admin", NORMAL, limit=8, queue_timeout=2.0),
+        AdmissionRule("/api/contact", NORMAL, limit=16, queue_timeout=2.0),
+        # Quotes read the cart's products; the checkout page asks for them
+        AdmissionRule("/api/shipping", NORMAL, limit=64, queue_timeout=2.0),
+        # An admin import, not catalog browsing
+        AdmissionRule("/api/products/bulk", NORMAL, limit=4, queue_timeout=2.0),
+        AdmissionRule("/api/products", LOW, limit=128, queue_timeout=0.5),
+        AdmissionRule("/api/categories", LOW, limit=128, queue_timeout=0.5),
+        AdmissionRule("/api/storefront", LOW, limit=128, queue_timeout=0.5),
+        AdmissionRule("/api/currencies", LOW, limit=128, queue_timeout=0.5),
+        AdmissionRule("/api/catalog", LOW, limit=32, queue_timeout=0.5),
+        AdmissionRule("/api/feeds", LOW, limit=16, queue_timeout=0.5),
+    ]
+
+
+class AdmissionMiddleware:
+    """Bounds concurrency per route and sheds low-priority work under load.
+
+    The first matching rule gives a request its priority class and
+    concurrency limit. While loop lag or pool wait exceeds its threshold,
+    low-priority requests are answered at once with 503 and ``Retry-After``;
+    normal ones only at twice the thresholds, critical ones never. A request
+    that waits longer than its rule's ``queue_timeout`` for a free slot gets
+    the same 503. Paths without a rule (health checks) are always admitted.
+    A threshold of 0 turns that signal off.
+    """
+
+    def __init__(self, app, rules: Sequence[AdmissionRule], monitor: LoadMonitor,
+                 loop_lag_ms: float = 200, pool_wait_ms: float = 100, retry_after: int = 2):
+        self.app = app
+        self.rules = list(rules)
+        self.monitor = monitor
+        self.loop_lag_ms = loop_lag_ms
+        self.pool_wait_ms = pool_wait_ms
+        self.retry_after = retry_after
+        self.slots = {rule: asyncio.Semaphore(rule.limit) for rule in self.rules if rule.limit}
+
+    def match(self, method: str, path: str) -> Optional[AdmissionRule]:
+        for rule in self.rules:
+            if method in rule.methods and (path == rule.prefix or path.startswith(rule.prefix + "/")):
+                return rule
+        return None
+
+    def load(self) -> float:
+        ratios = [0.0]
+        if self.loop_lag_ms:
+            ratios.append(self.monitor.loop_lag_ms / self.loop_lag_ms)
+        if self.pool_wait_ms:
+            ratios.append(self.monitor.pool_wait_ms / self.pool_wait_ms)
+        return max(ratios)
+
+    async def reject(self, send, reason: str):
+        body = json.dumps({"detail": "Server is busy, please retry", "reason": reason}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(self.retry_after).encode()),
+                (b"cache-control", b"no-store"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        rule = self.match(scope["method"], scope["path"])
+        if rule is None:
+            await self.app(scope, receive, send)
+            return
+        outcomes = self.monitor.outcomes
+        shed_at = SHED_AT[rule.priority]
+        if shed_at is not None and self.load() >= shed_at:
+            outcomes[f"{rule.priority}:shed"] += 1
+            await self.reject(send, "overloaded")
+            return
+        slots = self.slots.get(rule)
+        if slots is None:
+            outcomes[f"{rule.priority}:admitted"] += 1
+            await self.app(scope, receive, send)
+            return
+        try:
+            await asyncio.wait_for(slots.acquire(), rule.queue_timeout)
+        except asyncio.TimeoutError:
+            outcomes[f"{rule.priority}:queue_timeout"] += 1
+            await self.reject(send, "queue timeout")
+            return
+        outcomes[f"{rule.priority}:admitted"] += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            slots.release()
+
+
+# ============== REQUEST LOG ==============
+
+REQUEST_ID_PATTERN = re.compile(r"[A-Za-z0-9._:-]{1,128}")
+
+
+class RequestLogMiddleware:
+    """Gives every request a correlation id and logs one line per request.
+
+    The id is taken from ``X-Request-ID`` when a client or proxy sends a sane
+    one, echoed on the response and stamped on every record logged while the
+    request is handled. Request lines for path prefixes in ``sample_rates``
+    are only kept with that probability; server errors and requests slower
+    than ``slow_ms`` are always logged.
+    """
+
+    def __init__(self, app, sample_rates: Sequence[Tuple[str, float]] = (), slow_ms: int = 1000):
+        self.app = app
+        self.sample_rates = list(sample_rates)
+        self.slow_ms = slow_ms
+
+    def sample_rate(self, path: str) -> float:
+        for prefix, rate in self.sample_rates:
+            if path == prefix or path.startswith(prefix.rstrip("/") + "/"):
+                return rate
+        return 1.0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        raw = (_header(scope.get("headers", []), b"x-request-id") or b"").decode("latin-1")
+        request_id = raw if REQUEST_ID_PATTERN.fullmatch(raw) else uuid.uuid4().hex
+        token = correlation_id.set(request_id)
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+                _set_header(headers, b"x-request-id", request_id.encode("latin-1"))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            duration_ms = (time.perf_counter() - started) * 1000
+            path = scope["path"]
+            if status >= 500 or duration_ms >= self.slow_ms or random.random() < self.sample_rate(path):
+                request_logger.info(
+                    f"{scope['method']} {path} {status}",
+                    extra={"method": scope["method"], "path": path, "status": status, "duration_ms": round(duration_ms, 1)},
+                )
+            correlation_id.reset(token)
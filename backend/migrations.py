@@ -0,0 +1,158 @@
+"""Versioned, run-once data migrations.
+
+Migrations are registered with the ``@migration(version, name)`` decorator
+and applied in version order by ``run_migrations``. Applied versions are
+recorded in the ``migrations`` collection; a lease document in the same
+collection makes sure only one worker (or deploy job) applies them while the
+others wait. The lease is renewed while migrations run, however long a
+migration takes; a runner that loses its lease stops.
+
+Run at deploy time with ``python migrations.py`` or let the API lifespan do it
+on startup (``RUN_MIGRATIONS=true``, the default).
+"""
+import asyncio
+import logging
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, List
+
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+LOCK_ID = "lock"
+
+MigrationFunc = Callable[..., Awaitable[None]]
+
+
+class MigrationError(RuntimeError):
+    pass
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    up: MigrationFunc
+
+
+MIGRATIONS: Dict[int, Migration] = {}
+
+
+def migration(version: int, name: str):
+    def register(func: MigrationFunc) -> MigrationFunc:
+        if version in MIGRATIONS:
+            raise MigrationError(f"Migration version {version} registered twice")
+        MIGRATIONS[version] = Migration(version, name, func)
+        return func
+    return register
+
+
+async def applied_versions(database) -> set:
+    docs = await database.migrations.find({"version": {"$exists": True}}, {"_id": 0, "version": 1}).to_list(None)
+    return {doc["version"] for doc in docs}
+
+
+async def pending_migrations(database) -> List[Migration]:
+    applied = await applied_versions(database)
+    return [MIGRATIONS[v] for v in sorted(MIGRATIONS) if v not in applied]
+
+
+async def _acquire_lock(database, owner: str, lease: timedelta) -> bool:
+    now = datetime.now(timezone.utc)
+    try:
+        await database.migrations.find_one_and_update(
+            {"_id": LOCK_ID, "$or": [{"expires_at": {"$lt": now}}, {"owner": owner}]},
+            {"$set": {"owner": owner, "expires_at": now + lease}},
+            upsert=True,
+        )
+        return True
+    except DuplicateKeyError:
+        # Someone else holds an unexpired lease
+        return False
+
+
+async def _renew_lock(database, owner: str, lease: timedelta):
+    # Renewed three times per lease, so one slow round trip does not lose it
+    while True:
+        await asyncio.sleep(lease.total_seconds() / 3)
+        result = await database.migrations.update_one(
+            {"_id": LOCK_ID, "owner": owner},
+            {"$set": {"expires_at": datetime.now(timezone.utc) + lease}},
+        )
+        if not result.matched_count:
+            raise MigrationError("Lost the migration lock")
+
+
+async def _apply_pending(database, applied: List[int]):
+    # Re-read under the lock: another worker may have just finished
+    for pending in await pending_migrations(database):
+        logger.info(f"Applying migration {pending.version}: {pending.name}")
+        await pending.up(database)
+        await database.migrations.insert_one({
+            "_id": f"v{pending.version:04d}",
+            "version": pending.version,
+            "name": pending.name,
+            "applied_at": datetime.now(timezone.utc).isoformat(),
+        })
+        applied.append(pending.version)
+
+
+async def run_migrations(database, lease_seconds: int = 300, wait_seconds: int = 120) -> List[int]:
+    """Apply pending migrations and return the versions applied here."""
+    if not await pending_migrations(database):
+        return []
+
+    owner = str(uuid.uuid4())
+    lease = timedelta(seconds=lease_seconds)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + wait_seconds
+    while not await _acquire_lock(database, owner, lease):
+        if loop.time() > deadline:
+            raise MigrationError("Timed out waiting for the migration lock")
+        await asyncio.sleep(0.5)
+
+    applied: List[int] = []
+    work = asyncio.create_task(_apply_pending(database, applied))
+    heartbeat = asyncio.create_task(_renew_lock(database, owner, lease))
+    try:
+        await asyncio.wait({work, heartbeat}, return_when=asyncio.FIRST_COMPLETED)
+        if not work.done():
+            # The heartbeat only ends when the lease is gone: stop before
+            # another runner applies the same migration
+            work.cancel()
+            heartbeat.result()
+        work.result()
+    finally:
+        for task in (work, heartbeat):
+            task.cancel()
+        await asyncio.gather(work, heartbeat, return_exceptions=True)
+        await database.migrations.delete_one({"_id": LOCK_ID, "owner": owner})
+    return applied
+
+
+def main():
+    # Import through the module name so the registry server.py fills is the
+    # one used here, not a copy belonging to __main__
+    import server  # noqa: F401
+    import migrations
+    from config import get_settings
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    settings = get_settings().validate()
+
+    async def run():
+        client = AsyncIOMotorClient(settings.mongo_url)
+        try:
+            applied = await migrations.run_migrations(client[settings.db_name])
+        finally:
+            client.close()
+        print(f"Applied migrations: {applied}" if applied else "Database is up to date")
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
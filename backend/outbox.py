@@ -0,0 +1,207 @@
+"""Transactional outbox for order emails.
+
+Messages are inserted into ``notification_outbox`` together with the order
+change that causes them (see ``OrderRepository``), so an order is never
+stored without its emails and an email never goes out for a write that was
+rolled back. ``OutboxWorker`` drains the collection in the background:
+
+* each loop claims up to ``batch_size`` due messages with a lease token, so
+  several workers (or app processes) can drain the same collection;
+* a claimed batch is rendered and handed to the transport in one call;
+* failures are retried with exponential backoff and marked ``failed`` after
+  ``max_attempts``. A worker that dies mid-batch leaves its lease to expire
+  and the messages are picked up again.
+
+Delivery is at least once: a crash between sending and recording the result
+sends the message again.
+"""
+import asyncio
+import logging
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+import notifications
+
+logger = logging.getLogger(__name__)
+
+ORDER_CREATED = "order_created"
+ORDER_PAID = "order_paid"
+
+LEASE = timedelta(minutes=5)
+RETRY_BASE = timedelta(seconds=30)
+RETRY_CAP = timedelta(hours=1)
+
+
+def order_messages(kind: str, order_id: str, shop_email: Optional[str]) -> List[Dict]:
+    """Outbox documents for one order event; the id makes re-enqueueing a no-op."""
+    now = datetime.now(timezone.utc)
+    audiences = ["customer"] + (["shop"] if shop_email else [])
+    return [
+        {
+            "_id": f"{kind}:{audience}:{order_id}",
+            "kind": kind,
+            "audience": audience,
+            "order_id": order_id,
+            "status": "pending",
+            "attempts": 0,
+            "created_at": now,
+            "next_attempt_at": now,
+        }
+        for audience in audiences
+    ]
+
+
+async def enqueue(collection, messages: List[Dict], session=None):
+    if not messages:
+        return
+    try:
+        await collection.insert_many(messages, ordered=False, session=session)
+    except BulkWriteError as e:
+        # Already queued by an earlier attempt
+        if any(error["code"] != 11000 for error in e.details["writeErrors"]):
+            raise
+
+
+def retry_delay(attempts: int) -> timedelta:
+    return min(RETRY_BASE * 2 ** (attempts - 1), RETRY_CAP)
+
+
+class OutboxWorker:
+    def __init__(self, database, transport, sender: str, shop_email: Optional[str] = None,
+                 concurrency: int = 1, batch_size: int = 50, poll_interval: float = 1.0, max_attempts: int = 8):
+        self.database = database
+        self.transport = transport
+        self.sender = sender
+        self.shop_email = shop_email
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.metrics = {"sent": 0, "retried": 0, "failed": 0, "batches": 0, "last_lag_seconds": 0.0,
+                        "max_lag_seconds": 0.0}
+        self._tasks: List[asyncio.Task] = []
+        self._started: Optional[float] = None
+
+    @property
+    def collection(self):
+        return self.database.notification_outbox
+
+    async def claim(self) -> List[Dict]:
+        now = datetime.now(timezone.utc)
+        due = {"$or": [
+            {"status": "pending", "next_attempt_at": {"$lte": now}},
+            {"status": "sending", "lease_until": {"$lte": now}},
+        ]}
+        ids = [doc["_id"] async for doc in self.collection.find(due, {"_id": 1}).sort("next_attempt_at", 1)
+               .limit(self.batch_size)]
+        if not ids:
+            return []
+        token = uuid.uuid4().hex
+        # Re-checking ``due`` keeps a message another worker claimed in between out of this batch
+        await self.collection.update_many(
+            {"_id": {"$in": ids}, **due},
+            {"$set": {"status": "sending", "claim": token, "lease_until": now + LEASE}},
+        )
+        return await self.collection.find({"claim": token}).to_list(self.batch_size)
+
+    async def process(self, batch: List[Dict]) -> int:
+        order_ids = list({message["order_id"] for message in batch})
+        orders = {order["id"]: order async for order in self.database.orders.find({"id": {"$in": order_ids}}, {"_id": 0})}
+        writes, sendable, emails = [], [], []
+        for message in batch:
+            order = orders.get(message["order_id"])
+            if order is None or (message["audience"] == "shop" and not self.shop_email):
+                writes.append(self._failed(message, "order not found" if order is None else "SHOP_EMAIL is not set"))
+                continue
+            sendable.append(message)
+            emails.append(notifications.render(message["kind"], message["audience"], order, self.sender,
+                                               self.shop_email))
+        results = await self.transport.send_batch(emails) if emails else []
+        sent_at = datetime.now(timezone.utc)
+        for message, error in zip(sendable, results):
+            if error is None:
+                writes.append(UpdateOne({"_id": message["_id"], "claim": message["claim"]}, {
+                    "$set": {"status": "sent", "sent_at": sent_at},
+                    "$unset": {"claim": "", "lease_until": "", "last_error": ""},
+                }))
+                lag = (sent_at - message["created_at"].replace(tzinfo=timezone.utc)).total_seconds()
+                self.metrics["sent"] += 1
+                self.metrics["last_lag_seconds"] = round(lag, 3)
+                self.metrics["max_lag_seconds"] = max(self.metrics["max_lag_seconds"], round(lag, 3))
+            elif message["attempts"] + 1 >= self.max_attempts:
+                writes.append(self._failed(message, str(error)))
+            else:
+                attempts = message["attempts"] + 1
+                writes.append(UpdateOne({"_id": message["_id"], "claim": message["claim"]}, {
+                    "$set": {"status": "pending", "attempts": attempts, "last_error": str(error),
+                             "next_attempt_at": sent_at + retry_delay(attempts)},
+                    "$unset": {"claim": "", "lease_until": ""},
+                }))
+                self.metrics["retried"] += 1
+        if writes:
+            await self.collection.bulk_write(writes, ordered=False)
+        self.metrics["batches"] += 1
+        return len(batch)
+
+    def _failed(self, message: Dict, error: str) -> UpdateOne:
+        logger.error(f"Giving up on notification {message['_id']}: {error}")
+        self.metrics["failed"] += 1
+        return UpdateOne({"_id": message["_id"], "claim": message["claim"]}, {
+            "$set": {"status": "failed", "attempts": message["attempts"] + 1, "last_error": error},
+            "$unset": {"claim": "", "lease_until": ""},
+        })
+
+    async def drain(self) -> int:
+        """Processes batches until nothing is due; returns the number of messages handled."""
+        handled = 0
+        while batch := await self.claim():
+            handled += await self.process(batch)
+        return handled
+
+    async def _run(self):
+        while True:
+            try:
+                if await self.drain():
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Outbox worker error: {e}")
+            await asyncio.sleep(self.poll_interval)
+
+    def start(self):
+        self._started = time.monotonic()
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self.concurrency)]
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> Dict:
+        uptime = time.monotonic() - self._started if self._started is not None else 0.0
+        return {
+            "workers": len(self._tasks),
+            **self.metrics,
+            "sent_per_minute": round(self.metrics["sent"] * 60 / uptime, 1) if uptime else 0.0,
+        }
+
+
+async def queue_stats(collection) -> Dict:
+    counts = {doc["_id"]: doc["count"] async for doc in collection.aggregate(
+        [{"$group": {"_id": "$status", "count": {"$sum": 1}}}]
+    )}
+    oldest = await collection.find_one({"status": "pending"}, {"created_at": 1}, sort=[("created_at", 1)])
+    oldest_age = 0.0
+    if oldest is not None:
+        oldest_age = (datetime.now(timezone.utc) - oldest["created_at"].replace(tzinfo=timezone.utc)).total_seconds()
+    return {
+        "counts": {status: counts.get(status, 0) for status in ("pending", "sending", "sent", "failed")},
+        "oldest_pending_seconds": round(oldest_age, 1),
+    }
@@ -0,0 +1,74 @@
+"""One payable Stripe session per order.
+
+Checkout can reach an order that already has a Stripe session: a retry
+without an Idempotency-Key, a new key after the customer came back from
+Stripe's ``cancel_url``, or ``/checkout/session`` called again. Stripe keeps
+every session payable until it expires, so ``open_session`` returns the
+order's open session when it is for the same amount and currency and has
+time left, and otherwise expires the open ones before opening a new session.
+Requests for the same order take turns through an idempotency-key claim on
+the order id (see idempotency.py).
+"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+import idempotency
+
+# Stripe's default ``expires_at``
+SESSION_LIFETIME = timedelta(hours=24)
+# A session is only handed out again if the customer has this long to pay
+REUSE_MARGIN = timedelta(hours=1)
+OPEN_STATUSES = ("pending", "open")
+SCOPE = "payment-session"
+
+
+class SessionPaid(Exception):
+    """A previous session of the order has been paid."""
+
+
+async def open_session(
+    database,
+    order_id: str,
+    amount: float,
+    currency: str,
+    create: Callable[[], Awaitable[Any]],
+    expire: Callable[[str], Awaitable[bool]],
+    payment_doc: Callable[[Any], Dict],
+) -> Tuple[str, str]:
+    """Returns ``(session_id, url)`` of the session to pay ``order_id`` with.
+
+    ``create()`` opens a Stripe session (with ``session_id`` and ``url``),
+    ``expire(session_id)`` expires one and returns False if it was paid
+    instead, and ``payment_doc(session)`` is the payment record of a new one.
+    Raises ``SessionPaid``, or ``idempotency.IdempotencyInProgress`` while
+    another request opens a session for the order.
+    """
+    await idempotency.claim(database, SCOPE, order_id, order_id)
+    try:
+        now = datetime.now(timezone.utc)
+        payments = await database.payment_transactions.find(
+            {"order_id": order_id, "status": {"$in": list(OPEN_STATUSES)}, "payment_status": {"$ne": "paid"}},
+            {"_id": 0},
+        ).to_list(None)
+        fresh_since = (now - SESSION_LIFETIME + REUSE_MARGIN).isoformat()
+        for payment in payments:
+            if (payment.get("url") and payment["currency"] == currency and payment["amount"] == amount
+                    and payment["created_at"] > fresh_since):
+                return payment["session_id"], payment["url"]
+
+        for payment in payments:
+            if not await expire(payment["session_id"]):
+                raise SessionPaid(payment["session_id"])
+            await database.payment_transactions.update_one(
+                {"session_id": payment["session_id"]},
+                {"$set": {"status": "expired", "updated_at": now.isoformat()}},
+            )
+        session = await create()
+        await asyncio.gather(
+            database.payment_transactions.insert_one(payment_doc(session)),
+            database.orders.update_one({"id": order_id}, {"$set": {"payment_session_id": session.session_id}}),
+        )
+        return session.session_id, session.url
+    finally:
+        await idempotency.release(database, SCOPE, order_id)
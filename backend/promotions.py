@@ -0,0 +1,303 @@
+"""Promotions and discount codes.
+
+Rules are documents in ``promotions``, of three kinds:
+
+* ``percent``: ``value`` % off the lines the rule covers;
+* ``fixed``: ``value`` € off the order, once, at most the amount it covers;
+* ``buy_x_get_y``: of every ``buy_quantity + get_quantity`` units of a
+  covered product, ``get_quantity`` are ``value`` % off (100: free).
+
+A rule covers the products in ``product_ids`` and the categories in
+``category_ids``, or the whole cart when both are empty. It applies between
+``starts_at`` and ``ends_at``, from an order subtotal of ``min_subtotal``, and
+to at most ``max_uses`` orders. Rules without a ``code`` apply by themselves
+(sales); a rule with a code only applies when the customer enters it.
+
+A cart is priced in three steps:
+
+1. each line gets the best automatic ``percent`` or ``buy_x_get_y`` rule
+   covering it, since sales do not add up on one line;
+2. the best automatic ``fixed`` rule comes off the order;
+3. the customer's code, if any, applies to what is left.
+
+Order-level amounts are spread over the lines they cover in proportion to
+their amounts. Each item therefore carries its own ``discount``, and the
+revenue per product stays net.
+
+``PromotionEngine.load`` compiles the active rules into lookups by product,
+category and code, once per worker. Pricing a cart only looks at the rules
+indexed under its products and their categories. Workers reload the rules
+when the ``promotions`` cache namespace is invalidated.
+
+Uses are counted in ``uses`` with a conditional ``$inc`` when an order is
+created. They are given back when no order came of it. A worker that crashes
+in between leaves a use counted, so a cap can run out early but is never
+exceeded. Unpaid orders count as uses.
+"""
+import logging
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from itertools import chain
+from typing import Callable, Collection, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+PERCENT = "percent"
+FIXED = "fixed"
+BUY_X_GET_Y = "buy_x_get_y"
+KINDS = (PERCENT, FIXED, BUY_X_GET_Y)
+
+
+class InvalidCode(Exception):
+    """The code does not exist, is outside its dates, used up or not applicable."""
+
+
+def normalize_code(code: str) -> str:
+    return code.strip().upper()
+
+
+def _timestamp(value, default: float) -> float:
+    if not value:
+        return default
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+@dataclass(frozen=True)
+class Rule:
+    id: str
+    name: str
+    code: Optional[str]
+    kind: str
+    value: float
+    min_subtotal: float
+    starts: float
+    ends: float
+    capped: bool
+    product_ids: frozenset
+    category_ids: frozenset
+    scoped: bool
+    # Discount of one line from unit price and quantity, chosen at compile time
+    line: Callable[[float, int], float]
+
+    def live(self, now: float, subtotal: float) -> bool:
+        return self.starts <= now < self.ends and subtotal >= self.min_subtotal
+
+    def covers(self, item: Dict) -> bool:
+        return not self.scoped or item["product_id"] in self.product_ids or item.get("category_id") in self.category_ids
+
+
+def compile_rule(doc: Dict) -> Rule:
+    kind, value = doc["kind"], float(doc["value"])
+    product_ids, category_ids = frozenset(doc.get("product_ids") or ()), frozenset(doc.get("category_ids") or ())
+    if kind == PERCENT:
+        rate = value / 100
+
+        def line(price: float, quantity: int) -> float:
+            return price * quantity * rate
+    elif kind == BUY_X_GET_Y:
+        rate, group, free = value / 100, doc["buy_quantity"] + doc["get_quantity"], doc["get_quantity"]
+
+        def line(price: float, quantity: int) -> float:
+            return (quantity // group) * free * price * rate
+    else:
+        def line(price: float, quantity: int) -> float:
+            return 0.0
+
+    return Rule(
+        id=doc["id"],
+        name=doc.get("name", ""),
+        code=normalize_code(doc["code"]) if doc.get("code") else None,
+        kind=kind,
+        value=value,
+        min_subtotal=float(doc.get("min_subtotal") or 0.0),
+        starts=_timestamp(doc.get("starts_at"), float("-inf")),
+        ends=_timestamp(doc.get("ends_at"), float("inf")),
+        capped=doc.get("max_uses") is not None,
+        product_ids=product_ids,
+        category_ids=category_ids,
+        scoped=bool(product_ids or category_ids),
+        line=line,
+    )
+
+
+def _spread(amount: float, lines: List[int], net: List[float]) -> Dict[int, float]:
+    """Splits ``amount`` over ``lines`` in proportion to their net amounts, to the cent."""
+    base = sum(net[k] for k in lines)
+    shares, left = {}, round(amount, 2)
+    for position, k in enumerate(lines):
+        share = left if position == len(lines) - 1 else round(amount * net[k] / base, 2)
+        share = min(share, round(net[k], 2), left)
+        shares[k] = share
+        left = round(left - share, 2)
+    return shares
+
+
+class PromotionEngine:
+    def __init__(self):
+        self.rules: Dict[str, Rule] = {}
+        self._by_product: Dict[str, List[Rule]] = {}
+        self._by_category: Dict[str, List[Rule]] = {}
+        self._everywhere: List[Rule] = []
+        self._order_rules: List[Rule] = []
+        self._codes: Dict[str, Rule] = {}
+
+    def set_rules(self, docs: Sequence[Dict]):
+        rules = [compile_rule(doc) for doc in docs]
+        by_product, by_category = defaultdict(list), defaultdict(list)
+        everywhere, order_rules, codes = [], [], {}
+        for rule in rules:
+            if rule.code:
+                codes[rule.code] = rule
+            elif rule.kind == FIXED:
+                order_rules.append(rule)
+            elif not rule.scoped:
+                everywhere.append(rule)
+            else:
+                for product_id in rule.product_ids:
+                    by_product[product_id].append(rule)
+                for category_id in rule.category_ids:
+                    by_category[category_id].append(rule)
+        # Swapped in one go so a request never sees half of the new rules
+        self.rules = {rule.id: rule for rule in rules}
+        self._by_product, self._by_category = dict(by_product), dict(by_category)
+        self._everywhere, self._order_rules, self._codes = everywhere, order_rules, codes
+
+    async def load(self, database):
+        docs = await database.promotions.find({"active": True}, {"_id": 0}).to_list(None)
+        # Used-up rules are left out; their counter only ever grows
+        self.set_rules([d for d in docs if d.get("max_uses") is None or d.get("uses", 0) < d["max_uses"]])
+        logger.info("Loaded %d promotions", len(self.rules))
+
+    def apply(self, items: List[Dict], code: Optional[str] = None, now: Optional[float] = None,
+              exclude: Collection[str] = ()) -> Dict:
+        """Prices priced cart ``items`` (with ``price``, ``quantity``, ``subtotal``)."""
+        now = time.time() if now is None else now
+        subtotal = round(sum(item["subtotal"] for item in items), 2)
+        code_rule = None
+        if code:
+            code_rule = self._codes.get(normalize_code(code))
+            if code_rule is None or not code_rule.live(now, subtotal):
+                raise InvalidCode("Unknown or expired promotion code")
+            if code_rule.id in exclude:
+                raise InvalidCode("Promotion code is no longer available")
+
+        net = [item["subtotal"] for item in items]
+        discounts = [0.0] * len(items)
+        applied: Dict[str, float] = defaultdict(float)
+
+        def take(rule: Rule, shares: Dict[int, float]):
+            for k, amount in shares.items():
+                net[k] = round(net[k] - amount, 2)
+                discounts[k] = round(discounts[k] + amount, 2)
+                applied[rule.id] = round(applied[rule.id] + amount, 2)
+
+        for k, item in enumerate(items):
+            best, best_rule = 0.0, None
+            for rule in chain(
+                self._by_product.get(item["product_id"], ()),
+                self._by_category.get(item.get("category_id"), ()),
+                self._everywhere,
+            ):
+                if rule.id in exclude or not rule.live(now, subtotal):
+                    continue
+                amount = rule.line(item["price"], item["quantity"])
+                if amount > best:
+                    best, best_rule = amount, rule
+            if best_rule is not None:
+                take(best_rule, {k: min(round(best, 2), net[k])})
+
+        best, best_rule, best_lines = 0.0, None, []
+        # Rules on the whole cart all cover the same lines
+        every_line = [k for k in range(len(items)) if net[k] > 0]
+        every_net = sum(net[k] for k in every_line)
+        for rule in self._order_rules:
+            if rule.id in exclude or not rule.live(now, subtotal):
+                continue
+            if rule.scoped:
+                lines = [k for k, item in enumerate(items) if rule.covers(item) and net[k] > 0]
+                amount = min(rule.value, sum(net[k] for k in lines))
+            else:
+                lines, amount = every_line, min(rule.value, every_net)
+            if amount > best:
+                best, best_rule, best_lines = amount, rule, lines
+        if best_rule is not None:
+            take(best_rule, _spread(best, best_lines, net))
+
+        if code_rule is not None:
+            lines = [k for k, item in enumerate(items) if code_rule.covers(item) and net[k] > 0]
+            if code_rule.kind == FIXED:
+                shares = _spread(min(code_rule.value, sum(net[k] for k in lines)), lines, net) if lines else {}
+            else:
+                # Applied to what the line costs after the sales
+                shares = {
+                    k: min(round(code_rule.line(net[k] / items[k]["quantity"], items[k]["quantity"]), 2), net[k])
+                    for k in lines
+                }
+            shares = {k: amount for k, amount in shares.items() if amount > 0}
+            if not shares:
+                raise InvalidCode("Promotion code does not apply to this cart")
+            take(code_rule, shares)
+
+        discount = round(sum(discounts), 2)
+        return {
+            "items": [{**item, "discount": discounts[k]} for k, item in enumerate(items)],
+            "subtotal": subtotal,
+            "discount": discount,
+            "total": round(subtotal - discount, 2),
+            "promotions": [
+                {"id": rule_id, "name": self.rules[rule_id].name, "code": self.rules[rule_id].code, "amount": amount}
+                for rule_id, amount in applied.items()
+                if amount > 0
+            ],
+        }
+
+
+async def _take_use(database, promotion_id: str) -> bool:
+    result = await database.promotions.update_one(
+        {"id": promotion_id, "$expr": {"$lt": [{"$ifNull": ["$uses", 0]}, "$max_uses"]}},
+        {"$inc": {"uses": 1}},
+    )
+    return result.modified_count == 1
+
+
+async def release(database, promotion_ids: Sequence[str]):
+    """Gives back the uses taken by ``price_order`` for an order that was not created."""
+    if promotion_ids:
+        await database.promotions.update_many({"id": {"$in": list(promotion_ids)}}, {"$inc": {"uses": -1}})
+
+
+async def price_order(engine: PromotionEngine, database, items: List[Dict], code: Optional[str] = None,
+                      now: Optional[float] = None) -> Tuple[Dict, List[str]]:
+    """Prices ``items`` and takes a use of every capped promotion applied.
+
+    A promotion found used up is dropped and the cart priced again without
+    it. Returns the pricing and the ids whose use was taken, to ``release``
+    if the order is not created after all. Raises ``InvalidCode``.
+    """
+    exclude, taken = set(), []
+    try:
+        while True:
+            pricing = engine.apply(items, code, now, exclude)
+            applied = [p["id"] for p in pricing["promotions"]]
+            used_up = []
+            for promotion_id in applied:
+                if engine.rules[promotion_id].capped and promotion_id not in taken:
+                    if await _take_use(database, promotion_id):
+                        taken.append(promotion_id)
+                    else:
+                        used_up.append(promotion_id)
+            if not used_up:
+                break
+            exclude.update(used_up)
+    except Exception:
+        await release(database, taken)
+        raise
+    # Repricing without a used-up rule can leave out one that was taken earlier
+    await release(database, [p for p in taken if p not in applied])
+    return pricing, [p for p in taken if p in applied]
@@ -0,0 +1,226 @@
+"""In-memory "frequently bought together" index.
+
+Every worker keeps, per product, a ranked list of related products so that
+``/products/{id}/related`` is a dictionary lookup. Products bought together
+in paid orders rank first (by how often); the list is topped up with products
+of the same category and the closest price.
+
+The co-purchase counts are built once per worker in the background by
+streaming the ``items`` of paid orders: pairs of product indexes are packed
+into int64 codes and counted with ``np.unique``, batch by batch, so memory
+follows the number of distinct pairs rather than the number of orders.
+Afterwards each newly paid basket is added incrementally (``add_basket``).
+The catalog side is reloaded in the background after every catalog
+invalidation (``reload_catalog``); its price neighbours come from one sort
+per category, computed off the event loop. A product's list is ranked the
+first time it is asked for and again only after its pairs or the catalog
+change.
+"""
+import asyncio
+import logging
+from collections import Counter, defaultdict
+from itertools import combinations
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MAX_RELATED = 12
+BATCH_SIZE = 5000
+
+SUMMARY_FIELDS = {
+    "_id": 0, "id": 1, "name_fr": 1, "name_tr": 1, "name_en": 1,
+    "price": 1, "images": 1, "stock": 1, "featured": 1, "category_id": 1,
+}
+
+
+def merge_counts(codes: np.ndarray, counts: np.ndarray, new_codes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Adds the occurrences in ``new_codes`` to the sparse ``codes``/``counts`` pair."""
+    new_codes, new_counts = np.unique(new_codes, return_counts=True)
+    merged, inverse = np.unique(np.concatenate([codes, new_codes]), return_inverse=True)
+    return merged, np.bincount(inverse, weights=np.concatenate([counts, new_counts])).astype(np.int64)
+
+
+def price_neighbours(products: List[Dict], limit: int) -> Dict[str, List[str]]:
+    """Same-category products ordered by price distance (on a log scale).
+
+    The ``limit`` nearest prices are among the ``limit`` products on either
+    side in price order, so each category is sorted once and only those
+    ``2 * limit`` candidates are ranked per product.
+    """
+    by_category: Dict[Optional[str], List[Dict]] = defaultdict(list)
+    for product in products:
+        by_category[product.get("category_id")].append(product)
+    neighbours = {}
+    offsets = np.concatenate([np.arange(-limit, 0), np.arange(1, limit + 1)])
+    for group in by_category.values():
+        ids = [p["id"] for p in group]
+        prices = np.log(np.maximum(np.array([p.get("price") or 0.0 for p in group], dtype=float), 0.01))
+        order = np.argsort(prices, kind="stable")
+        sorted_prices = prices[order]
+        window = np.arange(len(ids))[:, None] + offsets[None, :]
+        outside = (window < 0) | (window >= len(ids))
+        window = np.clip(window, 0, len(ids) - 1)
+        distance = np.where(outside, np.inf, np.abs(sorted_prices[window] - sorted_prices[:, None]))
+        candidates = order[window]
+        # Closest first, ties in catalog order
+        ranked = np.take_along_axis(candidates, np.lexsort((candidates, distance)), axis=1)[:, :limit]
+        ranked_distance = np.sort(distance, axis=1)[:, :limit]
+        for row, position in enumerate(order.tolist()):
+            neighbours[ids[position]] = [ids[k] for k in ranked[row][np.isfinite(ranked_distance[row])].tolist()]
+    return neighbours
+
+
+def summarize_catalog(products: List[Dict], limit: int) -> Tuple[Dict[str, Dict], Dict[str, List[str]]]:
+    summaries = {p["id"]: {**p, "images": p.get("images", [])[:1]} for p in products}
+    return summaries, price_neighbours(products, limit)
+
+
+class RelatedProducts:
+    def __init__(self, limit: int = MAX_RELATED):
+        self.limit = limit
+        self._products: Dict[str, Dict] = {}
+        self._neighbours: Dict[str, List[str]] = {}
+        self._pairs: Dict[str, Counter] = defaultdict(Counter)
+        self._related: Dict[str, List[str]] = {}
+        self._pending: Optional[List[List[str]]] = None
+        self._task: Optional[asyncio.Task] = None
+        self._reload: Optional[asyncio.Task] = None
+        self._reload_again = False
+
+    @property
+    def building(self) -> bool:
+        return self._pending is not None
+
+    def related(self, product_id: str, limit: int = MAX_RELATED) -> Optional[List[Dict]]:
+        """Summaries of the related products, or None for an unknown product."""
+        if product_id not in self._products:
+            return None
+        ranked = self._related.get(product_id)
+        if ranked is None:
+            ranked = self._related[product_id] = self._rank(product_id)
+        return [self._products[related_id] for related_id in ranked[:limit]]
+
+    def _rank(self, product_id: str) -> List[str]:
+        ranked = []
+        for candidate, _ in self._pairs.get(product_id, Counter()).most_common():
+            if len(ranked) == self.limit:
+                return ranked
+            if self._products.get(candidate, {}).get("stock", 0) > 0:
+                ranked.append(candidate)
+        for candidate in self._neighbours.get(product_id, []):
+            if len(ranked) == self.limit:
+                break
+            if candidate not in ranked and self._products[candidate].get("stock", 0) > 0:
+                ranked.append(candidate)
+        return ranked
+
+    def _rerank(self, product_ids: Iterable[str]):
+        for product_id in product_ids:
+            self._related.pop(product_id, None)
+
+    def _use_catalog(self, products: Dict[str, Dict], neighbours: Dict[str, List[str]]):
+        self._products, self._neighbours, self._related = products, neighbours, {}
+
+    def set_catalog(self, products: List[Dict]):
+        self._use_catalog(*summarize_catalog(products, self.limit))
+
+    async def load_catalog(self, database):
+        products = await database.products.find({}, SUMMARY_FIELDS).to_list(None)
+        # Sorting tens of thousands of prices must not stall the requests
+        self._use_catalog(*await asyncio.to_thread(summarize_catalog, products, self.limit))
+
+    def reload_catalog(self, database):
+        """Reloads the catalog in the background.
+
+        Reloads asked for while one runs are merged into a single one after it.
+        """
+        if self._reload is not None and not self._reload.done():
+            self._reload_again = True
+            return
+
+        async def run():
+            while True:
+                self._reload_again = False
+                try:
+                    await self.load_catalog(database)
+                except Exception as e:
+                    logger.error(f"Related products catalog reload failed: {e}")
+                if not self._reload_again:
+                    return
+
+        self._reload = asyncio.create_task(run())
+
+    def add_basket(self, product_ids: List[str]):
+        basket = sorted(set(product_ids))
+        if len(basket) < 2:
+            return
+        if self.building:
+            # Applied once the initial count is in place
+            self._pending.append(basket)
+            return
+        for left, right in combinations(basket, 2):
+            self._pairs[left][right] += 1
+            self._pairs[right][left] += 1
+        self._rerank(basket)
+
+    def set_pairs(self, index: List[str], codes: np.ndarray, counts: np.ndarray):
+        pairs: Dict[str, Counter] = defaultdict(Counter)
+        for left, right, count in zip((codes >> 32).tolist(), (codes & 0xFFFFFFFF).tolist(), counts.tolist()):
+            pairs[index[left]][index[right]] = count
+            pairs[index[right]][index[left]] = count
+        self._pairs = pairs
+        self._related = {}
+
+    async def build(self, database, batch_size: int = BATCH_SIZE):
+        """Counts co-purchases over all paid orders, then applies baskets paid meanwhile."""
+        self._pending = []
+        try:
+            positions: Dict[str, int] = {}
+            index: List[str] = []
+            codes = np.empty(0, dtype=np.int64)
+            counts = np.empty(0, dtype=np.int64)
+            batch: List[int] = []
+            cursor = database.orders.find({"status": "paid"}, {"_id": 0, "items.product_id": 1}).batch_size(batch_size)
+            async for order in cursor:
+                basket = set()
+                for item in order.get("items", []):
+                    if item["product_id"] not in positions:
+                        positions[item["product_id"]] = len(index)
+                        index.append(item["product_id"])
+                    basket.add(positions[item["product_id"]])
+                batch.extend((left << 32) | right for left, right in combinations(sorted(basket), 2))
+                if len(batch) >= batch_size * 8:
+                    codes, counts = merge_counts(codes, counts, np.array(batch, dtype=np.int64))
+                    batch = []
+            if batch:
+                codes, counts = merge_counts(codes, counts, np.array(batch, dtype=np.int64))
+            self.set_pairs(index, codes, counts)
+        finally:
+            pending, self._pending = self._pending, None
+        for basket in pending:
+            self.add_basket(basket)
+        logger.info(f"Related products index built from {len(codes)} product pairs")
+
+    def start(self, database):
+        async def run():
+            try:
+                await self.build(database)
+            except Exception as e:
+                logger.error(f"Related products index build failed: {e}")
+
+        self._task = asyncio.create_task(run())
+
+    async def close(self):
+        for task in (self._task, self._reload):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._task = self._reload = None
+
+
+related_products = RelatedProducts()
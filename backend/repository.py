@@ -0,0 +1,207 @@
+"""Single-round-trip write operations.
+
+Updates go through ``find_one_and_update`` with ``return_document=AFTER`` so
+the caller gets the new document without a separate read. Products carry a
+``version`` counter incremented on every write; passing the version the
+client last saw turns a concurrent edit into ``VersionConflict`` instead of a
+silent overwrite. Documents written before versioning count as version 0.
+
+Carts are versioned the same way, which lets ``OrderRepository`` turn one
+cart version into exactly one order however often checkout is retried.
+"""
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Sequence
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+import analytics
+import outbox
+
+
+class VersionConflict(Exception):
+    def __init__(self, current_version: int):
+        super().__init__(f"Document was modified concurrently (current version {current_version})")
+        self.current_version = current_version
+
+
+class CartChanged(Exception):
+    """The cart was edited after it was priced; nothing was written."""
+
+
+def _version_filter(expected_version: int) -> Dict:
+    if expected_version == 0:
+        # Matches 0 as well as documents that predate the version field
+        return {"version": {"$in": [0, None]}}
+    return {"version": expected_version}
+
+
+class ProductRepository:
+    projection = {"_id": 0}
+
+    def __init__(self, database):
+        self.database = database
+
+    @property
+    def collection(self):
+        return self.database.products
+
+    async def _raise_if_conflict(self, product_id: str):
+        # Only reached when the guarded write matched nothing
+        current = await self.collection.find_one({"id": product_id}, {"_id": 0, "version": 1})
+        if current is not None:
+            raise VersionConflict(current.get("version", 0))
+
+    async def update(self, product_id: str, data: Dict, expected_version: Optional[int] = None) -> Optional[Dict]:
+        query = {"id": product_id}
+        if expected_version is not None:
+            query.update(_version_filter(expected_version))
+        updated = await self.collection.find_one_and_update(
+            query,
+            {"$set": data, "$inc": {"version": 1}},
+            projection=self.projection,
+            return_document=ReturnDocument.AFTER,
+        )
+        if updated is None and expected_version is not None:
+            await self._raise_if_conflict(product_id)
+        return updated
+
+    async def delete(self, product_id: str, expected_version: Optional[int] = None) -> bool:
+        if expected_version is None:
+            result = await self.collection.delete_one({"id": product_id})
+            return result.deleted_count > 0
+        deleted = await self.collection.find_one_and_delete(
+            {"id": product_id, **_version_filter(expected_version)},
+            projection={"_id": 0, "id": 1},
+        )
+        if deleted is None:
+            await self._raise_if_conflict(product_id)
+        return deleted is not None
+
+
+class UserRepository:
+    projection = {"_id": 0, "password": 0}
+
+    def __init__(self, database):
+        self.database = database
+
+    @property
+    def collection(self):
+        return self.database.users
+
+    async def update_profile(self, user_id: str, data: Dict) -> Optional[Dict]:
+        if not data:
+            return await self.collection.find_one({"id": user_id}, self.projection)
+        return await self.collection.find_one_and_update(
+            {"id": user_id},
+            {"$set": data},
+            projection=self.projection,
+            return_document=ReturnDocument.AFTER,
+        )
+
+
+class _CartClaimed(Exception):
+    pass
+
+
+class OrderRepository:
+    """Creates orders from carts, once per cart version.
+
+    The order insert and the cart lock (``order_id`` set on the cart) happen in
+    one transaction when the server supports them (replica set or mongos). On
+    a standalone server the unique ``(cart_session_id, cart_version)`` index on
+    orders is what keeps concurrent requests from creating a second order.
+    Either way, a repeated request for the same cart version gets the order
+    that is already stored.
+
+    Notification messages passed along are written to the outbox (see
+    outbox.py) in the same transaction as the order change that causes them,
+    and so is a paid order's share of the sales rollups (see analytics.py).
+    """
+
+    projection = {"_id": 0}
+
+    def __init__(self, database):
+        self.database = database
+        self._transactions: Optional[bool] = None
+
+    async def supports_transactions(self) -> bool:
+        if self._transactions is None:
+            hello = await self.database.command("hello")
+            self._transactions = "setName" in hello or hello.get("msg") == "isdbgrid"
+        return self._transactions
+
+    def _claim(self, session_id: str, cart_version: int, order_id: str, session=None):
+        return self.database.carts.update_one(
+            {"session_id": session_id, **_version_filter(cart_version), "order_id": None},
+            {"$set": {"order_id": order_id, "checked_out_at": datetime.now(timezone.utc).isoformat()}},
+            session=session,
+        )
+
+    async def find_for_cart(self, session_id: str, cart_version: int) -> Optional[Dict]:
+        return await self.database.orders.find_one(
+            {"cart_session_id": session_id, "cart_version": cart_version}, self.projection
+        )
+
+    async def create_from_cart(self, order: Dict, messages: Sequence[Dict] = ()) -> Dict:
+        """Stores ``order`` (which carries its cart key) unless that cart version already has one.
+
+        Returns the order now stored for the cart version. Raises ``CartChanged``
+        when the cart has been edited since it was priced.
+        """
+        session_id, cart_version = order["cart_session_id"], order["cart_version"]
+        try:
+            if await self.supports_transactions():
+                await self._create_in_transaction(order, list(messages))
+            else:
+                await self._create_guarded_by_index(order, list(messages))
+            return {k: v for k, v in order.items() if k != "_id"}
+        except (_CartClaimed, DuplicateKeyError):
+            pass
+        existing = await self.find_for_cart(session_id, cart_version)
+        if existing is None:
+            raise CartChanged()
+        return existing
+
+    async def _create_in_transaction(self, order: Dict, messages: List[Dict]):
+        async def finalize(session):
+            # Claiming the cart first makes a concurrent transaction hit a
+            # write conflict, retry, and then find the cart already claimed
+            result = await self._claim(order["cart_session_id"], order["cart_version"], order["id"], session=session)
+            if result.modified_count == 0:
+                raise _CartClaimed()
+            await self.database.orders.insert_one(order, session=session)
+            await outbox.enqueue(self.database.notification_outbox, messages, session=session)
+
+        async with await self.database.client.start_session() as session:
+            await session.with_transaction(finalize)
+
+    async def _create_guarded_by_index(self, order: Dict, messages: List[Dict]):
+        await self.database.orders.insert_one(order)
+        result = await self._claim(order["cart_session_id"], order["cart_version"], order["id"])
+        if result.modified_count == 0:
+            # Edited since it was priced: the order no longer matches the cart
+            await self.database.orders.delete_one({"id": order["id"]})
+            raise CartChanged()
+        # Queued once the order is known to stand; a crash in between loses
+        # the email but never sends one for an order that was rolled back
+        await outbox.enqueue(self.database.notification_outbox, messages)
+
+    async def mark_paid(self, order_id: str, paid_at: str, messages: Sequence[Dict] = ()) -> Optional[Dict]:
+        """Flips the order to paid; returns it only for the call that did the flip."""
+        async def flip(session=None):
+            order = await self.database.orders.find_one_and_update(
+                {"id": order_id, "status": {"$ne": "paid"}},
+                {"$set": {"status": "paid", "paid_at": paid_at}},
+                projection=self.projection,
+                session=session,
+            )
+            if order is not None:
+                await analytics.record_paid_order(self.database, order, paid_at, session=session)
+                await outbox.enqueue(self.database.notification_outbox, list(messages), session=session)
+            return order
+
+        if not await self.supports_transactions():
+            return await flip()
+        async with await self.database.client.start_session() as session:
+            return await session.with_transaction(flip)
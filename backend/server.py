@@ -1,48 +1,123 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Request, Depends
+from fastapi import FastAPI, APIRouter, HTTPException, Request, Depends, Header, Query
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from dotenv import load_dotenv
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
-import os
+from contextlib import asynccontextmanager
+import asyncio
+import hashlib
+import json
+import time
 import logging
-from pathlib import Path
-from pydantic import BaseModel, Field, EmailStr
-from typing import List, Optional, Dict
+from pydantic import BaseModel, Field, EmailStr, ValidationError, model_validator
+from typing import List, Optional, Dict, Literal, Any, TYPE_CHECKING
 import uuid
-from datetime import datetime, timezone, timedelta
-from emergentintegrations.payments.stripe.checkout import (
-    StripeCheckout, 
-    CheckoutSessionResponse, 
-    CheckoutStatusResponse, 
-    CheckoutSessionRequest
-)
+from datetime import date, datetime, timezone, timedelta
+from pathlib import Path
 import jwt
 import bcrypt
+from pymongo import DeleteOne, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from config import Settings, get_settings
+from database import PROFILES, db
+from cache import cache
+from carts import cart_store
+from currency import exchange_rates, provider_from_url
+from events import events
+from migrations import migration, run_migrations
+import analytics
+import changelog
+import feeds
+import idempotency
+import outbox
+import notifications
+import payments
+import promotions
+import shipping
+from storefront import LANGUAGES, build_home_payloads, negotiate_language
+from recommendations import MAX_RELATED, related_products
+from repository import CartChanged, OrderRepository, ProductRepository, UserRepository, VersionConflict
+from middleware import (
+    AdmissionMiddleware,
+    CacheControlMiddleware,
+    CompressionMiddleware,
+    LoadMonitor,
+    RequestLogMiddleware,
+    default_admission_rules,
+    default_cache_rules,
+)
+import logs
+from warmup import Warmup
 
-ROOT_DIR = Path(__file__).parent
-load_dotenv(ROOT_DIR / '.env')
-
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+if TYPE_CHECKING:
+    from emergentintegrations.payments.stripe.checkout import (
+        StripeCheckout,
+        CheckoutStatusResponse,
+    )
 
-# Stripe configuration
-STRIPE_API_KEY = os.environ.get('STRIPE_API_KEY')
-JWT_SECRET = os.environ.get('JWT_SECRET', 'gulum-mobilya-secret-key-2024')
 JWT_ALGORITHM = "HS256"
+READINESS_TIMEOUT = 2.0
+PAYMENT_STREAM_TIMEOUT = 600
+PAYMENT_STREAM_HEARTBEAT = 15
+ANALYTICS_DEFAULT_DAYS = 30
+ORDER_PAID_TOPIC = "orders:paid"
+OUTBOX_RETENTION_DAYS = 14
 
 # Security
 security = HTTPBearer(auto_error=False)
 
-# Create the main app
-app = FastAPI()
 api_router = APIRouter(prefix="/api")
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+# Data-access profiles (database.py): what each group of operations may trade for latency
+catalog_db = db.profile("catalog-read")
+catalog_fresh_db = db.profile("catalog-fresh")
+analytics_db = db.profile("analytics-read")
+cart_db = db.profile("cart-write")
+payment_db = db.profile("payment-critical")
+
+product_repository = ProductRepository(db)
+user_repository = UserRepository(db)
+order_repository = OrderRepository(payment_db)
+
+# Handlers are installed by the lifespan (logs.setup), once per worker
 logger = logging.getLogger(__name__)
 
+# A secondary may serve catalog reads while up to its max staleness behind. For
+# that long after a catalog change, cached responses are refilled from the
+# primary, or a lagging secondary could cache the old catalog for a whole TTL
+CATALOG_PRIMARY_WINDOW = PROFILES["catalog-read"].read_preference.max_staleness
+_catalog_changed_at = float("-inf")
+
+def catalog_source():
+    if time.monotonic() - _catalog_changed_at < CATALOG_PRIMARY_WINDOW:
+        return catalog_fresh_db
+    return catalog_db
+
+async def mark_catalog_changed(namespace: str):
+    global _catalog_changed_at
+    _catalog_changed_at = time.monotonic()
+
+# Registered first, so the other catalog handlers already refill from the primary
+cache.on_invalidate("catalog", mark_catalog_changed)
+
+# The exchange-rate table a worker has published along with its catalog
+# invalidation (publish_rates)
+SHARED_RATES_KEY = "exchange-rates:table"
+# Long enough to cover workers loading the same new table at about the same time
+RATES_CLAIM_TTL = 60
+
+async def adopt_shared_rates(namespace: str):
+    # The other workers take the published table before any catalog handler
+    # reprices, and their own refresh then finds nothing new to publish
+    shared = await cache.get(SHARED_RATES_KEY)
+    if shared is None:
+        return
+    updated_at = datetime.fromisoformat(shared["updated_at"])
+    if exchange_rates.updated_at is None or updated_at > exchange_rates.updated_at:
+        exchange_rates.set_rates(shared["rates"], updated_at)
+
+cache.on_invalidate("catalog", adopt_shared_rates)
+
 # ============== AUTH HELPERS ==============
 
 def hash_password(password: str) -> str:
@@ -57,11 +132,11 @@ def create_token(user_id: str, email: str) -> str:
         "email": email,
         "exp": datetime.now(timezone.utc) + timedelta(days=30)
     }
-    return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
+    return jwt.encode(payload, get_settings().jwt_secret, algorithm=JWT_ALGORITHM)
 
 def decode_token(token: str) -> Optional[Dict]:
     try:
-        return jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+        return jwt.decode(token, get_settings().jwt_secret, algorithms=[JWT_ALGORITHM])
     except:
         return None
 
@@ -74,6 +149,18 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     user = await db.users.find_one({"id": payload["user_id"]}, {"_id": 0, "password": 0})
     return user
 
+def rate_limit(scope: str, setting: str, window: int = 60):
+    # Fixed-window counter kept in the shared cache so limits hold across workers;
+    # `setting` names the Settings field holding the limit
+    async def dependency(request: Request):
+        limit = getattr(get_settings(), setting)
+        forwarded = request.headers.get("X-Forwarded-For")
+        client_ip = forwarded.split(",")[0].strip() if forwarded else (request.client.host if request.client else "unknown")
+        key = f"ratelimit:{scope}:{client_ip}:{int(time.time()) // window}"
+        if await cache.incr(key, window) > limit:
+            raise HTTPException(status_code=429, detail="Trop de tentatives, réessayez plus tard")
+    return dependency
+
 async def require_auth(credentials: HTTPAuthorizationCredentials = Depends(security)) -> Dict:
     if not credentials:
         raise HTTPException(status_code=401, detail="Non authentifié")
@@ -85,6 +172,12 @@ async def require_auth(credentials: HTTPAuthorizationCredentials = Depends(secur
         raise HTTPException(status_code=401, detail="Utilisateur non trouvé")
     return user
 
+async def require_admin(user: Dict = Depends(require_auth)) -> Dict:
+    # Admins are the accounts listed in ADMIN_EMAILS
+    if user["email"].lower() not in get_settings().admin_emails:
+        raise HTTPException(status_code=403, detail="Accès réservé aux administrateurs")
+    return user
+
 # ============== MODELS ==============
 
 class User(BaseModel):
@@ -133,8 +226,17 @@ class Product(BaseModel):
     images: List[str] = []
     stock: int = 0
     featured: bool = False
+    weight_kg: Optional[float] = None
+    length_cm: Optional[float] = None
+    width_cm: Optional[float] = None
+    height_cm: Optional[float] = None
+    version: int = 0
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+class CatalogProduct(Product):
+    # The price in every currency offered, from the current exchange rates
+    prices: Dict[str, float] = {}
+
 class ProductCreate(BaseModel):
     name_fr: str
     name_tr: str
@@ -147,6 +249,40 @@ class ProductCreate(BaseModel):
     images: List[str] = []
     stock: int = 0
     featured: bool = False
+    # Packed for delivery; used to quote shipping
+    weight_kg: Optional[float] = Field(None, ge=0)
+    length_cm: Optional[float] = Field(None, gt=0)
+    width_cm: Optional[float] = Field(None, gt=0)
+    height_cm: Optional[float] = Field(None, gt=0)
+
+class ProductUpdate(ProductCreate):
+    # Version the client last read; omit to overwrite unconditionally
+    version: Optional[int] = None
+
+class ProductPatch(BaseModel):
+    price: Optional[float] = None
+    stock: Optional[int] = None
+    featured: Optional[bool] = None
+
+class BulkProductOperation(BaseModel):
+    op: Literal["upsert", "patch", "delete"]
+    id: Optional[str] = None
+    product: Optional[ProductCreate] = None
+    patch: Optional[ProductPatch] = None
+
+    @model_validator(mode="after")
+    def check_payload(self):
+        if self.op == "upsert" and self.product is None:
+            raise ValueError("upsert requires 'product'")
+        if self.op in ("patch", "delete") and not self.id:
+            raise ValueError(f"{self.op} requires 'id'")
+        if self.op == "patch" and (self.patch is None or not self.patch.model_dump(exclude_none=True)):
+            raise ValueError("patch requires at least one of price, stock, featured")
+        return self
+
+class BulkProductRequest(BaseModel):
+    operations: List[Dict[str, Any]]
+    ordered: bool = True
 
 class CartItem(BaseModel):
     product_id: str
@@ -156,6 +292,8 @@ class Cart(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     session_id: str
     items: List[CartItem] = []
+    version: int = 0
+    order_id: Optional[str] = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
@@ -166,10 +304,20 @@ class Order(BaseModel):
     customer_email: str
     customer_phone: str
     customer_address: str
+    customer_postcode: Optional[str] = None
     items: List[Dict] = []
+    subtotal: Optional[float] = None
+    discount: float = 0.0
+    promotions: List[Dict] = []
+    shipping: float = 0.0
+    shipping_zone: Optional[str] = None
     total: float
     status: str = "pending"
     payment_session_id: Optional[str] = None
+    paid_at: Optional[datetime] = None
+    cart_session_id: Optional[str] = None
+    cart_version: Optional[int] = None
+    language: str = "fr"
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class OrderCreate(BaseModel):
@@ -177,7 +325,15 @@ class OrderCreate(BaseModel):
     customer_email: str
     customer_phone: str
     customer_address: str
+    # Read from the address when not given
+    customer_postcode: Optional[str] = None
     cart_session_id: str
+    language: Optional[str] = None
+    promo_code: Optional[str] = None
+
+class CheckoutCreate(OrderCreate):
+    origin_url: str
+    currency: str = "eur"
 
 class PaymentTransaction(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -187,6 +343,10 @@ class PaymentTransaction(BaseModel):
     currency: str = "eur"
     status: str = "pending"
     payment_status: str = "pending"
+    # Euros to ``currency`` when the session was opened; order totals stay in euros
+    exchange_rate: float = 1.0
+    # Stripe's page for the session, handed out again while it can be paid
+    url: Optional[str] = None
     metadata: Dict = {}
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
@@ -194,6 +354,61 @@ class PaymentTransaction(BaseModel):
 class CheckoutRequest(BaseModel):
     order_id: str
     origin_url: str
+    currency: str = "eur"
+
+class PromotionCreate(BaseModel):
+    name: str
+    # Customers enter the code; without one the promotion applies by itself
+    code: Optional[str] = None
+    kind: Literal["percent", "fixed", "buy_x_get_y"]
+    value: float = Field(gt=0)
+    product_ids: List[str] = []
+    category_ids: List[str] = []
+    buy_quantity: int = Field(0, ge=0)
+    get_quantity: int = Field(0, ge=0)
+    min_subtotal: float = Field(0.0, ge=0)
+    starts_at: Optional[datetime] = None
+    ends_at: Optional[datetime] = None
+    max_uses: Optional[int] = Field(None, ge=1)
+    active: bool = True
+
+    @model_validator(mode="after")
+    def check_rule(self):
+        if self.kind != "fixed" and self.value > 100:
+            raise ValueError(f"{self.kind} value is a percentage, at most 100")
+        if self.kind == "buy_x_get_y" and (self.buy_quantity < 1 or self.get_quantity < 1):
+            raise ValueError("buy_x_get_y requires buy_quantity and get_quantity")
+        if self.starts_at and self.ends_at and self.ends_at <= self.starts_at:
+            raise ValueError("ends_at must be after starts_at")
+        if self.code is not None:
+            self.code = promotions.normalize_code(self.code) or None
+        return self
+
+class Promotion(PromotionCreate):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    uses: int = 0
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+class ShippingBand(BaseModel):
+    max_kg: float = Field(gt=0)
+    price: float = Field(ge=0)
+
+class ShippingZoneCreate(BaseModel):
+    name: str
+    # Postcode prefixes; "" matches every postcode
+    postcodes: List[str] = Field(min_length=1)
+    bands: List[ShippingBand] = Field(min_length=1)
+    per_kg_over: float = Field(0.0, ge=0)
+    bulky_fee: float = Field(0.0, ge=0)
+
+class ShippingZone(ShippingZoneCreate):
+    id: str
+
+class ShippingQuoteRequest(BaseModel):
+    postcode: str
+    # Either a cart or loose items, e.g. from a product page
+    cart_session_id: Optional[str] = None
+    items: List[CartItem] = []
 
 class ContactMessage(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -241,7 +456,7 @@ async def register(data: UserRegister):
         }
     }
 
-@api_router.post("/auth/login")
+@api_router.post("/auth/login", dependencies=[Depends(rate_limit("login", "login_rate_limit"))])
 async def login(data: UserLogin):
     user = await db.users.find_one({"email": data.email.lower()})
     if not user:
@@ -270,25 +485,27 @@ async def get_me(user: Dict = Depends(require_auth)):
 @api_router.put("/auth/profile")
 async def update_profile(data: UserUpdate, user: Dict = Depends(require_auth)):
     update_data = {k: v for k, v in data.model_dump().items() if v is not None}
-    if update_data:
-        await db.users.update_one({"id": user["id"]}, {"$set": update_data})
-    
-    updated_user = await db.users.find_one({"id": user["id"]}, {"_id": 0, "password": 0})
+    updated_user = await user_repository.update_profile(user["id"], update_data)
     return updated_user
 
 @api_router.get("/auth/orders")
-async def get_my_orders(user: Dict = Depends(require_auth)):
+async def get_my_orders(user: Dict = Depends(require_auth), include_archived: bool = False):
     orders = await db.orders.find(
         {"user_id": user["id"]}, 
         {"_id": 0}
     ).sort("created_at", -1).to_list(100)
+    if include_archived and len(orders) < 100:
+        orders += await load_archived_orders({"user_id": user["id"]}, 100 - len(orders))
     return orders
 
 # ============== CATEGORIES ==============
 
 @api_router.get("/categories", response_model=List[Category])
 async def get_categories():
-    categories = await db.categories.find({}, {"_id": 0}).to_list(100)
+    categories = await cache.get("catalog:categories")
+    if categories is None:
+        categories = await catalog_source().categories.find({}, {"_id": 0}).to_list(100)
+        await cache.set("catalog:categories", categories, get_settings().catalog_cache_ttl)
     return categories
 
 @api_router.post("/categories", response_model=Category)
@@ -296,26 +513,59 @@ async def create_category(category: Category):
     doc = category.model_dump()
     doc['created_at'] = doc['created_at'].isoformat()
     await db.categories.insert_one(doc)
+    await changelog.record(db, changelog.CATEGORY, [category.id])
+    await cache.invalidate("catalog")
     return category
 
 # ============== PRODUCTS ==============
 
-@api_router.get("/products", response_model=List[Product])
+def with_prices(product: Dict) -> Dict:
+    return {**product, "prices": exchange_rates.prices(product["price"])}
+
+@api_router.get("/products", response_model=List[CatalogProduct])
 async def get_products(category_id: Optional[str] = None, featured: Optional[bool] = None):
+    cache_key = f"catalog:products:{category_id or '*'}:{featured}"
+    products = await cache.get(cache_key)
+    if products is not None:
+        return products
+    
     query = {}
     if category_id:
         query["category_id"] = category_id
     if featured is not None:
         query["featured"] = featured
-    products = await db.products.find(query, {"_id": 0}).to_list(1000)
+    # Cached with their prices, which are dropped with the rest of the
+    # catalog namespace when the exchange rates change
+    products = [with_prices(p) for p in await catalog_source().products.find(query, {"_id": 0}).to_list(1000)]
+    await cache.set(cache_key, products, get_settings().catalog_cache_ttl)
     return products
 
-@api_router.get("/products/{product_id}", response_model=Product)
+@api_router.get("/products/{product_id}", response_model=CatalogProduct)
 async def get_product(product_id: str):
-    product = await db.products.find_one({"id": product_id}, {"_id": 0})
+    product = await catalog_source().products.find_one({"id": product_id}, {"_id": 0})
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
-    return product
+    return with_prices(product)
+
+@api_router.get("/products/{product_id}/related")
+async def get_related_products(product_id: str, limit: int = Query(8, ge=1, le=MAX_RELATED)):
+    # Served from the per-worker index, no database round trip
+    related = related_products.related(product_id, limit)
+    if related is None:
+        raise HTTPException(status_code=404, detail="Product not found")
+    return [with_prices(p) for p in related]
+
+async def refresh_related(namespace: str):
+    # Not awaited: the write that invalidated the catalog should not wait for it
+    if db.connected:
+        related_products.reload_catalog(db)
+
+cache.on_invalidate("catalog", refresh_related)
+
+def index_paid_order(payload: Dict):
+    related_products.add_basket(payload["product_ids"])
+
+events.on(ORDER_PAID_TOPIC, index_paid_order)
 
 @api_router.post("/products", response_model=Product)
 async def create_product(product_data: ProductCreate):
@@ -323,39 +573,224 @@ async def create_product(product_data: ProductCreate):
     doc = product.model_dump()
     doc['created_at'] = doc['created_at'].isoformat()
     await db.products.insert_one(doc)
+    await changelog.record(db, changelog.PRODUCT, [product.id])
+    await cache.invalidate("catalog")
     return product
 
+def version_conflict(e: VersionConflict) -> HTTPException:
+    return HTTPException(
+        status_code=409,
+        detail={"message": "Product was modified by someone else", "current_version": e.current_version},
+    )
+
 @api_router.put("/products/{product_id}", response_model=Product)
-async def update_product(product_id: str, product_data: ProductCreate):
-    existing = await db.products.find_one({"id": product_id})
-    if not existing:
+async def update_product(product_id: str, product_data: ProductUpdate):
+    update_data = product_data.model_dump(exclude={"version"})
+    try:
+        updated = await product_repository.update(product_id, update_data, expected_version=product_data.version)
+    except VersionConflict as e:
+        raise version_conflict(e)
+    if not updated:
         raise HTTPException(status_code=404, detail="Product not found")
     
-    update_data = product_data.model_dump()
-    await db.products.update_one({"id": product_id}, {"$set": update_data})
-    
-    updated = await db.products.find_one({"id": product_id}, {"_id": 0})
+    await changelog.record(db, changelog.PRODUCT, [product_id])
+    await cache.invalidate("catalog")
     return updated
 
 @api_router.delete("/products/{product_id}")
-async def delete_product(product_id: str):
-    result = await db.products.delete_one({"id": product_id})
-    if result.deleted_count == 0:
+async def delete_product(product_id: str, version: Optional[int] = None):
+    try:
+        deleted = await product_repository.delete(product_id, expected_version=version)
+    except VersionConflict as e:
+        raise version_conflict(e)
+    if not deleted:
         raise HTTPException(status_code=404, detail="Product not found")
+    await changelog.record(db, changelog.PRODUCT, [product_id], deleted=True)
+    await cache.invalidate("catalog")
     return {"message": "Product deleted"}
 
+@api_router.post("/products/bulk")
+async def bulk_products(request_data: BulkProductRequest):
+    # Items are validated one by one so a bad entry is reported instead of
+    # rejecting the whole batch; with ordered=True nothing after it is written
+    results: List[Dict] = []
+    valid = []
+    for index, raw in enumerate(request_data.operations):
+        if request_data.ordered and any(r["status"] == "invalid" for r in results):
+            results.append({"index": index, "op": raw.get("op"), "id": raw.get("id"), "status": "skipped"})
+            continue
+        try:
+            operation = BulkProductOperation(**raw)
+        except ValidationError as e:
+            errors = "; ".join(err["msg"] for err in e.errors())
+            results.append({"index": index, "op": raw.get("op"), "id": raw.get("id"), "status": "invalid", "error": errors})
+            continue
+        if operation.op == "upsert" and not operation.id:
+            operation.id = str(uuid.uuid4())
+        results.append({"index": index, "op": operation.op, "id": operation.id, "status": "pending"})
+        valid.append((index, operation))
+    
+    if not valid:
+        return {"ok": False, "results": results}
+    
+    # One read tells apart created/updated and reports missing ids per item
+    ids = list({operation.id for _, operation in valid})
+    existing = {doc["id"] for doc in await db.products.find({"id": {"$in": ids}}, {"_id": 0, "id": 1}).to_list(None)}
+    
+    writes = []
+    write_items = []
+    now = datetime.now(timezone.utc).isoformat()
+    for index, operation in valid:
+        result = results[index]
+        if operation.op == "upsert":
+            writes.append(UpdateOne(
+                {"id": operation.id},
+                {
+                    "$set": operation.product.model_dump(),
+                    "$setOnInsert": {"id": operation.id, "created_at": now},
+                    "$inc": {"version": 1},
+                },
+                upsert=True,
+            ))
+            result["status"] = "updated" if operation.id in existing else "created"
+            existing.add(operation.id)
+        elif operation.id not in existing:
+            result["status"] = "not_found"
+            continue
+        elif operation.op == "patch":
+            writes.append(UpdateOne(
+                {"id": operation.id},
+                {"$set": operation.patch.model_dump(exclude_none=True), "$inc": {"version": 1}},
+            ))
+            result["status"] = "updated"
+        else:
+            writes.append(DeleteOne({"id": operation.id}))
+            result["status"] = "deleted"
+            existing.discard(operation.id)
+        write_items.append(result)
+    
+    ok = True
+    if writes:
+        try:
+            await db.products.bulk_write(writes, ordered=request_data.ordered)
+        except BulkWriteError as e:
+            ok = False
+            failed = {err["index"]: err.get("errmsg", "write error") for err in e.details.get("writeErrors", [])}
+            first_failure = min(failed) if failed else len(write_items)
+            for position, result in enumerate(write_items):
+                if position in failed:
+                    result["status"] = "error"
+                    result["error"] = failed[position]
+                elif request_data.ordered and position > first_failure:
+                    result["status"] = "skipped"
+        written = [r for r in write_items if r["status"] in ("created", "updated", "deleted")]
+        await changelog.record(db, changelog.PRODUCT, [r["id"] for r in written if r["status"] != "deleted"])
+        await changelog.record(db, changelog.PRODUCT, [r["id"] for r in written if r["status"] == "deleted"], deleted=True)
+        # Invalidated once for the whole batch, not per item
+        await cache.invalidate("catalog")
+    
+    ok = ok and all(r["status"] not in ("invalid", "error", "skipped", "not_found") for r in results)
+    return {"ok": ok, "results": results}
+
+# ============== CATALOG CHANGES ==============
+
+@api_router.get("/catalog/changes")
+async def catalog_changes(since: int = Query(0, ge=0), limit: int = Query(changelog.MAX_PAGE, ge=1, le=changelog.MAX_PAGE)):
+    # since=0 lists the whole catalog; afterwards clients pass the returned
+    # version back and get only what changed, deletions as tombstones
+    try:
+        return await changelog.changes_since(db, since, limit)
+    except changelog.ResyncRequired as e:
+        raise HTTPException(
+            status_code=410,
+            detail={"message": "Changes are no longer available, sync again from version 0", "floor": e.floor},
+        )
+
+# ============== STOREFRONT ==============
+
+async def cache_home_payloads() -> Dict[str, Dict]:
+    payloads = await build_home_payloads(catalog_source(), exchange_rates.prices)
+    for lang, payload in payloads.items():
+        await cache.set(f"catalog:storefront:home:{lang}", payload, get_settings().catalog_cache_ttl)
+    return payloads
+
+async def refresh_storefront(namespace: str):
+    # Rebuilt right after a catalog change so the homepage never waits for it
+    if db.connected:
+        await cache_home_payloads()
+
+cache.on_invalidate("catalog", refresh_storefront)
+
+@api_router.get("/storefront/home")
+async def storefront_home(request: Request, lang: Optional[str] = None):
+    lang = negotiate_language(lang, request.headers.get("Accept-Language"))
+    payload = await cache.get(f"catalog:storefront:home:{lang}")
+    if payload is None:
+        payload = (await cache_home_payloads())[lang]
+    return payload
+
+# ============== CURRENCIES ==============
+
+async def publish_rates():
+    # Every worker refreshes the rates on its own timer, so they tend to load a
+    # new table together: only the first to claim it invalidates the catalog
+    table = json.dumps(exchange_rates.rates, sort_keys=True)
+    claim = f"exchange-rates:claim:{hashlib.sha256(table.encode()).hexdigest()}"
+    if await cache.incr(claim, RATES_CLAIM_TTL) > 1:
+        return
+    shared = {"rates": exchange_rates.rates, "updated_at": exchange_rates.updated_at.isoformat()}
+    await cache.set(SHARED_RATES_KEY, shared)
+    await cache.invalidate("catalog")
+
+@api_router.get("/currencies")
+async def get_currencies():
+    # Rates from the euro; catalog responses carry the converted prices
+    return exchange_rates.describe()
+
+def checkout_currency(code: str) -> str:
+    code = code.strip().lower()
+    if code not in exchange_rates.rates:
+        raise HTTPException(status_code=422, detail=f"Currency {code!r} is not available")
+    return code
+
+# ============== FEEDS ==============
+
+@api_router.get("/feeds/{filename}")
+async def get_feed_file(filename: str, request: Request):
+    # Written by `python feeds.py`; served from disk, never built per request
+    published = feeds.published_file(Path(get_settings().feeds_dir), filename)
+    if published is None:
+        raise HTTPException(status_code=404, detail="Feed not found")
+    path, etag = published
+    # Weak comparison: compression turns the ETag of the small index files into W/"..."
+    if etag in [t.strip().removeprefix("W/") for t in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers={"ETag": etag})
+    media_type = "application/gzip" if filename.endswith(".gz") else "application/xml"
+    return FileResponse(path, media_type=media_type, headers={"ETag": etag})
+
 # ============== CART ==============
 
+def edit_cart(cart: Dict, items: List[Dict]) -> Dict:
+    # Every edit is a new cart version; an order already created from the
+    # previous version no longer locks the cart
+    return {
+        **cart,
+        "items": items,
+        "order_id": None,
+        "updated_at": datetime.now(timezone.utc).isoformat(),
+        "version": cart.get("version", 0) + 1,
+    }
+
 @api_router.get("/cart/{session_id}")
 async def get_cart(session_id: str):
-    cart = await db.carts.find_one({"session_id": session_id}, {"_id": 0})
+    cart = await cart_store.get(session_id)
     if not cart:
         return {"session_id": session_id, "items": [], "products": []}
     
     # Get product details for cart items
     products = []
     for item in cart.get("items", []):
-        product = await db.products.find_one({"id": item["product_id"]}, {"_id": 0})
+        product = await catalog_db.products.find_one({"id": item["product_id"]}, {"_id": 0})
         if product:
             products.append({**product, "quantity": item["quantity"]})
     
@@ -363,13 +798,13 @@ async def get_cart(session_id: str):
 
 @api_router.post("/cart/{session_id}/add")
 async def add_to_cart(session_id: str, item: CartItem):
-    cart = await db.carts.find_one({"session_id": session_id})
+    cart = await cart_store.get(session_id)
     
     if not cart:
         cart = Cart(session_id=session_id, items=[item]).model_dump()
         cart['created_at'] = cart['created_at'].isoformat()
         cart['updated_at'] = cart['updated_at'].isoformat()
-        await db.carts.insert_one(cart)
+        await cart_store.save(cart)
     else:
         items = cart.get("items", [])
         found = False
@@ -381,16 +816,13 @@ async def add_to_cart(session_id: str, item: CartItem):
         if not found:
             items.append(item.model_dump())
         
-        await db.carts.update_one(
-            {"session_id": session_id},
-            {"$set": {"items": items, "updated_at": datetime.now(timezone.utc).isoformat()}}
-        )
+        await cart_store.save(edit_cart(cart, items))
     
     return {"message": "Item added to cart"}
 
 @api_router.post("/cart/{session_id}/update")
 async def update_cart_item(session_id: str, item: CartItem):
-    cart = await db.carts.find_one({"session_id": session_id})
+    cart = await cart_store.get(session_id)
     if not cart:
         raise HTTPException(status_code=404, detail="Cart not found")
     
@@ -403,163 +835,341 @@ async def update_cart_item(session_id: str, item: CartItem):
                 items[i]["quantity"] = item.quantity
             break
     
-    await db.carts.update_one(
-        {"session_id": session_id},
-        {"$set": {"items": items, "updated_at": datetime.now(timezone.utc).isoformat()}}
-    )
+    await cart_store.save(edit_cart(cart, items))
     
     return {"message": "Cart updated"}
 
 @api_router.delete("/cart/{session_id}/item/{product_id}")
 async def remove_from_cart(session_id: str, product_id: str):
-    cart = await db.carts.find_one({"session_id": session_id})
+    cart = await cart_store.get(session_id)
     if not cart:
         raise HTTPException(status_code=404, detail="Cart not found")
     
     items = [item for item in cart.get("items", []) if item["product_id"] != product_id]
     
-    await db.carts.update_one(
-        {"session_id": session_id},
-        {"$set": {"items": items, "updated_at": datetime.now(timezone.utc).isoformat()}}
-    )
+    await cart_store.save(edit_cart(cart, items))
     
     return {"message": "Item removed from cart"}
 
 @api_router.delete("/cart/{session_id}")
 async def clear_cart(session_id: str):
-    await db.carts.delete_one({"session_id": session_id})
+    await cart_store.delete(session_id)
     return {"message": "Cart cleared"}
 
 # ============== ORDERS ==============
 
-@api_router.post("/orders", response_model=Order)
-async def create_order(order_data: OrderCreate, user: Optional[Dict] = Depends(get_current_user)):
-    # Get cart
-    cart = await db.carts.find_one({"session_id": order_data.cart_session_id})
+async def load_cart(cart_session_id: str) -> Dict:
+    # Orders are priced and claimed against MongoDB, so write the cart's
+    # pending edits there first
+    await cart_store.flush([cart_session_id])
+    cart = await cart_db.carts.find_one({"session_id": cart_session_id}, {"_id": 0})
     if not cart or not cart.get("items"):
         raise HTTPException(status_code=400, detail="Cart is empty")
-    
-    # Calculate total and get product details
+    return cart
+
+async def price_cart(cart: Dict):
+    # Price the items and return the products with them for the shipping
+    # quote (one query for all products)
+    product_ids = [item["product_id"] for item in cart["items"]]
+    products = {
+        p["id"]: p
+        for p in await db.products.find({"id": {"$in": product_ids}}, {"_id": 0}).to_list(None)
+    }
     items = []
-    total = 0.0
     for item in cart.get("items", []):
-        product = await db.products.find_one({"id": item["product_id"]}, {"_id": 0})
+        product = products.get(item["product_id"])
         if product:
             item_total = product["price"] * item["quantity"]
-            total += item_total
             items.append({
                 "product_id": product["id"],
                 "name_fr": product["name_fr"],
                 "name_tr": product["name_tr"],
                 "name_en": product["name_en"],
+                "category_id": product.get("category_id"),
                 "price": product["price"],
                 "quantity": item["quantity"],
                 "subtotal": item_total
             })
-    
-    order = Order(
+    return items, products
+
+def quote_shipping(postcode: str, items: List[Dict], products: Dict[str, Dict]) -> Dict:
+    try:
+        return shipping_rates.quote(postcode, shipping.cart_lines(items, products))
+    except shipping.NoDelivery as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+def build_order(order_data: OrderCreate, user: Optional[Dict], cart: Dict, pricing: Dict, quote: Dict,
+                postcode: Optional[str]) -> Order:
+    return Order(
         user_id=user["id"] if user else None,
         customer_name=order_data.customer_name,
         customer_email=order_data.customer_email,
         customer_phone=order_data.customer_phone,
         customer_address=order_data.customer_address,
-        items=items,
-        total=total
+        customer_postcode=postcode,
+        items=pricing["items"],
+        subtotal=pricing["subtotal"],
+        discount=pricing["discount"],
+        promotions=pricing["promotions"],
+        shipping=quote["price"],
+        shipping_zone=quote["zone"],
+        total=round(pricing["total"] + quote["price"], 2),
+        cart_session_id=cart["session_id"],
+        cart_version=cart.get("version", 0),
+        language=negotiate_language(order_data.language, None)
     )
-    
-    doc = order.model_dump()
+
+async def finalize_order(order_data: OrderCreate, user: Optional[Dict]) -> Dict:
+    # One order per cart version: double clicks, retries and parallel requests
+    # all get the order created first
+    cart = await load_cart(order_data.cart_session_id)
+    existing = await order_repository.find_for_cart(cart["session_id"], cart.get("version", 0))
+    if existing is not None:
+        return existing
+    items, products = await price_cart(cart)
+    postcode = order_data.customer_postcode or shipping.postcode_in(order_data.customer_address)
+    # Quoted before promotion uses are taken, so an undeliverable order takes none
+    quote = quote_shipping(postcode or "", items, products)
+    try:
+        pricing, used = await promotions.price_order(promotion_engine, db, items, order_data.promo_code)
+    except promotions.InvalidCode as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    doc = build_order(order_data, user, cart, pricing, quote, postcode).model_dump()
     doc['created_at'] = doc['created_at'].isoformat()
-    await db.orders.insert_one(doc)
-    
+    # Confirmation emails are queued with the order, in the same transaction
+    messages = outbox.order_messages(outbox.ORDER_CREATED, doc["id"], get_settings().shop_email)
+    try:
+        order = await order_repository.create_from_cart(doc, messages)
+    except CartChanged:
+        await promotions.release(db, used)
+        raise HTTPException(status_code=409, detail="Cart changed while the order was being placed")
+    except Exception:
+        await promotions.release(db, used)
+        raise
+    if order["id"] != doc["id"]:
+        # A parallel request created the order for this cart version first
+        await promotions.release(db, used)
     return order
 
+@api_router.get("/cart/{session_id}/pricing")
+async def get_cart_pricing(session_id: str, promo_code: Optional[str] = None):
+    # What the order would cost now; uses are only counted when it is placed
+    cart = await cart_store.get(session_id)
+    items, _ = await price_cart(cart) if cart and cart.get("items") else ([], {})
+    try:
+        return promotion_engine.apply(items, promo_code)
+    except promotions.InvalidCode as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+@api_router.post("/shipping/quote")
+async def get_shipping_quote(request_data: ShippingQuoteRequest):
+    if request_data.cart_session_id:
+        cart = await cart_store.get(request_data.cart_session_id) or {"items": []}
+    else:
+        cart = {"items": [item.model_dump() for item in request_data.items]}
+    items, products = await price_cart(cart) if cart["items"] else ([], {})
+    return quote_shipping(request_data.postcode, items, products)
+
+@api_router.post("/orders", response_model=Order)
+async def create_order(order_data: OrderCreate, user: Optional[Dict] = Depends(get_current_user)):
+    return await finalize_order(order_data, user)
+
+async def load_archived_orders(query: Dict, limit: int) -> List[Dict]:
+    # Stubs say which month's Parquet files hold each order; always older
+    # than anything still in the orders collection
+    stubs = await db.archived_orders.find(query, {"_id": 0}).sort("created_at", -1).to_list(limit)
+    if not stubs:
+        return []
+    # Imported on first use so startup does not pay for pyarrow
+    import archive
+    return await archive.load_orders(Path(get_settings().archive_dir), stubs)
+
 @api_router.get("/orders/{order_id}", response_model=Order)
 async def get_order(order_id: str):
-    order = await db.orders.find_one({"id": order_id}, {"_id": 0})
+    order = await payment_db.orders.find_one({"id": order_id}, {"_id": 0})
+    if not order:
+        archived = await load_archived_orders({"id": order_id}, 1)
+        order = archived[0] if archived else None
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     return order
 
 @api_router.get("/orders")
-async def get_all_orders():
+async def get_all_orders(include_archived: bool = False):
     orders = await db.orders.find({}, {"_id": 0}).to_list(1000)
+    if include_archived and len(orders) < 1000:
+        orders += await load_archived_orders({}, 1000 - len(orders))
     return orders
 
 # ============== STRIPE PAYMENT ==============
 
-@api_router.post("/checkout/session")
-async def create_checkout_session(request: Request, checkout_data: CheckoutRequest):
-    if not STRIPE_API_KEY:
+def get_stripe_checkout(request: Request) -> "StripeCheckout":
+    stripe_api_key = get_settings().stripe_api_key
+    if not stripe_api_key:
         raise HTTPException(status_code=500, detail="Stripe not configured")
     
-    # Get order
-    order = await db.orders.find_one({"id": checkout_data.order_id}, {"_id": 0})
-    if not order:
-        raise HTTPException(status_code=404, detail="Order not found")
+    # Imported on first use so startup does not pay for the payments SDK
+    from emergentintegrations.payments.stripe.checkout import StripeCheckout
     
-    # Initialize Stripe
     host_url = str(request.base_url).rstrip('/')
     webhook_url = f"{host_url}/api/webhook/stripe"
-    stripe_checkout = StripeCheckout(api_key=STRIPE_API_KEY, webhook_url=webhook_url)
+    return StripeCheckout(api_key=stripe_api_key, webhook_url=webhook_url)
+
+def build_stripe_request(order: Dict, origin_url: str, currency: str = "eur"):
+    from emergentintegrations.payments.stripe.checkout import CheckoutSessionRequest
     
     # Build URLs from origin
-    origin = checkout_data.origin_url.rstrip('/')
-    success_url = f"{origin}/order-success?session_id={{CHECKOUT_SESSION_ID}}"
-    cancel_url = f"{origin}/checkout"
-    
-    # Create checkout session (amount in EUR)
-    checkout_request = CheckoutSessionRequest(
-        amount=float(order["total"]),
-        currency="eur",
-        success_url=success_url,
-        cancel_url=cancel_url,
+    origin = origin_url.rstrip('/')
+    return CheckoutSessionRequest(
+        amount=exchange_rates.convert(float(order["total"]), currency),
+        currency=currency,
+        success_url=f"{origin}/order-success?session_id={{CHECKOUT_SESSION_ID}}",
+        cancel_url=f"{origin}/checkout",
         metadata={
-            "order_id": checkout_data.order_id,
+            "order_id": order["id"],
             "customer_email": order["customer_email"]
         }
     )
-    
-    session: CheckoutSessionResponse = await stripe_checkout.create_checkout_session(checkout_request)
-    
-    # Create payment transaction record
+
+def build_payment_doc(order: Dict, session_id: str, currency: str = "eur", url: Optional[str] = None) -> Dict:
     payment = PaymentTransaction(
-        session_id=session.session_id,
-        order_id=checkout_data.order_id,
-        amount=float(order["total"]),
-        currency="eur",
+        session_id=session_id,
+        order_id=order["id"],
+        amount=exchange_rates.convert(float(order["total"]), currency),
+        currency=currency,
+        exchange_rate=exchange_rates.rates[currency],
+        url=url,
         status="pending",
         payment_status="pending",
-        metadata={"order_id": checkout_data.order_id}
+        metadata={"order_id": order["id"]}
     )
-    
     payment_doc = payment.model_dump()
     payment_doc['created_at'] = payment_doc['created_at'].isoformat()
     payment_doc['updated_at'] = payment_doc['updated_at'].isoformat()
-    await db.payment_transactions.insert_one(payment_doc)
+    return payment_doc
+
+async def expire_payment_session(stripe_checkout: "StripeCheckout", session_id: str) -> bool:
+    """Expires an open Stripe session; False if it has been paid instead."""
+    # The payments SDK cannot expire sessions, the Stripe library it wraps can
+    import stripe
+
+    try:
+        await asyncio.to_thread(stripe.checkout.Session.expire, session_id, api_key=get_settings().stripe_api_key)
+        return True
+    except stripe.error.StripeError as e:
+        # Only open sessions can be expired: find out what became of this one
+        status = await sync_payment_status(stripe_checkout, session_id)
+        if status.get("payment_status") == "paid":
+            return False
+        if status.get("status") == "expired":
+            return True
+        raise HTTPException(status_code=502, detail="Could not close the previous payment session") from e
+
+async def open_payment_session(stripe_checkout: "StripeCheckout", order: Dict, origin_url: str, currency: str):
+    # At most one session per order can be paid: an open one for the same
+    # amount is returned as is, others are expired before a new one is opened
+    try:
+        return await payments.open_session(
+            payment_db,
+            order["id"],
+            exchange_rates.convert(float(order["total"]), currency),
+            currency,
+            create=lambda: stripe_checkout.create_checkout_session(build_stripe_request(order, origin_url, currency)),
+            expire=lambda session_id: expire_payment_session(stripe_checkout, session_id),
+            payment_doc=lambda session: build_payment_doc(order, session.session_id, currency, url=session.url),
+        )
+    except payments.SessionPaid:
+        raise HTTPException(status_code=409, detail="Order already paid")
+    except idempotency.IdempotencyInProgress:
+        raise HTTPException(status_code=409, detail="Checkout already in progress")
+
+@api_router.post("/checkout")
+async def checkout(
+    request: Request,
+    checkout_data: CheckoutCreate,
+    user: Optional[Dict] = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+):
+    # Prices the cart, opens the Stripe session and records order and payment
+    # in one call; a retried Idempotency-Key gets the first response back
+    stripe_checkout = get_stripe_checkout(request)
+    currency = checkout_currency(checkout_data.currency)
+    if idempotency_key:
+        request_fingerprint = idempotency.fingerprint({**checkout_data.model_dump(), "user_id": user["id"] if user else None})
+        try:
+            previous = await idempotency.claim(payment_db, "checkout", idempotency_key, request_fingerprint)
+        except idempotency.IdempotencyInProgress:
+            raise HTTPException(status_code=409, detail="Checkout already in progress")
+        except idempotency.IdempotencyMismatch:
+            raise HTTPException(status_code=422, detail="Idempotency-Key reused with a different request")
+        if previous is not None:
+            return previous
     
-    # Update order with payment session id
-    await db.orders.update_one(
-        {"id": checkout_data.order_id},
-        {"$set": {"payment_session_id": session.session_id}}
-    )
+    try:
+        order_doc = await finalize_order(checkout_data, user)
+        if order_doc["status"] == "paid":
+            raise HTTPException(status_code=409, detail="Order already paid")
+        
+        # The order may be the one created for this cart version by an
+        # earlier attempt, with a session of its own
+        session_id, url = await open_payment_session(stripe_checkout, order_doc, checkout_data.origin_url, currency)
+        order_doc["payment_session_id"] = session_id
+        response = {"order": order_doc, "url": url, "session_id": session_id}
+    except Exception:
+        if idempotency_key:
+            await idempotency.release(payment_db, "checkout", idempotency_key)
+        raise
     
-    return {"url": session.url, "session_id": session.session_id}
+    if idempotency_key:
+        await idempotency.complete(payment_db, "checkout", idempotency_key, response)
+    return response
+
+@api_router.post("/checkout/session")
+async def create_checkout_session(request: Request, checkout_data: CheckoutRequest):
+    stripe_checkout = get_stripe_checkout(request)
+    currency = checkout_currency(checkout_data.currency)
+    
+    # Get order
+    order = await payment_db.orders.find_one({"id": checkout_data.order_id}, {"_id": 0})
+    if not order:
+        raise HTTPException(status_code=404, detail="Order not found")
+    if order["status"] == "paid":
+        raise HTTPException(status_code=409, detail="Order already paid")
+    
+    # In the customer's currency at today's rate
+    session_id, url = await open_payment_session(stripe_checkout, order, checkout_data.origin_url, currency)
+    return {"url": url, "session_id": session_id}
+
+async def mark_order_paid(order_id: str):
+    # Webhook and status checks race for the same order; only the request that
+    # flips it to paid adds it to the sales rollups, in the same transaction
+    paid_at = datetime.now(timezone.utc).isoformat()
+    messages = outbox.order_messages(outbox.ORDER_PAID, order_id, get_settings().shop_email)
+    order = await order_repository.mark_paid(order_id, paid_at, messages)
+    if order is not None:
+        await events.publish(ORDER_PAID_TOPIC, {
+            "order_id": order_id,
+            "product_ids": [item["product_id"] for item in order.get("items", [])]
+        })
+
+def payment_topic(session_id: str) -> str:
+    return f"payment:{session_id}"
+
+def payment_is_final(status: Dict) -> bool:
+    return status.get("payment_status") == "paid" or status.get("status") == "expired"
 
 @api_router.get("/checkout/status/{session_id}")
 async def get_checkout_status(request: Request, session_id: str):
-    if not STRIPE_API_KEY:
-        raise HTTPException(status_code=500, detail="Stripe not configured")
-    
+    stripe_checkout = get_stripe_checkout(request)
+    return await sync_payment_status(stripe_checkout, session_id)
+
+async def sync_payment_status(stripe_checkout: "StripeCheckout", session_id: str) -> Dict:
     # Check if already processed
-    payment = await db.payment_transactions.find_one({"session_id": session_id}, {"_id": 0})
+    payment = await payment_db.payment_transactions.find_one({"session_id": session_id}, {"_id": 0})
     if payment and payment.get("payment_status") == "paid":
         return payment
     
-    # Initialize Stripe and get status
-    host_url = str(request.base_url).rstrip('/')
-    webhook_url = f"{host_url}/api/webhook/stripe"
-    stripe_checkout = StripeCheckout(api_key=STRIPE_API_KEY, webhook_url=webhook_url)
-    
+    # Get status from Stripe
     checkout_status: CheckoutStatusResponse = await stripe_checkout.get_checkout_status(session_id)
     
     # Update payment transaction
@@ -569,7 +1179,7 @@ async def get_checkout_status(request: Request, session_id: str):
         "updated_at": datetime.now(timezone.utc).isoformat()
     }
     
-    await db.payment_transactions.update_one(
+    await payment_db.payment_transactions.update_one(
         {"session_id": session_id},
         {"$set": update_data}
     )
@@ -577,27 +1187,62 @@ async def get_checkout_status(request: Request, session_id: str):
     # If paid, update order status
     if checkout_status.payment_status == "paid":
         if payment:
-            await db.orders.update_one(
-                {"id": payment["order_id"]},
-                {"$set": {"status": "paid"}}
-            )
+            await mark_order_paid(payment["order_id"])
     
-    return {
+    status = {
         "session_id": session_id,
         "status": checkout_status.status,
         "payment_status": checkout_status.payment_status,
         "amount_total": checkout_status.amount_total,
         "currency": checkout_status.currency
     }
+    if payment_is_final(status):
+        await events.publish(payment_topic(session_id), status)
+    return status
+
+def sse_message(data: Dict, event: str = "status") -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+@api_router.get("/checkout/status/{session_id}/stream")
+async def stream_checkout_status(request: Request, session_id: str):
+    # One connection per waiting customer instead of a poll every 2 s: Stripe is
+    # asked once here, then the webhook (on any worker) pushes the final status
+    stripe_checkout = get_stripe_checkout(request)
+    topic = payment_topic(session_id)
+    waiter = events.subscribe(topic)
+    try:
+        status = await sync_payment_status(stripe_checkout, session_id)
+    except Exception:
+        events.unsubscribe(topic, waiter)
+        raise
+    
+    async def stream():
+        try:
+            yield sse_message(status)
+            if payment_is_final(status):
+                return
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + PAYMENT_STREAM_TIMEOUT
+            while True:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    yield sse_message({"session_id": session_id}, event="timeout")
+                    return
+                try:
+                    final = await asyncio.wait_for(asyncio.shield(waiter), timeout=min(PAYMENT_STREAM_HEARTBEAT, remaining))
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield sse_message(final)
+                return
+        finally:
+            events.unsubscribe(topic, waiter)
+    
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={"X-Accel-Buffering": "no"})
 
 @api_router.post("/webhook/stripe")
 async def stripe_webhook(request: Request):
-    if not STRIPE_API_KEY:
-        raise HTTPException(status_code=500, detail="Stripe not configured")
-    
-    host_url = str(request.base_url).rstrip('/')
-    webhook_url = f"{host_url}/api/webhook/stripe"
-    stripe_checkout = StripeCheckout(api_key=STRIPE_API_KEY, webhook_url=webhook_url)
+    stripe_checkout = get_stripe_checkout(request)
     
     body = await request.body()
     signature = request.headers.get("Stripe-Signature")
@@ -607,7 +1252,7 @@ async def stripe_webhook(request: Request):
         
         if webhook_response.payment_status == "paid":
             # Update payment transaction
-            await db.payment_transactions.update_one(
+            await payment_db.payment_transactions.update_one(
                 {"session_id": webhook_response.session_id},
                 {"$set": {
                     "status": "complete",
@@ -618,16 +1263,140 @@ async def stripe_webhook(request: Request):
             
             # Update order
             if webhook_response.metadata and webhook_response.metadata.get("order_id"):
-                await db.orders.update_one(
-                    {"id": webhook_response.metadata["order_id"]},
-                    {"$set": {"status": "paid"}}
-                )
+                await mark_order_paid(webhook_response.metadata["order_id"])
+            
+            await events.publish(payment_topic(webhook_response.session_id), {
+                "session_id": webhook_response.session_id,
+                "status": "complete",
+                "payment_status": "paid"
+            })
         
         return {"status": "success"}
     except Exception as e:
         logger.error(f"Webhook error: {e}")
         raise HTTPException(status_code=400, detail=str(e))
 
+# ============== ADMIN ANALYTICS ==============
+
+@api_router.get("/admin/analytics")
+async def admin_analytics(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    top: int = Query(10, ge=1, le=100),
+):
+    # Read from the daily rollups, never from the orders themselves
+    end = end or datetime.now(timezone.utc).date()
+    start = start or end - timedelta(days=ANALYTICS_DEFAULT_DAYS - 1)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    return await analytics.sales_report(analytics_db, start, end, top)
+
+# ============== ADMIN NOTIFICATIONS ==============
+
+@api_router.get("/admin/outbox")
+async def admin_outbox(request: Request):
+    # Queue state is shared by every process; throughput and lag are this worker's
+    stats = await outbox.queue_stats(db.notification_outbox)
+    worker = request.app.state.outbox_worker
+    stats["worker"] = worker.stats() if worker is not None else None
+    return stats
+
+@api_router.get("/admin/load")
+async def admin_load(request: Request):
+    # This worker's view: loop lag, Mongo pool wait, admission outcomes,
+    # carts waiting to be flushed and log records lost to a full queue
+    return {**request.app.state.load_monitor.stats(), "carts": await cart_store.stats(), "logs": logs.stats()}
+
+# ============== PROMOTIONS ==============
+
+promotion_engine = promotions.PromotionEngine()
+
+async def refresh_promotions(namespace: str):
+    if db.connected:
+        await promotion_engine.load(db)
+
+cache.on_invalidate("promotions", refresh_promotions)
+
+def promotion_doc(promotion: Promotion) -> Dict:
+    doc = promotion.model_dump()
+    for field in ("starts_at", "ends_at", "created_at"):
+        if doc[field] is not None:
+            doc[field] = doc[field].isoformat()
+    return doc
+
+@api_router.get("/admin/promotions", response_model=List[Promotion])
+async def list_promotions(admin: Dict = Depends(require_admin)):
+    return await db.promotions.find({}, {"_id": 0}).sort("created_at", -1).to_list(1000)
+
+@api_router.post("/admin/promotions", response_model=Promotion)
+async def create_promotion(promotion_data: PromotionCreate, admin: Dict = Depends(require_admin)):
+    promotion = Promotion(**promotion_data.model_dump())
+    try:
+        await db.promotions.insert_one(promotion_doc(promotion))
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail="Promotion code already exists")
+    await cache.invalidate("promotions")
+    return promotion
+
+@api_router.put("/admin/promotions/{promotion_id}", response_model=Promotion)
+async def update_promotion(promotion_id: str, promotion_data: PromotionCreate, admin: Dict = Depends(require_admin)):
+    # Replaces the rule; the number of uses so far is kept
+    doc = promotion_doc(Promotion(id=promotion_id, **promotion_data.model_dump()))
+    for field in ("id", "uses", "created_at"):
+        doc.pop(field)
+    try:
+        updated = await db.promotions.find_one_and_update(
+            {"id": promotion_id}, {"$set": doc}, projection={"_id": 0}, return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail="Promotion code already exists")
+    if updated is None:
+        raise HTTPException(status_code=404, detail="Promotion not found")
+    await cache.invalidate("promotions")
+    return updated
+
+@api_router.delete("/admin/promotions/{promotion_id}")
+async def delete_promotion(promotion_id: str, admin: Dict = Depends(require_admin)):
+    result = await db.promotions.delete_one({"id": promotion_id})
+    if result.deleted_count == 0:
+        raise HTTPException(status_code=404, detail="Promotion not found")
+    await cache.invalidate("promotions")
+    return {"message": "Promotion deleted"}
+
+# ============== SHIPPING ZONES ==============
+
+shipping_rates = shipping.ShippingRates()
+
+async def refresh_shipping(namespace: str):
+    if db.connected:
+        await shipping_rates.load(db)
+
+cache.on_invalidate("shipping", refresh_shipping)
+
+@api_router.get("/admin/shipping/zones", response_model=List[ShippingZone])
+async def list_shipping_zones(admin: Dict = Depends(require_admin)):
+    return await db.shipping_zones.find({}, {"_id": 0}).sort("id", 1).to_list(1000)
+
+@api_router.put("/admin/shipping/zones/{zone_id}", response_model=ShippingZone)
+async def put_shipping_zone(zone_id: str, zone_data: ShippingZoneCreate, admin: Dict = Depends(require_admin)):
+    zone = ShippingZone(id=zone_id, **zone_data.model_dump())
+    zone.postcodes = [shipping.normalize_postcode(prefix) for prefix in zone.postcodes]
+    # A postcode prefix belongs to one zone
+    taken = await db.shipping_zones.find_one({"id": {"$ne": zone_id}, "postcodes": {"$in": zone.postcodes}}, {"_id": 0})
+    if taken is not None:
+        raise HTTPException(status_code=409, detail=f"Postcodes already in zone {taken['id']}")
+    await db.shipping_zones.replace_one({"id": zone_id}, zone.model_dump(), upsert=True)
+    await cache.invalidate("shipping")
+    return zone
+
+@api_router.delete("/admin/shipping/zones/{zone_id}")
+async def delete_shipping_zone(zone_id: str, admin: Dict = Depends(require_admin)):
+    result = await db.shipping_zones.delete_one({"id": zone_id})
+    if result.deleted_count == 0:
+        raise HTTPException(status_code=404, detail="Shipping zone not found")
+    await cache.invalidate("shipping")
+    return {"message": "Shipping zone deleted"}
+
 # ============== CONTACT ==============
 
 @api_router.post("/contact", response_model=ContactMessage)
@@ -635,18 +1404,31 @@ async def create_contact_message(message_data: ContactMessageCreate):
     message = ContactMessage(**message_data.model_dump())
     doc = message.model_dump()
     doc['created_at'] = doc['created_at'].isoformat()
-    await db.contact_messages.insert_one(doc)
+    await cart_db.contact_messages.insert_one(doc)
     return message
 
 # ============== SEED DATA ==============
 
 @api_router.post("/seed")
-async def seed_data():
-    # Check if data already exists
-    existing_categories = await db.categories.count_documents({})
-    if existing_categories > 0:
+async def seed_data(request: Request):
+    # Seeding is a migration applied once at deploy or startup, so this is a
+    # no-op unless the worker started with RUN_MIGRATIONS disabled
+    if request.app.state.migrations_current:
         return {"message": "Data already seeded"}
     
+    applied = await run_migrations(db)
+    request.app.state.migrations_current = True
+    if 1 in applied:
+        await cache.invalidate("catalog")
+        return {"message": "Data seeded successfully"}
+    return {"message": "Data already seeded"}
+
+@migration(1, "seed catalog")
+async def seed_catalog(database):
+    # Databases seeded before migrations existed already have the catalog
+    if await database.categories.count_documents({}) > 0:
+        return
+    
     # Create categories
     categories = [
         Category(
@@ -675,10 +1457,12 @@ async def seed_data():
         )
     ]
     
+    docs = []
     for cat in categories:
         doc = cat.model_dump()
         doc['created_at'] = doc['created_at'].isoformat()
-        await db.categories.insert_one(doc)
+        docs.append(doc)
+    await database.categories.insert_many(docs)
     
     # Create products
     products = [
@@ -796,12 +1580,151 @@ async def seed_data():
         )
     ]
     
+    docs = []
     for prod in products:
         doc = prod.model_dump()
         doc['created_at'] = doc['created_at'].isoformat()
-        await db.products.insert_one(doc)
-    
-    return {"message": "Data seeded successfully", "categories": len(categories), "products": len(products)}
+        docs.append(doc)
+    await database.products.insert_many(docs)
+
+@migration(2, "lookup indexes")
+async def create_lookup_indexes(database):
+    await database.categories.create_index("id")
+    await database.products.create_index("id")
+    await database.products.create_index([("category_id", 1), ("featured", 1)])
+    await database.users.create_index("id")
+    await database.users.create_index("email")
+    await database.carts.create_index("session_id")
+    await database.orders.create_index("id")
+    await database.orders.create_index([("user_id", 1), ("created_at", -1)])
+    await database.payment_transactions.create_index("session_id")
+
+@migration(3, "idempotency key expiry")
+async def create_idempotency_ttl(database):
+    await database.idempotency_keys.create_index("created_at", expireAfterSeconds=24 * 3600)
+
+@migration(4, "sales rollups")
+async def create_sales_rollups(database):
+    await database.sales_daily_products.create_index("day")
+    await analytics.rebuild_rollups(database)
+
+@migration(5, "one order per cart version")
+async def create_cart_order_index(database):
+    await database.orders.create_index(
+        [("cart_session_id", 1), ("cart_version", 1)],
+        unique=True,
+        partialFilterExpression={"cart_version": {"$exists": True}},
+    )
+
+@migration(6, "notification outbox")
+async def create_outbox_indexes(database):
+    await database.notification_outbox.create_index([("status", 1), ("next_attempt_at", 1)])
+    await database.notification_outbox.create_index("claim", sparse=True)
+    await database.notification_outbox.create_index("sent_at", expireAfterSeconds=OUTBOX_RETENTION_DAYS * 24 * 3600)
+
+@migration(7, "feed shards")
+async def create_feed_shard_index(database):
+    await database.products.create_index([("feed_shard", 1), ("id", 1)])
+    await feeds.assign_shards(database.products)
+
+@migration(8, "catalog change log")
+async def create_catalog_change_log(database):
+    await database.catalog_changes.create_index("version")
+    await database.catalog_changes.create_index([("deleted", 1), ("version", 1)])
+    await changelog.backfill(database)
+
+@migration(9, "order archive")
+async def create_order_archive_indexes(database):
+    # archive.py selects orders by age; the stubs are listed like orders
+    await database.orders.create_index("created_at")
+    await database.payment_transactions.create_index("order_id")
+    await database.archived_orders.create_index("id", unique=True)
+    await database.archived_orders.create_index([("user_id", 1), ("created_at", -1)])
+    await database.archived_orders.create_index("created_at")
+
+@migration(10, "promotions")
+async def create_promotion_indexes(database):
+    # Usage counters are updated by id; a code names one promotion
+    await database.promotions.create_index("id", unique=True)
+    await database.promotions.create_index("code", unique=True, partialFilterExpression={"code": {"$type": "string"}})
+
+# Packed sizes of the seed catalog: length, width, height in cm, weight in kg
+SEED_PARCELS = {
+    "prod-sofa-grey": (220, 95, 85, 68),
+    "prod-dining-table": (185, 95, 20, 45),
+    "prod-chair-set": (100, 55, 95, 32),
+    "prod-bed-queen": (210, 165, 40, 72),
+    "prod-nightstand": (52, 42, 58, 14),
+    "prod-coffee-machine": (48, 34, 42, 10),
+    "prod-tea-set": (42, 32, 36, 4.5),
+    "prod-armchair": (92, 86, 98, 31),
+}
+
+DEFAULT_SHIPPING_ZONES = [
+    {
+        "id": "idf",
+        "name": "Île-de-France",
+        "postcodes": ["75", "77", "78", "91", "92", "93", "94", "95"],
+        "bands": [{"max_kg": 30, "price": 19.0}, {"max_kg": 100, "price": 49.0}, {"max_kg": 250, "price": 79.0},
+                  {"max_kg": 500, "price": 119.0}, {"max_kg": 1000, "price": 189.0}],
+        "per_kg_over": 0.15,
+        "bulky_fee": 20.0,
+    },
+    {
+        "id": "corse",
+        "name": "Corse",
+        "postcodes": ["20"],
+        "bands": [{"max_kg": 30, "price": 49.0}, {"max_kg": 100, "price": 109.0}, {"max_kg": 250, "price": 179.0},
+                  {"max_kg": 500, "price": 279.0}, {"max_kg": 1000, "price": 419.0}],
+        "per_kg_over": 0.4,
+        "bulky_fee": 40.0,
+    },
+    {
+        "id": "france",
+        "name": "France métropolitaine",
+        "postcodes": [""],
+        "bands": [{"max_kg": 30, "price": 29.0}, {"max_kg": 100, "price": 69.0}, {"max_kg": 250, "price": 109.0},
+                  {"max_kg": 500, "price": 169.0}, {"max_kg": 1000, "price": 269.0}],
+        "per_kg_over": 0.25,
+        "bulky_fee": 30.0,
+    },
+]
+
+@migration(11, "shipping zones")
+async def create_shipping_zones(database):
+    await database.shipping_zones.create_index("id", unique=True)
+    if await database.shipping_zones.count_documents({}) == 0:
+        await database.shipping_zones.insert_many([dict(zone) for zone in DEFAULT_SHIPPING_ZONES])
+    # Only products nobody has measured yet
+    measured = []
+    for product_id, (length, width, height, weight) in SEED_PARCELS.items():
+        result = await database.products.update_one(
+            {"id": product_id, "weight_kg": None},
+            {
+                "$set": {"length_cm": length, "width_cm": width, "height_cm": height, "weight_kg": weight},
+                "$inc": {"version": 1},
+            },
+        )
+        if result.modified_count:
+            measured.append(product_id)
+    await changelog.record(database, changelog.PRODUCT, measured)
+
+# ============== WARM-UP ==============
+
+async def warmup_paths() -> List[str]:
+    # The catalog responses a new visitor asks for first, then one request per
+    # other read model, so each response model has been serialized once
+    paths = ["/api/categories", "/api/products", "/api/products?featured=true"]
+    paths += [f"/api/products?category_id={category['id']}" for category in await get_categories()]
+    paths += [f"/api/storefront/home?lang={lang}" for lang in LANGUAGES]
+    paths += ["/api/currencies", "/api/cart/warmup"]
+    product = await catalog_db.products.find_one({}, {"_id": 0, "id": 1})
+    if product:
+        paths += [f"/api/products/{product['id']}", f"/api/products/{product['id']}/related"]
+    order = await payment_db.orders.find_one({}, {"_id": 0, "id": 1}, sort=[("created_at", -1)])
+    if order:
+        paths.append(f"/api/orders/{order['id']}")
+    return paths
 
 # ============== ROOT ==============
 
@@ -809,17 +1732,128 @@ async def seed_data():
 async def root():
     return {"message": "Gül Mobilya API", "version": "1.0.0"}
 
-# Include router and middleware
-app.include_router(api_router)
-
-app.add_middleware(
-    CORSMiddleware,
-    allow_credentials=True,
-    allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+@api_router.get("/health/ready")
+async def readiness(request: Request):
+    # Ready once the lifespan has connected Mongo, the worker has warmed up
+    # and the server answers a ping
+    if not db.connected:
+        return JSONResponse(status_code=503, content={"status": "starting", "mongo": "not connected"})
+    warmup = request.app.state.warmup
+    if not warmup.finished:
+        return JSONResponse(status_code=503, content={"status": "warming up", "warmup": warmup.describe()})
+    try:
+        await asyncio.wait_for(db.command("ping"), timeout=READINESS_TIMEOUT)
+    except Exception as e:
+        return JSONResponse(status_code=503, content={"status": "unavailable", "mongo": str(e)})
+    return {"status": "ready", "mongo": "ok"}
+
+# ============== APP ==============
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Runs in every worker after it has been forked, so pools are never shared
+    settings: Settings = app.state.settings.validate()
+    logs.setup(settings.log_level, settings.log_format)
+    db.connect(
+        settings.mongo_url,
+        settings.db_name,
+        max_pool_size=settings.mongo_max_pool_size,
+        # Connections opened by the warm-up stay open
+        min_pool_size=max(settings.mongo_min_pool_size, settings.warmup_connections if settings.warmup else 0),
+        max_connecting=settings.mongo_max_connecting,
+        wait_queue_timeout_ms=settings.mongo_wait_queue_timeout_ms,
+        event_listeners=[app.state.load_monitor],
+    )
+    app.state.load_monitor.start()
+    cache.configure(settings.cache_url)
+    await cache.start()
+    events.configure(settings.cache_url)
+    await events.start()
+    cart_store.configure(cart_db, settings.cache_url, settings.cart_flush_interval_ms / 1000, settings.web_concurrency)
+    await cart_store.start()
+    app.state.migrations_current = False
+    if settings.run_migrations:
+        if await run_migrations(db):
+            await cache.invalidate("catalog")
+        app.state.migrations_current = True
+    await related_products.load_catalog(db)
+    related_products.start(db)
+    await promotion_engine.load(db)
+    await shipping_rates.load(db)
+    exchange_rates.configure(
+        provider_from_url(settings.exchange_rates_url),
+        settings.currencies,
+        settings.exchange_rates_refresh_s,
+        on_change=publish_rates,
+    )
+    await exchange_rates.start()
+    app.state.outbox_worker = None
+    if settings.outbox_workers:
+        app.state.outbox_worker = outbox.OutboxWorker(
+            db,
+            notifications.transport_from_url(settings.smtp_url),
+            settings.mail_from,
+            shop_email=settings.shop_email,
+            concurrency=settings.outbox_workers,
+        )
+        app.state.outbox_worker.start()
+    if settings.warmup:
+        app.state.warmup.start(
+            app, db, app.state.load_monitor, settings.warmup_connections, warmup_paths, settings.warmup_timeout_s
+        )
+    else:
+        app.state.warmup.skip()
+    try:
+        yield
+    finally:
+        await app.state.warmup.close()
+        if app.state.outbox_worker is not None:
+            await app.state.outbox_worker.close()
+        await exchange_rates.close()
+        await related_products.close()
+        await cart_store.close()
+        await events.close()
+        await cache.close()
+        db.close()
+        await app.state.load_monitor.close()
+        logs.shutdown()
+
+def create_app() -> FastAPI:
+    # Cheap and side-effect free: settings are validated and connections opened
+    # by the lifespan, so importing this module never touches Mongo or Stripe
+    settings = get_settings()
+    app = FastAPI(lifespan=lifespan)
+    app.state.settings = settings
+    app.state.load_monitor = LoadMonitor()
+    app.state.warmup = Warmup()
+    app.include_router(api_router)
+    
+    # Added innermost first: cache headers/ETags see the uncompressed body
+    app.add_middleware(CacheControlMiddleware, rules=default_cache_rules(settings.catalog_max_age))
+    app.add_middleware(CompressionMiddleware, minimum_size=settings.compression_min_size)
+    # Outside compression so a shed request costs next to nothing, inside
+    # CORS so browsers can read the 503 and its Retry-After
+    app.add_middleware(
+        AdmissionMiddleware,
+        rules=default_admission_rules(),
+        monitor=app.state.load_monitor,
+        loop_lag_ms=settings.shed_loop_lag_ms,
+        pool_wait_ms=settings.shed_pool_wait_ms,
+    )
+    app.add_middleware(
+        CORSMiddleware,
+        allow_credentials=True,
+        allow_origins=settings.cors_origins,
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=["X-Request-ID", "Retry-After"],
+    )
+    # Outermost, so the correlation id covers every other middleware
+    app.add_middleware(
+        RequestLogMiddleware,
+        sample_rates=settings.log_sample_rates,
+        slow_ms=settings.log_slow_request_ms,
+    )
+    return app
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
+app = create_app()
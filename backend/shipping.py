@@ -0,0 +1,156 @@
+"""Delivery quotes from postcode zones and weight bands.
+
+Zones are documents in ``shipping_zones``::
+
+    {"id": "idf", "name": "Île-de-France", "postcodes": ["75", "92", "93", "94"],
+     "bands": [{"max_kg": 30, "price": 29.0}, {"max_kg": 100, "price": 59.0}],
+     "per_kg_over": 0.2, "bulky_fee": 20.0}
+
+``postcodes`` are prefixes; a postcode belongs to the zone with its longest
+matching prefix, and ``""`` matches every postcode. A delivery is charged on
+its chargeable weight: its weight, or its volume at ``KG_PER_M3`` if that is
+more, rounded up to the kilogram. The price is that of the first band the
+weight fits in, plus ``per_kg_over`` for every kilogram past the last band.
+Deliveries with an item longer than ``BULKY_CM`` on any side need a
+two-person crew, charged once as ``bulky_fee``. Products without a weight
+count as ``DEFAULT_WEIGHT_KG`` and products without dimensions as no volume.
+
+``ShippingRates.load`` compiles the zones once per worker: a lookup per
+prefix length, and a price per whole kilogram up to the last band, so quoting
+a cart costs a pass over its lines plus a few dictionary and list lookups.
+Workers reload the zones when the ``shipping`` cache namespace is
+invalidated. With no zone at all, delivery is not charged.
+"""
+import logging
+import math
+import re
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Furniture freight is usually charged from 200 to 250 kg per m³
+KG_PER_M3 = 200
+BULKY_CM = 150
+DEFAULT_WEIGHT_KG = 5.0
+
+POSTCODE = re.compile(r"\b(\d{5}|\d{2}\s\d{3})\b")
+
+
+class NoDelivery(Exception):
+    """No zone delivers to the postcode."""
+
+
+def normalize_postcode(postcode: str) -> str:
+    return "".join(postcode.split()).upper()
+
+
+def postcode_in(address: str) -> Optional[str]:
+    """The first French-style postcode in a free-text address, if any."""
+    match = POSTCODE.search(address or "")
+    return normalize_postcode(match.group(1)) if match else None
+
+
+def measure(product: Dict) -> Tuple[float, float, bool]:
+    """Weight in kg, volume in m³ and whether ``product`` is bulky."""
+    weight = product.get("weight_kg")
+    if weight is None:
+        weight = DEFAULT_WEIGHT_KG
+    length, width, height = product.get("length_cm") or 0, product.get("width_cm") or 0, product.get("height_cm") or 0
+    return weight, length * width * height / 1e6, length > BULKY_CM or width > BULKY_CM or height > BULKY_CM
+
+
+@dataclass(frozen=True)
+class Zone:
+    id: str
+    name: str
+    # Price by chargeable weight in whole kilograms, up to the last band
+    prices: Tuple[float, ...]
+    per_kg_over: float
+    bulky_fee: float
+
+    def price(self, kg: int, bulky: bool) -> float:
+        last = len(self.prices) - 1
+        price = self.prices[kg] if kg <= last else self.prices[last] + (kg - last) * self.per_kg_over
+        return round(price + (self.bulky_fee if bulky else 0.0), 2)
+
+
+def compile_zone(doc: Dict) -> Zone:
+    prices = []
+    for band in sorted(doc["bands"], key=lambda band: band["max_kg"]):
+        price = float(band["price"])
+        prices.extend([price] * (math.floor(band["max_kg"]) + 1 - len(prices)))
+    return Zone(
+        id=doc["id"],
+        name=doc.get("name", ""),
+        prices=tuple(prices),
+        per_kg_over=float(doc.get("per_kg_over") or 0.0),
+        bulky_fee=float(doc.get("bulky_fee") or 0.0),
+    )
+
+
+class ShippingRates:
+    def __init__(self):
+        self.zones: Dict[str, Zone] = {}
+        self._by_prefix: Dict[str, Zone] = {}
+        self._lengths: Tuple[int, ...] = ()
+
+    def set_zones(self, docs: Sequence[Dict]):
+        zones, by_prefix = {}, {}
+        for doc in docs:
+            zone = zones[doc["id"]] = compile_zone(doc)
+            for prefix in doc.get("postcodes", ()):
+                prefix = normalize_postcode(prefix)
+                if prefix in by_prefix:
+                    logger.warning("Postcode prefix %r is in zones %s and %s", prefix, by_prefix[prefix].id, zone.id)
+                by_prefix[prefix] = zone
+        # Swapped in one go so a request never sees half of the new zones
+        self.zones, self._by_prefix = zones, by_prefix
+        self._lengths = tuple(sorted({len(prefix) for prefix in by_prefix}, reverse=True))
+
+    async def load(self, database):
+        self.set_zones(await database.shipping_zones.find({}, {"_id": 0}).to_list(None))
+        logger.info("Loaded %d shipping zones", len(self.zones))
+
+    def zone_for(self, postcode: str) -> Zone:
+        postcode = normalize_postcode(postcode)
+        for length in self._lengths:
+            if length <= len(postcode):
+                zone = self._by_prefix.get(postcode[:length])
+                if zone is not None:
+                    return zone
+        raise NoDelivery("No delivery to this postcode")
+
+    def quote(self, postcode: str, lines: Iterable[Tuple[Dict, int]]) -> Dict:
+        """Quotes delivering ``quantity`` of each ``product`` in ``lines`` to ``postcode``.
+
+        Raises ``NoDelivery``.
+        """
+        weight = volume = 0.0
+        units, bulky = 0, False
+        for product, quantity in lines:
+            kg, m3, large = measure(product)
+            weight += kg * quantity
+            volume += m3 * quantity
+            units += quantity
+            bulky = bulky or large
+        # Rounded first so 30.0000001 kg of float sums stays in the 30 kg band
+        chargeable = math.ceil(round(max(weight, volume * KG_PER_M3), 6))
+        quote = {
+            "zone": None,
+            "name": None,
+            "weight_kg": round(weight, 2),
+            "volume_m3": round(volume, 3),
+            "chargeable_kg": chargeable,
+            "bulky": bulky,
+            "price": 0.0,
+        }
+        if not self.zones:
+            return quote
+        zone = self.zone_for(postcode)
+        price = zone.price(chargeable, bulky) if units else 0.0
+        return {**quote, "zone": zone.id, "name": zone.name, "price": price}
+
+
+def cart_lines(items: List[Dict], products: Dict[str, Dict]) -> List[Tuple[Dict, int]]:
+    return [(products[item["product_id"]], item["quantity"]) for item in items if item["product_id"] in products]
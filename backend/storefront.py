@@ -0,0 +1,82 @@
+"""Precomputed storefront payloads.
+
+The homepage needs the categories, the featured products and a short preview
+of the catalog, each in one language only. ``build_home_payloads`` reads them
+once and returns a ready-to-serve payload per language; the API keeps those
+in the catalog cache namespace so they are dropped and rebuilt whenever a
+product or category changes.
+
+Localized fields keep their ``name_<lang>`` keys so the frontend language
+helpers work unchanged; an empty translation falls back to French. Products
+carry their ``prices`` in every currency, from the ``prices`` function the
+payloads are built with.
+"""
+from typing import Callable, Dict, Optional
+
+LANGUAGES = ("fr", "tr", "en")
+DEFAULT_LANGUAGE = "fr"
+FEATURED_LIMIT = 8
+PREVIEW_LIMIT = 10
+
+CATEGORY_FIELDS = {"_id": 0, "id": 1, "slug": 1, "image_url": 1, **{f"name_{code}": 1 for code in LANGUAGES}}
+PRODUCT_FIELDS = {
+    "_id": 0, "id": 1, "price": 1, "images": 1, "stock": 1, "featured": 1, "category_id": 1,
+    **{f"name_{code}": 1 for code in LANGUAGES},
+    **{f"description_{code}": 1 for code in LANGUAGES},
+}
+
+
+def negotiate_language(lang: Optional[str], accept_language: Optional[str]) -> str:
+    if lang in LANGUAGES:
+        return lang
+    for part in (accept_language or "").split(","):
+        code = part.split(";")[0].strip().lower()[:2]
+        if code in LANGUAGES:
+            return code
+    return DEFAULT_LANGUAGE
+
+
+def _localized(doc: Dict, field: str, lang: str) -> str:
+    return doc.get(f"{field}_{lang}") or doc.get(f"{field}_{DEFAULT_LANGUAGE}") or ""
+
+
+def localize_category(doc: Dict, lang: str) -> Dict:
+    return {
+        "id": doc["id"],
+        "slug": doc.get("slug"),
+        "image_url": doc.get("image_url"),
+        f"name_{lang}": _localized(doc, "name", lang),
+    }
+
+
+def localize_product(doc: Dict, lang: str, with_description: bool = True,
+                     prices: Optional[Callable[[float], Dict[str, float]]] = None) -> Dict:
+    product = {
+        "id": doc["id"],
+        "price": doc.get("price"),
+        "images": doc.get("images", [])[:1],
+        "stock": doc.get("stock", 0),
+        "featured": doc.get("featured", False),
+        "category_id": doc.get("category_id"),
+        f"name_{lang}": _localized(doc, "name", lang),
+    }
+    if with_description:
+        product[f"description_{lang}"] = _localized(doc, "description", lang)
+    if prices is not None:
+        product["prices"] = prices(doc["price"])
+    return product
+
+
+async def build_home_payloads(database, prices: Optional[Callable[[float], Dict[str, float]]] = None) -> Dict[str, Dict]:
+    categories = await database.categories.find({}, CATEGORY_FIELDS).to_list(100)
+    featured = await database.products.find({"featured": True}, PRODUCT_FIELDS).limit(FEATURED_LIMIT).to_list(None)
+    preview = await database.products.find({}, PRODUCT_FIELDS).limit(PREVIEW_LIMIT).to_list(None)
+    return {
+        lang: {
+            "lang": lang,
+            "categories": [localize_category(c, lang) for c in categories],
+            "featured": [localize_product(p, lang, prices=prices) for p in featured],
+            "products": [localize_product(p, lang, with_description=False, prices=prices) for p in preview],
+        }
+        for lang in LANGUAGES
+    }
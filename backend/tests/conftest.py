@@ -0,0 +1,50 @@
+import os
+import sys
+import uuid
+from pathlib import Path
+
+import pytest
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+from pymongo.monitoring import CommandListener
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+HANDSHAKE_COMMANDS = {"hello", "ismaster", "isMaster", "ping", "endSessions", "buildInfo", "saslStart", "saslContinue"}
+
+
+class CommandRecorder(CommandListener):
+    """Records the commands sent to the server, minus connection handshakes."""
+
+    def __init__(self):
+        self.commands = []
+
+    def started(self, event):
+        if event.command_name not in HANDSHAKE_COMMANDS:
+            self.commands.append(event.command_name)
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+    def reset(self):
+        self.commands.clear()
+
+
+@pytest.fixture(scope="session")
+def mongo_url():
+    url = os.environ.get("TEST_MONGO_URL", "mongodb://localhost:27017")
+    try:
+        MongoClient(url, serverSelectionTimeoutMS=500).admin.command("ping")
+    except PyMongoError:
+        pytest.skip(f"MongoDB is not reachable at {url}")
+    return url
+
+
+@pytest.fixture
+def mongo_db_name(mongo_url):
+    name = f"gulum_test_{uuid.uuid4().hex[:8]}"
+    yield name
+    MongoClient(mongo_url).drop_database(name)
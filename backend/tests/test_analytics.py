@@ -0,0 +1,60 @@
+import asyncio
+from datetime import date
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+import analytics
+
+
+def test_product_increments_merge_repeated_items():
+    rows = analytics.product_increments([
+        {"product_id": "p1", "quantity": 2, "subtotal": 20.0, "category_id": "c1"},
+        {"product_id": "p2", "quantity": 1, "subtotal": 5.0},
+        {"product_id": "p1", "quantity": 1, "subtotal": 10.0},
+    ])
+    assert rows == {
+        "p1": {"units": 3, "revenue": 30.0, "category_id": "c1"},
+        "p2": {"units": 1, "revenue": 5.0, "category_id": None},
+    }
+
+
+def test_incremental_rollups_match_rebuild(mongo_url, mongo_db_name):
+    orders = [
+        {"id": "o1", "status": "paid", "total": 30.0, "created_at": "2026-03-01T09:00:00+00:00",
+         "items": [{"product_id": "p1", "category_id": "c1", "quantity": 3, "subtotal": 30.0}]},
+        # Placed before items carried their category
+        {"id": "o2", "status": "paid", "total": 25.0, "created_at": "2026-03-01T18:00:00+00:00",
+         "items": [{"product_id": "p1", "quantity": 1, "subtotal": 10.0},
+                   {"product_id": "p2", "quantity": 1, "subtotal": 15.0}]},
+        {"id": "o3", "status": "paid", "total": 15.0, "created_at": "2026-03-02T08:00:00+00:00",
+         "items": [{"product_id": "p2", "quantity": 1, "subtotal": 15.0}]},
+    ]
+
+    async def scenario():
+        client = AsyncIOMotorClient(mongo_url)
+        database = client[mongo_db_name]
+        try:
+            await database.products.insert_many([
+                {"id": "p1", "category_id": "c1", "name_fr": "Chaise"},
+                {"id": "p2", "category_id": "c2", "name_fr": "Table"},
+            ])
+            await database.categories.insert_many([{"id": "c1", "name_fr": "Salon"}, {"id": "c2", "name_fr": "Cuisine"}])
+            for order in orders:
+                await analytics.record_paid_order(database, order, order["created_at"])
+            await database.orders.insert_many(orders + [{"id": "o4", "status": "pending", "total": 99.0, "items": []}])
+
+            report = await analytics.sales_report(database, date(2026, 3, 1), date(2026, 3, 2))
+            assert report["totals"] == {"orders": 3, "revenue": 70.0, "units": 6, "average_order_value": 23.33}
+            assert [d["day"] for d in report["daily"]] == ["2026-03-01", "2026-03-02"]
+            assert [(p["product_id"], p["units"], p["revenue"]) for p in report["top_products"]] == [
+                ("p1", 4, 40.0), ("p2", 2, 30.0),
+            ]
+            assert report["top_products"][0]["name_fr"] == "Chaise"
+            assert [(c["category_id"], c["revenue"]) for c in report["top_categories"]] == [("c1", 40.0), ("c2", 30.0)]
+
+            await analytics.rebuild_rollups(database)
+            assert await analytics.sales_report(database, date(2026, 3, 1), date(2026, 3, 2)) == report
+        finally:
+            client.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,77 @@
+import asyncio
+import shutil
+from datetime import datetime, timedelta, timezone
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+import archive
+
+ORDER = {
+    "id": "order-1",
+    "user_id": "user-1",
+    "customer_name": "Ayşe Yılmaz",
+    "customer_email": "ayse@example.com",
+    "items": [{"product_id": "prod-sofa", "quantity": 2, "price": 899.0}],
+    "total": 1798,
+    "status": "paid",
+    "cart_version": 3,
+    "created_at": "2023-02-14T10:00:00+00:00",
+    "gift_note": "Joyeux anniversaire",
+}
+
+
+def test_orders_round_trip_through_parquet(tmp_path):
+    table = archive.to_table([ORDER, {"id": "order-0", "total": 5.0, "created_at": "2023-02-01"}], archive.ORDER_SCHEMA)
+    assert table.column("id").to_pylist() == ["order-0", "order-1"]
+    archive.write_partition(tmp_path, "orders", "2023-02", table)
+    archive.write_partition(tmp_path, "orders", "2023-02", archive.to_table([ORDER], archive.ORDER_SCHEMA))
+
+    found = archive.read_partition(tmp_path, "orders", "2023-02", ["order-1", "missing"])
+    assert list(found) == ["order-1"]
+    assert found["order-1"] == {**ORDER, "total": 1798.0}
+    assert not list(tmp_path.rglob("*.tmp"))
+
+
+def test_orders_whose_file_is_missing_are_left_out(tmp_path, caplog):
+    archive.write_partition(tmp_path, "orders", "2023-02", archive.to_table([ORDER], archive.ORDER_SCHEMA))
+    archive.write_partition(
+        tmp_path, "orders", "2023-01", archive.to_table([{**ORDER, "id": "order-0"}], archive.ORDER_SCHEMA)
+    )
+    shutil.rmtree(tmp_path / "orders" / "month=2023-01")
+    stubs = [archive.stub(ORDER, "2023-02", "2024-01-01"), archive.stub({**ORDER, "id": "order-0"}, "2023-01", "2024-01-01")]
+
+    orders = asyncio.run(archive.load_orders(tmp_path, stubs))
+    assert [o["id"] for o in orders] == ["order-1"]
+    assert "order-0" in caplog.text
+
+
+def test_old_orders_move_to_files_and_stubs(mongo_url, mongo_db_name, tmp_path):
+    async def scenario():
+        client = AsyncIOMotorClient(mongo_url)
+        database = client[mongo_db_name]
+        try:
+            recent = (datetime.now(timezone.utc) - timedelta(days=3)).isoformat()
+            old = [{**ORDER, "id": f"old-{n}", "created_at": f"2023-0{1 + n % 2}-1{n % 10}T08:00:00+00:00"} for n in range(25)]
+            await database.orders.insert_many(old + [{**ORDER, "id": "new", "created_at": recent}])
+            await database.payment_transactions.insert_many([
+                {"id": "pay-old", "session_id": "cs_1", "order_id": "old-3", "amount": 10.0},
+                {"id": "pay-new", "session_id": "cs_2", "order_id": "new", "amount": 10.0},
+            ])
+
+            result = await archive.archive_orders(database, tmp_path, timedelta(days=30), batch_size=10)
+            assert (result["orders"], result["payment_transactions"]) == (25, 1)
+            assert [o["id"] async for o in database.orders.find()] == ["new"]
+            assert [p["id"] async for p in database.payment_transactions.find()] == ["pay-new"]
+            assert sorted(p.name for p in (tmp_path / "orders").iterdir()) == ["month=2023-01", "month=2023-02"]
+
+            stubs = await database.archived_orders.find({"user_id": "user-1"}, {"_id": 0}).sort("created_at", -1).to_list(None)
+            assert len(stubs) == 25 and "items" not in stubs[0]
+            orders = await archive.load_orders(tmp_path, stubs[:3])
+            assert [o["id"] for o in orders] == [s["id"] for s in stubs[:3]]
+            assert orders[0]["items"] == ORDER["items"] and orders[0]["gift_note"] == ORDER["gift_note"]
+
+            assert (await archive.archive_orders(database, tmp_path, timedelta(days=30)))["orders"] == 0
+        finally:
+            client.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+
+from cache import Cache, MemoryBackend, RedisBackend, RedisBus
+
+
+def test_memory_backend_expiry_and_incr():
+    async def scenario():
+        backend = MemoryBackend()
+        await backend.set("a", "1", ttl=1)
+        assert await backend.get("a") == "1"
+        backend._data["a"] = (0.0, "1")
+        assert await backend.get("a") is None
+
+        assert await backend.incr("hits", 60) == 1
+        assert await backend.incr("hits", 60) == 2
+
+    asyncio.run(scenario())
+
+
+def test_invalidate_drops_namespace_and_runs_handlers():
+    async def scenario():
+        cache = Cache()
+        seen = []
+
+        async def handler(namespace):
+            seen.append(namespace)
+
+        cache.on_invalidate("catalog", handler)
+        await cache.start()
+        await cache.set("catalog:products:*:None", [{"id": "p1"}])
+        await cache.set("other:key", {"ok": True})
+
+        await cache.invalidate("catalog")
+
+        assert await cache.get("catalog:products:*:None") is None
+        assert await cache.get("other:key") == {"ok": True}
+        assert seen == ["catalog"]
+        await cache.close()
+
+    asyncio.run(scenario())
+
+
+def test_redis_backend_shares_state_between_workers():
+    fakeredis = pytest.importorskip("fakeredis")
+
+    async def scenario():
+        server = fakeredis.FakeServer()
+        workers = []
+        seen = []
+        for name in ("w1", "w2"):
+            client = fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+            worker = Cache()
+            worker.backend = RedisBackend(client)
+            worker.bus = RedisBus(client)
+
+            async def handler(namespace, name=name):
+                seen.append((name, namespace))
+
+            worker.on_invalidate("catalog", handler)
+            await worker.start()
+            workers.append(worker)
+
+        w1, w2 = workers
+        await w1.set("catalog:categories", [{"id": "cat-furniture"}], ttl=60)
+        assert await w2.get("catalog:categories") == [{"id": "cat-furniture"}]
+
+        assert await w1.incr("ratelimit:login:1.2.3.4:0", 60) == 1
+        assert await w2.incr("ratelimit:login:1.2.3.4:0", 60) == 2
+        assert 0 < await w1.backend.client.ttl("ratelimit:login:1.2.3.4:0") <= 60
+
+        await w2.invalidate("catalog")
+        for _ in range(50):
+            if len(seen) == 2:
+                break
+            await asyncio.sleep(0.05)
+
+        assert await w1.get("catalog:categories") is None
+        assert sorted(seen) == [("w1", "catalog"), ("w2", "catalog")]
+        for worker in workers:
+            await worker.close()
+
+    asyncio.run(scenario())
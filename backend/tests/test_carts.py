@@ -0,0 +1,139 @@
+import asyncio
+
+import pytest
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from carts import CartStore, MemoryTier, RedisTier
+
+
+def cart(session_id: str, version: int, *product_ids: str):
+    return {
+        "id": f"id-{session_id}",
+        "session_id": session_id,
+        "items": [{"product_id": p, "quantity": 1} for p in product_ids],
+        "version": version,
+        "order_id": None,
+        "created_at": "2025-01-01T00:00:00+00:00",
+        "updated_at": f"2025-01-01T00:00:{version:02d}+00:00",
+    }
+
+
+def test_memory_tier_never_evicts_unflushed_carts():
+    async def scenario():
+        tier = MemoryTier(max_carts=2)
+        await tier.put(cart("a", 1, "p1"), dirty=True)
+        await tier.put(cart("b", 1), dirty=False)
+        await tier.put(cart("c", 1), dirty=False)
+        assert await tier.get("b") is None and await tier.get("a") is not None
+
+        edited = await tier.get("a")
+        edited["items"].append({"product_id": "p2", "quantity": 1})
+        assert [i["product_id"] for i in (await tier.get("a"))["items"]] == ["p1"]
+
+        assert [c["session_id"] for c in await tier.take_dirty(["a", "c"], 10)] == ["a"]
+        assert await tier.take_dirty(None, 10) == []
+
+    asyncio.run(scenario())
+
+
+def test_crash_loses_at_most_the_unflushed_edits(mongo_url, mongo_db_name):
+    async def scenario():
+        client = AsyncIOMotorClient(mongo_url)
+        database = client[mongo_db_name]
+        try:
+            store = CartStore()
+            # Flushed by hand below instead of on a timer
+            store.configure(database, "memory://", flush_interval=60)
+            for version in range(1, 4):
+                await store.save(cart("s1", version, *[f"p{n}" for n in range(version)]))
+            await store.save(cart("s2", 1, "p9"))
+            assert await database.carts.count_documents({}) == 0
+            assert await store.flush() == 2
+
+            await store.save(cart("s1", 4, "p0", "p1", "p2", "p3"))
+            await store.save(cart("s3", 1, "p5"))
+            # The worker dies here: no close(), no final flush
+
+            recovered = CartStore()
+            recovered.configure(database, "memory://", flush_interval=60)
+            s1 = await recovered.get("s1")
+            assert s1["version"] == 3 and len(s1["items"]) == 3
+            assert (await recovered.get("s2"))["items"] == [{"product_id": "p9", "quantity": 1}]
+            assert await recovered.get("s3") is None
+
+            # An older cart flushed late does not overwrite a newer one
+            await recovered.save(cart("s1", 5, "p7"))
+            await recovered.flush()
+            await store.flush()
+            stored = await database.carts.find_one({"session_id": "s1"}, {"_id": 0})
+            assert (stored["version"], stored["items"]) == (5, [{"product_id": "p7", "quantity": 1}])
+            assert await database.carts.count_documents({"session_id": "s1"}) == 1
+
+            # Write-through loses nothing
+            through = CartStore()
+            through.configure(database, "memory://", flush_interval=0)
+            await through.save(cart("s4", 1, "p1"))
+            assert await database.carts.count_documents({"session_id": "s4"}) == 1
+        finally:
+            client.close()
+
+    asyncio.run(scenario())
+
+
+def test_redis_tier_survives_a_worker(mongo_url, mongo_db_name):
+    fakeredis = pytest.importorskip("fakeredis")
+
+    async def scenario():
+        client = AsyncIOMotorClient(mongo_url)
+        database = client[mongo_db_name]
+        server = fakeredis.FakeServer()
+        try:
+            workers = []
+            for _ in range(2):
+                store = CartStore()
+                store.configure(database, "memory://", flush_interval=60)
+                store.tier = RedisTier(fakeredis.FakeAsyncRedis(server=server, decode_responses=True))
+                workers.append(store)
+            first, second = workers
+
+            await first.save(cart("s1", 1, "p1"))
+            assert (await second.get("s1"))["items"] == [{"product_id": "p1", "quantity": 1}]
+            # The first worker dies with the edit unflushed; the dirty set is in Redis
+            assert await second.flush() == 1
+            assert (await database.carts.find_one({"session_id": "s1"}))["version"] == 1
+            await second.close()
+        finally:
+            client.close()
+
+    asyncio.run(scenario())
+
+
+def test_workers_without_a_shared_tier_write_carts_through(mongo_url, mongo_db_name):
+    async def scenario():
+        client = AsyncIOMotorClient(mongo_url)
+        database = client[mongo_db_name]
+        try:
+            first, second = CartStore(), CartStore()
+            for store in (first, second):
+                store.configure(database, "memory://", flush_interval=60, workers=2)
+            assert (await first.stats())["tier"] == "none"
+
+            # Each worker edits the version the other one wrote
+            await first.save(cart("s1", 1, "p1"))
+            edited = await second.get("s1")
+            await second.save({**edited, "items": edited["items"] + [{"product_id": "p2", "quantity": 1}], "version": 2})
+            edited = await first.get("s1")
+            assert (edited["version"], len(edited["items"])) == (2, 2)
+            await first.save({**edited, "items": edited["items"][1:], "version": 3})
+            for store in (first, second):
+                await store.flush(["s1"])
+            stored = await database.carts.find_one({"session_id": "s1"}, {"_id": 0})
+            assert (stored["version"], stored["items"]) == (3, [{"product_id": "p2", "quantity": 1}])
+
+            # A cart cleared through one worker is gone for the other
+            await second.delete("s1")
+            assert await first.get("s1") is None
+        finally:
+            client.close()
+
+    asyncio.run(scenario())
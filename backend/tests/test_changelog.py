@@ -0,0 +1,51 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from motor.motor_asyncio import AsyncIOMotorClient
+
+import changelog
+
+LATER = datetime.now(timezone.utc) + timedelta(minutes=1)
+
+
+def test_changes_are_versioned_and_deletions_become_tombstones(mongo_url, mongo_db_name):
+    async def scenario():
+        client = AsyncIOMotorClient(mongo_url)
+        database = client[mongo_db_name]
+        try:
+            await database.categories.insert_one({"id": "cat-1", "name_fr": "Salon"})
+            await database.products.insert_many([{"id": f"p{n}", "price": 10.0, "feed_shard": 3} for n in range(3)])
+            assert await changelog.backfill(database) == 4
+
+            full = await changelog.changes_since(database, 0, now=LATER)
+            assert full["version"] == 4 and not full["has_more"]
+            assert [(c["type"], c["op"]) for c in full["changes"]] == [("product", "upsert")] * 3 + [("category", "upsert")]
+            assert "feed_shard" not in full["changes"][0]["data"]
+
+            # Entries are not visible until they have settled
+            await database.products.update_one({"id": "p1"}, {"$set": {"price": 12.0}})
+            await changelog.record(database, changelog.PRODUCT, ["p1"])
+            assert (await changelog.changes_since(database, 4))["changes"] == []
+
+            await database.products.delete_one({"id": "p2"})
+            await changelog.record(database, changelog.PRODUCT, ["p2"], deleted=True)
+            delta = await changelog.changes_since(database, 4, now=LATER)
+            assert delta["version"] == 6
+            assert [(c["id"], c["op"]) for c in delta["changes"]] == [("p1", "upsert"), ("p2", "delete")]
+            assert delta["changes"][0]["data"]["price"] == 12.0
+            # One entry per entity, however often it changed
+            assert await database.catalog_changes.count_documents({}) == 4
+
+            page = await changelog.changes_since(database, 0, limit=2, now=LATER)
+            assert [c["id"] for c in page["changes"]] == ["p0", "cat-1"] and page["has_more"]
+
+            assert await changelog.compact(database, retention=timedelta(0)) == 1
+            with pytest.raises(changelog.ResyncRequired):
+                await changelog.changes_since(database, 4, now=LATER)
+            assert (await changelog.changes_since(database, 6, now=LATER))["changes"] == []
+            assert len((await changelog.changes_since(database, 0, now=LATER))["changes"]) == 3
+        finally:
+            client.close()
+
+    asyncio.run(scenario())
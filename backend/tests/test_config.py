@@ -0,0 +1,66 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from config import ConfigError, Settings
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def test_missing_and_invalid_values_are_reported_together():
+    settings = Settings.from_env({
+        "MONGO_MAX_POOL_SIZE": "many",
+        "CACHE_URL": "memcached://x",
+        "LOG_FORMAT": "xml",
+        "LOG_SAMPLE_RATES": "/api/products=0.5,products=2",
+        "SMTP_URL": "mail.example.com:25",
+        "EXCHANGE_RATES_URL": "https://rates.example.com",
+        "WARMUP": "maybe",
+    })
+    with pytest.raises(ConfigError) as exc:
+        settings.validate()
+    message = str(exc.value)
+    assert "MONGO_URL is not set" in message
+    assert "DB_NAME is not set" in message
+    assert "MONGO_MAX_POOL_SIZE must be an integer" in message
+    assert "CACHE_URL must start with" in message
+    assert "LOG_FORMAT must be one of" in message
+    assert "LOG_SAMPLE_RATES entries must look like /api/path=0.1, got 'products=2'" in message
+    assert "SMTP_URL must start with" in message
+    assert "EXCHANGE_RATES_URL must start with" in message
+    assert "WARMUP must be true or false" in message
+
+
+def test_valid_environment():
+    settings = Settings.from_env({
+        "MONGO_URL": "mongodb://localhost:27017",
+        "DB_NAME": "gulum",
+        "CORS_ORIGINS": "https://a.fr,https://b.fr",
+        "MONGO_MAX_POOL_SIZE": "20",
+        "ADMIN_EMAILS": "Owner@gulmobilya.fr, ",
+    }).validate()
+    assert settings.cors_origins == ["https://a.fr", "https://b.fr"]
+    assert settings.admin_emails == ("owner@gulmobilya.fr",)
+    assert settings.mongo_max_pool_size == 20
+    assert settings.stripe_api_key is None
+    assert ("/api/products", 0.1) in settings.log_sample_rates
+    assert settings.smtp_url is None and settings.outbox_workers == 1
+    assert settings.order_archive_days == 365 and settings.cart_flush_interval_ms == 1000
+    assert settings.web_concurrency == 1
+    assert settings.mongo_max_connecting == 2 and settings.mongo_wait_queue_timeout_ms == 0
+    assert settings.currencies == ("eur", "try", "usd", "gbp") and settings.exchange_rates_url is None
+    assert settings.warmup and settings.warmup_connections == 4 and settings.warmup_timeout_s == 30
+
+
+def test_server_imports_without_environment_or_payment_sdk():
+    code = "import sys, server; assert not {'emergentintegrations', 'pyarrow'} & set(sys.modules)"
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=BACKEND_DIR,
+        env={"PATH": "", "PYTHONPATH": str(BACKEND_DIR)},
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 0, result.stderr
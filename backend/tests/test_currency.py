@@ -0,0 +1,72 @@
+import asyncio
+import json
+
+import pytest
+
+from currency import EcbRates, ExchangeRates, FixedRates, UnsupportedCurrency, provider_from_url
+
+ECB_DAILY = b"""<?xml version="1.0" encoding="UTF-8"?>
+<gesmes:Envelope xmlns:gesmes="http://www.gesmes.org/xml/2002-08-01" xmlns="http://www.ecb.int/vocabulary/2002-08-01/eurofxref">
+  <Cube><Cube time="2026-10-16">
+    <Cube currency="USD" rate="1.0842"/><Cube currency="GBP" rate="0.8571"/><Cube currency="TRY" rate="37.215"/>
+  </Cube></Cube>
+</gesmes:Envelope>"""
+
+
+def test_providers_read_rates_from_the_euro(tmp_path, monkeypatch):
+    async def scenario():
+        assert await provider_from_url("fixed://TRY=35.5, usd=1.1").fetch() == {"try": 35.5, "usd": 1.1}
+        rates_file = tmp_path / "rates.json"
+        rates_file.write_text(json.dumps({"date": "2026-10-16", "rates": {"TRY": 37.2}}))
+        assert await provider_from_url(f"file://{rates_file}").fetch() == {"try": 37.2}
+        ecb = provider_from_url("ecb://")
+        monkeypatch.setattr(ecb, "_download", lambda: ECB_DAILY)
+        assert await ecb.fetch() == {"usd": 1.0842, "gbp": 0.8571, "try": 37.215}
+        assert provider_from_url(None) is None and isinstance(ecb, EcbRates)
+
+    asyncio.run(scenario())
+
+
+def test_prices_follow_the_current_table():
+    async def scenario():
+        changes = []
+
+        async def on_change():
+            changes.append(dict(rates.rates))
+
+        rates = ExchangeRates()
+        provider = FixedRates({"TRY": 35.0, "USD": 1.1, "JPY": 160})
+        rates.configure(provider, ["eur", "try", "usd", "gbp"], 3600, on_change=on_change)
+        assert rates.prices(1299.0) == {"eur": 1299.0}
+
+        await rates.start()
+        assert rates.prices(1299.0) == {"eur": 1299.0, "try": 45465.0, "usd": 1428.9}
+        assert rates.prices(1299.0) is rates.prices(1299.0)
+        assert rates.convert(89.0, "TRY") == 3115.0
+        with pytest.raises(UnsupportedCurrency):
+            rates.convert(89.0, "gbp")
+
+        # Unchanged rates do not drop the cached catalog again
+        assert await rates.refresh() is False
+        provider.rates["try"] = 36.0
+        assert await rates.refresh() is True
+        assert rates.prices(1299.0)["try"] == 46764.0
+        assert [c["try"] for c in changes] == [35.0, 36.0]
+
+        # A failed refresh keeps the table
+        async def unavailable():
+            raise OSError("timed out")
+
+        provider.fetch = unavailable
+        assert await rates.refresh() is False and rates.rates["try"] == 36.0
+        await rates.close()
+
+    asyncio.run(scenario())
+
+
+def test_zero_decimal_currencies_are_rounded_to_whole_units():
+    rates = ExchangeRates()
+    rates.configure(None, ["eur", "jpy", "usd"], 3600)
+    rates.set_rates({"jpy": 161.37, "usd": 1.0842})
+    assert rates.prices(89.99) == {"eur": 89.99, "jpy": 14522.0, "usd": 97.57}
+    assert rates.convert(89.99, "JPY") == 14522.0 and rates.convert(89.99, "usd") == 97.57
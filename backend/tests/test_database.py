@@ -0,0 +1,41 @@
+import pytest
+from pymongo.read_preferences import Primary, SecondaryPreferred
+
+from database import PROFILES, Database, ProfiledCollection
+
+
+def test_views_can_be_created_before_connecting():
+    database = Database()
+    catalog = database.profile("catalog-read")
+    with pytest.raises(RuntimeError):
+        catalog.products
+    with pytest.raises(KeyError):
+        database.profile("fast")
+
+
+def test_profile_collections_carry_their_options():
+    # Motor connects lazily, so no server is needed to inspect the handles
+    database = Database()
+    database.connect("mongodb://localhost:1", "gulum", max_pool_size=10, max_connecting=3, wait_queue_timeout_ms=250)
+    try:
+        pool = database.client.options.pool_options
+        assert (pool.max_pool_size, pool.max_connecting, pool.wait_queue_timeout) == (10, 3, 0.25)
+
+        products = database.profile("catalog-read").products
+        assert isinstance(products, ProfiledCollection)
+        assert isinstance(products.read_preference, SecondaryPreferred)
+        assert products.find({}).delegate._Cursor__max_time_ms == PROFILES["catalog-read"].max_time_ms
+        assert products.find({}, max_time_ms=50).delegate._Cursor__max_time_ms == 50
+        assert database.profile("catalog-fresh").products.read_preference == Primary()
+
+        orders = database.profile("payment-critical").orders
+        assert orders.write_concern.document["w"] == "majority"
+        assert orders.read_concern.level == "majority"
+        assert database.profile("cart-write").carts.write_concern.document == {"w": 1}
+
+        # Everything that is not a collection is the database's own
+        payments = database.profile("payment-critical")
+        assert payments.client is database.client
+        assert database.products.write_concern.document == {}
+    finally:
+        database.close()
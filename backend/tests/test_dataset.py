@@ -0,0 +1,58 @@
+from collections import Counter
+from datetime import datetime, timezone
+
+import dataset
+import server
+
+PLAN = dataset.Plan(
+    seed=3,
+    products=500,
+    users=200,
+    orders=2500,
+    abandoned_carts=300,
+    days=365,
+    end=datetime(2025, 6, 1, tzinfo=timezone.utc),
+    password_hash="$2b$12$hash",
+    batch_size=1000,
+)
+
+
+def test_chunks_are_reproducible_and_distinct():
+    catalog = dataset.build_catalog(PLAN)
+    first = dataset.generate_orders(PLAN, catalog, 1)
+    assert first == dataset.generate_orders(PLAN, dataset.build_catalog(PLAN), 1)
+    assert len(first["orders"]) == len(first["carts"]) == len(first["payment_transactions"]) == 1000
+    assert len(dataset.generate_orders(PLAN, catalog, 2)["orders"]) == 500
+    assert not {o["id"] for o in first["orders"]} & {o["id"] for o in dataset.generate_orders(PLAN, catalog, 0)["orders"]}
+
+
+def test_documents_match_the_models():
+    catalog = dataset.build_catalog(PLAN)
+    users = dataset.generate_users(PLAN, 0)["users"]
+    batches = dataset.generate_orders(PLAN, catalog, 0)
+    server.Category(**catalog.categories[0])
+    server.Product(**catalog.products[0])
+    server.User(**users[0])
+    order = batches["orders"][0]
+    server.Order(**order)
+    server.Cart(**batches["carts"][0])
+    server.PaymentTransaction(**batches["payment_transactions"][0])
+    assert {p["category_id"] for p in catalog.products} <= {c["id"] for c in catalog.categories}
+
+    user_ids = {u["id"] for u in users}
+    registered = [o for o in batches["orders"] if o["user_id"]]
+    assert registered and all(o["user_id"] in user_ids for o in registered)
+    assert all(PLAN.start.isoformat() <= o["created_at"] <= PLAN.end.isoformat() for o in batches["orders"])
+    assert all(c["order_id"] is None for c in dataset.generate_abandoned_carts(PLAN, catalog, 0)["carts"])
+
+
+def test_product_popularity_is_skewed():
+    catalog = dataset.build_catalog(PLAN)
+    lines = Counter(
+        item["product_id"]
+        for chunk in range(PLAN.chunks(PLAN.orders))
+        for order in dataset.generate_orders(PLAN, catalog, chunk)["orders"]
+        for item in order["items"]
+    )
+    top = sum(count for _, count in lines.most_common(PLAN.products // 100))
+    assert top / sum(lines.values()) > 0.15
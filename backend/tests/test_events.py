@@ -0,0 +1,62 @@
+import asyncio
+
+import pytest
+
+from events import EventHub
+
+
+def test_publish_resolves_local_waiters_once():
+    async def scenario():
+        hub = EventHub()
+        first = hub.subscribe("payment:cs_1")
+        second = hub.subscribe("payment:cs_1")
+        other = hub.subscribe("payment:cs_2")
+        assert hub.waiting == 3
+
+        await hub.publish("payment:cs_1", {"payment_status": "paid"})
+        assert first.result() == second.result() == {"payment_status": "paid"}
+        assert not other.done()
+
+        hub.unsubscribe("payment:cs_2", other)
+        assert other.cancelled()
+        assert hub.waiting == 0
+
+    asyncio.run(scenario())
+
+
+def test_handlers_run_for_every_event():
+    async def scenario():
+        hub = EventHub()
+        seen = []
+        hub.on("orders:paid", seen.append)
+        hub.on("orders:paid", lambda payload: 1 / 0)  # a failing handler does not stop the others
+
+        await hub.publish("orders:paid", {"order_id": "o1"})
+        await hub.publish("orders:paid", {"order_id": "o2"})
+        await hub.publish("payment:cs_1", {"payment_status": "paid"})
+        assert seen == [{"order_id": "o1"}, {"order_id": "o2"}]
+
+    asyncio.run(scenario())
+
+
+def test_redis_backend_wakes_waiters_on_other_workers():
+    fakeredis = pytest.importorskip("fakeredis")
+
+    async def scenario():
+        server = fakeredis.FakeServer()
+        workers = []
+        for _ in range(2):
+            hub = EventHub()
+            hub._client = fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+            await hub.start()
+            workers.append(hub)
+        webhook_worker, stream_worker = workers
+
+        waiter = stream_worker.subscribe("payment:cs_1")
+        await webhook_worker.publish("payment:cs_1", {"payment_status": "paid"})
+        assert await asyncio.wait_for(waiter, timeout=5) == {"payment_status": "paid"}
+
+        for hub in workers:
+            await hub.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,103 @@
+import asyncio
+import gzip
+import xml.etree.ElementTree as ET
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+import feeds
+
+SITE = "https://gulmobilya.fr"
+G = "{http://base.google.com/ns/1.0}"
+SITEMAP = "{http://www.sitemaps.org/schemas/sitemap/0.9}"
+
+PRODUCT = {
+    "id": "prod-sofa",
+    "name_fr": "Canapé d'angle <Lyon> & co",
+    "name_tr": "Köşe Kanepe",
+    "name_en": "",
+    "description_fr": "Tissu gris",
+    "price": 1299.0,
+    "stock": 0,
+    "images": ["https://img/1.jpg", "https://img/2.jpg"],
+    "category_id": "cat-living",
+}
+CATEGORIES = {"cat-living": {"id": "cat-living", "name_fr": "Salon", "name_tr": "Oturma Odası", "name_en": "Living"}}
+
+
+def test_feed_items_are_escaped_and_fall_back_to_french():
+    feed = feeds.feed_header("en", SITE) + feeds.feed_item(PRODUCT, "en", SITE, CATEGORIES) + feeds.FEED_FOOTER
+    item = ET.fromstring(feed).find("channel/item")
+    assert item.find(f"{G}title").text == "Canapé d'angle <Lyon> & co"
+    assert item.find(f"{G}link").text == f"{SITE}/products/prod-sofa?lang=en"
+    assert item.find(f"{G}availability").text == "out_of_stock"
+    assert item.find(f"{G}price").text == "1299.00 EUR"
+    assert item.find(f"{G}product_type").text == "Living"
+    assert [e.text for e in item.findall(f"{G}additional_image_link")] == ["https://img/2.jpg"]
+
+    sitemap = feeds.SITEMAP_HEADER + feeds.sitemap_entries(PRODUCT, SITE)["tr"] + feeds.SITEMAP_FOOTER
+    url = ET.fromstring(sitemap).find(f"{SITEMAP}url")
+    assert url.find(f"{SITEMAP}loc").text.endswith("?lang=tr")
+    assert len(url.findall("{http://www.w3.org/1999/xhtml}link")) == 3
+
+
+def test_shards_are_stable_and_spread():
+    assert feeds.shard_of("prod-sofa") == feeds.shard_of("prod-sofa")
+    used = {feeds.shard_of(f"p{n}") for n in range(2000)}
+    assert len(used) == feeds.SHARD_COUNT
+
+
+def test_only_files_in_the_manifest_are_published(tmp_path):
+    assert feeds.published_file(tmp_path, "feed-fr-00.xml.gz") is None
+    (tmp_path / "feed-fr-00.xml.gz").write_bytes(b"")
+    feeds.write_manifest(tmp_path, {"files": {"feed-fr-00.xml.gz": '"abc"'}})
+    assert feeds.published_file(tmp_path, "feed-fr-00.xml.gz") == (tmp_path / "feed-fr-00.xml.gz", '"abc"')
+    assert feeds.published_file(tmp_path, "feed-fr-01.xml.gz") is None
+    assert feeds.published_file(tmp_path, "../manifest.json") is None
+    assert feeds.published_file(tmp_path, feeds.MANIFEST) is None
+
+
+def test_identical_content_gives_identical_files(tmp_path):
+    etags = []
+    for _ in range(2):
+        file = feeds._XmlFile(tmp_path, "feed-fr-00.xml.gz")
+        file.write(feeds.feed_header("fr", SITE))
+        file.write(feeds.FEED_FOOTER)
+        etags.append((file.commit(), (tmp_path / "feed-fr-00.xml.gz").read_bytes()))
+    assert etags[0] == etags[1]
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_only_changed_shards_are_rewritten(mongo_url, mongo_db_name, tmp_path):
+    async def scenario():
+        client = AsyncIOMotorClient(mongo_url)
+        database = client[mongo_db_name]
+        try:
+            await database.categories.insert_one(dict(CATEGORIES["cat-living"]))
+            await database.products.insert_many([{**PRODUCT, "id": f"p{n}", "stock": n % 3} for n in range(500)])
+
+            first = await feeds.generate(database, tmp_path, SITE)
+            assert first == {**first, "products": 500, "assigned": 500, "rewritten_shards": feeds.SHARD_COUNT}
+            manifest = feeds.read_manifest(tmp_path)
+            assert sum(shard["count"] for shard in manifest["shards"].values()) == 500
+
+            assert (await feeds.generate(database, tmp_path, SITE))["rewritten_shards"] == 0
+
+            shard = feeds.shard_of("p7")
+            await database.products.update_one({"id": "p7"}, {"$set": {"price": 10.0}})
+            await database.products.insert_one({**PRODUCT, "id": "p-new"})
+            changed = {shard, feeds.shard_of("p-new")}
+            assert (await feeds.generate(database, tmp_path, SITE))["rewritten_shards"] == len(changed)
+
+            with gzip.open(tmp_path / feeds.feed_name("fr", shard)) as f:
+                items = {i.find(f"{G}id").text: i for i in ET.parse(f).getroot().iter("item")}
+            assert items["p7"].find(f"{G}price").text == "10.00 EUR"
+            index = ET.parse(tmp_path / "sitemap-fr.xml").getroot()
+            assert len(index.findall(f"{SITEMAP}sitemap")) == feeds.SHARD_COUNT
+
+            # A category rename touches every product's product_type
+            await database.categories.update_one({"id": "cat-living"}, {"$set": {"name_fr": "Séjour"}})
+            assert (await feeds.generate(database, tmp_path, SITE))["rewritten_shards"] == feeds.SHARD_COUNT
+        finally:
+            client.close()
+
+    asyncio.run(scenario())
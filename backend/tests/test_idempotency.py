@@ -0,0 +1,32 @@
+import asyncio
+
+import pytest
+from motor.motor_asyncio import AsyncIOMotorClient
+
+import idempotency
+
+
+def test_retry_gets_stored_response(mongo_url, mongo_db_name):
+    async def scenario():
+        client = AsyncIOMotorClient(mongo_url)
+        database = client[mongo_db_name]
+        try:
+            fp = idempotency.fingerprint({"cart_session_id": "s1"})
+            assert await idempotency.claim(database, "checkout", "k1", fp) is None
+
+            with pytest.raises(idempotency.IdempotencyInProgress):
+                await idempotency.claim(database, "checkout", "k1", fp)
+            with pytest.raises(idempotency.IdempotencyMismatch):
+                await idempotency.claim(database, "checkout", "k1", idempotency.fingerprint({"cart_session_id": "s2"}))
+
+            await idempotency.complete(database, "checkout", "k1", {"session_id": "cs_1"})
+            assert await idempotency.claim(database, "checkout", "k1", fp) == {"session_id": "cs_1"}
+
+            # A failed attempt releases the key so the client can retry it
+            assert await idempotency.claim(database, "checkout", "k2", fp) is None
+            await idempotency.release(database, "checkout", "k2")
+            assert await idempotency.claim(database, "checkout", "k2", fp) is None
+        finally:
+            client.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,101 @@
+import asyncio
+import io
+import json
+import logging
+import queue
+
+import logs
+from middleware import RequestLogMiddleware
+
+
+def captured(run):
+    stream = io.StringIO()
+    logs.setup("INFO", "json", stream=stream)
+    try:
+        run()
+    finally:
+        logs.shutdown()
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+
+def call(app, path, headers=()):
+    messages = []
+    scope = {"type": "http", "method": "GET", "path": path, "headers": list(headers)}
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    return dict(messages[0]["headers"])
+
+
+def status_app(status):
+    async def app(scope, receive, send):
+        logging.getLogger("gulum.test").info("handling %s", scope["path"], extra={"user_id": "u1"})
+        await send({"type": "http.response.start", "status": status, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    return app
+
+
+def test_records_are_json_with_the_request_correlation_id():
+    def run():
+        headers = call(RequestLogMiddleware(status_app(200)), "/api/cart/s1", [(b"x-request-id", b"abc-123")])
+        assert headers[b"x-request-id"] == b"abc-123"
+        # Unusable ids are replaced by a fresh one
+        headers = call(RequestLogMiddleware(status_app(200)), "/api/cart/s1", [(b"x-request-id", b"bad id\n")])
+        assert len(headers[b"x-request-id"]) == 32
+
+    records = captured(run)
+    handled, request = records[0], records[1]
+    assert handled["message"] == "handling /api/cart/s1"
+    assert handled["correlation_id"] == "abc-123"
+    assert handled["user_id"] == "u1"
+    assert request["logger"] == "gulum.requests"
+    assert request["correlation_id"] == "abc-123"
+    assert request["status"] == 200 and "duration_ms" in request
+    assert records[3]["correlation_id"] not in ("abc-123", "-")
+
+
+def test_sampled_routes_still_log_server_errors():
+    rates = [("/api/products", 0.0)]
+
+    def run():
+        call(RequestLogMiddleware(status_app(200), sample_rates=rates), "/api/products/p1")
+        call(RequestLogMiddleware(status_app(503), sample_rates=rates), "/api/products")
+        call(RequestLogMiddleware(status_app(200), sample_rates=rates), "/api/productsx")
+
+    requests = [r for r in captured(run) if r["logger"] == "gulum.requests"]
+    assert [(r["path"], r["status"]) for r in requests] == [("/api/products", 503), ("/api/productsx", 200)]
+
+
+def test_full_queue_drops_instead_of_blocking():
+    handler = logs.ContextQueueHandler(queue.Queue(1))
+    logger = logging.getLogger("gulum.test.drops")
+    logger.addHandler(handler)
+    logger.propagate = False
+    try:
+        for n in range(3):
+            logger.warning("record %d", n)
+    finally:
+        logger.removeHandler(handler)
+    assert handler.queue.get_nowait().msg == "record 0"
+    assert handler.dropped == 2
+
+
+def test_stats_report_dropped_records():
+    stream = io.StringIO()
+    handler = logs.setup("INFO", "json", stream=stream, queue_size=1)
+    try:
+        # Stands in for a listener that has fallen behind
+        logs._listener.stop()
+        for n in range(3):
+            logging.getLogger("gulum.test.stats").warning("record %d", n)
+        assert logs.stats() == {"queued": 1, "dropped": 2} and handler.dropped == 2
+    finally:
+        logs._listener = None
+        logs.shutdown()
+    assert logs.stats() == {"queued": 0, "dropped": 0}
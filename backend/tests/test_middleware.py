@@ -0,0 +1,184 @@
+import asyncio
+import gzip
+import json
+import time
+
+from middleware import (
+    CRITICAL,
+    LOW,
+    NORMAL,
+    AdmissionMiddleware,
+    AdmissionRule,
+    CacheControlMiddleware,
+    CacheRule,
+    CompressionMiddleware,
+    LoadMonitor,
+    default_admission_rules,
+)
+
+
+def json_app(payload, chunks=1, content_type=b"application/json"):
+    body = json.dumps(payload).encode()
+
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", content_type)]})
+        size = len(body) // chunks + 1
+        parts = [body[i:i + size] for i in range(0, len(body), size)]
+        for i, part in enumerate(parts):
+            await send({"type": "http.response.body", "body": part, "more_body": i < len(parts) - 1})
+
+    return app
+
+
+def call(app, path="/api/products", method="GET", headers=()):
+    messages = []
+    scope = {"type": "http", "method": method, "path": path, "headers": [(k.lower().encode(), v.encode()) for k, v in headers]}
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    start = messages[0]
+    body = b"".join(m.get("body", b"") for m in messages[1:])
+    return start["status"], {k.decode(): v.decode() for k, v in start["headers"]}, body
+
+
+CATALOG = [{"id": f"p{i}", "description_fr": "Canapé élégant et confortable " * 5} for i in range(50)]
+RULES = [
+    CacheRule("/api/products", "public, max-age=300", etag=True, vary=("Accept-Language",)),
+    CacheRule("/api/cart", "no-store", methods=("GET", "POST")),
+]
+
+
+def test_large_json_is_gzipped_and_small_json_is_not():
+    app = CompressionMiddleware(json_app(CATALOG), minimum_size=1024)
+    status, headers, body = call(app, headers=[("Accept-Encoding", "gzip")])
+    assert headers["content-encoding"] == "gzip"
+    assert json.loads(gzip.decompress(body)) == CATALOG
+    assert headers["content-length"] == str(len(body))
+    assert "Accept-Encoding" in headers["vary"]
+
+    small = CompressionMiddleware(json_app({"ok": True}), minimum_size=1024)
+    _, headers, body = call(small, headers=[("Accept-Encoding", "gzip")])
+    assert "content-encoding" not in headers
+    assert json.loads(body) == {"ok": True}
+
+
+def test_streaming_and_event_streams_pass_through():
+    streaming = CompressionMiddleware(json_app(CATALOG, chunks=3), minimum_size=10)
+    _, headers, body = call(streaming, headers=[("Accept-Encoding", "gzip")])
+    assert "content-encoding" not in headers
+    assert json.loads(body) == CATALOG
+
+    events = CompressionMiddleware(json_app(CATALOG, content_type=b"text/event-stream"), minimum_size=10)
+    _, headers, _ = call(events, headers=[("Accept-Encoding", "gzip")])
+    assert "content-encoding" not in headers
+
+
+def test_catalog_gets_cache_headers_and_etag_revalidation():
+    app = CacheControlMiddleware(json_app(CATALOG), RULES)
+    status, headers, _ = call(app)
+    assert status == 200
+    assert headers["cache-control"] == "public, max-age=300"
+    assert headers["vary"] == "Accept-Language"
+
+    status, _, body = call(app, headers=[("If-None-Match", headers["etag"])])
+    assert status == 304
+    assert body == b""
+
+
+def test_private_routes_are_not_stored():
+    app = CacheControlMiddleware(json_app({"items": []}), RULES)
+    _, headers, _ = call(app, path="/api/cart/abc", method="POST")
+    assert headers["cache-control"] == "no-store"
+    assert "etag" not in headers
+
+    _, headers, _ = call(app, path="/api/contact", method="POST")
+    assert "cache-control" not in headers
+
+
+ADMISSION_RULES = [
+    AdmissionRule("/api/checkout", CRITICAL, limit=1, queue_timeout=0.05),
+    AdmissionRule("/api/cart", NORMAL),
+    AdmissionRule("/api/products", LOW),
+]
+
+
+def test_low_priority_is_shed_first_under_load():
+    monitor = LoadMonitor()
+    app = AdmissionMiddleware(json_app({"ok": True}), ADMISSION_RULES, monitor, loop_lag_ms=100, pool_wait_ms=50)
+    assert call(app)[0] == 200
+
+    monitor.loop_lag_ms = 150
+    status, headers, body = call(app)
+    assert (status, headers["retry-after"]) == (503, "2")
+    assert json.loads(body)["reason"] == "overloaded"
+    assert call(app, path="/api/cart/abc")[0] == 200
+
+    monitor.loop_lag_ms, monitor.pool_wait_ms = 0, 120
+    assert call(app, path="/api/cart/abc")[0] == 503
+    assert call(app, path="/api/checkout/session", method="POST")[0] == 200
+    assert call(app, path="/api/health/ready")[0] == 200
+    assert monitor.outcomes == {"low:admitted": 1, "low:shed": 1, "normal:admitted": 1, "normal:shed": 1,
+                                "critical:admitted": 1}
+
+
+def test_default_rules_cover_the_api_routes():
+    app = AdmissionMiddleware(json_app({}), default_admission_rules(), LoadMonitor())
+    assert app.match("POST", "/api/shipping/quote").priority == NORMAL
+    assert app.match("POST", "/api/products/bulk").priority == NORMAL
+    assert app.match("GET", "/api/products/p1").priority == LOW
+    assert app.match("GET", "/api/currencies").priority == LOW
+    assert app.match("GET", "/api/health/ready") is None
+
+
+def test_requests_over_the_limit_time_out_in_the_queue():
+    release = asyncio.Event()
+
+    async def slow(scope, receive, send):
+        await release.wait()
+        await json_app({"ok": True})(scope, receive, send)
+
+    app = AdmissionMiddleware(slow, ADMISSION_RULES, LoadMonitor())
+    scope = {"type": "http", "method": "POST", "path": "/api/checkout/session", "headers": []}
+
+    async def request():
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+
+        await app(scope, None, send)
+        return messages[0]["status"]
+
+    async def scenario():
+        first = asyncio.create_task(request())
+        await asyncio.sleep(0)
+        second = await request()
+        release.set()
+        return await first, second, await request()
+
+    assert asyncio.run(scenario()) == (200, 503, 200)
+
+
+def test_monitor_measures_loop_lag_and_pool_wait():
+    async def scenario():
+        monitor = LoadMonitor(interval=0.01)
+        monitor.start()
+        await asyncio.sleep(0.03)
+        # A checkout still waiting counts with its age so far
+        monitor.connection_check_out_started(None)
+        time.sleep(0.2)
+        await asyncio.sleep(0)
+        lag, wait = monitor.loop_lag_ms, monitor.pool_wait_ms
+        monitor.connection_checked_out(None)
+        await asyncio.sleep(0.05)
+        await monitor.close()
+        return lag, wait, monitor.pool_wait_ms
+
+    lag, wait, wait_after = asyncio.run(scenario())
+    assert lag >= 100 and wait >= 150
+    assert wait_after < 50
@@ -0,0 +1,60 @@
+import asyncio
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+import migrations
+
+
+def test_migrations_run_once_across_concurrent_runners(mongo_url, mongo_db_name, monkeypatch):
+    calls = []
+    registry = {}
+    monkeypatch.setattr(migrations, "MIGRATIONS", registry)
+
+    @migrations.migration(1, "first")
+    async def first(database):
+        calls.append(1)
+        await asyncio.sleep(0.2)
+        await database.things.insert_one({"id": "a"})
+
+    @migrations.migration(2, "second")
+    async def second(database):
+        calls.append(2)
+
+    async def scenario():
+        client = AsyncIOMotorClient(mongo_url)
+        database = client[mongo_db_name]
+        try:
+            results = await asyncio.gather(*(migrations.run_migrations(database) for _ in range(4)))
+            assert sorted(results, key=len) == [[], [], [], [1, 2]]
+            assert calls == [1, 2]
+            assert await database.things.count_documents({}) == 1
+            assert await migrations.pending_migrations(database) == []
+            assert await database.migrations.find_one({"_id": migrations.LOCK_ID}) is None
+        finally:
+            client.close()
+
+    asyncio.run(scenario())
+
+
+def test_lease_is_renewed_while_a_migration_outlives_it(mongo_url, mongo_db_name, monkeypatch):
+    calls = []
+    monkeypatch.setattr(migrations, "MIGRATIONS", {})
+
+    @migrations.migration(1, "rewrite everything")
+    async def slow(database):
+        calls.append(1)
+        await asyncio.sleep(2.5)
+
+    async def scenario():
+        client = AsyncIOMotorClient(mongo_url)
+        database = client[mongo_db_name]
+        try:
+            first = asyncio.create_task(migrations.run_migrations(database, lease_seconds=1, wait_seconds=10))
+            await asyncio.sleep(0.2)
+            # Waits past the one-second lease instead of running it again
+            assert await migrations.run_migrations(database, lease_seconds=1, wait_seconds=10) == []
+            assert await first == [1] and calls == [1]
+        finally:
+            client.close()
+
+    asyncio.run(scenario())
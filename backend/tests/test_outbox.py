@@ -0,0 +1,167 @@
+import asyncio
+import socket
+import socketserver
+import threading
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from motor.motor_asyncio import AsyncIOMotorClient
+
+import notifications
+import outbox
+from repository import OrderRepository
+from storefront import LANGUAGES
+
+ORDER = {
+    "id": "3f2a9c1e-0000-4000-8000-000000000000",
+    "customer_name": "Ayşe Demir",
+    "customer_email": "ayse@example.com",
+    "customer_phone": "+33 6 00 00 00 00",
+    "customer_address": "1 rue de Lyon, Villeurbanne",
+    "items": [{"product_id": "p1", "name_fr": "Canapé", "name_tr": "Kanepe", "name_en": "Sofa",
+               "quantity": 2, "subtotal": 1798.0}],
+    "total": 1798.0,
+}
+
+
+@pytest.mark.parametrize("kind", [outbox.ORDER_CREATED, outbox.ORDER_PAID])
+@pytest.mark.parametrize("lang", LANGUAGES)
+def test_every_template_renders_in_every_language(kind, lang):
+    for audience in ("customer", "shop"):
+        assert set(notifications.TEMPLATES[f"{kind}:{audience}"]) == set(LANGUAGES)
+    message = notifications.render(kind, "customer", {**ORDER, "language": lang}, "shop@x.fr", "shop@x.fr")
+    assert message["To"] == "ayse@example.com"
+    assert "3F2A9C1E" in message["Subject"]
+    body = message.get_content()
+    assert "1798.00" in body and "{" not in body
+    if kind == outbox.ORDER_CREATED:
+        assert {"fr": "Canapé", "tr": "Kanepe", "en": "Sofa"}[lang] in body
+
+
+def test_shop_copy_is_turkish_and_unknown_languages_fall_back():
+    shop = notifications.render(outbox.ORDER_CREATED, "shop", {**ORDER, "language": "en"}, "a@x.fr", "shop@x.fr")
+    assert shop["To"] == "shop@x.fr"
+    assert shop["Subject"].startswith("Yeni sipariş")
+    customer = notifications.render(outbox.ORDER_CREATED, "customer", {**ORDER, "language": "de"}, "a@x.fr", None)
+    assert customer["Subject"].startswith("Votre commande")
+
+
+def test_messages_have_stable_ids_and_back_off():
+    messages = outbox.order_messages(outbox.ORDER_PAID, "o1", None)
+    assert [m["_id"] for m in messages] == ["order_paid:customer:o1"]
+    assert len(outbox.order_messages(outbox.ORDER_PAID, "o1", "shop@x.fr")) == 2
+    assert [outbox.retry_delay(n).total_seconds() for n in (1, 2, 3)] == [30, 60, 120]
+    assert outbox.retry_delay(20) == outbox.RETRY_CAP
+
+
+class _SmtpHandler(socketserver.StreamRequestHandler):
+    def reply(self, line: str):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        self.reply("220 test")
+        while line := self.rfile.readline().decode().strip():
+            command = line.split(" ")[0].upper()
+            if command == "DATA":
+                self.reply("354 go ahead")
+                lines = []
+                while (data := self.rfile.readline()) != b".\r\n":
+                    lines.append(data)
+                self.server.received.append(b"".join(lines))
+                self.reply("250 queued")
+            elif command == "RCPT" and "reject" in line:
+                self.reply("550 no such user")
+            elif command == "QUIT":
+                self.reply("221 bye")
+                return
+            else:
+                self.reply("250 ok")
+
+
+@pytest.fixture
+def smtp_server():
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), _SmtpHandler)
+    server.daemon_threads = True
+    server.received = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_smtp_transport_sends_a_batch_over_one_connection(smtp_server):
+    port = smtp_server.server_address[1]
+    transport = notifications.transport_from_url(f"smtp://127.0.0.1:{port}")
+    messages = [
+        notifications.render(outbox.ORDER_CREATED, "customer", ORDER, "shop@x.fr", None),
+        notifications.render(outbox.ORDER_CREATED, "customer", {**ORDER, "customer_email": "reject@x.fr"},
+                             "shop@x.fr", None),
+        notifications.render(outbox.ORDER_PAID, "shop", ORDER, "shop@x.fr", "shop@x.fr"),
+    ]
+    results = asyncio.run(transport.send_batch(messages))
+    assert results[0] is None and results[2] is None
+    assert results[1] is not None
+    assert len(smtp_server.received) == 2
+
+
+def test_unreachable_smtp_server_fails_the_whole_batch():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    transport = notifications.SmtpTransport("127.0.0.1", port, timeout=1)
+    messages = [notifications.render(outbox.ORDER_PAID, "customer", ORDER, "a@x.fr", None)] * 2
+    results = asyncio.run(transport.send_batch(messages))
+    assert all(isinstance(error, OSError) for error in results)
+
+
+class FlakyTransport:
+    def __init__(self, failures: int):
+        self.failures = failures
+        self.sent = []
+
+    async def send_batch(self, messages):
+        if self.failures:
+            self.failures -= 1
+            return [ConnectionError("server busy")] * len(messages)
+        self.sent.extend(messages)
+        return [None] * len(messages)
+
+
+def test_order_and_messages_are_written_together_and_retried(mongo_url, mongo_db_name):
+    async def scenario():
+        client = AsyncIOMotorClient(mongo_url)
+        database = client[mongo_db_name]
+        try:
+            await database.orders.create_index([("cart_session_id", 1), ("cart_version", 1)], unique=True)
+            await database.carts.insert_one({"session_id": "s1", "items": [{"product_id": "p1"}], "version": 0})
+            orders = OrderRepository(database)
+            order = {**ORDER, "cart_session_id": "s1", "cart_version": 0}
+            messages = outbox.order_messages(outbox.ORDER_CREATED, ORDER["id"], "shop@x.fr")
+            await orders.create_from_cart(order, messages)
+            # A retried checkout neither duplicates the order nor its emails
+            await orders.create_from_cart({**order, "id": "other"}, messages)
+            assert await database.notification_outbox.count_documents({}) == 2
+
+            transport = FlakyTransport(failures=1)
+            worker = outbox.OutboxWorker(database, transport, "a@x.fr", shop_email="shop@x.fr")
+            assert await worker.drain() == 2
+            assert worker.metrics["retried"] == 2 and not transport.sent
+            # Not due yet
+            assert await worker.drain() == 0
+            await database.notification_outbox.update_many(
+                {}, {"$set": {"next_attempt_at": datetime.now(timezone.utc) - timedelta(seconds=1)}}
+            )
+            assert await worker.drain() == 2
+            assert sorted(m["To"] for m in transport.sent) == ["ayse@example.com", "shop@x.fr"]
+            stats = await outbox.queue_stats(database.notification_outbox)
+            assert stats["counts"]["sent"] == 2 and stats["counts"]["pending"] == 0
+
+            paid = outbox.order_messages(outbox.ORDER_PAID, ORDER["id"], None)
+            assert await orders.mark_paid(ORDER["id"], "2026-01-01T00:00:00+00:00", paid) is not None
+            assert await orders.mark_paid(ORDER["id"], "2026-01-01T00:00:00+00:00", paid) is None
+            assert await database.notification_outbox.count_documents({"kind": outbox.ORDER_PAID}) == 1
+        finally:
+            client.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,55 @@
+import asyncio
+import itertools
+from types import SimpleNamespace
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+import payments
+
+
+class FakeStripe:
+    def __init__(self):
+        self.ids = itertools.count(1)
+        self.open = set()
+
+    async def create(self):
+        await asyncio.sleep(0.01)
+        session_id = f"cs_{next(self.ids)}"
+        self.open.add(session_id)
+        return SimpleNamespace(session_id=session_id, url=f"https://checkout.stripe.test/{session_id}")
+
+    async def expire(self, session_id):
+        self.open.discard(session_id)
+        return True
+
+
+def test_checking_out_twice_leaves_one_open_session(mongo_url, mongo_db_name):
+    async def scenario():
+        client = AsyncIOMotorClient(mongo_url)
+        database = client[mongo_db_name]
+        stripe = FakeStripe()
+
+        def checkout(amount=1299.0, currency="eur"):
+            return payments.open_session(
+                database, "o1", amount, currency, stripe.create, stripe.expire,
+                lambda session: {"session_id": session.session_id, "order_id": "o1", "amount": amount,
+                                 "currency": currency, "url": session.url, "status": "pending",
+                                 "payment_status": "pending", "created_at": "9999"},
+            )
+
+        try:
+            await database.orders.insert_one({"id": "o1", "status": "pending"})
+            first = await checkout()
+            # A retry, or a customer back from the cancel page, gets the same session
+            assert await checkout() == first
+            assert stripe.open == {first[0]}
+
+            # Another amount needs a new session; the old one can no longer be paid
+            second = await checkout(currency="try", amount=48000.0)
+            assert second != first and stripe.open == {second[0]}
+            assert (await database.orders.find_one({"id": "o1"}))["payment_session_id"] == second[0]
+            assert await database.payment_transactions.count_documents({"status": "pending"}) == 1
+        finally:
+            client.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,91 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+from motor.motor_asyncio import AsyncIOMotorClient
+
+import promotions
+from promotions import InvalidCode, PromotionEngine
+
+NOW = datetime(2025, 3, 10, 12, tzinfo=timezone.utc).timestamp()
+
+
+def line(product_id: str, price: float, quantity: int, category_id: str = "cat-furniture"):
+    return {"product_id": product_id, "category_id": category_id, "price": price, "quantity": quantity,
+            "subtotal": price * quantity}
+
+
+def engine(*rules):
+    compiled = PromotionEngine()
+    compiled.set_rules([{"id": f"r{n}", "name": f"rule {n}", **rule} for n, rule in enumerate(rules)])
+    return compiled
+
+
+def test_sales_take_the_best_rule_per_line_then_the_code():
+    rules = engine(
+        {"kind": "percent", "value": 20, "category_ids": ["cat-furniture"]},
+        {"kind": "percent", "value": 10, "product_ids": ["sofa"]},
+        {"kind": "buy_x_get_y", "value": 100, "buy_quantity": 2, "get_quantity": 1, "product_ids": ["chair"]},
+        # Outside its dates
+        {"kind": "percent", "value": 50, "ends_at": "2025-03-01T00:00:00+00:00"},
+        {"kind": "fixed", "value": 30, "min_subtotal": 1000},
+        {"kind": "percent", "value": 10, "code": "welcome10"},
+    )
+    items = [line("sofa", 1000.0, 1), line("chair", 100.0, 4), line("tea", 60.0, 1, "cat-appliances")]
+
+    pricing = rules.apply(items, now=NOW)
+    # sofa -200 (category beats product), one chair free beats -20%, then
+    # the 30 off is spread over the 1160 left
+    assert [i["discount"] for i in pricing["items"]] == [220.69, 107.76, 1.55]
+    assert (pricing["subtotal"], pricing["discount"], pricing["total"]) == (1460.0, 330.0, 1130.0)
+
+    with_code = rules.apply(items, code=" Welcome10 ", now=NOW)
+    assert with_code["total"] == 1017.0
+    assert [p["code"] for p in with_code["promotions"]] == [None, None, None, "WELCOME10"]
+    assert sum(p["amount"] for p in with_code["promotions"]) == with_code["discount"]
+
+    for code in ("nope", "WELCOME10"):
+        with pytest.raises(InvalidCode):
+            rules.apply(items, code=code, now=NOW, exclude={"r5"} if code == "WELCOME10" else ())
+
+
+def test_fixed_codes_need_covered_lines_and_never_go_negative():
+    rules = engine(
+        {"kind": "fixed", "value": 500, "code": "LAMPS", "category_ids": ["cat-lighting"]},
+        {"kind": "fixed", "value": 50, "code": "BIG", "min_subtotal": 100},
+    )
+    with pytest.raises(InvalidCode):
+        rules.apply([line("sofa", 80.0, 1)], code="LAMPS", now=NOW)
+    with pytest.raises(InvalidCode):
+        rules.apply([line("sofa", 80.0, 1)], code="BIG", now=NOW)
+    pricing = rules.apply([line("lamp", 90.0, 1, "cat-lighting"), line("sofa", 80.0, 1)], code="LAMPS", now=NOW)
+    assert [i["discount"] for i in pricing["items"]] == [90.0, 0.0] and pricing["total"] == 80.0
+
+
+def test_usage_caps_hold_under_concurrent_orders(mongo_url, mongo_db_name):
+    async def scenario():
+        client = AsyncIOMotorClient(mongo_url)
+        database = client[mongo_db_name]
+        try:
+            await database.promotions.insert_many([
+                {"id": "launch", "name": "Launch", "kind": "percent", "value": 15, "max_uses": 3, "uses": 0, "active": True},
+                {"id": "sale", "name": "Sale", "kind": "percent", "value": 5, "active": True},
+            ])
+            rules = PromotionEngine()
+            await rules.load(database)
+            items = [line("sofa", 100.0, 1)]
+
+            results = await asyncio.gather(*[promotions.price_order(rules, database, items) for _ in range(8)])
+            totals = sorted(pricing["total"] for pricing, _ in results)
+            # Three orders got the capped rule; the others fell back to the sale
+            assert totals == [85.0] * 3 + [95.0] * 5
+            assert (await database.promotions.find_one({"id": "launch"}))["uses"] == 3
+
+            await promotions.release(database, next(used for _, used in results if used))
+            assert (await database.promotions.find_one({"id": "launch"}))["uses"] == 2
+            await rules.load(database)
+            assert "launch" in rules.rules
+        finally:
+            client.close()
+
+    asyncio.run(scenario())
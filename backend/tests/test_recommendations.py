@@ -0,0 +1,102 @@
+import asyncio
+
+import numpy as np
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from recommendations import RelatedProducts, merge_counts, price_neighbours
+
+CATALOG = [
+    {"id": "sofa", "category_id": "salon", "price": 1000.0, "stock": 3},
+    {"id": "armchair", "category_id": "salon", "price": 400.0, "stock": 3},
+    {"id": "pouf", "category_id": "salon", "price": 90.0, "stock": 3},
+    {"id": "rug", "category_id": "deco", "price": 150.0, "stock": 3},
+    {"id": "lamp", "category_id": "deco", "price": 60.0, "stock": 0},
+]
+
+
+def related_ids(index, product_id):
+    return [p["id"] for p in index.related(product_id)]
+
+
+def test_merge_counts_accumulates_batches():
+    codes, counts = merge_counts(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.array([5, 3, 5]))
+    codes, counts = merge_counts(codes, counts, np.array([3, 7]))
+    assert codes.tolist() == [3, 5, 7]
+    assert counts.tolist() == [2, 2, 1]
+
+
+def test_co_purchases_rank_before_price_neighbours():
+    index = RelatedProducts(limit=3)
+    index.set_catalog(CATALOG)
+    # Nothing bought yet: same category, closest price first
+    assert related_ids(index, "sofa") == ["armchair", "pouf"]
+
+    index.add_basket(["sofa", "rug"])
+    index.add_basket(["sofa", "rug", "lamp"])
+    index.add_basket(["pouf", "sofa"])
+    # Out-of-stock products are never suggested
+    assert related_ids(index, "sofa") == ["rug", "pouf", "armchair"]
+    assert related_ids(index, "rug") == ["sofa"]
+    assert index.related("unknown") is None
+
+
+def test_price_neighbours_match_a_full_ranking():
+    catalog = [{"id": f"p{n}", "category_id": "salon", "price": float(price)}
+               for n, price in enumerate([90, 1000, 400, 60, 150, 2500, 95, 720])]
+    neighbours = price_neighbours(catalog, 3)
+    assert neighbours["p2"] == ["p7", "p1", "p4"]
+    assert neighbours["p5"] == ["p1", "p7", "p2"]
+    assert price_neighbours(catalog[:2], 3) == {"p0": ["p1"], "p1": ["p0"]}
+
+
+def test_catalog_reloads_requested_meanwhile_run_once_more():
+    class Products:
+        def __init__(self):
+            self.catalog, self.loads = list(CATALOG), 0
+
+        def find(self, *args):
+            return self
+
+        async def to_list(self, length):
+            self.loads += 1
+            catalog = list(self.catalog)
+            await asyncio.sleep(0.01)
+            return catalog
+
+    async def scenario():
+        database = type("Database", (), {"products": Products()})()
+        index = RelatedProducts(limit=3)
+        index.reload_catalog(database)
+        await asyncio.sleep(0)
+        database.products.catalog.append({"id": "chair", "category_id": "salon", "price": 380.0, "stock": 3})
+        for _ in range(3):
+            index.reload_catalog(database)
+        await index._reload
+        assert database.products.loads == 2
+        assert related_ids(index, "armchair") == ["chair", "sofa", "pouf"]
+        await index.close()
+
+    asyncio.run(scenario())
+
+
+def test_build_counts_paid_orders_only(mongo_url, mongo_db_name):
+    async def scenario():
+        client = AsyncIOMotorClient(mongo_url)
+        database = client[mongo_db_name]
+        try:
+            await database.products.insert_many([dict(p) for p in CATALOG])
+            await database.orders.insert_many([
+                {"status": "paid", "items": [{"product_id": "pouf"}, {"product_id": "rug"}]},
+                {"status": "paid", "items": [{"product_id": "rug"}, {"product_id": "pouf"}, {"product_id": "pouf"}]},
+                {"status": "paid", "items": [{"product_id": "armchair"}, {"product_id": "rug"}]},
+                {"status": "pending", "items": [{"product_id": "sofa"}, {"product_id": "rug"}]},
+            ])
+            index = RelatedProducts(limit=3)
+            await index.load_catalog(database)
+            await index.build(database, batch_size=1)
+            assert related_ids(index, "rug") == ["pouf", "armchair"]
+            assert related_ids(index, "pouf")[0] == "rug"
+        finally:
+            client.close()
+
+    asyncio.run(scenario())
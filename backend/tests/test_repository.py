@@ -0,0 +1,133 @@
+import asyncio
+
+import pytest
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from conftest import CommandRecorder
+from repository import CartChanged, OrderRepository, ProductRepository, UserRepository, VersionConflict
+
+
+def run_with_db(mongo_url, db_name, scenario):
+    async def runner():
+        recorder = CommandRecorder()
+        client = AsyncIOMotorClient(mongo_url, event_listeners=[recorder])
+        try:
+            await scenario(client[db_name], recorder)
+        finally:
+            client.close()
+
+    asyncio.run(runner())
+
+
+def test_product_update_is_one_round_trip(mongo_url, mongo_db_name):
+    async def scenario(database, recorder):
+        await database.products.insert_one({"id": "p1", "price": 10.0, "version": 0})
+        products = ProductRepository(database)
+
+        recorder.reset()
+        updated = await products.update("p1", {"price": 12.0}, expected_version=0)
+        assert recorder.commands == ["findAndModify"]
+        assert updated == {"id": "p1", "price": 12.0, "version": 1}
+
+        recorder.reset()
+        assert await products.update("missing", {"price": 1.0}) is None
+        assert recorder.commands == ["findAndModify"]
+
+    run_with_db(mongo_url, mongo_db_name, scenario)
+
+
+def test_concurrent_edits_are_detected(mongo_url, mongo_db_name):
+    async def scenario(database, recorder):
+        # Legacy document without a version field counts as version 0
+        await database.products.insert_one({"id": "p1", "price": 10.0})
+        products = ProductRepository(database)
+
+        first, second = await asyncio.gather(
+            products.update("p1", {"price": 11.0}, expected_version=0),
+            products.update("p1", {"price": 12.0}, expected_version=0),
+            return_exceptions=True,
+        )
+        outcomes = sorted(type(r).__name__ for r in (first, second))
+        assert outcomes == ["VersionConflict", "dict"]
+
+        with pytest.raises(VersionConflict) as exc:
+            await products.delete("p1", expected_version=0)
+        assert exc.value.current_version == 1
+        assert await products.delete("p1", expected_version=1) is True
+        assert await products.delete("p1", expected_version=1) is False
+
+    run_with_db(mongo_url, mongo_db_name, scenario)
+
+
+def test_profile_update_is_one_round_trip(mongo_url, mongo_db_name):
+    async def scenario(database, recorder):
+        await database.users.insert_one({"id": "u1", "name": "Ayşe", "password": "hash"})
+        users = UserRepository(database)
+
+        recorder.reset()
+        updated = await users.update_profile("u1", {"phone": "0601443115"})
+        assert recorder.commands == ["findAndModify"]
+        assert updated == {"id": "u1", "name": "Ayşe", "phone": "0601443115"}
+
+    run_with_db(mongo_url, mongo_db_name, scenario)
+
+
+def cart_order(order_id, version):
+    return {"id": order_id, "cart_session_id": "s1", "cart_version": version, "status": "pending", "total": 10.0}
+
+
+@pytest.mark.parametrize("transactions", [True, False], ids=["transaction", "unique-index"])
+def test_parallel_finalization_creates_one_order(mongo_url, mongo_db_name, transactions):
+    async def scenario(database, recorder):
+        orders = OrderRepository(database)
+        if transactions and not await orders.supports_transactions():
+            pytest.skip("MongoDB is not a replica set; start mongod with --replSet for transactions")
+        orders._transactions = transactions
+        await database.orders.create_index(
+            [("cart_session_id", 1), ("cart_version", 1)],
+            unique=True,
+            partialFilterExpression={"cart_version": {"$exists": True}},
+        )
+        await database.carts.insert_one({"session_id": "s1", "items": [{"product_id": "p1", "quantity": 1}], "version": 3})
+
+        results = await asyncio.gather(*(orders.create_from_cart(cart_order(f"o{n}", 3)) for n in range(8)))
+        assert len({r["id"] for r in results}) == 1
+        assert await database.orders.count_documents({}) == 1
+        cart = await database.carts.find_one({"session_id": "s1"})
+        assert cart["order_id"] == results[0]["id"]
+
+        # A stale version (the cart was edited after pricing) writes nothing
+        with pytest.raises(CartChanged):
+            await orders.create_from_cart(cart_order("stale", 2))
+        assert await database.orders.count_documents({}) == 1
+
+    run_with_db(mongo_url, mongo_db_name, scenario)
+
+
+@pytest.mark.parametrize("transactions", [True, False], ids=["transaction", "standalone"])
+def test_paid_orders_reach_the_rollups_with_the_status(mongo_url, mongo_db_name, transactions, monkeypatch):
+    async def scenario(database, recorder):
+        orders = OrderRepository(database)
+        if transactions and not await orders.supports_transactions():
+            pytest.skip("MongoDB is not a replica set; start mongod with --replSet for transactions")
+        orders._transactions = transactions
+        order = {"id": "o1", "status": "pending", "total": 30.0,
+                 "items": [{"product_id": "p1", "category_id": "c1", "quantity": 2, "price": 15.0}]}
+        await database.orders.insert_many([order, {**order, "id": "o2"}])
+
+        paid = await asyncio.gather(*(orders.mark_paid("o1", "2026-10-19T10:00:00+00:00") for _ in range(4)))
+        assert [p["id"] for p in paid if p is not None] == ["o1"]
+        day = await database.sales_daily.find_one({"_id": "2026-10-19"})
+        assert (day["orders"], day["revenue"], day["units"]) == (1, 30.0, 2)
+
+        if transactions:
+            # A failed rollup write leaves the order unpaid, to be retried
+            async def unavailable(*args, **kwargs):
+                raise RuntimeError("rollup write failed")
+
+            monkeypatch.setattr("analytics.record_paid_order", unavailable)
+            with pytest.raises(RuntimeError):
+                await orders.mark_paid("o2", "2026-10-19T11:00:00+00:00")
+            assert (await database.orders.find_one({"id": "o2"}))["status"] == "pending"
+
+    run_with_db(mongo_url, mongo_db_name, scenario)
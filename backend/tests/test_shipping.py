@@ -0,0 +1,46 @@
+import pytest
+
+from shipping import NoDelivery, ShippingRates, postcode_in
+
+ZONES = [
+    {"id": "france", "name": "France", "postcodes": [""], "bands": [{"max_kg": 30, "price": 29}, {"max_kg": 100, "price": 69}],
+     "per_kg_over": 0.5, "bulky_fee": 30},
+    {"id": "idf", "name": "Île-de-France", "postcodes": ["75", "92"], "bands": [{"max_kg": 100, "price": 49}, {"max_kg": 30, "price": 19}]},
+    {"id": "paris-1", "name": "Paris 1er", "postcodes": ["75001"], "bands": [{"max_kg": 10, "price": 5}]},
+]
+
+TEA_SET = {"weight_kg": 4.5, "length_cm": 42, "width_cm": 32, "height_cm": 36}
+SOFA = {"weight_kg": 68, "length_cm": 220, "width_cm": 95, "height_cm": 85}
+
+
+def rates(docs=ZONES):
+    compiled = ShippingRates()
+    compiled.set_zones(docs)
+    return compiled
+
+
+def test_postcodes_go_to_the_longest_matching_prefix():
+    shipping_rates = rates()
+    assert [shipping_rates.zone_for(p).id for p in ("75001", "75 011", "92100", "69003", "")] == [
+        "paris-1", "idf", "idf", "france", "france"
+    ]
+    with pytest.raises(NoDelivery):
+        rates(ZONES[1:]).zone_for("69003")
+    assert postcode_in("12 rue de la Paix, 75 002 Paris") == "75002"
+    assert postcode_in("123 Test Street, Test City") is None
+
+
+def test_quotes_charge_the_larger_of_weight_and_volume():
+    shipping_rates = rates()
+    # 6 x 4.5 kg = 27 kg, but 6 x 0.048 m³ count as 58 kg
+    quote = shipping_rates.quote("69003", [(TEA_SET, 6)])
+    assert (quote["zone"], quote["weight_kg"], quote["chargeable_kg"], quote["bulky"], quote["price"]) == (
+        "france", 27.0, 59, False, 69.0
+    )
+    assert shipping_rates.quote("92100", [(TEA_SET, 1)])["price"] == 19.0
+    # 356 kg by volume: 256 kg past the last band, and a two-person crew
+    assert shipping_rates.quote("69003", [(SOFA, 1)])["price"] == 69 + 256 * 0.5 + 30
+    # Unmeasured products count their default weight
+    assert shipping_rates.quote("13001", [({}, 2)])["chargeable_kg"] == 10
+    assert rates([]).quote("13001", [(SOFA, 1)])["price"] == 0.0
+    assert shipping_rates.quote("13001", [])["price"] == 0.0
@@ -0,0 +1,36 @@
+from storefront import localize_product, negotiate_language
+
+PRODUCT = {
+    "id": "prod-tea-set",
+    "name_fr": "Service à Thé Turc Traditionnel",
+    "name_tr": "Geleneksel Türk Çay Seti",
+    "name_en": "",
+    "description_fr": "Service à thé turc complet.",
+    "description_tr": "Komple Türk çay seti.",
+    "description_en": "Complete Turkish tea set.",
+    "price": 89.0,
+    "images": ["https://example.com/1.jpg", "https://example.com/2.jpg"],
+    "stock": 25,
+    "featured": False,
+    "category_id": "cat-appliances",
+}
+
+
+def test_language_negotiation():
+    assert negotiate_language("tr", "en-US,en") == "tr"
+    assert negotiate_language(None, "de-DE,en;q=0.8") == "en"
+    assert negotiate_language("de", None) == "fr"
+
+
+def test_product_is_projected_to_one_language():
+    product = localize_product(PRODUCT, "tr")
+    assert product["name_tr"] == "Geleneksel Türk Çay Seti"
+    assert product["description_tr"] == "Komple Türk çay seti."
+    assert "name_fr" not in product and "description_en" not in product
+    assert product["images"] == ["https://example.com/1.jpg"]
+
+
+def test_missing_translation_falls_back_to_french():
+    product = localize_product(PRODUCT, "en", with_description=False)
+    assert product["name_en"] == "Service à Thé Turc Traditionnel"
+    assert "description_en" not in product
@@ -0,0 +1,71 @@
+import asyncio
+from types import SimpleNamespace
+
+from fastapi import FastAPI
+
+from middleware import LoadMonitor
+from warmup import Warmup
+
+PRIMARY = ("mongo-0", 27017)
+
+
+class FakeDatabase:
+    """Opens a connection to the primary on every ping, like a cold pool."""
+
+    def __init__(self, monitor: LoadMonitor):
+        self.monitor = monitor
+        self.client = SimpleNamespace(topology_description=SimpleNamespace(
+            readable_servers=[SimpleNamespace(address=PRIMARY)]
+        ))
+        monitor.pool_created(SimpleNamespace(address=PRIMARY))
+        # An arbiter's pool is never filled and must not be waited for
+        monitor.pool_created(SimpleNamespace(address=("arbiter", 27017)))
+
+    async def command(self, name):
+        self.monitor.connection_ready(SimpleNamespace(address=PRIMARY))
+
+    def profile(self, name):
+        return self
+
+
+def test_warmup_primes_the_pool_and_requests_each_path():
+    app = FastAPI()
+    served = []
+
+    @app.get("/api/products")
+    async def products(featured: bool = False):
+        served.append(("products", featured))
+        return []
+
+    @app.get("/api/broken")
+    async def broken():
+        raise RuntimeError("no catalog")
+
+    async def paths():
+        return ["/api/products", "/api/products?featured=true", "/api/broken", "/api/missing"]
+
+    async def scenario():
+        monitor, warmup = LoadMonitor(), Warmup()
+        warmup.start(app, FakeDatabase(monitor), monitor, 3, paths, timeout=5)
+        assert not warmup.finished
+        await warmup._task
+        assert warmup.finished and warmup.state == "done"
+        assert monitor.open_connections()[PRIMARY] >= 3
+        assert served == [("products", False), ("products", True)]
+        # A 404 is an answer; a failing route is logged and skipped
+        assert warmup.describe()["failed"] == ["/api/broken"]
+        assert set(warmup.stages) == {"pool", "requests"}
+
+    asyncio.run(scenario())
+
+
+def test_a_slow_warmup_still_ends():
+    async def paths():
+        await asyncio.sleep(60)
+
+    async def scenario():
+        monitor, warmup = LoadMonitor(), Warmup()
+        await warmup.run(FastAPI(), FakeDatabase(monitor), monitor, 1, paths, timeout=0.05)
+        assert warmup.finished and warmup.state == "timed out"
+
+    asyncio.run(scenario())
@@ -0,0 +1,142 @@
+"""Warm-up of a worker before it reports ready.
+
+Without it, the first requests a new worker serves pay for opening MongoDB
+connections, for reading the catalog into a cold cache and for the first run
+of each route's validation and serialization code. ``Warmup.run`` does that
+work once, in the background after the lifespan has started:
+
+* ``pool``: pings the servers until the driver holds ``connections`` open
+  connections to each primary and secondary (they are kept: the lifespan
+  raises ``minPoolSize`` to the same number);
+* ``requests``: sends one ``GET`` for each path of ``paths()`` through the
+  application itself, with no socket involved. The catalog, categories and
+  storefront responses land in the cache, and every middleware and response
+  model on the way runs once.
+
+``/api/health/ready`` answers 503 until warm-up has finished. A failed
+request is logged and skipped; a warm-up failing or running past ``timeout``
+is logged and the worker becomes ready anyway, since warm-up only makes the
+first requests faster.
+"""
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+POOL_POLL_INTERVAL = 0.01
+
+
+async def get(app, path: str) -> int:
+    """Runs ``GET path`` through the ASGI ``app`` and returns the status code."""
+    route, _, query = path.partition("?")
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": route,
+        "raw_path": route.encode(),
+        "root_path": "",
+        "query_string": query.encode(),
+        "headers": [(b"host", b"warmup"), (b"accept-encoding", b"br, gzip"), (b"x-request-id", b"warmup")],
+        "client": ("127.0.0.1", 0),
+        "server": ("warmup", 80),
+    }
+    status = 0
+    requested = False
+
+    async def receive():
+        nonlocal requested
+        if requested:
+            return {"type": "http.disconnect"}
+        requested = True
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    return status
+
+
+class Warmup:
+    def __init__(self):
+        self.state = "pending"
+        self.stages: Dict[str, float] = {}
+        self.failed: List[Tuple[str, str]] = []
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.state not in ("pending", "running")
+
+    def skip(self):
+        self.state = "skipped"
+
+    async def _prime_pool(self, database, monitor, connections: int):
+        # A ping per wanted connection speeds up the driver's own filling of
+        # minPoolSize; the catalog profile's pings reach the secondaries
+        pings = [database.command("ping") for _ in range(connections)]
+        pings += [database.profile("catalog-read").command("ping") for _ in range(connections)]
+        await asyncio.gather(*pings)
+        # Arbiters and hidden members get a pool too but never serve a request
+        servers = [server.address for server in database.client.topology_description.readable_servers]
+        while any(monitor.open_connections().get(address, 0) < connections for address in servers):
+            await asyncio.sleep(POOL_POLL_INTERVAL)
+
+    async def _replay(self, app, paths: List[str]):
+        for path in paths:
+            try:
+                status = await get(app, path)
+            except Exception as e:
+                self.failed.append((path, str(e)))
+                continue
+            if status >= 500:
+                self.failed.append((path, f"status {status}"))
+        for path, reason in self.failed:
+            logger.warning("Warm-up request %s failed: %s", path, reason)
+
+    async def _stage(self, name: str, work: Awaitable):
+        started = time.perf_counter()
+        await work
+        self.stages[name] = round((time.perf_counter() - started) * 1000, 1)
+
+    async def run(self, app, database, monitor, connections: int,
+                  paths: Callable[[], Awaitable[List[str]]], timeout: float):
+        self.state, self.stages, self.failed = "running", {}, []
+        started = time.perf_counter()
+
+        async def stages():
+            await self._stage("pool", self._prime_pool(database, monitor, connections))
+            await self._stage("requests", self._replay(app, await paths()))
+
+        try:
+            await asyncio.wait_for(stages(), timeout)
+            self.state = "done"
+        except asyncio.TimeoutError:
+            self.state = "timed out"
+            logger.warning("Warm-up did not finish within %.0f s; ready anyway", timeout)
+        except Exception:
+            self.state = "failed"
+            logger.exception("Warm-up failed; ready anyway")
+        logger.info("Warm-up %s in %.0f ms: %s", self.state, (time.perf_counter() - started) * 1000, self.stages)
+
+    def start(self, *args, **kwargs):
+        self._task = asyncio.create_task(self.run(*args, **kwargs))
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def describe(self) -> Dict:
+        return {"state": self.state, "stages_ms": self.stages, "failed": [path for path, _ in self.failed]}
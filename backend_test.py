@@ -1,6 +1,7 @@
 import requests
 import sys
 import json
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 class EcommerceAPITester:
@@ -92,10 +93,28 @@ class EcommerceAPITester:
         """Test get single product"""
         return self.run_test("Get Single Product", "GET", "products/prod-sofa-grey", 200)
 
+    def test_get_currencies(self):
+        """Test exchange rate table"""
+        success, response = self.run_test("Get Currencies", "GET", "currencies", 200)
+        if success and response.get("rates", {}).get("eur") != 1.0:
+            print(f"❌ Currencies response has no euro rate: {response}")
+            self.tests_passed -= 1
+            return False, response
+        return success, response
+
     def test_get_nonexistent_product(self):
         """Test get nonexistent product (should return 404)"""
         return self.run_test("Get Nonexistent Product", "GET", "products/nonexistent", 404)
 
+    def test_get_related_products(self):
+        """Test related products"""
+        success, response = self.run_test("Get Related Products", "GET", "products/prod-sofa-grey/related?limit=4", 200)
+        if success and (len(response) > 4 or any(p.get("id") == "prod-sofa-grey" for p in response)):
+            print("❌ Related products include the product itself or exceed the limit")
+            self.tests_passed -= 1
+            return False, response
+        return success, response
+
     def test_create_product(self):
         """Test create new product"""
         product_data = {
@@ -137,6 +156,38 @@ class EcommerceAPITester:
         }
         return self.run_test("Update Product", "PUT", f"products/{self.created_product_id}", 200, update_data)
 
+    def test_bulk_products(self):
+        """Test bulk upsert, patch and delete in one request"""
+        product_data = {
+            "name_fr": "Test Produit Lot",
+            "name_tr": "Test Toplu Ürün",
+            "name_en": "Test Bulk Product",
+            "description_fr": "Description française de test",
+            "description_tr": "Test Türkçe açıklama",
+            "description_en": "Test English description",
+            "price": 149.99,
+            "category_id": "cat-bedroom",
+            "stock": 3
+        }
+        bulk_id = f"test-bulk-{self.session_id}"
+        bulk_data = {
+            "ordered": True,
+            "operations": [
+                {"op": "upsert", "id": bulk_id, "product": product_data},
+                {"op": "patch", "id": bulk_id, "patch": {"price": 99.99, "featured": True}},
+                {"op": "patch", "id": "nonexistent", "patch": {"stock": 1}},
+                {"op": "delete", "id": bulk_id}
+            ]
+        }
+        success, response = self.run_test("Bulk Products", "POST", "products/bulk", 200, bulk_data)
+        if success:
+            statuses = [r.get("status") for r in response.get("results", [])]
+            if statuses != ["created", "updated", "not_found", "deleted"]:
+                print(f"❌ Unexpected per-item results: {statuses}")
+                self.tests_passed -= 1
+                return False, response
+        return success, response
+
     def test_empty_cart(self):
         """Test get empty cart"""
         return self.run_test("Get Empty Cart", "GET", f"cart/{self.session_id}", 200)
@@ -169,6 +220,16 @@ class EcommerceAPITester:
         }
         return self.run_test("Add Another Item to Cart", "POST", f"cart/{self.session_id}/add", 200, cart_item)
 
+    def test_shipping_quote(self):
+        """Test delivery quote for the cart"""
+        quote_data = {"postcode": "75011", "cart_session_id": self.session_id}
+        success, response = self.run_test("Shipping Quote", "POST", "shipping/quote", 200, quote_data)
+        if success and not {"zone", "chargeable_kg", "price"} <= set(response):
+            print(f"❌ Quote response is missing fields: {sorted(response)}")
+            self.tests_passed -= 1
+            return False, response
+        return success, response
+
     def test_create_order(self):
         """Test create order from cart"""
         order_data = {
@@ -195,6 +256,46 @@ class EcommerceAPITester:
         """Test get all orders"""
         return self.run_test("Get All Orders", "GET", "orders", 200)
 
+    def test_get_all_orders_with_archive(self):
+        """Test order listing including archived orders"""
+        return self.run_test("Get All Orders (with archive)", "GET", "orders?include_archived=true", 200)
+
+    def test_admin_analytics(self):
+        """Test sales analytics report"""
+        success, response = self.run_test("Admin Analytics", "GET", "admin/analytics?top=5", 200)
+        if success and not {"totals", "daily", "top_products", "top_categories"} <= set(response):
+            print(f"❌ Analytics response is missing sections: {sorted(response)}")
+            self.tests_passed -= 1
+            return False, response
+        return success, response
+
+    def test_admin_outbox(self):
+        """Test notification outbox status"""
+        success, response = self.run_test("Admin Outbox", "GET", "admin/outbox", 200)
+        if success and not {"counts", "oldest_pending_seconds", "worker"} <= set(response):
+            print(f"❌ Outbox response is missing sections: {sorted(response)}")
+            self.tests_passed -= 1
+            return False, response
+        return success, response
+
+    def test_admin_load(self):
+        """Test admission control readings"""
+        success, response = self.run_test("Admin Load", "GET", "admin/load", 200)
+        if success and not {"loop_lag_ms", "pool_wait_ms", "requests", "carts", "logs"} <= set(response):
+            print(f"❌ Load response is missing fields: {sorted(response)}")
+            self.tests_passed -= 1
+            return False, response
+        return success, response
+
+    def test_catalog_changes(self):
+        """Test catalog delta sync"""
+        success, response = self.run_test("Catalog Changes", "GET", "catalog/changes?since=0&limit=5", 200)
+        if success and not {"version", "has_more", "changes"} <= set(response):
+            print(f"❌ Changes response is missing fields: {sorted(response)}")
+            self.tests_passed -= 1
+            return False, response
+        return success, response
+
     def test_remove_cart_item(self):
         """Test remove item from cart"""
         return self.run_test("Remove Cart Item", "DELETE", f"cart/{self.session_id}/item/prod-sofa-grey", 200)
@@ -314,6 +415,19 @@ class EcommerceAPITester:
         }
         return self.run_test("Update Profile", "PUT", "auth/profile", 200, update_data, headers)
     
+    def test_admin_promotions_need_an_admin(self):
+        """Test that promotions cannot be managed without an admin account"""
+        promotion = {"name": "Test", "kind": "percent", "value": 100, "code": "TESTFREE"}
+        success, _ = self.run_test("Admin Promotions Anonymous", "POST", "admin/promotions", 401, promotion)
+        if not success or not self.auth_token:
+            return success, {}
+        headers = {
+            'Content-Type': 'application/json',
+            'Authorization': f'Bearer {self.auth_token}'
+        }
+        # The test user is not listed in ADMIN_EMAILS
+        return self.run_test("Admin Promotions Non-Admin", "POST", "admin/promotions", 403, promotion, headers)
+    
     def test_get_user_orders(self):
         """Test get user's orders"""
         if not self.auth_token:
@@ -352,6 +466,36 @@ class EcommerceAPITester:
             self.created_order_id = response['id']
         return success, response
 
+    def test_parallel_orders_one_cart(self):
+        """Test parallel order requests for one cart create a single order"""
+        cart_session_id = f"{self.session_id}_parallel"
+        cart_item = {"product_id": "prod-sofa-grey", "quantity": 1}
+        self.run_test("Add to Cart (Parallel Orders)", "POST", f"cart/{cart_session_id}/add", 200, cart_item)
+        
+        order_data = {
+            "customer_name": "Parallel Customer",
+            "customer_email": "parallel@example.com",
+            "customer_phone": "0123456789",
+            "customer_address": "789 Retry Street, Test City",
+            "cart_session_id": cart_session_id
+        }
+        
+        def place_order(_):
+            return requests.post(f"{self.base_url}/orders", json=order_data, timeout=30)
+        
+        self.tests_run += 1
+        print("\n🔍 Testing Parallel Orders for One Cart...")
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            responses = list(pool.map(place_order, range(8)))
+        statuses = [r.status_code for r in responses]
+        order_ids = {r.json().get("id") for r in responses if r.status_code == 200}
+        if statuses == [200] * 8 and len(order_ids) == 1:
+            self.tests_passed += 1
+            print(f"✅ Passed - 8 requests, 1 order ({order_ids.pop()})")
+            return True, {}
+        print(f"❌ Failed - Statuses {statuses}, {len(order_ids)} distinct orders")
+        return False, {}
+
 def main():
     print("🧪 Starting E-commerce API Tests with Authentication")
     print("=" * 60)
@@ -368,6 +512,8 @@ def main():
         ("Products by Category", tester.test_get_products_by_category),
         ("Single Product", tester.test_get_single_product),
         ("Nonexistent Product", tester.test_get_nonexistent_product),
+        ("Currencies", tester.test_get_currencies),
+        ("Related Products", tester.test_get_related_products),
         
         # Auth tests
         ("Register User", tester.test_register_user),
@@ -379,21 +525,30 @@ def main():
         ("Get Current User Invalid Token", tester.test_get_current_user_invalid_token),
         ("Update Profile", tester.test_update_profile),
         ("Get User Orders", tester.test_get_user_orders),
+        ("Admin Promotions Need an Admin", tester.test_admin_promotions_need_an_admin),
         
         # Product and cart tests
         ("Create Product", tester.test_create_product),
         ("Update Product", tester.test_update_product),
+        ("Bulk Products", tester.test_bulk_products),
+        ("Catalog Changes", tester.test_catalog_changes),
         ("Empty Cart", tester.test_empty_cart),
         ("Add to Cart", tester.test_add_to_cart),
         ("Cart with Items", tester.test_get_cart_with_items),
         ("Update Cart Quantity", tester.test_update_cart_quantity),
         ("Add Another Item", tester.test_add_another_item_to_cart),
+        ("Shipping Quote", tester.test_shipping_quote),
         
         # Order tests
         ("Create Order", tester.test_create_order),
         ("Create Order (Authenticated)", tester.test_create_order_with_auth),
+        ("Parallel Orders (One Cart)", tester.test_parallel_orders_one_cart),
         ("Get Order", tester.test_get_order),
         ("Get All Orders", tester.test_get_all_orders),
+        ("Get All Orders (with archive)", tester.test_get_all_orders_with_archive),
+        ("Admin Analytics", tester.test_admin_analytics),
+        ("Admin Outbox", tester.test_admin_outbox),
+        ("Admin Load", tester.test_admin_load),
         
         # Cart cleanup
         ("Remove Cart Item", tester.test_remove_cart_item),
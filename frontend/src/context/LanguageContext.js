@@ -5,6 +5,11 @@ const LanguageContext = createContext();
 
 export const LanguageProvider = ({ children }) => {
   const [language, setLanguage] = useState(() => {
+    // Feed and sitemap links carry ?lang= so each language has its own URL
+    const fromUrl = new URLSearchParams(window.location.search).get('lang');
+    if (['fr', 'tr', 'en'].includes(fromUrl)) {
+      return fromUrl;
+    }
     return localStorage.getItem('gul-mobilya-lang') || 'fr';
   });
 
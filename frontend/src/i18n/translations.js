@@ -27,6 +27,7 @@ export const translations = {
       price: "Prix",
       stock: "En Stock",
       outOfStock: "Rupture de Stock",
+      related: "Souvent achetés ensemble",
       category: "Catégorie",
       categories: "Catégories"
     },
@@ -118,6 +119,7 @@ export const translations = {
       price: "Fiyat",
       stock: "Stokta",
       outOfStock: "Stokta Yok",
+      related: "Birlikte Alınanlar",
       category: "Kategori",
       categories: "Kategoriler"
     },
@@ -209,6 +211,7 @@ export const translations = {
       price: "Price",
       stock: "In Stock",
       outOfStock: "Out of Stock",
+      related: "Frequently Bought Together",
       category: "Category",
       categories: "Categories"
     },
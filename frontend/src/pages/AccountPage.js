@@ -19,7 +19,8 @@ const AccountPage = () => {
       try {
         const token = getToken();
         const response = await axios.get(`${API}/auth/orders`, {
-          headers: { Authorization: `Bearer ${token}` }
+          headers: { Authorization: `Bearer ${token}` },
+          params: { include_archived: true }
         });
         setOrders(response.data);
       } catch (error) {
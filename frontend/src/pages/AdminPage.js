@@ -22,6 +22,7 @@ const AdminPage = () => {
   const [products, setProducts] = useState([]);
   const [categories, setCategories] = useState([]);
   const [orders, setOrders] = useState([]);
+  const [analytics, setAnalytics] = useState(null);
   const [loading, setLoading] = useState(false);
   const [viewMode, setViewMode] = useState('grid');
   const [searchQuery, setSearchQuery] = useState('');
@@ -66,14 +67,18 @@ const AdminPage = () => {
   const fetchData = async () => {
     setLoading(true);
     try {
-      const [productsRes, categoriesRes, ordersRes] = await Promise.all([
-        axios.get(`${API}/products`),
-        axios.get(`${API}/categories`),
-        axios.get(`${API}/orders`)
+      // Catalog responses are HTTP-cached; revalidate so edits show up at once
+      const noCache = { headers: { 'Cache-Control': 'no-cache' } };
+      const [productsRes, categoriesRes, ordersRes, analyticsRes] = await Promise.all([
+        axios.get(`${API}/products`, noCache),
+        axios.get(`${API}/categories`, noCache),
+        axios.get(`${API}/orders`),
+        axios.get(`${API}/admin/analytics`)
       ]);
       setProducts(productsRes.data);
       setCategories(categoriesRes.data);
       setOrders(ordersRes.data);
+      setAnalytics(analyticsRes.data);
     } catch (error) {
       console.error('Error fetching data:', error);
     } finally {
@@ -145,7 +150,10 @@ const AdminPage = () => {
       };
 
       if (editingProduct) {
-        await axios.put(`${API}/products/${editingProduct.id}`, productData);
+        await axios.put(`${API}/products/${editingProduct.id}`, {
+          ...productData,
+          version: editingProduct.version ?? 0
+        });
       } else {
         await axios.post(`${API}/products`, productData);
       }
@@ -154,7 +162,13 @@ const AdminPage = () => {
       resetProductForm();
     } catch (error) {
       console.error('Error saving product:', error);
-      alert('Erreur lors de la sauvegarde');
+      if (error.response?.status === 409) {
+        alert('Bu ürün başka biri tarafından güncellendi. Liste yenilendi, lütfen tekrar düzenleyin.');
+        await fetchData();
+        resetProductForm();
+      } else {
+        alert('Erreur lors de la sauvegarde');
+      }
     } finally {
       setLoading(false);
     }
@@ -192,7 +206,9 @@ const AdminPage = () => {
   };
 
   // Stats
-  const totalRevenue = orders.filter(o => o.status === 'paid').reduce((sum, o) => sum + (o.total || 0), 0);
+  // Last 30 days from the server-side rollups
+  const totalRevenue = analytics ? analytics.totals.revenue : 0;
+  const topProducts = analytics ? analytics.top_products.slice(0, 5) : [];
   const totalOrders = orders.length;
   const totalProducts = products.length;
   const lowStockProducts = products.filter(p => p.stock < 5).length;
@@ -371,7 +387,7 @@ const AdminPage = () => {
                     </div>
                     <span className="text-green-600 text-sm font-medium">+12%</span>
                   </div>
-                  <p className="text-gray-500 text-sm">Toplam Gelir</p>
+                  <p className="text-gray-500 text-sm">Gelir (30 gün)</p>
                   <p className="text-2xl font-bold text-gray-900">{totalRevenue.toFixed(2)}€</p>
                 </div>
                 
@@ -406,6 +422,27 @@ const AdminPage = () => {
                 </div>
               </div>
 
+              {/* Top Sellers */}
+              <div className="bg-white rounded-2xl shadow-sm border border-gray-100">
+                <div className="p-6 border-b border-gray-100">
+                  <h3 className="text-lg font-bold">Çok Satanlar (30 gün)</h3>
+                </div>
+                <div className="divide-y divide-gray-100">
+                  {topProducts.map((product) => (
+                    <div key={product.product_id} className="p-4 flex items-center justify-between hover:bg-gray-50">
+                      <div>
+                        <p className="font-medium text-gray-900">{product.name_tr || product.name_fr || product.product_id}</p>
+                        <p className="text-sm text-gray-500">{product.units} adet</p>
+                      </div>
+                      <p className="font-bold text-gray-900">{product.revenue.toFixed(2)}€</p>
+                    </div>
+                  ))}
+                  {topProducts.length === 0 && (
+                    <p className="p-4 text-sm text-gray-500">Henüz satış yok</p>
+                  )}
+                </div>
+              </div>
+
               {/* Recent Orders */}
               <div className="bg-white rounded-2xl shadow-sm border border-gray-100">
                 <div className="p-6 border-b border-gray-100 flex items-center justify-between">
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { useNavigate } from 'react-router-dom';
 import axios from 'axios';
 import { useLanguage } from '../context/LanguageContext';
@@ -9,8 +9,14 @@ import AuthModal from '../components/auth/AuthModal';
 
 const API = `${process.env.REACT_APP_BACKEND_URL}/api`;
 
+// Same pattern as the server, which reads the postcode from the address too
+const POSTCODE = /\b(\d{5}|\d{2}\s\d{3})\b/;
+
+const newIdempotencyKey = () =>
+  window.crypto?.randomUUID ? window.crypto.randomUUID() : `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+
 const CheckoutPage = () => {
-  const { t, getProductField } = useLanguage();
+  const { t, getProductField, language } = useLanguage();
   const { cart, getTotal, sessionId } = useCart();
   const { user, getToken } = useAuth();
   const navigate = useNavigate();
@@ -24,6 +30,9 @@ const CheckoutPage = () => {
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState('');
   const [authModalOpen, setAuthModalOpen] = useState(false);
+  const [shipping, setShipping] = useState(null);
+  // Same key for retries of the same checkout, so the server never creates it twice
+  const idempotencyKey = useRef(newIdempotencyKey());
 
   // Pre-fill form with user data
   useEffect(() => {
@@ -37,6 +46,25 @@ const CheckoutPage = () => {
     }
   }, [user]);
 
+  // Delivery is quoted from the cart's weight and volume and the postcode
+  const postcode = formData.customer_address.match(POSTCODE)?.[1];
+  useEffect(() => {
+    if (!postcode) {
+      setShipping(null);
+      return;
+    }
+    let cancelled = false;
+    axios.post(`${API}/shipping/quote`, { postcode, cart_session_id: sessionId })
+      .then(response => { if (!cancelled) setShipping(response.data); })
+      .catch(() => { if (!cancelled) setShipping(null); });
+    return () => { cancelled = true; };
+  }, [postcode, sessionId, cart]);
+
+  // A different form is a different checkout and needs a fresh key
+  useEffect(() => {
+    idempotencyKey.current = newIdempotencyKey();
+  }, [formData]);
+
   const handleChange = (e) => {
     setFormData(prev => ({
       ...prev,
@@ -50,25 +78,19 @@ const CheckoutPage = () => {
     setError('');
 
     try {
-      const headers = {};
+      const headers = { 'Idempotency-Key': idempotencyKey.current };
       const token = getToken();
       if (token) {
         headers['Authorization'] = `Bearer ${token}`;
       }
 
-      // Create order
-      const orderResponse = await axios.post(`${API}/orders`, {
+      // Create order and checkout session in one call
+      const checkoutResponse = await axios.post(`${API}/checkout`, {
         ...formData,
-        cart_session_id: sessionId
-      }, { headers });
-
-      const order = orderResponse.data;
-
-      // Create checkout session
-      const checkoutResponse = await axios.post(`${API}/checkout/session`, {
-        order_id: order.id,
+        cart_session_id: sessionId,
+        language,
         origin_url: window.location.origin
-      });
+      }, { headers });
 
       // Redirect to Stripe
       if (checkoutResponse.data.url) {
@@ -267,7 +289,13 @@ const CheckoutPage = () => {
                 </div>
                 <div className="flex justify-between">
                   <span className="text-gray-600">Livraison</span>
-                  <span className="text-green-600 font-medium">Gratuite</span>
+                  {!shipping ? (
+                    <span className="text-gray-500">—</span>
+                  ) : shipping.price > 0 ? (
+                    <span className="text-gray-900">{shipping.price.toFixed(2)}€</span>
+                  ) : (
+                    <span className="text-green-600 font-medium">Gratuite</span>
+                  )}
                 </div>
               </div>
 
@@ -276,7 +304,7 @@ const CheckoutPage = () => {
                   {t('cart.total')}
                 </span>
                 <span className="text-lg font-bold text-[#E53935]">
-                  {getTotal().toFixed(2)}€
+                  {(getTotal() + (shipping?.price || 0)).toFixed(2)}€
                 </span>
               </div>
             </div>
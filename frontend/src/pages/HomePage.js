@@ -20,17 +20,10 @@ const HomePage = () => {
   useEffect(() => {
     const fetchData = async () => {
       try {
-        await axios.post(`${API}/seed`).catch(() => {});
-        await new Promise(resolve => setTimeout(resolve, 300));
-        
-        const [productsRes, categoriesRes] = await Promise.all([
-          axios.get(`${API}/products`),
-          axios.get(`${API}/categories`)
-        ]);
-        const products = productsRes.data;
-        setAllProducts(products);
-        setFeaturedProducts(products.filter(p => p.featured));
-        setCategories(categoriesRes.data);
+        const { data } = await axios.get(`${API}/storefront/home`, { params: { lang: language } });
+        setAllProducts(data.products);
+        setFeaturedProducts(data.featured);
+        setCategories(data.categories);
       } catch (error) {
         console.error('Error fetching data:', error);
       } finally {
@@ -38,7 +31,7 @@ const HomePage = () => {
       }
     };
     fetchData();
-  }, []);
+  }, [language]);
 
   // Auto slide
   useEffect(() => {
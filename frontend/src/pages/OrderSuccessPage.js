@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { Link, useSearchParams } from 'react-router-dom';
 import axios from 'axios';
 import { useLanguage } from '../context/LanguageContext';
@@ -12,9 +12,11 @@ const OrderSuccessPage = () => {
   const { clearCart } = useCart();
   const [searchParams] = useSearchParams();
   const [status, setStatus] = useState('checking');
-  const [attempts, setAttempts] = useState(0);
 
   const sessionId = searchParams.get('session_id');
+  // clearCart changes identity on every cart update; keep the stream effect off it
+  const clearCartRef = useRef(clearCart);
+  clearCartRef.current = clearCart;
 
   useEffect(() => {
     if (!sessionId) {
@@ -22,35 +24,57 @@ const OrderSuccessPage = () => {
       return;
     }
 
-    const pollPaymentStatus = async () => {
-      if (attempts >= 10) {
-        setStatus('timeout');
-        return;
+    const handleStatus = (data) => {
+      if (data.payment_status === 'paid') {
+        setStatus('success');
+        clearCartRef.current();
+        return true;
       }
+      if (data.status === 'expired') {
+        setStatus('expired');
+        return true;
+      }
+      return false;
+    };
 
+    // Fallback when the stream is unavailable or timed out: ask once more
+    const checkOnce = async () => {
       try {
         const response = await axios.get(`${API}/checkout/status/${sessionId}`);
-        
-        if (response.data.payment_status === 'paid') {
-          setStatus('success');
-          clearCart();
-          return;
-        } else if (response.data.status === 'expired') {
-          setStatus('expired');
-          return;
+        if (!handleStatus(response.data)) {
+          setStatus('timeout');
         }
-
-        // Continue polling
-        setAttempts(prev => prev + 1);
-        setTimeout(pollPaymentStatus, 2000);
       } catch (error) {
         console.error('Error checking payment status:', error);
         setStatus('error');
       }
     };
 
-    pollPaymentStatus();
-  }, [sessionId, attempts, clearCart]);
+    if (!window.EventSource) {
+      checkOnce();
+      return;
+    }
+
+    // The server pushes the final status as soon as Stripe confirms the payment
+    const source = new EventSource(`${API}/checkout/status/${sessionId}/stream`);
+    source.addEventListener('status', (event) => {
+      if (handleStatus(JSON.parse(event.data))) {
+        source.close();
+      }
+    });
+    source.addEventListener('timeout', () => {
+      source.close();
+      checkOnce();
+    });
+    source.onerror = () => {
+      // EventSource reconnects on its own unless the connection was refused for good
+      if (source.readyState === EventSource.CLOSED) {
+        checkOnce();
+      }
+    };
+
+    return () => source.close();
+  }, [sessionId]);
 
   return (
     <div className="min-h-screen bg-[#FDFDFD] flex items-center justify-center px-4" data-testid="order-success-page">
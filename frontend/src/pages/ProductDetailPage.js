@@ -3,6 +3,7 @@ import { useParams, Link } from 'react-router-dom';
 import axios from 'axios';
 import { useLanguage } from '../context/LanguageContext';
 import { useCart } from '../context/CartContext';
+import ProductCard from '../components/products/ProductCard';
 import { ShoppingBag, Minus, Plus, ArrowLeft, Check } from 'lucide-react';
 
 const API = `${process.env.REACT_APP_BACKEND_URL}/api`;
@@ -16,6 +17,7 @@ const ProductDetailPage = () => {
   const [quantity, setQuantity] = useState(1);
   const [added, setAdded] = useState(false);
   const [selectedImage, setSelectedImage] = useState(0);
+  const [related, setRelated] = useState([]);
 
   useEffect(() => {
     const fetchProduct = async () => {
@@ -28,7 +30,16 @@ const ProductDetailPage = () => {
         setLoading(false);
       }
     };
+    const fetchRelated = async () => {
+      try {
+        const response = await axios.get(`${API}/products/${productId}/related?limit=4`);
+        setRelated(response.data);
+      } catch (error) {
+        setRelated([]);
+      }
+    };
     fetchProduct();
+    fetchRelated();
   }, [productId]);
 
   const handleAddToCart = async () => {
@@ -183,6 +194,20 @@ const ProductDetailPage = () => {
             </div>
           </div>
         </div>
+
+        {/* Related Products */}
+        {related.length > 0 && (
+          <section className="mt-20" data-testid="related-products">
+            <h2 className="font-heading text-2xl font-medium tracking-tight text-[#1C1C1C] mb-6">
+              {t('products.related')}
+            </h2>
+            <div className="grid grid-cols-2 md:grid-cols-4 gap-4">
+              {related.map((item) => (
+                <ProductCard key={item.id} product={item} compact />
+              ))}
+            </div>
+          </section>
+        )}
       </div>
     </div>
   );